@@ -0,0 +1,261 @@
+"""
+Sistema de Extração de Dados do ERP - Agendamento por Custo
+Este módulo registra o custo de processamento de cada cliente e usa esse histórico para
+ordenar o trabalho (maior custo primeiro, LPT) e estimar o término da execução.
+"""
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Carrega as variáveis de ambiente
+load_dotenv()
+
+# Arquivo com o histórico de custos por cliente
+ARQUIVO_HISTORICO_CUSTOS = os.getenv("ARQUIVO_HISTORICO_CUSTOS", "resultados/historico_custos.json")
+
+# Peso da execução mais recente na média do tempo de cada cliente (0 a 1)
+PESO_EXECUCAO_RECENTE = 0.5
+
+# Valores usados enquanto não há histórico suficiente para calibrar a estimativa
+SEGUNDOS_BASE_PADRAO = 0.2
+SEGUNDOS_POR_MOVIMENTACAO_PADRAO = 0.002
+
+def carregar_historico_custos(caminho=ARQUIVO_HISTORICO_CUSTOS):
+    """
+    Carrega o histórico de custos por cliente.
+
+    Args:
+        caminho: Caminho do arquivo de histórico
+
+    Returns:
+        Dicionário {código do cliente: {"segundos", "movimentacao", "lancamentos", "execucao"}}
+    """
+    if not os.path.exists(caminho):
+        return {}
+
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            return json.load(f).get("clientes", {})
+    except Exception as e:
+        print(f"Erro ao carregar histórico de custos: {e}")
+        return {}
+
+def salvar_historico_custos(historico, caminho=ARQUIVO_HISTORICO_CUSTOS):
+    """
+    Salva o histórico de custos por cliente, substituindo o arquivo de forma atômica.
+
+    Args:
+        historico: Dicionário retornado por carregar_historico_custos
+        caminho: Caminho do arquivo de histórico
+    """
+    diretorio = os.path.dirname(caminho)
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+
+    caminho_temporario = caminho + ".tmp"
+    with open(caminho_temporario, "w", encoding="utf-8") as f:
+        json.dump({"atualizado_em": datetime.now().isoformat(timespec="seconds"), "clientes": historico}, f)
+    os.replace(caminho_temporario, caminho)
+
+class RegistroCustos:
+    """
+    Acumula, de forma segura entre threads, o custo medido de cada cliente durante uma execução.
+    """
+
+    def __init__(self, historico=None, contagem_movimentacao=None, execucao=None):
+        """
+        Args:
+            historico: Histórico carregado de execuções anteriores (é atualizado no lugar)
+            contagem_movimentacao: Dicionário {código: número de movimentações de venda} (opcional)
+            execucao: Identificação da execução (padrão: data e hora atual)
+        """
+        self.historico = historico if historico is not None else {}
+        self.contagem_movimentacao = contagem_movimentacao or {}
+        self.execucao = execucao or datetime.now().strftime("%Y%m%d_%H%M%S")
+        self._lock = threading.Lock()
+
+    def registrar(self, cod_cliente, segundos, movimentacao=None, lancamentos=None):
+        """
+        Registra o tempo de processamento e a contagem de documentos de um cliente.
+
+        Args:
+            cod_cliente: Código do cliente
+            segundos: Tempo de processamento do cliente
+            movimentacao: Número de movimentações de venda do cliente (padrão: contagem informada na criação)
+            lancamentos: Número de lançamentos (títulos) do cliente (opcional)
+        """
+        if movimentacao is None:
+            movimentacao = self.contagem_movimentacao.get(cod_cliente)
+
+        with self._lock:
+            anterior = self.historico.get(cod_cliente)
+            if anterior and anterior.get("segundos") is not None:
+                # Suaviza a variação entre execuções
+                segundos_medios = PESO_EXECUCAO_RECENTE * segundos + (1 - PESO_EXECUCAO_RECENTE) * anterior["segundos"]
+            else:
+                segundos_medios = segundos
+
+            # Sem a contagem desta execução, mantém a última conhecida (usada na calibração)
+            if movimentacao is None and anterior:
+                movimentacao = anterior.get("movimentacao")
+
+            self.historico[cod_cliente] = {
+                "segundos": round(segundos_medios, 4),
+                "ultima_execucao_segundos": round(segundos, 4),
+                "movimentacao": movimentacao,
+                "lancamentos": lancamentos,
+                "execucao": self.execucao
+            }
+
+    def salvar(self, caminho=ARQUIVO_HISTORICO_CUSTOS):
+        """Salva o histórico atualizado."""
+        with self._lock:
+            salvar_historico_custos(self.historico, caminho)
+
+def calibrar_modelo(historico):
+    """
+    Ajusta o modelo linear segundos = base + taxa * movimentações a partir do histórico.
+
+    Args:
+        historico: Histórico de custos por cliente
+
+    Returns:
+        Tupla (segundos_base, segundos_por_movimentacao)
+    """
+    pontos = [
+        (dados["movimentacao"], dados["segundos"])
+        for dados in historico.values()
+        if dados.get("movimentacao") is not None and dados.get("segundos") is not None
+    ]
+
+    if len(pontos) < 2:
+        return SEGUNDOS_BASE_PADRAO, SEGUNDOS_POR_MOVIMENTACAO_PADRAO
+
+    # Regressão linear por mínimos quadrados
+    n = len(pontos)
+    media_x = sum(x for x, _ in pontos) / n
+    media_y = sum(y for _, y in pontos) / n
+    variancia_x = sum((x - media_x) ** 2 for x, _ in pontos)
+
+    if variancia_x == 0:
+        return media_y, 0.0
+
+    taxa = sum((x - media_x) * (y - media_y) for x, y in pontos) / variancia_x
+    taxa = max(taxa, 0.0)
+    base = max(media_y - taxa * media_x, 0.0)
+
+    return base, taxa
+
+def estimar_custos(codigos_clientes, historico, contagem_movimentacao):
+    """
+    Estima o custo (em segundos) de cada cliente.
+
+    Usa o tempo medido em execuções anteriores; para clientes sem histórico, usa o
+    número de movimentações com o modelo calibrado pelo histórico.
+
+    Args:
+        codigos_clientes: Códigos dos clientes a processar
+        historico: Histórico de custos por cliente
+        contagem_movimentacao: Dicionário {código: número de movimentações de venda}
+
+    Returns:
+        Dicionário {código do cliente: custo estimado em segundos}
+    """
+    base, taxa = calibrar_modelo(historico)
+    custos = {}
+
+    for cod_cliente in codigos_clientes:
+        dados = historico.get(cod_cliente)
+        if dados and dados.get("segundos") is not None:
+            custos[cod_cliente] = dados["segundos"]
+        else:
+            custos[cod_cliente] = base + taxa * contagem_movimentacao.get(cod_cliente, 0)
+
+    return custos
+
+def clientes_sem_historico(codigos_clientes, historico):
+    """
+    Lista os clientes sem tempo medido no histórico, os únicos que precisam da contagem de
+    movimentações na estimativa de custo.
+
+    Args:
+        codigos_clientes: Códigos dos clientes a processar
+        historico: Histórico de custos por cliente
+
+    Returns:
+        Lista de códigos
+    """
+    return [
+        cod_cliente for cod_cliente in codigos_clientes
+        if (historico.get(cod_cliente) or {}).get("segundos") is None
+    ]
+
+def ordenar_por_custo(codigos_clientes, custos):
+    """
+    Ordena os clientes do maior para o menor custo estimado (ordem LPT).
+
+    Args:
+        codigos_clientes: Códigos dos clientes
+        custos: Dicionário {código: custo estimado}
+
+    Returns:
+        Lista de códigos ordenada
+    """
+    # O código desempata para que a ordem seja reproduzível entre execuções
+    return sorted(codigos_clientes, key=lambda cod: (-custos.get(cod, 0), cod))
+
+class EstimadorTermino:
+    """
+    Estima o tempo restante da execução a partir do custo estimado já concluído.
+
+    A razão entre o tempo real decorrido e o custo estimado concluído corrige a escala
+    do modelo (por exemplo, quando o banco está mais lento que nas execuções anteriores).
+    """
+
+    def __init__(self, custos, paralelismo=1):
+        """
+        Args:
+            custos: Dicionário {código: custo estimado} dos clientes a processar
+            paralelismo: Número de clientes processados simultaneamente
+        """
+        self.custos = custos
+        self.custo_total = sum(custos.values())
+        self.custo_concluido = 0.0
+        self.paralelismo = max(1, paralelismo)
+        self.inicio = time.time()
+        self._lock = threading.Lock()
+
+    def concluir(self, cod_cliente):
+        """Marca um cliente como concluído."""
+        with self._lock:
+            self.custo_concluido += self.custos.get(cod_cliente, 0)
+
+    def segundos_restantes(self):
+        """
+        Returns:
+            Estimativa de segundos até o fim da execução, ou None se ainda não houver dados
+        """
+        with self._lock:
+            decorrido = time.time() - self.inicio
+            if self.custo_concluido <= 0:
+                if self.custo_total <= 0:
+                    return None
+                # Sem medições ainda: usa o próprio modelo
+                return self.custo_total / self.paralelismo
+
+            restante = max(self.custo_total - self.custo_concluido, 0.0)
+            return decorrido * restante / self.custo_concluido
+
+    def descricao(self):
+        """Retorna a estimativa de término formatada para os logs."""
+        restante = self.segundos_restantes()
+        if restante is None:
+            return "ETA: indisponível"
+
+        horas, resto = divmod(int(restante), 3600)
+        minutos, segundos = divmod(resto, 60)
+        termino = datetime.fromtimestamp(time.time() + restante).strftime("%H:%M:%S")
+        return f"ETA: {horas:02d}:{minutos:02d}:{segundos:02d} (término previsto às {termino})"
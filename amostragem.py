@@ -0,0 +1,323 @@
+"""
+Sistema de Extração de Dados do ERP - Amostragem Estratificada
+Este módulo sorteia uma amostra reprodutível dos clientes com movimentações, estratificada pelo
+número de movimentações de venda (uma única agregação, já usada pelo agendamento por custo), para
+que as faixas da classificação possam ser ajustadas em minutos em vez de horas.
+
+Os clientes são ordenados pelo número de movimentações e divididos em estratos com o mesmo número
+de clientes; cada estrato recebe uma parte da amostra (proporcional ao seu tamanho ou, na alocação
+de Neyman, também à variação das movimentações dentro dele). Dentro do estrato são escolhidos os
+clientes com os menores números pseudoaleatórios derivados da semente e do código: a mesma semente
+sorteia os mesmos clientes, e clientes novos na base mudam pouco a amostra das execuções seguintes.
+
+Cada cliente da amostra representa peso = clientes do estrato / clientes do estrato com resultado.
+Os sorteados sem resultado (sem cadastro, sem vendas ou com erro) são tratados como não resposta
+do seu estrato, e os pesos são recalculados na leitura do arquivo, a partir dos clientes
+efetivamente gravados. Os percentis da população são estimados com esses pesos, e os intervalos
+de confiança por bootstrap estratificado (reamostragem com reposição dentro de cada estrato).
+"""
+import os
+import math
+import hashlib
+from dotenv import load_dotenv
+
+from persistencia import carregar_colunas, listar_arquivos_resultados
+
+# O NumPy é necessário apenas para as estimativas com intervalos de confiança
+from dependencias import np, exigir_numpy
+
+# Carrega as variáveis de ambiente
+load_dotenv()
+
+# Número de clientes da amostra (0 processa todos os clientes)
+AMOSTRA_CLIENTES = int(os.getenv("AMOSTRA_CLIENTES", "0"))
+
+# Semente do sorteio: a mesma semente sorteia os mesmos clientes
+AMOSTRA_SEMENTE = int(os.getenv("AMOSTRA_SEMENTE", "42"))
+
+# Número de estratos por número de movimentações
+AMOSTRA_ESTRATOS = int(os.getenv("AMOSTRA_ESTRATOS", "6"))
+
+# Alocação da amostra entre os estratos ("proporcional" ou "neyman")
+AMOSTRA_ALOCACAO = os.getenv("AMOSTRA_ALOCACAO", "proporcional").lower()
+
+# Mínimo de clientes sorteados por estrato (necessário para o bootstrap)
+MINIMO_POR_ESTRATO = 2
+
+# Nível de confiança e número de reamostragens dos intervalos dos percentis
+NIVEL_CONFIANCA = 0.95
+REAMOSTRAGENS = 1000
+
+# Reamostragens calculadas de uma vez (limita a memória das matrizes de valores)
+REAMOSTRAGENS_POR_BLOCO = 100
+
+# Campos gravados em cada resultado da amostra (o peso gravado considera todos os sorteados)
+CAMPO_PESO = "amostra.peso"
+CAMPO_ESTRATO = "amostra.estrato"
+CAMPO_CLIENTES_ESTRATO = "amostra.clientes_estrato"
+
+def numero_sorteio(codigo, semente):
+    """Número pseudoaleatório fixo de um cliente para a semente (0 a 2^64 - 1)."""
+    resumo = hashlib.blake2b(f"{semente}:{codigo}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(resumo, "big")
+
+def alocar(tamanhos, desvios, tamanho_amostra, alocacao="proporcional"):
+    """
+    Divide o tamanho da amostra entre os estratos.
+
+    Cada estrato recebe pelo menos MINIMO_POR_ESTRATO clientes (ou todos, se tiver menos) e
+    nunca mais clientes do que tem; o restante é dividido pelo maior resto.
+
+    Args:
+        tamanhos: Lista com o número de clientes de cada estrato
+        desvios: Lista com o desvio padrão das movimentações em cada estrato
+        tamanho_amostra: Número total de clientes a sortear
+        alocacao: "proporcional" (ao tamanho do estrato) ou "neyman" (ao tamanho vezes o desvio)
+
+    Returns:
+        Lista com o número de clientes sorteados de cada estrato
+    """
+    if alocacao not in ("proporcional", "neyman"):
+        raise ValueError(f"Alocação inválida: {alocacao}. Use proporcional ou neyman.")
+
+    tamanho_amostra = min(tamanho_amostra, sum(tamanhos))
+    sorteados = [min(tamanho, MINIMO_POR_ESTRATO) for tamanho in tamanhos]
+
+    # Estratos sem variação nas movimentações ainda recebem a parte proporcional na alocação de Neyman
+    fatores = [
+        tamanho * (desvio if alocacao == "neyman" and desvio > 0 else 1.0)
+        for tamanho, desvio in zip(tamanhos, desvios)
+    ]
+
+    # A cada rodada, o restante é dividido entre os estratos que ainda têm clientes não sorteados;
+    # uma nova rodada só é necessária quando algum estrato esgota
+    restante = tamanho_amostra - sum(sorteados)
+    while restante > 0:
+        abertos = [h for h, tamanho in enumerate(tamanhos) if sorteados[h] < tamanho]
+        soma_fatores = sum(fatores[h] for h in abertos)
+        partes = {h: restante * fatores[h] / soma_fatores for h in abertos}
+        adicionais = {h: min(int(partes[h]), tamanhos[h] - sorteados[h]) for h in abertos}
+
+        # Os clientes que sobram do arredondamento vão para os estratos com os maiores restos
+        sobra = restante - sum(adicionais.values())
+        for h in sorted(abertos, key=lambda h: (int(partes[h]) - partes[h], h)):
+            if sobra == 0:
+                break
+            if sorteados[h] + adicionais[h] < tamanhos[h]:
+                adicionais[h] += 1
+                sobra -= 1
+
+        for h in abertos:
+            sorteados[h] += adicionais[h]
+        restante = sobra
+
+    return sorteados
+
+def sortear_amostra(clientes, contagem_movimentacao, tamanho_amostra=AMOSTRA_CLIENTES, estratos=AMOSTRA_ESTRATOS,
+                    semente=AMOSTRA_SEMENTE, alocacao=AMOSTRA_ALOCACAO):
+    """
+    Sorteia a amostra estratificada pelo número de movimentações de venda.
+
+    Args:
+        clientes: Códigos dos clientes com movimentações (população)
+        contagem_movimentacao: Dicionário {código do cliente: número de movimentações de venda},
+            de obter_contagem_movimentacao_por_cliente; clientes ausentes contam 0
+        tamanho_amostra: Número de clientes a sortear
+        estratos: Número de estratos
+        semente: Semente do sorteio
+        alocacao: "proporcional" ou "neyman" (ver alocar)
+
+    Returns:
+        Dicionário com os códigos sorteados ("codigos"), o estrato, o tamanho do estrato e o peso
+        de cada um ("clientes" {código: {"estrato", "clientes_estrato", "sorteados_estrato",
+        "peso"}}) e a descrição dos estratos ("estratos")
+    """
+    if not clientes:
+        raise ValueError("Nenhum cliente para sortear")
+
+    # A ordem pelas movimentações, com o código como desempate, não depende da ordem de leitura
+    populacao = sorted(set(clientes), key=lambda codigo: (contagem_movimentacao.get(codigo, 0), str(codigo)))
+    estratos = max(1, min(estratos, len(populacao)))
+    limites = [len(populacao) * h // estratos for h in range(estratos + 1)]
+    membros_estratos = [populacao[inicio:fim] for inicio, fim in zip(limites, limites[1:])]
+
+    desvios = []
+    for membros in membros_estratos:
+        contagens = [contagem_movimentacao.get(codigo, 0) for codigo in membros]
+        media = sum(contagens) / len(contagens)
+        desvios.append(math.sqrt(sum((contagem - media) ** 2 for contagem in contagens) / len(contagens)))
+
+    sorteados_por_estrato = alocar([len(membros) for membros in membros_estratos], desvios, tamanho_amostra, alocacao)
+
+    codigos = []
+    clientes_amostra = {}
+    descricao = []
+    for h, (membros, sorteados) in enumerate(zip(membros_estratos, sorteados_por_estrato)):
+        escolhidos = sorted(membros, key=lambda codigo: numero_sorteio(codigo, semente))[:sorteados]
+        peso = len(membros) / sorteados
+        for codigo in escolhidos:
+            clientes_amostra[codigo] = {
+                "estrato": h,
+                "clientes_estrato": len(membros),
+                "sorteados_estrato": sorteados,
+                "peso": peso
+            }
+        codigos.extend(escolhidos)
+        descricao.append({
+            "estrato": h,
+            "movimentacoes_minimo": contagem_movimentacao.get(membros[0], 0),
+            "movimentacoes_maximo": contagem_movimentacao.get(membros[-1], 0),
+            "clientes": len(membros),
+            "sorteados": sorteados,
+            "peso": peso
+        })
+
+    return {
+        "semente": semente,
+        "alocacao": alocacao,
+        "populacao": len(populacao),
+        "codigos": codigos,
+        "clientes": clientes_amostra,
+        "estratos": descricao
+    }
+
+def exibir_plano(plano):
+    """Exibe os estratos da amostra: faixa de movimentações, clientes, sorteados e peso."""
+    print(
+        f"Amostra de {len(plano['codigos'])} de {plano['populacao']} clientes "
+        f"(semente {plano['semente']}, alocação {plano['alocacao']}):"
+    )
+    for estrato in plano["estratos"]:
+        print(
+            f"    Estrato {estrato['estrato']}: {estrato['movimentacoes_minimo']} a {estrato['movimentacoes_maximo']} movimentações | "
+            f"{estrato['sorteados']}/{estrato['clientes']} clientes | peso {estrato['peso']:.2f}"
+        )
+
+def percentis_ponderados(valores, pesos, percentis):
+    """
+    Percentis ponderados pelo posto mais próximo, em cada linha.
+
+    O percentil p é o menor valor cuja soma dos pesos dos valores até ele atinge p% do peso
+    total, a mesma definição de analise_servidor.posicao_percentil com pesos unitários.
+
+    Args:
+        valores: Matriz (linhas x clientes); NaN marca clientes fora da análise
+        pesos: Matriz de pesos com a mesma forma
+        percentis: Percentis a calcular (0 a 100)
+
+    Returns:
+        Matriz (linhas x percentis), com NaN nas linhas sem valores
+    """
+    pesos = np.where(np.isnan(valores), 0.0, pesos)
+    ordem = np.argsort(np.where(np.isnan(valores), np.inf, valores), axis=1)
+    ordenados = np.take_along_axis(valores, ordem, axis=1)
+    acumulados = np.cumsum(np.take_along_axis(pesos, ordem, axis=1), axis=1)
+    totais = acumulados[:, -1:]
+
+    resultado = np.empty((len(valores), len(percentis)))
+    for coluna, p in enumerate(percentis):
+        # Tolerância relativa para que arredondamentos da soma não pulem uma posição
+        alvos = totais * (p / 100) * (1 - 1e-12)
+        posicoes = np.minimum((acumulados < alvos).sum(axis=1), valores.shape[1] - 1)
+        resultado[:, coluna] = ordenados[np.arange(len(valores)), posicoes]
+    resultado[totais[:, 0] == 0] = np.nan
+    return resultado
+
+def estimar_percentis(valores, pesos, estratos, percentis, confianca=NIVEL_CONFIANCA, reamostragens=REAMOSTRAGENS, semente=0):
+    """
+    Estima os percentis da população a partir da amostra, com intervalos de confiança.
+
+    Os intervalos são obtidos por bootstrap estratificado: cada reamostragem sorteia, com
+    reposição, o mesmo número de clientes de cada estrato, e os limites são os quantis
+    (1 - confiança) / 2 e (1 + confiança) / 2 dos percentis das reamostragens. Clientes fora da
+    análise (por exemplo, sem faturamento) devem ter valor NaN, e não ser removidos, para que a
+    variação do número de clientes analisados em cada estrato também entre no intervalo.
+
+    Args:
+        valores: Valores dos clientes da amostra (NaN fora da análise)
+        pesos: Peso de cada cliente (campo amostra.peso dos resultados)
+        estratos: Estrato de cada cliente (campo amostra.estrato dos resultados)
+        percentis: Percentis a estimar (0 a 100)
+        confianca: Nível de confiança dos intervalos
+        reamostragens: Número de reamostragens do bootstrap
+        semente: Semente das reamostragens
+
+    Returns:
+        Lista de tuplas (estimativa, limite inferior, limite superior), na ordem dos percentis
+    """
+    exigir_numpy("as estimativas da amostra")
+
+    valores = np.asarray(valores, dtype=float)
+    pesos = np.asarray(pesos, dtype=float)
+    estratos = np.asarray(estratos)
+    estimativas = percentis_ponderados(valores[None, :], pesos[None, :], percentis)[0]
+
+    gerador = np.random.default_rng(semente)
+    membros = [np.flatnonzero(estratos == estrato) for estrato in np.unique(estratos)]
+    replicas = []
+    for inicio in range(0, reamostragens, REAMOSTRAGENS_POR_BLOCO):
+        linhas = min(REAMOSTRAGENS_POR_BLOCO, reamostragens - inicio)
+        indices = np.concatenate(
+            [indices_estrato[gerador.integers(0, len(indices_estrato), size=(linhas, len(indices_estrato)))] for indices_estrato in membros],
+            axis=1
+        )
+        replicas.append(percentis_ponderados(valores[indices], pesos[indices], percentis))
+    replicas = np.concatenate(replicas)
+
+    alfa = 1 - confianca
+    inferiores = np.nanquantile(replicas, alfa / 2, axis=0)
+    superiores = np.nanquantile(replicas, 1 - alfa / 2, axis=0)
+    return [(float(e), float(i), float(s)) for e, i, s in zip(estimativas, inferiores, superiores)]
+
+def recalcular_pesos(estratos, clientes_estrato):
+    """
+    Recalcula os pesos a partir dos clientes gravados de cada estrato.
+
+    Args:
+        estratos: Estrato de cada cliente gravado
+        clientes_estrato: Número de clientes da população no estrato de cada cliente
+
+    Returns:
+        Array com o peso de cada cliente (clientes do estrato / clientes gravados do estrato)
+    """
+    exigir_numpy("as estimativas da amostra")
+
+    estratos = np.asarray(estratos)
+    pesos = np.asarray(clientes_estrato, dtype=float).copy()
+    for estrato in np.unique(estratos):
+        membros = estratos == estrato
+        pesos[membros] /= membros.sum()
+    return pesos
+
+def localizar_amostra(diretorio="resultados"):
+    """Retorna o arquivo de resultados da amostra mais recente, ou None."""
+    arquivos = listar_arquivos_resultados(diretorio, prefixo="resultado_amostra_")
+    return arquivos[-1] if arquivos else None
+
+def carregar_amostra(caminho, campos):
+    """
+    Carrega as colunas pedidas de um arquivo de resultados da amostra, com o peso e o estrato.
+
+    Args:
+        caminho: Arquivo de resultados da amostra (ver localizar_amostra)
+        campos: Especificação das colunas (ver persistencia.colunas.normalizar_campos)
+
+    Returns:
+        Dicionário {coluna: array do NumPy}, com as colunas "peso" e "estrato"; clientes sem peso
+        (gravados fora de uma amostra) ficam de fora. Os pesos são recalculados pelos clientes
+        gravados de cada estrato (ver recalcular_pesos); arquivos gravados antes do campo
+        amostra.clientes_estrato mantêm os pesos gravados
+    """
+    colunas = carregar_colunas(caminho, {
+        **campos,
+        "peso": CAMPO_PESO,
+        "estrato": (CAMPO_ESTRATO, "int"),
+        "clientes_estrato": CAMPO_CLIENTES_ESTRATO
+    })
+    validos = colunas["peso"] > 0
+    colunas = {nome: coluna[validos] for nome, coluna in colunas.items()}
+
+    clientes_estrato = colunas.pop("clientes_estrato")
+    if len(clientes_estrato) and not np.isnan(clientes_estrato).any():
+        colunas["peso"] = recalcular_pesos(colunas["estrato"], clientes_estrato)
+    return colunas
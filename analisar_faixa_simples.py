@@ -2,56 +2,36 @@
 Script para analisar a distribuição de faturamento a partir de um arquivo JSON existente.
 """
 import os
-import json
-import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from sklearn.cluster import KMeans
 
-def carregar_arquivo(caminho_arquivo):
-    """Carrega um arquivo JSON."""
-    try:
-        with open(caminho_arquivo, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Erro ao carregar o arquivo: {e}")
-        return None
+from persistencia import carregar_colunas, listar_arquivos_resultados
+from segmentacao_otima import segmentar, GRUPOS_FAIXAS
 
-def extrair_faturamentos(dados):
-    """Extrai os dados de faturamento de cada cliente."""
-    faturamentos = []
-    
-    # Verifica se os dados são uma lista de clientes ou um objeto único
-    if isinstance(dados, list):
-        # É uma lista de clientes
-        clientes = dados
-    else:
-        # É um único objeto que pode conter uma lista de clientes
-        clientes = dados if isinstance(dados, list) else [dados]
+def localizar_arquivo(caminho_arquivo, diretorio='resultados'):
+    """Retorna o caminho informado ou, se não existir, o resultado completo mais recente."""
+    if os.path.exists(caminho_arquivo):
+        return caminho_arquivo
     
-    for cliente in clientes:
-        try:
-            # Extrai o faturamento líquido
-            fat = cliente.get('faturamento_ultimos_12_meses', {}).get('faturamento_liquido', 0)
-            if fat > 0:  # Ignora faturamentos nulos ou negativos
-                faturamentos.append({
-                    'codigo': cliente.get('codigo_cliente', 'N/A'),
-                    'nome': cliente.get('nome_completo', 'N/A'),
-                    'faturamento': fat
-                })
-        except Exception as e:
-            print(f"Erro ao extrair faturamento do cliente: {str(e)}")
+    arquivos = listar_arquivos_resultados(diretorio, prefixo="resultado_completo_")
+    return arquivos[-1] if arquivos else None
+
+def extrair_faturamentos(caminho_arquivo):
+    """Carrega o faturamento líquido dos clientes com faturamento positivo, em uma coluna do NumPy."""
+    colunas = carregar_colunas(caminho_arquivo, {'faturamento': 'faturamento_ultimos_12_meses.faturamento_liquido'})
     
-    return faturamentos
+    # Ignora faturamentos nulos, negativos ou ausentes (NaN)
+    faturamentos = colunas['faturamento']
+    return faturamentos[faturamentos > 0]
 
 def analisar_distribuicao(faturamentos):
     """Analisa a distribuição dos faturamentos e sugere faixas ideais."""
-    if not faturamentos:
+    if len(faturamentos) == 0:
         print("Nenhum dado de faturamento disponível para análise")
         return
     
     # Converte para DataFrame para facilitar a análise
-    df = pd.DataFrame(faturamentos)
+    df = pd.DataFrame({'faturamento': faturamentos})
     
     # Estatísticas básicas
     print("\n=== ESTATÍSTICAS DE FATURAMENTO ===")
@@ -78,29 +58,25 @@ def analisar_distribuicao(faturamentos):
     print(f"Faixa para 2 pontos: R$ {valores_percentis[0]:.2f} a R$ {valores_percentis[1]:.2f} (Percentil 10-25)")
     print(f"Faixa para 0 pontos: Abaixo de R$ {valores_percentis[0]:.2f} (Percentil <10)")
     
-    # Análise com K-means para encontrar clusters naturais
+    # Segmentação ótima (quebras naturais) para encontrar os grupos naturais
     try:
-        if len(df) >= 5:  # Só tenta fazer clustering se houver pelo menos 5 clientes
-            # Preparação dos dados para clustering
-            X = np.array(df['faturamento']).reshape(-1, 1)
-            
-            # K-means com 5 clusters (para 5 níveis de pontuação)
-            kmeans = KMeans(n_clusters=5, random_state=42, n_init=10).fit(X)
-            
-            # Obtém os centroides e ordena
-            centroides = [c[0] for c in kmeans.cluster_centers_]
-            centroides.sort()
+        segmentacao = segmentar(df['faturamento'], GRUPOS_FAIXAS)
+        
+        # Só sugere faixas se houver um grupo para cada nível de pontuação
+        if len(segmentacao['limites_inferiores']) == GRUPOS_FAIXAS:
+            # Cada faixa começa no menor faturamento do seu grupo
+            limites = segmentacao['limites_inferiores']
             
-            print("\n=== SUGESTÃO DE FAIXAS BASEADA EM CLUSTERS (K-MEANS) ===")
-            print(f"Faixa para 10 pontos: R$ {centroides[4]:.2f} ou mais")
-            print(f"Faixa para 8 pontos: R$ {centroides[3]:.2f} a R$ {centroides[4]:.2f}")
-            print(f"Faixa para 6 pontos: R$ {centroides[2]:.2f} a R$ {centroides[3]:.2f}")
-            print(f"Faixa para 4 pontos: R$ {centroides[1]:.2f} a R$ {centroides[2]:.2f}")
-            print(f"Faixa para 2 pontos: Abaixo de R$ {centroides[1]:.2f}")
+            print("\n=== SUGESTÃO DE FAIXAS BASEADA EM GRUPOS NATURAIS (SEGMENTAÇÃO ÓTIMA) ===")
+            print(f"Faixa para 10 pontos: R$ {limites[4]:.2f} ou mais")
+            print(f"Faixa para 8 pontos: R$ {limites[3]:.2f} a R$ {limites[4]:.2f}")
+            print(f"Faixa para 6 pontos: R$ {limites[2]:.2f} a R$ {limites[3]:.2f}")
+            print(f"Faixa para 4 pontos: R$ {limites[1]:.2f} a R$ {limites[2]:.2f}")
+            print(f"Faixa para 2 pontos: Abaixo de R$ {limites[1]:.2f}")
         else:
-            print("\nDados insuficientes para análise de clusters (mínimo de 5 clientes necessários).")
+            print(f"\nDados insuficientes para análise de grupos (mínimo de {GRUPOS_FAIXAS} valores distintos necessários).")
     except Exception as e:
-        print(f"Erro na análise de clusters: {e}")
+        print(f"Erro na análise de grupos: {e}")
     
     # Sugestão de configuração para o arquivo .env
     print("\n=== SUGESTÃO DE CONFIGURAÇÃO PARA .ENV ===")
@@ -135,19 +111,16 @@ def main():
     """Função principal."""
     print("=== ANALISADOR DE FAIXAS DE FATURAMENTO ===")
     
-    # Caminho direto para o arquivo
-    caminho_arquivo = "resultados/resultados_completos.json"
-    print(f"Analisando arquivo: {caminho_arquivo}")
-    
-    # Carrega os dados
-    dados = carregar_arquivo(caminho_arquivo)
-    if not dados:
+    # Caminho direto para o arquivo (ou o resultado completo mais recente)
+    caminho_arquivo = localizar_arquivo("resultados/resultados_completos.json")
+    if not caminho_arquivo:
         print("Não foi possível carregar os dados. Verifique o caminho e formato do arquivo.")
         return
+    print(f"Analisando arquivo: {caminho_arquivo}")
     
-    # Extrai e analisa os faturamentos
-    faturamentos = extrair_faturamentos(dados)
-    if faturamentos:
+    # Extrai e analisa os faturamentos, lendo do arquivo apenas a coluna de faturamento
+    faturamentos = extrair_faturamentos(caminho_arquivo)
+    if len(faturamentos):
         print(f"Foram encontrados dados de {len(faturamentos)} clientes com faturamento válido.")
         analisar_distribuicao(faturamentos)
     else:
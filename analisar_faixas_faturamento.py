@@ -5,85 +5,166 @@ Este script analisa um conjunto de resultados de clientes para determinar
 as faixas de faturamento mais adequadas para classificação.
 """
 import os
-import json
-import glob
+import sys
+import argparse
+import subprocess
 import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 import matplotlib.pyplot as plt
-from sklearn.cluster import KMeans
+
+from persistencia import carregar_colunas, listar_arquivos_resultados
+from esbocos_quantis import localizar_esbocos, carregar_esbocos
+from segmentacao_otima import segmentar, GRUPOS_FAIXAS
+from analise_servidor import resumir_metricas, exibir_histograma
+from conexao import obter_banco
+from amostragem import localizar_amostra, carregar_amostra, estimar_percentis, NIVEL_CONFIANCA
 
 # Carrega as variáveis de ambiente
 load_dotenv()
 
-def carregar_resultados(diretorio='resultados'):
-    """Carrega todos os arquivos de resultado JSON do diretório especificado."""
-    dados = []
-    arquivos = glob.glob(f"{diretorio}/resultado_*.json")
+def localizar_arquivos_resultados(diretorio='resultados'):
+    """Lista os arquivos de resultado (JSON ou NDJSON) disponíveis no diretório especificado."""
+    arquivos = listar_arquivos_resultados(diretorio, prefixo="resultado_")
+    
+    # Os resultados de uma amostra só valem com os pesos de cada cliente (ver analisar_amostra)
+    arquivos = [arquivo for arquivo in arquivos if not os.path.basename(arquivo).startswith("resultado_amostra_")]
     
     # Se não encontrou arquivos de resultado, verifica se há um arquivo de resultados completos
+    if not arquivos and os.path.exists(f"{diretorio}/resultados_completos.json"):
+        arquivos = [f"{diretorio}/resultados_completos.json"]
+    
+    return arquivos
+
+def extrair_faturamentos(diretorio='resultados'):
+    """
+    Carrega o faturamento líquido dos clientes com faturamento positivo de todos os arquivos de
+    resultado do diretório, em uma coluna do NumPy (um processo de leitura por arquivo).
+    """
+    arquivos = localizar_arquivos_resultados(diretorio)
     if not arquivos:
-        if os.path.exists(f"{diretorio}/resultados_completos.json"):
-            try:
-                with open(f"{diretorio}/resultados_completos.json", 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"Erro ao carregar resultados completos: {e}")
-                return []
+        print("Nenhum arquivo de resultado encontrado")
+        return np.array([])
+    
+    colunas = carregar_colunas(arquivos, {'faturamento': 'faturamento_ultimos_12_meses.faturamento_liquido'})
+    
+    # Ignora faturamentos nulos, negativos ou ausentes (NaN)
+    faturamentos = colunas['faturamento']
+    return faturamentos[faturamentos > 0]
+
+# Percentis usados nas sugestões de faixas
+PERCENTIS = [25, 50, 75, 90, 95, 99]
+
+def exibir_sugestao_percentis(valores_percentis, intervalos=None):
+    """
+    Exibe os percentis do faturamento e as faixas sugeridas a partir deles.
+    
+    Args:
+        valores_percentis: Valores dos percentis, na ordem de PERCENTIS
+        intervalos: Intervalos de confiança (inferior, superior) de cada percentil, quando os
+            percentis são estimados a partir de uma amostra
+    """
+    print("\n=== ANÁLISE DE PERCENTIS ===")
+    for indice, (p, v) in enumerate(zip(PERCENTIS, valores_percentis)):
+        if intervalos:
+            inferior, superior = intervalos[indice]
+            print(f"Percentil {p}%: R$ {v:.2f} (IC {NIVEL_CONFIANCA:.0%}: R$ {inferior:.2f} a R$ {superior:.2f})")
         else:
-            print("Nenhum arquivo de resultado encontrado")
-            return []
-    
-    # Carrega cada arquivo de resultado individual
-    for arquivo in arquivos:
-        try:
-            with open(arquivo, 'r', encoding='utf-8') as f:
-                dados_cliente = json.load(f)
-                dados.append(dados_cliente)
-        except Exception as e:
-            print(f"Erro ao carregar {arquivo}: {e}")
-    
-    return dados
+            print(f"Percentil {p}%: R$ {v:.2f}")
+    
+    # Sugestão baseada em percentis
+    print("\n=== SUGESTÃO DE FAIXAS BASEADA EM PERCENTIS ===")
+    print(f"Faixa para 10 pontos: R$ {valores_percentis[-2]:.2f} ou mais")
+    print(f"Faixa para 8 pontos: R$ {valores_percentis[-3]:.2f} a R$ {valores_percentis[-2]:.2f}")
+    print(f"Faixa para 6 pontos: R$ {valores_percentis[-4]:.2f} a R$ {valores_percentis[-3]:.2f}")
+    print(f"Faixa para 4 pontos: R$ {valores_percentis[-5]:.2f} a R$ {valores_percentis[-4]:.2f}")
+    print(f"Faixa para 2 pontos: Abaixo de R$ {valores_percentis[-5]:.2f}")
 
-def extrair_faturamentos(dados):
-    """Extrai os dados de faturamento de cada cliente."""
-    faturamentos = []
-    
-    for cliente in dados:
-        try:
-            # Verifica se é um cliente individual ou lista
-            if isinstance(cliente, list):
-                # Se for uma lista de clientes
-                for c in cliente:
-                    fat = c.get('faturamento_ultimos_12_meses', {}).get('faturamento_liquido', 0)
-                    if fat > 0:  # Ignora faturamentos nulos ou negativos
-                        faturamentos.append({
-                            'codigo': c.get('codigo_cliente', 'N/A'),
-                            'nome': c.get('nome_completo', 'N/A'),
-                            'faturamento': fat
-                        })
-            else:
-                # Cliente individual
-                fat = cliente.get('faturamento_ultimos_12_meses', {}).get('faturamento_liquido', 0)
-                if fat > 0:  # Ignora faturamentos nulos ou negativos
-                    faturamentos.append({
-                        'codigo': cliente.get('codigo_cliente', 'N/A'),
-                        'nome': cliente.get('nome_completo', 'N/A'),
-                        'faturamento': fat
-                    })
-        except Exception as e:
-            print(f"Erro ao extrair faturamento: {e}")
-    
-    return faturamentos
+def exibir_env_percentis(valores_percentis):
+    """Exibe as faixas sugeridas pelos percentis no formato do arquivo .env."""
+    print("# Com base nos percentis")
+    print(f"FATURAMENTO_FAIXA_10={int(valores_percentis[-2])}")
+    print(f"FATURAMENTO_FAIXA_8={int(valores_percentis[-3])}")
+    print(f"FATURAMENTO_FAIXA_6={int(valores_percentis[-4])}")
+    print(f"FATURAMENTO_FAIXA_4={int(valores_percentis[-5])}")
+
+def analisar_esboco(esboco):
+    """Sugere as faixas a partir do esboço de quantis do faturamento, sem ler os resultados."""
+    if esboco.contagem == 0:
+        print("Nenhum dado de faturamento disponível para análise")
+        return
+    
+    print("\n=== ESTATÍSTICAS DE FATURAMENTO (ESBOÇO DE QUANTIS) ===")
+    print(f"Total de clientes com faturamento: {esboco.contagem}")
+    print(f"Faturamento mínimo: R$ {esboco.minimo:.2f}")
+    print(f"Faturamento máximo: R$ {esboco.maximo:.2f}")
+    print(f"Faturamento médio: R$ {esboco.media():.2f}")
+    print(f"Faturamento mediana: R$ {esboco.quantil(0.5):.2f}")
+    
+    valores_percentis = esboco.quantis([p/100 for p in PERCENTIS])
+    exibir_sugestao_percentis(valores_percentis)
+    
+    print("\n=== SUGESTÃO DE CONFIGURAÇÃO PARA .ENV ===")
+    exibir_env_percentis(valores_percentis)
+
+def analisar_servidor(nome_collection="ClientInsight"):
+    """Sugere as faixas com as estatísticas calculadas no servidor, sem arquivos de resultados."""
+    resumo = resumir_metricas(obter_banco(), nome_collection, metricas=["faturamento_liquido"], percentis=PERCENTIS)
+    faturamento = resumo["metricas"]["faturamento_liquido"]
+    if not faturamento["clientes"]:
+        print("Nenhum dado de faturamento disponível para análise")
+        return
+    
+    print(f"\n=== ESTATÍSTICAS DE FATURAMENTO (SERVIDOR, {resumo['segundos']:.2f} s) ===")
+    print(f"Total de clientes com faturamento: {faturamento['clientes']}")
+    print(f"Faturamento mínimo: R$ {faturamento['minimo']:.2f}")
+    print(f"Faturamento máximo: R$ {faturamento['maximo']:.2f}")
+    print(f"Faturamento médio: R$ {faturamento['media']:.2f}")
+    print(f"Faturamento mediana: R$ {faturamento['mediana']:.2f}")
+    
+    print("\nDistribuição de faturamento (faixas com o mesmo número de clientes):")
+    exibir_histograma(faturamento["histograma"])
+    
+    valores_percentis = [faturamento["percentis"][p] for p in PERCENTIS]
+    exibir_sugestao_percentis(valores_percentis)
+    
+    print("\n=== SUGESTÃO DE CONFIGURAÇÃO PARA .ENV ===")
+    exibir_env_percentis(valores_percentis)
+
+def analisar_amostra(caminho):
+    """Sugere as faixas a partir de uma amostra estratificada, com intervalos de confiança dos percentis."""
+    colunas = carregar_amostra(caminho, {'faturamento': 'faturamento_ultimos_12_meses.faturamento_liquido'})
+    
+    # Clientes sem faturamento positivo ficam fora dos percentis, mas continuam nas reamostragens
+    faturamentos = np.where(colunas['faturamento'] > 0, colunas['faturamento'], np.nan)
+    positivos = ~np.isnan(faturamentos)
+    if not positivos.any():
+        print("Nenhum dado de faturamento disponível para análise")
+        return
+    
+    print(f"\n=== ESTATÍSTICAS DE FATURAMENTO (AMOSTRA '{caminho}') ===")
+    print(f"Clientes da amostra com faturamento: {int(positivos.sum())} de {len(faturamentos)}")
+    print(f"Total estimado de clientes com faturamento: {colunas['peso'][positivos].sum():.0f}")
+    print(f"Faturamento médio estimado: R$ {np.average(faturamentos[positivos], weights=colunas['peso'][positivos]):.2f}")
+    
+    estimativas = estimar_percentis(faturamentos, colunas['peso'], colunas['estrato'], PERCENTIS + [50])
+    *estimativas_percentis, mediana = estimativas
+    print(f"Faturamento mediana estimada: R$ {mediana[0]:.2f} (IC {NIVEL_CONFIANCA:.0%}: R$ {mediana[1]:.2f} a R$ {mediana[2]:.2f})")
+    
+    valores_percentis = [estimativa for estimativa, _, _ in estimativas_percentis]
+    exibir_sugestao_percentis(valores_percentis, [(inferior, superior) for _, inferior, superior in estimativas_percentis])
+    
+    print("\n=== SUGESTÃO DE CONFIGURAÇÃO PARA .ENV ===")
+    exibir_env_percentis(valores_percentis)
 
 def analisar_distribuicao(faturamentos):
     """Analisa a distribuição dos faturamentos e sugere faixas ideais."""
-    if not faturamentos:
+    if len(faturamentos) == 0:
         print("Nenhum dado de faturamento disponível para análise")
         return
     
     # Converte para DataFrame para facilitar a análise
-    df = pd.DataFrame(faturamentos)
+    df = pd.DataFrame({'faturamento': faturamentos})
     
     # Estatísticas básicas
     print("\n=== ESTATÍSTICAS DE FATURAMENTO ===")
@@ -94,58 +175,38 @@ def analisar_distribuicao(faturamentos):
     print(f"Faturamento mediana: R$ {df['faturamento'].median():.2f}")
     
     # Análise de percentis
-    percentis = [25, 50, 75, 90, 95, 99]
-    valores_percentis = [df['faturamento'].quantile(p/100) for p in percentis]
-    
-    print("\n=== ANÁLISE DE PERCENTIS ===")
-    for p, v in zip(percentis, valores_percentis):
-        print(f"Percentil {p}%: R$ {v:.2f}")
+    valores_percentis = [df['faturamento'].quantile(p/100) for p in PERCENTIS]
+    exibir_sugestao_percentis(valores_percentis)
     
-    # Sugestão baseada em percentis
-    print("\n=== SUGESTÃO DE FAIXAS BASEADA EM PERCENTIS ===")
-    print(f"Faixa para 10 pontos: R$ {valores_percentis[-2]:.2f} ou mais")
-    print(f"Faixa para 8 pontos: R$ {valores_percentis[-3]:.2f} a R$ {valores_percentis[-2]:.2f}")
-    print(f"Faixa para 6 pontos: R$ {valores_percentis[-4]:.2f} a R$ {valores_percentis[-3]:.2f}")
-    print(f"Faixa para 4 pontos: R$ {valores_percentis[-5]:.2f} a R$ {valores_percentis[-4]:.2f}")
-    print(f"Faixa para 2 pontos: Abaixo de R$ {valores_percentis[-5]:.2f}")
-    
-    # Análise com K-means para encontrar clusters naturais
+    # Segmentação ótima (quebras naturais) para encontrar os grupos naturais
+    limites = None
     try:
-        # Preparação dos dados para clustering
-        X = np.array(df['faturamento']).reshape(-1, 1)
-        
-        # K-means com 5 clusters (para 5 níveis de pontuação)
-        kmeans = KMeans(n_clusters=5, random_state=42, n_init=10).fit(X)
-        
-        # Obtém os centroides e ordena
-        centroides = [c[0] for c in kmeans.cluster_centers_]
-        centroides.sort()
-        
-        print("\n=== SUGESTÃO DE FAIXAS BASEADA EM CLUSTERS (K-MEANS) ===")
-        print(f"Faixa para 10 pontos: R$ {centroides[4]:.2f} ou mais")
-        print(f"Faixa para 8 pontos: R$ {centroides[3]:.2f} a R$ {centroides[4]:.2f}")
-        print(f"Faixa para 6 pontos: R$ {centroides[2]:.2f} a R$ {centroides[3]:.2f}")
-        print(f"Faixa para 4 pontos: R$ {centroides[1]:.2f} a R$ {centroides[2]:.2f}")
-        print(f"Faixa para 2 pontos: Abaixo de R$ {centroides[1]:.2f}")
+        segmentacao = segmentar(df['faturamento'], GRUPOS_FAIXAS)
+        if len(segmentacao['limites_inferiores']) == GRUPOS_FAIXAS:
+            # Cada faixa começa no menor faturamento do seu grupo
+            limites = segmentacao['limites_inferiores']
+            
+            print("\n=== SUGESTÃO DE FAIXAS BASEADA EM GRUPOS NATURAIS (SEGMENTAÇÃO ÓTIMA) ===")
+            print(f"Faixa para 10 pontos: R$ {limites[4]:.2f} ou mais ({segmentacao['tamanhos'][4]} clientes)")
+            print(f"Faixa para 8 pontos: R$ {limites[3]:.2f} a R$ {limites[4]:.2f} ({segmentacao['tamanhos'][3]} clientes)")
+            print(f"Faixa para 6 pontos: R$ {limites[2]:.2f} a R$ {limites[3]:.2f} ({segmentacao['tamanhos'][2]} clientes)")
+            print(f"Faixa para 4 pontos: R$ {limites[1]:.2f} a R$ {limites[2]:.2f} ({segmentacao['tamanhos'][1]} clientes)")
+            print(f"Faixa para 2 pontos: Abaixo de R$ {limites[1]:.2f} ({segmentacao['tamanhos'][0]} clientes)")
+        else:
+            print(f"\nDados insuficientes para a segmentação (mínimo de {GRUPOS_FAIXAS} valores distintos).")
     except Exception as e:
-        print(f"Erro na análise de clusters: {e}")
+        print(f"Erro na análise de grupos: {e}")
     
     # Sugestão de configuração para o arquivo .env
     print("\n=== SUGESTÃO DE CONFIGURAÇÃO PARA .ENV ===")
-    print("# Com base nos percentis")
-    print(f"FATURAMENTO_FAIXA_10={int(valores_percentis[-2])}")
-    print(f"FATURAMENTO_FAIXA_8={int(valores_percentis[-3])}")
-    print(f"FATURAMENTO_FAIXA_6={int(valores_percentis[-4])}")
-    print(f"FATURAMENTO_FAIXA_4={int(valores_percentis[-5])}")
+    exibir_env_percentis(valores_percentis)
     
-    print("\n# Com base nos clusters")
-    try:
-        print(f"FATURAMENTO_FAIXA_10={int(centroides[4])}")
-        print(f"FATURAMENTO_FAIXA_8={int(centroides[3])}")
-        print(f"FATURAMENTO_FAIXA_6={int(centroides[2])}")
-        print(f"FATURAMENTO_FAIXA_4={int(centroides[1])}")
-    except:
-        pass
+    if limites:
+        print("\n# Com base nos grupos naturais")
+        print(f"FATURAMENTO_FAIXA_10={int(limites[4])}")
+        print(f"FATURAMENTO_FAIXA_8={int(limites[3])}")
+        print(f"FATURAMENTO_FAIXA_6={int(limites[2])}")
+        print(f"FATURAMENTO_FAIXA_4={int(limites[1])}")
     
     # Tenta criar um histograma para visualização
     try:
@@ -163,57 +224,86 @@ def analisar_distribuicao(faturamentos):
     except Exception as e:
         print(f"Não foi possível gerar o histograma: {e}")
 
-def processar_todos_os_clientes():
-    """Altera a configuração do .env para processar todos os clientes."""
+def processar_todos_os_clientes(amostra=0):
+    """
+    Executa o main.py para todos os clientes, ou para uma amostra estratificada deles.
+    
+    A configuração é passada nas variáveis de ambiente do processo filho, que têm precedência
+    sobre o .env; o arquivo .env não é alterado.
+    
+    Args:
+        amostra: Número de clientes da amostra estratificada (0 processa todos os clientes)
+    """
     # Verifica se o diretório 'resultados' existe
     if not os.path.exists('resultados'):
         os.makedirs('resultados')
         print("Diretório 'resultados' criado")
     
-    # Altera o arquivo .env temporariamente
-    env_original = None
-    try:
-        # Faz backup das configurações originais
-        with open('.env', 'r', encoding='utf-8') as f:
-            env_original = f.read()
-        
-        # Atualiza para processar todos os clientes
-        env_conteudo = env_original.replace('PROCESSAR_TODOS=false', 'PROCESSAR_TODOS=true')
-        with open('.env', 'w', encoding='utf-8') as f:
-            f.write(env_conteudo)
-        
-        print("Configuração alterada para processar todos os clientes")
-        
-        # Executa o script principal
+    ambiente = {**os.environ, "PROCESSAR_TODOS": "true", "AMOSTRA_CLIENTES": str(amostra)}
+    
+    # Executa o script principal
+    if amostra > 0:
+        print(f"\nExecutando o processamento de uma amostra estratificada de {amostra} clientes...")
+    else:
         print("\nExecutando o processamento de todos os clientes...")
-        os.system('python main.py')
-        
-    finally:
-        # Restaura a configuração original
-        if env_original:
-            with open('.env', 'w', encoding='utf-8') as f:
-                f.write(env_original)
-            print("\nConfigurações originais do .env restauradas")
+    subprocess.run([sys.executable, "main.py"], env=ambiente)
 
-def main():
-    """Função principal."""
+def main(completa=False, servidor=False, amostra=None):
+    """
+    Função principal.
+    
+    Args:
+        completa: Se True, lê os resultados completos (grupos naturais e histograma) mesmo que
+            existam esboços de quantis da última execução
+        servidor: Se True, calcula as estatísticas na collection ClientInsight, sem arquivos locais
+        amostra: Se informado, analisa uma amostra estratificada; com um número maior que zero,
+            processa antes uma nova amostra com esse número de clientes
+    """
     print("=== ANALISADOR DE FAIXAS DE FATURAMENTO ===")
     
+    if servidor:
+        analisar_servidor()
+        return
+    
+    if amostra is not None:
+        if amostra > 0:
+            processar_todos_os_clientes(amostra)
+        caminho_amostra = localizar_amostra()
+        if not caminho_amostra:
+            print("Nenhum resultado de amostra encontrado (use --amostra N para processar uma amostra)")
+            return
+        analisar_amostra(caminho_amostra)
+        return
+    
+    # Os esboços gravados pela última execução dão os percentis sem ler os resultados
+    caminho_esbocos = None if completa else localizar_esbocos()
+    if caminho_esbocos:
+        print(f"Usando os esboços de quantis de '{caminho_esbocos}' (use --completa para ler os resultados)")
+        analisar_esboco(carregar_esbocos(caminho_esbocos).esbocos["faturamento_liquido"])
+        return
+    
     # Verifica se existem dados suficientes para análise
-    dados = carregar_resultados()
-    if not dados:
+    if not localizar_arquivos_resultados():
         resposta = input("Nenhum conjunto completo de resultados encontrado. Deseja processar todos os clientes agora? (s/n): ")
         if resposta.lower() == 's':
             processar_todos_os_clientes()
-            # Recarrega os resultados após o processamento
-            dados = carregar_resultados()
         else:
             print("Operação cancelada pelo usuário")
             return
     
-    # Extrai e analisa os faturamentos
-    faturamentos = extrair_faturamentos(dados)
+    # Extrai e analisa os faturamentos, lendo dos resultados apenas a coluna de faturamento
+    faturamentos = extrair_faturamentos()
     analisar_distribuicao(faturamentos)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Analisar as faixas de faturamento")
+    parser.add_argument("--completa", action="store_true",
+                        help="Ler os resultados completos (grupos naturais e histograma) em vez dos esboços de quantis")
+    parser.add_argument("--servidor", action="store_true",
+                        help="Calcular as estatísticas na collection ClientInsight, sem ler arquivos de resultados")
+    parser.add_argument("--amostra", type=int, nargs="?", const=0, metavar="N",
+                        help="Analisar uma amostra estratificada, com intervalos de confiança; com N, processa antes "
+                             "uma nova amostra de N clientes, sem N usa a amostra mais recente")
+    args = parser.parse_args()
+    
+    main(completa=args.completa, servidor=args.servidor, amostra=args.amostra)
@@ -2,59 +2,275 @@
 Script para analisar a distribuição das outras métricas importantes para a classificação.
 """
 import os
-import json
+import argparse
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from sklearn.cluster import KMeans
 
-def carregar_arquivo(caminho_arquivo="resultados/resultados_completos.json"):
-    """Carrega o arquivo JSON com os dados dos clientes."""
+from persistencia import carregar_colunas, listar_arquivos_resultados
+from esbocos_quantis import localizar_esbocos, carregar_esbocos
+from segmentacao_otima import segmentar, GRUPOS_FAIXAS
+from analise_servidor import resumir_metricas, exibir_histograma
+from conexao import obter_banco
+from amostragem import localizar_amostra, carregar_amostra, estimar_percentis, NIVEL_CONFIANCA
+
+# Percentis usados nas sugestões de faixas de peças e de pontualidade
+PERCENTIS = [10, 25, 50, 75, 90, 95]
+
+def localizar_arquivo(caminho_arquivo="resultados/resultados_completos.json", diretorio="resultados"):
+    """Retorna o caminho informado ou, se não existir, o resultado completo mais recente."""
+    if os.path.exists(caminho_arquivo):
+        return caminho_arquivo
+    
+    arquivos = listar_arquivos_resultados(diretorio, prefixo="resultado_completo_")
+    return arquivos[-1] if arquivos else None
+
+def extrair_metricas(caminho_arquivo):
+    """
+    Carrega as métricas dos clientes (volume de peças, marcas e pontualidade) em colunas do NumPy,
+    lendo do arquivo apenas os campos usados.
+    """
+    colunas = carregar_colunas(caminho_arquivo, {
+        'total_pecas': 'total_pecas.liquido',
+        'num_marcas': ('numero_marcas_diferentes', 'int'),
+        'pagos_em_dia': 'titulos_pagos_em_dia.percentual_pagos_em_dia',
+        'pagos_ate_7d': 'titulos_pagos_em_dia.percentual_pagos_em_ate_7d'
+    })
+    
+    # Campos ausentes valem 0; consideram-se pagamentos até 7 dias como pontuais
+    metricas = {
+        'total_pecas': np.nan_to_num(colunas['total_pecas']),
+        'num_marcas': colunas['num_marcas'],
+        'pontualidade': np.nan_to_num(colunas['pagos_em_dia']) + np.nan_to_num(colunas['pagos_ate_7d'])
+    }
+    
+    # Só mantém clientes com dados válidos em pelo menos uma das métricas
+    validos = (metricas['total_pecas'] > 0) | (metricas['num_marcas'] > 0) | (metricas['pontualidade'] > 0)
+    return {nome: coluna[validos] for nome, coluna in metricas.items()}
+
+def exibir_sugestao_pecas(valores_percentis, intervalos=None):
+    """
+    Exibe os percentis do volume de peças e a configuração sugerida a partir deles.
+    
+    Args:
+        valores_percentis: Valores dos percentis, na ordem de PERCENTIS
+        intervalos: Intervalos de confiança (inferior, superior) de cada percentil, quando os
+            percentis são estimados a partir de uma amostra
+    """
+    print("\nPercentis do Volume de Peças:")
+    for p, v, intervalo in zip(PERCENTIS, valores_percentis, intervalos or [None] * len(PERCENTIS)):
+        if intervalo:
+            print(f"Percentil {p}%: {v:.0f} peças (IC {NIVEL_CONFIANCA:.0%}: {intervalo[0]:.0f} a {intervalo[1]:.0f} peças)")
+        else:
+            print(f"Percentil {p}%: {v:.0f} peças")
+    
+    # Sugestão de configuração
+    print("\nSugestão de configuração para o arquivo .env:")
+    print(f"PECAS_FAIXA_10={int(valores_percentis[5])}  # Percentil 95")
+    print(f"PECAS_FAIXA_8={int(valores_percentis[4])}   # Percentil 90")
+    print(f"PECAS_FAIXA_6={int(valores_percentis[3])}   # Percentil 75")
+    print(f"PECAS_FAIXA_4={int(valores_percentis[1])}   # Percentil 25")
+
+def exibir_recomendacao_marcas():
+    """Exibe a configuração recomendada para a diversificação de marcas."""
+    # Recomendações atuais são boas, então não precisamos mudar muito
+    print("\nRecomendação para configuração (atual já parece boa):")
+    print("MARCAS_PARA_10_PONTOS=6        # 6 ou mais marcas = 10 pontos")
+    print("MARCAS_PARA_8_PONTOS=4-5       # 4 ou 5 marcas = 8 pontos")
+    print("MARCAS_PARA_6_PONTOS=2-3       # 2 ou 3 marcas = 6 pontos")
+    print("MARCAS_PARA_4_PONTOS=1         # 1 marca = 4 pontos")
+
+def exibir_sugestao_pontualidade(valores_percentis, intervalos=None):
+    """
+    Exibe os percentis da pontualidade e a configuração sugerida a partir deles.
+    
+    Args:
+        valores_percentis: Valores dos percentis, na ordem de PERCENTIS
+        intervalos: Intervalos de confiança (inferior, superior) de cada percentil, quando os
+            percentis são estimados a partir de uma amostra
+    """
+    print("\nPercentis da Pontualidade:")
+    for p, v, intervalo in zip(PERCENTIS, valores_percentis, intervalos or [None] * len(PERCENTIS)):
+        if intervalo:
+            print(f"Percentil {p}%: {v:.2f}% (IC {NIVEL_CONFIANCA:.0%}: {intervalo[0]:.2f} a {intervalo[1]:.2f}%)")
+        else:
+            print(f"Percentil {p}%: {v:.2f}%")
+    
+    # Sugestão de configuração
+    print("\nSugestão de configuração para o arquivo .env:")
+    print(f"PONTUALIDADE_FAIXA_10={valores_percentis[4]:.0f}  # Percentil 90")
+    print(f"PONTUALIDADE_FAIXA_8={valores_percentis[3]:.0f}   # Percentil 75")
+    print(f"PONTUALIDADE_FAIXA_6={valores_percentis[2]:.0f}   # Percentil 50")
+    print(f"PONTUALIDADE_FAIXA_4={valores_percentis[1]:.0f}   # Percentil 25")
+
+def exibir_sugestao_grupos(valores, variavel):
+    """
+    Exibe a configuração sugerida pelos grupos naturais (segmentação ótima) de uma métrica.
+    
+    Args:
+        valores: Valores da métrica (um por cliente)
+        variavel: Prefixo das variáveis do .env (ex: PECAS_FAIXA)
+    """
     try:
-        with open(caminho_arquivo, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        segmentacao = segmentar(valores, GRUPOS_FAIXAS)
     except Exception as e:
-        print(f"Erro ao carregar o arquivo: {e}")
-        return None
+        print(f"Erro na análise de grupos: {e}")
+        return
+    
+    if len(segmentacao['limites_inferiores']) < GRUPOS_FAIXAS:
+        print(f"\nDados insuficientes para a segmentação (mínimo de {GRUPOS_FAIXAS} valores distintos).")
+        return
+    
+    # Cada faixa começa no menor valor do seu grupo
+    limites = segmentacao['limites_inferiores']
+    tamanhos = segmentacao['tamanhos']
+    print("\nSugestão pelos grupos naturais (segmentação ótima):")
+    print(f"{variavel}_10={int(limites[4])}  # {tamanhos[4]} clientes")
+    print(f"{variavel}_8={int(limites[3])}   # {tamanhos[3]} clientes")
+    print(f"{variavel}_6={int(limites[2])}   # {tamanhos[2]} clientes")
+    print(f"{variavel}_4={int(limites[1])}   # {tamanhos[1]} clientes")
 
-def extrair_metricas(dados):
-    """Extrai as métricas dos clientes: volume de peças, marcas e pontualidade."""
-    metricas = []
+def analisar_esbocos(coletor):
+    """
+    Analisa as métricas a partir dos esboços de quantis da última execução, sem ler os resultados.
     
-    # Verifica se os dados são uma lista de clientes ou um objeto único
-    if isinstance(dados, list):
-        # É uma lista de clientes
-        clientes = dados
+    Args:
+        coletor: ColetorEsbocos carregado com esbocos_quantis.carregar_esbocos
+    """
+    esboco_pecas = coletor.esbocos["total_pecas"]
+    if esboco_pecas.contagem:
+        print("\n=== ANÁLISE DE VOLUME DE PEÇAS (ESBOÇO DE QUANTIS) ===")
+        print(f"Total de clientes com dados: {esboco_pecas.contagem}")
+        print(f"Mínimo: {esboco_pecas.minimo:.0f} peças")
+        print(f"Máximo: {esboco_pecas.maximo:.0f} peças")
+        print(f"Média: {esboco_pecas.media():.2f} peças")
+        print(f"Mediana: {esboco_pecas.quantil(0.5):.0f} peças")
+        exibir_sugestao_pecas(esboco_pecas.quantis([p/100 for p in PERCENTIS]))
     else:
-        # É um único objeto que pode conter uma lista de clientes
-        clientes = dados if isinstance(dados, list) else [dados]
+        print("Nenhum dado válido de volume de peças encontrado.")
     
-    for cliente in clientes:
-        try:
-            # Extrai volume de peças
-            total_pecas = cliente.get('total_pecas', {}).get('liquido', 0)
-            
-            # Extrai número de marcas
-            num_marcas = cliente.get('numero_marcas_diferentes', 0)
-            
-            # Extrai pontualidade
-            pontualidade = cliente.get('titulos_pagos_em_dia', {}).get('percentual_pagos_em_dia', 0)
-            pontualidade_7d = cliente.get('titulos_pagos_em_dia', {}).get('percentual_pagos_em_ate_7d', 0)
-            pontualidade_total = pontualidade + pontualidade_7d  # Consideram-se pagamentos até 7 dias como pontuais
-            
-            # Só adiciona clientes com dados válidos em pelo menos uma das métricas
-            if total_pecas > 0 or num_marcas > 0 or pontualidade_total > 0:
-                metricas.append({
-                    'codigo': cliente.get('codigo_cliente', 'N/A'),
-                    'nome': cliente.get('nome_completo', 'N/A'),
-                    'total_pecas': total_pecas,
-                    'num_marcas': num_marcas,
-                    'pontualidade': pontualidade_total
-                })
-        except Exception as e:
-            print(f"Erro ao extrair métricas do cliente: {str(e)}")
-    
-    return metricas
+    esboco_marcas = coletor.esbocos["numero_marcas"]
+    if esboco_marcas.contagem:
+        print("\n=== ANÁLISE DE DIVERSIFICAÇÃO DE MARCAS (ESBOÇO DE QUANTIS) ===")
+        print(f"Total de clientes com dados: {esboco_marcas.contagem}")
+        print(f"Mínimo: {esboco_marcas.minimo:.0f} marcas")
+        print(f"Máximo: {esboco_marcas.maximo:.0f} marcas")
+        print(f"Média: {esboco_marcas.media():.2f} marcas")
+        print(f"Mediana: {esboco_marcas.quantil(0.5):.0f} marcas")
+        print("\nPercentis de marcas:")
+        for p, v in zip(PERCENTIS, esboco_marcas.quantis([p/100 for p in PERCENTIS])):
+            print(f"Percentil {p}%: {v:.0f} marcas")
+        exibir_recomendacao_marcas()
+    else:
+        print("Nenhum dado válido de diversificação de marcas encontrado.")
+    
+    esboco_pontualidade = coletor.esbocos["pontualidade"]
+    if esboco_pontualidade.contagem:
+        print("\n=== ANÁLISE DE PONTUALIDADE (ESBOÇO DE QUANTIS) ===")
+        print(f"Total de clientes com dados: {esboco_pontualidade.contagem}")
+        print(f"Mínimo: {esboco_pontualidade.minimo:.2f}%")
+        print(f"Máximo: {esboco_pontualidade.maximo:.2f}%")
+        print(f"Média: {esboco_pontualidade.media():.2f}%")
+        print(f"Mediana: {esboco_pontualidade.quantil(0.5):.2f}%")
+        exibir_sugestao_pontualidade(esboco_pontualidade.quantis([p/100 for p in PERCENTIS]))
+    else:
+        print("Nenhum dado válido de pontualidade encontrado.")
+
+def analisar_servidor(nome_collection="ClientInsight"):
+    """Analisa as métricas com as estatísticas calculadas no servidor, sem arquivos de resultados."""
+    resumo = resumir_metricas(
+        obter_banco(),
+        nome_collection,
+        metricas=["total_pecas", "numero_marcas", "pontualidade"],
+        percentis=PERCENTIS
+    )
+    print(f"Estatísticas calculadas no servidor em {resumo['segundos']:.2f} segundos")
+    
+    pecas = resumo["metricas"]["total_pecas"]
+    if pecas["clientes"]:
+        print("\n=== ANÁLISE DE VOLUME DE PEÇAS (SERVIDOR) ===")
+        print(f"Total de clientes com dados: {pecas['clientes']}")
+        print(f"Mínimo: {pecas['minimo']:.0f} peças")
+        print(f"Máximo: {pecas['maximo']:.0f} peças")
+        print(f"Média: {pecas['media']:.2f} peças")
+        print(f"Mediana: {pecas['mediana']:.0f} peças")
+        print("\nDistribuição de peças (faixas com o mesmo número de clientes):")
+        exibir_histograma(pecas["histograma"])
+        exibir_sugestao_pecas([pecas["percentis"][p] for p in PERCENTIS])
+    else:
+        print("Nenhum dado válido de volume de peças encontrado.")
+    
+    marcas = resumo["metricas"]["numero_marcas"]
+    if marcas["clientes"]:
+        print("\n=== ANÁLISE DE DIVERSIFICAÇÃO DE MARCAS (SERVIDOR) ===")
+        print(f"Total de clientes com dados: {marcas['clientes']}")
+        print(f"Mínimo: {marcas['minimo']:.0f} marcas")
+        print(f"Máximo: {marcas['maximo']:.0f} marcas")
+        print(f"Média: {marcas['media']:.2f} marcas")
+        print(f"Mediana: {marcas['mediana']:.0f} marcas")
+        print("\nDistribuição de marcas:")
+        for n_marcas, qtd in marcas["distribuicao"].items():
+            print(f"{n_marcas} marcas: {qtd} clientes ({qtd/marcas['clientes']*100:.1f}%)")
+        exibir_recomendacao_marcas()
+    else:
+        print("Nenhum dado válido de diversificação de marcas encontrado.")
+    
+    pontualidade = resumo["metricas"]["pontualidade"]
+    if pontualidade["clientes"]:
+        print("\n=== ANÁLISE DE PONTUALIDADE (SERVIDOR) ===")
+        print(f"Total de clientes com dados: {pontualidade['clientes']}")
+        print(f"Mínimo: {pontualidade['minimo']:.2f}%")
+        print(f"Máximo: {pontualidade['maximo']:.2f}%")
+        print(f"Média: {pontualidade['media']:.2f}%")
+        print(f"Mediana: {pontualidade['mediana']:.2f}%")
+        print("\nDistribuição de pontualidade (faixas com o mesmo número de clientes):")
+        exibir_histograma(pontualidade["histograma"])
+        exibir_sugestao_pontualidade([pontualidade["percentis"][p] for p in PERCENTIS])
+    else:
+        print("Nenhum dado válido de pontualidade encontrado.")
+
+def analisar_amostra(caminho):
+    """
+    Analisa as métricas a partir de uma amostra estratificada, com os percentis estimados pelos
+    pesos de cada cliente e os seus intervalos de confiança.
+    """
+    colunas = carregar_amostra(caminho, {
+        'total_pecas': 'total_pecas.liquido',
+        'num_marcas': 'numero_marcas_diferentes',
+        'pagos_em_dia': 'titulos_pagos_em_dia.percentual_pagos_em_dia',
+        'pagos_ate_7d': 'titulos_pagos_em_dia.percentual_pagos_em_ate_7d'
+    })
+    print(f"Amostra de {len(colunas['peso'])} clientes carregada de '{caminho}' "
+          f"(representa {colunas['peso'].sum():.0f} clientes).")
+    
+    pontualidade = np.nan_to_num(colunas['pagos_em_dia']) + np.nan_to_num(colunas['pagos_ate_7d'])
+    analises = [
+        ("VOLUME DE PEÇAS", np.nan_to_num(colunas['total_pecas']), exibir_sugestao_pecas),
+        ("DIVERSIFICAÇÃO DE MARCAS", np.nan_to_num(colunas['num_marcas']), None),
+        ("PONTUALIDADE", pontualidade, exibir_sugestao_pontualidade)
+    ]
+    for titulo, valores, exibir_sugestao in analises:
+        # Clientes sem dados ficam fora dos percentis, mas continuam nas reamostragens
+        valores = np.where(valores > 0, valores, np.nan)
+        positivos = ~np.isnan(valores)
+        if not positivos.any():
+            print(f"\nNenhum dado válido de {titulo.lower()} encontrado.")
+            continue
+        
+        print(f"\n=== ANÁLISE DE {titulo} (AMOSTRA) ===")
+        print(f"Clientes da amostra com dados: {int(positivos.sum())}")
+        print(f"Total estimado de clientes com dados: {colunas['peso'][positivos].sum():.0f}")
+        print(f"Média estimada: {np.average(valores[positivos], weights=colunas['peso'][positivos]):.2f}")
+        
+        estimativas = estimar_percentis(valores, colunas['peso'], colunas['estrato'], PERCENTIS)
+        if exibir_sugestao:
+            exibir_sugestao([estimativa for estimativa, _, _ in estimativas],
+                            [(inferior, superior) for _, inferior, superior in estimativas])
+        else:
+            print("\nPercentis de marcas:")
+            for p, (estimativa, inferior, superior) in zip(PERCENTIS, estimativas):
+                print(f"Percentil {p}%: {estimativa:.0f} marcas (IC {NIVEL_CONFIANCA:.0%}: {inferior:.0f} a {superior:.0f})")
+            exibir_recomendacao_marcas()
 
 def analisar_volume_pecas(metricas):
     """Analisa a distribuição do volume de peças."""
@@ -75,19 +291,9 @@ def analisar_volume_pecas(metricas):
     print(f"Mediana: {df_pecas['total_pecas'].median():.0f} peças")
     
     # Análise de percentis
-    percentis = [10, 25, 50, 75, 90, 95]
-    valores_percentis = [df_pecas['total_pecas'].quantile(p/100) for p in percentis]
-    
-    print("\nPercentis do Volume de Peças:")
-    for p, v in zip(percentis, valores_percentis):
-        print(f"Percentil {p}%: {v:.0f} peças")
-    
-    # Sugestão de configuração
-    print("\nSugestão de configuração para o arquivo .env:")
-    print(f"PECAS_FAIXA_10={int(valores_percentis[5])}  # Percentil 95")
-    print(f"PECAS_FAIXA_8={int(valores_percentis[4])}   # Percentil 90")
-    print(f"PECAS_FAIXA_6={int(valores_percentis[3])}   # Percentil 75")
-    print(f"PECAS_FAIXA_4={int(valores_percentis[1])}   # Percentil 25")
+    valores_percentis = [df_pecas['total_pecas'].quantile(p/100) for p in PERCENTIS]
+    exibir_sugestao_pecas(valores_percentis)
+    exibir_sugestao_grupos(df_pecas['total_pecas'], "PECAS_FAIXA")
     
     try:
         # Gera o histograma
@@ -129,12 +335,7 @@ def analisar_diversificacao_marcas(metricas):
     for n_marcas, qtd in contagem.items():
         print(f"{n_marcas} marcas: {qtd} clientes ({qtd/len(df_marcas)*100:.1f}%)")
     
-    # Recomendações atuais são boas, então não precisamos mudar muito
-    print("\nRecomendação para configuração (atual já parece boa):")
-    print("MARCAS_PARA_10_PONTOS=6        # 6 ou mais marcas = 10 pontos")
-    print("MARCAS_PARA_8_PONTOS=4-5       # 4 ou 5 marcas = 8 pontos")
-    print("MARCAS_PARA_6_PONTOS=2-3       # 2 ou 3 marcas = 6 pontos")
-    print("MARCAS_PARA_4_PONTOS=1         # 1 marca = 4 pontos")
+    exibir_recomendacao_marcas()
     
     try:
         # Gera o gráfico de barras
@@ -170,19 +371,9 @@ def analisar_pontualidade(metricas):
     print(f"Mediana: {df_pont['pontualidade'].median():.2f}%")
     
     # Análise de percentis
-    percentis = [10, 25, 50, 75, 90, 95]
-    valores_percentis = [df_pont['pontualidade'].quantile(p/100) for p in percentis]
-    
-    print("\nPercentis da Pontualidade:")
-    for p, v in zip(percentis, valores_percentis):
-        print(f"Percentil {p}%: {v:.2f}%")
-    
-    # Sugestão de configuração
-    print("\nSugestão de configuração para o arquivo .env:")
-    print(f"PONTUALIDADE_FAIXA_10={valores_percentis[4]:.0f}  # Percentil 90")
-    print(f"PONTUALIDADE_FAIXA_8={valores_percentis[3]:.0f}   # Percentil 75")
-    print(f"PONTUALIDADE_FAIXA_6={valores_percentis[2]:.0f}   # Percentil 50")
-    print(f"PONTUALIDADE_FAIXA_4={valores_percentis[1]:.0f}   # Percentil 25")
+    valores_percentis = [df_pont['pontualidade'].quantile(p/100) for p in PERCENTIS]
+    exibir_sugestao_pontualidade(valores_percentis)
+    exibir_sugestao_grupos(df_pont['pontualidade'], "PONTUALIDADE_FAIXA")
     
     try:
         # Gera o histograma
@@ -196,23 +387,50 @@ def analisar_pontualidade(metricas):
     except Exception as e:
         print(f"Erro ao gerar histograma: {e}")
 
-def main():
-    """Função principal."""
+def main(completa=False, servidor=False, amostra=False):
+    """
+    Função principal.
+    
+    Args:
+        completa: Se True, lê o arquivo de resultados (histogramas e distribuição exata de
+            marcas) mesmo que existam esboços de quantis da última execução
+        servidor: Se True, calcula as estatísticas na collection ClientInsight, sem arquivos locais
+        amostra: Se True, analisa a amostra estratificada mais recente, com intervalos de confiança
+    """
     print("=== ANALISADOR DE MÉTRICAS DE CLASSIFICAÇÃO ===")
     
-    # Carrega os dados
-    dados = carregar_arquivo()
-    if not dados:
+    if servidor:
+        analisar_servidor()
+        return
+    
+    if amostra:
+        caminho_amostra = localizar_amostra()
+        if not caminho_amostra:
+            print("Nenhum resultado de amostra encontrado (processe uma com analisar_faixas_faturamento.py --amostra N)")
+            return
+        analisar_amostra(caminho_amostra)
+        return
+    
+    # Os esboços gravados pela última execução dão os percentis sem ler os resultados
+    caminho_esbocos = None if completa else localizar_esbocos()
+    if caminho_esbocos:
+        print(f"Usando os esboços de quantis de '{caminho_esbocos}' (use --completa para ler os resultados)")
+        analisar_esbocos(carregar_esbocos(caminho_esbocos))
+        return
+    
+    # Localiza o arquivo de resultados
+    caminho_arquivo = localizar_arquivo()
+    if not caminho_arquivo:
         print("Não foi possível carregar os dados.")
         return
     
-    # Extrai as métricas
-    metricas = extrair_metricas(dados)
-    if not metricas:
+    # Extrai as métricas, lendo do arquivo apenas as colunas usadas
+    metricas = extrair_metricas(caminho_arquivo)
+    if len(metricas['total_pecas']) == 0:
         print("Nenhuma métrica válida encontrada.")
         return
     
-    print(f"Dados de {len(metricas)} clientes carregados com sucesso.")
+    print(f"Dados de {len(metricas['total_pecas'])} clientes carregados com sucesso.")
     
     # Analisa cada métrica
     analisar_volume_pecas(metricas)
@@ -220,4 +438,13 @@ def main():
     analisar_pontualidade(metricas)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Analisar as métricas de peças, marcas e pontualidade")
+    parser.add_argument("--completa", action="store_true",
+                        help="Ler o arquivo de resultados (histogramas) em vez dos esboços de quantis")
+    parser.add_argument("--servidor", action="store_true",
+                        help="Calcular as estatísticas na collection ClientInsight, sem ler arquivos de resultados")
+    parser.add_argument("--amostra", action="store_true",
+                        help="Analisar a amostra estratificada mais recente, com intervalos de confiança dos percentis")
+    args = parser.parse_args()
+    
+    main(completa=args.completa, servidor=args.servidor, amostra=args.amostra)
@@ -0,0 +1,262 @@
+"""
+Script para analisar as métricas da classificação diretamente na collection ClientInsight.
+
+Em vez de ler os resultados de cada cliente em Python, a contagem, o mínimo, o máximo, a média,
+a mediana, os percentis e os histogramas do faturamento, do volume de peças, do número de marcas
+e da pontualidade são calculados pelo próprio MongoDB, em uma única agregação ($facet com $group,
+$percentile/$median e $bucketAuto), e apenas os números resumidos são transferidos. Em servidores
+sem $percentile (anteriores ao MongoDB 7.0), os percentis são obtidos por posição, com uma
+ordenação no servidor por métrica. Requer MongoDB 4.4 ou superior.
+
+Uso:
+    python analise_servidor.py
+    python analise_servidor.py --metricas faturamento_liquido,total_pecas --baldes 30
+    python analise_servidor.py --mostrar-pipeline
+"""
+import json
+import math
+import time
+import argparse
+from dotenv import load_dotenv
+from pymongo.errors import OperationFailure
+
+from conexao import obter_banco
+from reclassificar import expressoes_valores
+
+# Carrega as variáveis de ambiente
+load_dotenv()
+
+# Métricas analisadas, com os mesmos nomes dos esboços de quantis
+METRICAS_SERVIDOR = ("faturamento_liquido", "total_pecas", "numero_marcas", "pontualidade")
+
+# Métricas com poucos valores inteiros, para as quais a contagem por valor também é calculada
+METRICAS_DISCRETAS = ("numero_marcas",)
+
+# Percentis calculados por padrão
+PERCENTIS = [10, 25, 50, 75, 90, 95, 99]
+
+# Número de faixas dos histogramas ($bucketAuto)
+BALDES_HISTOGRAMA = 20
+
+def log(mensagem, nivel=0):
+    """Função para exibir logs."""
+    indentacao = "    " * nivel
+    print(f"{indentacao}{mensagem}")
+
+def expressoes_metricas():
+    """
+    Expressões de cada métrica, extraídas dos mesmos campos usados na classificação.
+
+    A pontualidade soma os pagamentos em dia e com até 7 dias de atraso, como na classificação;
+    valores não numéricos resultam em nulo e ficam fora da análise.
+
+    Returns:
+        Dicionário {métrica: expressão}
+    """
+    valores = expressoes_valores()
+    return {
+        "faturamento_liquido": valores["faturamento"],
+        "total_pecas": valores["pecas"],
+        "numero_marcas": valores["marcas"],
+        "pontualidade": {
+            "$cond": [
+                {"$and": [{"$isNumber": valores["em_dia"]}, {"$isNumber": valores["ate_7d"]}]},
+                {"$add": [valores["em_dia"], valores["ate_7d"]]},
+                None
+            ]
+        }
+    }
+
+def compilar_pipeline(metricas=METRICAS_SERVIDOR, percentis=PERCENTIS, baldes=BALDES_HISTOGRAMA, usar_percentile=True):
+    """
+    Monta a agregação que resume todas as métricas em uma única leitura da collection.
+
+    Como nos scripts de análise, apenas os valores positivos de cada métrica são considerados.
+
+    Args:
+        metricas: Métricas a resumir (nomes de METRICAS_SERVIDOR)
+        percentis: Percentis a calcular (0 a 100)
+        baldes: Número de faixas de cada histograma
+        usar_percentile: Se True, calcula os percentis e a mediana com $percentile e $median
+
+    Returns:
+        Lista de estágios para aggregate; o único documento retornado tem, para cada métrica, as
+        chaves <métrica> (estatísticas), <métrica>_histograma e, nas métricas discretas,
+        <métrica>_distribuicao
+    """
+    expressoes = expressoes_metricas()
+    facetas = {}
+    for metrica in metricas:
+        campo = f"${metrica}"
+        positivos = {"$match": {metrica: {"$gt": 0}}}
+
+        grupo = {
+            "_id": None,
+            "clientes": {"$sum": 1},
+            "minimo": {"$min": campo},
+            "maximo": {"$max": campo},
+            "media": {"$avg": campo}
+        }
+        if usar_percentile:
+            grupo["percentis"] = {"$percentile": {"input": campo, "p": [p / 100 for p in percentis], "method": "approximate"}}
+            grupo["mediana"] = {"$median": {"input": campo, "method": "approximate"}}
+
+        facetas[metrica] = [positivos, {"$group": grupo}]
+        facetas[f"{metrica}_histograma"] = [positivos, {"$bucketAuto": {"groupBy": campo, "buckets": baldes}}]
+        if metrica in METRICAS_DISCRETAS:
+            facetas[f"{metrica}_distribuicao"] = [
+                positivos,
+                {"$group": {"_id": campo, "clientes": {"$sum": 1}}},
+                {"$sort": {"_id": 1}}
+            ]
+
+    return [
+        {"$project": {"_id": 0, **{metrica: expressoes[metrica] for metrica in metricas}}},
+        {"$facet": facetas}
+    ]
+
+def posicao_percentil(percentil, clientes):
+    """Posição (a partir de 0) do percentil entre os valores ordenados, pelo posto mais próximo."""
+    return min(clientes - 1, max(0, math.ceil(percentil / 100 * clientes) - 1))
+
+def percentis_por_posicao(collection, metrica, clientes, percentis):
+    """
+    Calcula percentis exatos sem $percentile: os valores são ordenados uma vez no servidor e
+    apenas o valor de cada posição é retornado.
+
+    Args:
+        collection: Collection com os resultados
+        metrica: Nome da métrica (de METRICAS_SERVIDOR)
+        clientes: Número de clientes com valor positivo na métrica
+        percentis: Percentis a calcular (0 a 100)
+
+    Returns:
+        Lista de valores, na ordem dos percentis
+    """
+    posicoes = {str(posicao_percentil(p, clientes)) for p in percentis}
+    pipeline = [
+        {"$project": {"_id": 0, "valor": expressoes_metricas()[metrica]}},
+        {"$match": {"valor": {"$gt": 0}}},
+        {"$sort": {"valor": 1}},
+        {"$facet": {posicao: [{"$skip": int(posicao)}, {"$limit": 1}] for posicao in posicoes}}
+    ]
+    documento = next(collection.aggregate(pipeline, allowDiskUse=True), {})
+
+    valores = []
+    for p in percentis:
+        encontrados = documento.get(str(posicao_percentil(p, clientes))) or [{}]
+        valores.append(encontrados[0].get("valor"))
+    return valores
+
+def resumir_metricas(db, nome_collection="ClientInsight", metricas=METRICAS_SERVIDOR, percentis=PERCENTIS, baldes=BALDES_HISTOGRAMA):
+    """
+    Resume as métricas de todos os clientes da collection no próprio servidor.
+
+    Args:
+        db: Conexão com o banco de dados MongoDB
+        nome_collection: Collection com os resultados enviados por enviar_para_mongodb.py
+        metricas: Métricas a resumir (nomes de METRICAS_SERVIDOR)
+        percentis: Percentis a calcular (0 a 100)
+        baldes: Número de faixas de cada histograma
+
+    Returns:
+        Dicionário com o resumo de cada métrica (clientes, minimo, maximo, media, mediana,
+        percentis {percentil: valor}, histograma [{minimo, maximo, clientes}] e, nas métricas
+        discretas, distribuicao {valor: clientes}), o método dos percentis e o tempo em segundos
+    """
+    collection = db[nome_collection]
+    inicio = time.perf_counter()
+
+    try:
+        documento = next(collection.aggregate(compilar_pipeline(metricas, percentis, baldes), allowDiskUse=True), {})
+        metodo = "$percentile"
+    except OperationFailure as e:
+        log(f"$percentile indisponível no servidor ({e.code}); calculando os percentis por posição")
+        documento = next(collection.aggregate(compilar_pipeline(metricas, percentis, baldes, usar_percentile=False), allowDiskUse=True), {})
+        metodo = "posicao"
+
+    resumos = {}
+    for metrica in metricas:
+        grupo = (documento.get(metrica) or [None])[0]
+        if not grupo:
+            resumos[metrica] = {"clientes": 0}
+            continue
+
+        if "percentis" in grupo:
+            valores_percentis = grupo["percentis"]
+            mediana = grupo["mediana"]
+        else:
+            *valores_percentis, mediana = percentis_por_posicao(collection, metrica, grupo["clientes"], list(percentis) + [50])
+
+        resumo = {
+            "clientes": grupo["clientes"],
+            "minimo": grupo["minimo"],
+            "maximo": grupo["maximo"],
+            "media": grupo["media"],
+            "mediana": mediana,
+            "percentis": dict(zip(percentis, valores_percentis)),
+            "histograma": [
+                {"minimo": balde["_id"]["min"], "maximo": balde["_id"]["max"], "clientes": balde["count"]}
+                for balde in documento.get(f"{metrica}_histograma", [])
+            ]
+        }
+        if metrica in METRICAS_DISCRETAS:
+            resumo["distribuicao"] = {item["_id"]: item["clientes"] for item in documento.get(f"{metrica}_distribuicao", [])}
+        resumos[metrica] = resumo
+
+    return {
+        "metricas": resumos,
+        "metodo_percentis": metodo,
+        "segundos": time.perf_counter() - inicio
+    }
+
+def exibir_histograma(histograma, largura=40):
+    """Exibe um histograma de $bucketAuto em texto, com uma barra proporcional por faixa."""
+    maior = max((balde["clientes"] for balde in histograma), default=0)
+    for balde in histograma:
+        barra = "#" * round(largura * balde["clientes"] / maior) if maior else ""
+        log(f"{balde['minimo']:>14.2f} a {balde['maximo']:>14.2f} {balde['clientes']:>9}  {barra}", nivel=1)
+
+def exibir_resumos(resumo):
+    """Exibe a contagem, a média, a mediana e os percentis de cada métrica, e os histogramas."""
+    metricas = resumo["metricas"]
+    percentis = next((list(item["percentis"]) for item in metricas.values() if item.get("clientes")), PERCENTIS)
+
+    log(f"Resumo calculado no servidor em {resumo['segundos']:.2f} segundos (percentis: {resumo['metodo_percentis']})\n")
+    log(f"{'Métrica':<22}{'Clientes':>10}{'Média':>12}{'Mediana':>12}" + "".join(f"{'P' + str(p):>12}" for p in percentis))
+    for metrica, item in metricas.items():
+        if not item.get("clientes"):
+            log(f"{metrica:<22}{0:>10}")
+            continue
+        log(
+            f"{metrica:<22}{item['clientes']:>10}{item['media']:>12.2f}{item['mediana']:>12.2f}"
+            + "".join(f"{item['percentis'][p]:>12.2f}" for p in percentis)
+        )
+
+    for metrica, item in metricas.items():
+        if item.get("distribuicao"):
+            log(f"\nDistribuição de {metrica}:")
+            for valor, clientes in item["distribuicao"].items():
+                log(f"{valor:>14} {clientes:>9}", nivel=1)
+        elif item.get("histograma"):
+            log(f"\nHistograma de {metrica}:")
+            exibir_histograma(item["histograma"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analisar as métricas da classificação no servidor (collection ClientInsight)")
+    parser.add_argument("--collection", default="ClientInsight", help="Collection com os resultados")
+    parser.add_argument("--metricas", default=",".join(METRICAS_SERVIDOR),
+                        help=f"Métricas separadas por vírgula (padrão: {','.join(METRICAS_SERVIDOR)})")
+    parser.add_argument("--baldes", type=int, default=BALDES_HISTOGRAMA, help="Número de faixas dos histogramas")
+    parser.add_argument("--mostrar-pipeline", action="store_true", help="Apenas exibir a agregação gerada")
+    args = parser.parse_args()
+
+    metricas = [metrica.strip() for metrica in args.metricas.split(",") if metrica.strip()]
+    desconhecidas = [metrica for metrica in metricas if metrica not in METRICAS_SERVIDOR]
+    if desconhecidas:
+        parser.error(f"Métricas desconhecidas: {', '.join(desconhecidas)}")
+
+    if args.mostrar_pipeline:
+        print(json.dumps(compilar_pipeline(metricas, baldes=args.baldes), ensure_ascii=False, indent=2))
+    else:
+        exibir_resumos(resumir_metricas(obter_banco(), nome_collection=args.collection, metricas=metricas, baldes=args.baldes))
@@ -0,0 +1,5 @@
+"""
+Benchmarks de ponta a ponta do sistema ClientInsight.
+Este pacote carrega um conjunto de dados reproduzível em um MongoDB local (ou em uma URI informada),
+executa os modos de processamento em vários tamanhos e compara as medições com uma linha de base.
+"""
@@ -0,0 +1,193 @@
+"""
+Cenários do benchmark. Cada cenário é executado em um processo próprio, criado por
+benchmarks.executar, com o banco do benchmark nas variáveis de ambiente e uma pasta de
+trabalho temporária, de modo que as configurações, o pico de memória e os arquivos de uma
+medição não afetam as outras.
+
+Uso (normalmente chamado por benchmarks.executar):
+    python -m benchmarks.cenarios lotes --saida medicao.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import resource
+
+# Cenários disponíveis, na ordem em que são executados
+CENARIOS = ("cliente_individual", "lotes", "paralelo_threads", "paralelo_processos", "envio")
+
+def percentil(valores, percentual):
+    """
+    Calcula um percentil pelo método do posto mais próximo.
+
+    Args:
+        valores: Lista de valores
+        percentual: Percentil desejado (0 a 100)
+
+    Returns:
+        Valor do percentil, ou None se a lista estiver vazia
+    """
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    posicao = max(0, min(len(ordenados), math.ceil(percentual / 100 * len(ordenados))) - 1)
+    return ordenados[posicao]
+
+def pico_rss_mb():
+    """
+    Retorna o pico de memória residente do processo e dos processos filhos já encerrados.
+
+    Returns:
+        Maior pico de RSS entre o processo e os filhos, em MB
+    """
+    proprio = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    filhos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss é dado em KB no Linux e em bytes no macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return max(proprio, filhos) / divisor
+
+def contar_comandos():
+    """
+    Soma os comandos enviados ao MongoDB registrados pela instrumentação.
+
+    No processamento com processos, os comandos dos processos de trabalho já foram
+    mesclados no monitor do processo principal.
+
+    Returns:
+        Número de comandos
+    """
+    from instrumentacao import obter_monitor
+
+    por_consulta, _ = obter_monitor().coletar()
+    return sum(estatisticas.comandos for estatisticas in por_consulta.values())
+
+def latencias_do_historico():
+    """
+    Lê o tempo de cada cliente no histórico de custos gravado pela execução.
+
+    A pasta de trabalho do cenário começa vazia, então o histórico só tem os clientes
+    processados nesta medição.
+
+    Returns:
+        Lista de tempos por cliente, em segundos
+    """
+    from agendamento import carregar_historico_custos
+
+    return [
+        custo["ultima_execucao_segundos"]
+        for custo in carregar_historico_custos().values()
+        if custo.get("ultima_execucao_segundos") is not None
+    ]
+
+def cenario_cliente_individual():
+    """Processa todos os clientes, um por vez, com processar_cliente_individual."""
+    from main import conectar_mongodb, processar_cliente_individual
+
+    db = conectar_mongodb()
+    clientes = [cliente["_id"] for cliente in db.geradores.find({}, {"_id": 1}).sort("_id", 1)]
+
+    latencias = []
+    processados = 0
+    inicio = time.perf_counter()
+    for cliente_id in clientes:
+        inicio_cliente = time.perf_counter()
+        if processar_cliente_individual(db, cliente_id):
+            processados += 1
+        latencias.append(time.perf_counter() - inicio_cliente)
+
+    return processados, time.perf_counter() - inicio, latencias
+
+def cenario_lotes():
+    """Executa o laço de lotes de main.main() (PROCESSAR_TODOS), incluindo o envio de cada lote."""
+    import main
+
+    inicio = time.perf_counter()
+    main.main()
+    segundos = time.perf_counter() - inicio
+
+    latencias = latencias_do_historico()
+    return len(latencias), segundos, latencias
+
+def cenario_paralelo(modo):
+    """Executa processar_clientes_paralelo no modo informado ("threads" ou "processos")."""
+    from processar_paralelo import processar_clientes_paralelo
+
+    inicio = time.perf_counter()
+    processar_clientes_paralelo(modo=modo)
+    segundos = time.perf_counter() - inicio
+
+    latencias = latencias_do_historico()
+    return len(latencias), segundos, latencias
+
+def cenario_envio():
+    """
+    Envia para a ClientInsight um resultado por cliente com enviar_para_mongodb.main.
+
+    Os arquivos são gerados antes da medição, a partir dos geradores, no formato
+    configurado em FORMATO_SAIDA. O envio não tem tempo por cliente.
+    """
+    import enviar_para_mongodb
+    from main import FORMATO_SAIDA, COMPRIMIR_SAIDA, conectar_mongodb, criar_resultado_cliente
+    from persistencia import abrir_escritor
+
+    db = conectar_mongodb()
+    diretorio = os.path.join("resultados", "envio")
+    os.makedirs(diretorio, exist_ok=True)
+    with abrir_escritor(os.path.join(diretorio, "resultados_envio"), formato=FORMATO_SAIDA, comprimir=COMPRIMIR_SAIDA) as escritor:
+        for cliente in db.geradores.find().sort("_id", 1):
+            escritor.escrever(criar_resultado_cliente(cliente))
+
+    inicio = time.perf_counter()
+    enviar_para_mongodb.main(limpar_collection_antes=True, diretorio_resultados=diretorio)
+    return escritor.total_escritos, time.perf_counter() - inicio, []
+
+def executar_cenario(nome):
+    """
+    Executa um cenário e monta a medição.
+
+    Args:
+        nome: Nome do cenário (ver CENARIOS)
+
+    Returns:
+        Dicionário com clientes, tempo, clientes/s, consultas por cliente, latências e pico de RSS
+    """
+    if nome == "cliente_individual":
+        clientes, segundos, latencias = cenario_cliente_individual()
+    elif nome == "lotes":
+        clientes, segundos, latencias = cenario_lotes()
+    elif nome == "paralelo_threads":
+        clientes, segundos, latencias = cenario_paralelo("threads")
+    elif nome == "paralelo_processos":
+        clientes, segundos, latencias = cenario_paralelo("processos")
+    elif nome == "envio":
+        clientes, segundos, latencias = cenario_envio()
+    else:
+        raise ValueError(f"Cenário desconhecido: {nome}")
+
+    comandos = contar_comandos()
+    p50 = percentil(latencias, 50)
+    p95 = percentil(latencias, 95)
+
+    return {
+        "cenario": nome,
+        "clientes": clientes,
+        "segundos": segundos,
+        "clientes_por_segundo": clientes / segundos if segundos else 0.0,
+        "comandos": comandos,
+        "consultas_por_cliente": comandos / clientes if clientes else 0.0,
+        "latencia_p50_ms": p50 * 1000 if p50 is not None else None,
+        "latencia_p95_ms": p95 * 1000 if p95 is not None else None,
+        "pico_rss_mb": pico_rss_mb()
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Executar um cenário do benchmark")
+    parser.add_argument("cenario", choices=CENARIOS, help="Cenário a executar")
+    parser.add_argument("--saida", required=True, help="Arquivo JSON onde a medição é gravada")
+    args = parser.parse_args()
+
+    medicao = executar_cenario(args.cenario)
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(medicao, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,95 @@
+"""
+Compara duas linhas de base dos benchmarks e aponta as regressões.
+
+Uso:
+    python -m benchmarks.comparar benchmarks/resultados/base.json benchmarks/resultados/benchmark_20250601_101500.json
+"""
+import sys
+import json
+import argparse
+
+# Métricas comparadas e se um valor maior é melhor
+METRICAS = {
+    "clientes_por_segundo": True,
+    "consultas_por_cliente": False,
+    "latencia_p95_ms": False,
+    "pico_rss_mb": False
+}
+
+def comparar_medicoes(base, atual, tolerancia=10.0):
+    """
+    Compara as medições de cada cenário e tamanho presentes nas duas linhas de base.
+
+    Args:
+        base: Linha de base de referência (dicionário gravado por benchmarks.executar)
+        atual: Linha de base nova
+        tolerancia: Piora aceita, em percentual
+
+    Returns:
+        Lista de dicionários com o valor de referência, o atual, a variação e se houve regressão
+    """
+    referencias = {(medicao["cenario"], medicao["tamanho"]): medicao for medicao in base.get("medicoes", [])}
+
+    comparacoes = []
+    for medicao in atual.get("medicoes", []):
+        referencia = referencias.get((medicao["cenario"], medicao["tamanho"]))
+        if referencia is None:
+            continue
+
+        for metrica, maior_melhor in METRICAS.items():
+            valor_base = referencia.get(metrica)
+            valor_atual = medicao.get(metrica)
+            if valor_base is None or valor_atual is None:
+                continue
+
+            variacao = ((valor_atual - valor_base) / valor_base) * 100 if valor_base else 0.0
+            piora = -variacao if maior_melhor else variacao
+            comparacoes.append({
+                "cenario": medicao["cenario"],
+                "tamanho": medicao["tamanho"],
+                "metrica": metrica,
+                "base": valor_base,
+                "atual": valor_atual,
+                "variacao_percentual": variacao,
+                "regressao": piora > tolerancia
+            })
+
+    return comparacoes
+
+def exibir_comparacao(comparacoes):
+    """Exibe a comparação em forma de tabela, marcando as regressões."""
+    print(f"\n{'Cenário':<22}{'Clientes':>10}  {'Métrica':<24}{'Base':>12}{'Atual':>12}{'Variação':>11}")
+    for item in comparacoes:
+        print(
+            f"{item['cenario']:<22}"
+            f"{item['tamanho']:>10}  "
+            f"{item['metrica']:<24}"
+            f"{item['base']:>12.2f}"
+            f"{item['atual']:>12.2f}"
+            f"{item['variacao_percentual']:>+10.1f}%"
+            f"{'  REGRESSÃO' if item['regressao'] else ''}"
+        )
+
+    regressoes = sum(1 for item in comparacoes if item["regressao"])
+    if regressoes:
+        print(f"\n{regressoes} regressões encontradas.")
+    else:
+        print("\nNenhuma regressão encontrada.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Comparar duas linhas de base dos benchmarks")
+    parser.add_argument("base", help="Linha de base de referência")
+    parser.add_argument("atual", help="Linha de base nova")
+    parser.add_argument("--tolerancia", type=float, default=10.0, help="Piora aceita, em %%")
+    args = parser.parse_args()
+
+    with open(args.base, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.atual, "r", encoding="utf-8") as f:
+        atual = json.load(f)
+
+    comparacoes = comparar_medicoes(base, atual, tolerancia=args.tolerancia)
+    exibir_comparacao(comparacoes)
+
+    # Código de saída 1 quando há regressões, para uso em scripts
+    sys.exit(1 if any(item["regressao"] for item in comparacoes) else 0)
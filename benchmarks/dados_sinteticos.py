@@ -0,0 +1,483 @@
+"""
+Gerador do conjunto de dados sintético usado pelos benchmarks e nos testes de carga.
+
+Os dados têm o formato das collections do ERP lidas pelas consultas:
+
+- geradores: um documento por cliente (_id, cod_cliente e razao_social);
+- geradores_cod_cliente: um documento com a lista dos códigos de clientes;
+- movimentacao: os itens de cada pedido (eventos de venda reais, tipo_operacao "S"), as
+  devoluções (eventos de devolução, tipo_operacao "E") e as canceladas, com marca, qtde,
+  valor_final e data;
+- lancamentos_completo: as parcelas a receber dos pedidos, com os tipos de boleto (e outros
+  tipos de pagamento, que as consultas ignoram), vencimentos que podem cair em fins de semana
+  e feriados, pagamentos em dia, no dia útil seguinte ou com atraso, e títulos a vencer e vencidos.
+
+A quantidade de pedidos por cliente segue uma distribuição de Pareto (poucos clientes com
+muitos pedidos, como na base real), e cada cliente tem o seu perfil de marcas, de ticket e de
+pontualidade. Os clientes são gerados em blocos, cada um com a sua própria semente derivada da
+semente do conjunto, de modo que o resultado é o mesmo com qualquer número de escritores. Os
+blocos são gravados com insert_many por processos paralelos, o que permite gerar dezenas de
+milhões de movimentações.
+
+Uso:
+    python -m benchmarks.dados_sinteticos --uri mongodb://localhost:27017 --banco carga --clientes 500000 --escritores 8
+"""
+import os
+import random
+import argparse
+import concurrent.futures
+from datetime import datetime, date, timedelta
+from bson import ObjectId
+from pymongo import MongoClient, ASCENDING
+
+from consultas.base import EVENTOS_VENDA, EVENTOS_DEVOLUCAO
+from consultas.titulos_pagos import TIPOS_PAGAMENTO, obter_feriados_nacionais
+
+# Versão do formato dos dados; uma mudança no gerador deve alterar a versão
+VERSAO_DADOS = 2
+
+# Clientes gerados por bloco (cada bloco tem a sua semente) e documentos por insert_many
+CLIENTES_POR_BLOCO = 1000
+TAMANHO_LOTE_INSERCAO = 10000
+
+# Collection com a descrição do conjunto carregado
+COLLECTION_DESCRICAO = "_benchmark"
+
+# Forma da distribuição de pedidos por cliente (1.16 = cerca de 80% dos pedidos em 20% dos clientes)
+ALFA_PARETO = 1.16
+MEDIA_PEDIDOS_POR_CLIENTE = 12
+MAXIMO_PEDIDOS_POR_CLIENTE = 2000
+
+# Perfil geral da base
+ANOS_HISTORICO = 3
+PERCENTUAL_SEM_MOVIMENTACAO = 0.08
+PERCENTUAL_INATIVOS = 0.25
+PERCENTUAL_CANCELADAS = 0.02
+PERCENTUAL_PEDIDOS_COM_DEVOLUCAO = 0.05
+PERCENTUAL_USA_BOLETO = 0.8
+PERCENTUAL_SUBSTITUIDOS = 0.02
+PERCENTUAL_INADIMPLENTES = 0.06
+ITENS_POR_PEDIDO = (1, 8)
+PARCELAS_POR_PEDIDO = (1, 3)
+
+# Marcas e faixa de preço por peça de cada uma (R$)
+MARCAS = {
+    "CONFECCAO": (40, 180),
+    "SEMIJOIAS": (25, 120),
+    "COSMETICOS": (15, 90),
+    "ACESSORIOS": (20, 100),
+    "CALCADOS": (80, 250),
+    "INFANTIL": (30, 120),
+    "MASCULINO": (50, 200),
+    "PRAIA": (40, 160)
+}
+
+# Tipos de pagamento que não são boleto (são ignorados pela consulta de pontualidade)
+OUTROS_PAGAMENTOS = ["PIX", "CARTAO DE CREDITO", "DINHEIRO", "DEPOSITO"]
+
+# Campo com o código do cliente nos lançamentos (a consulta aceita qualquer um deles)
+CAMPOS_CODIGO_LANCAMENTO = [("cod_gerador", 0.85), ("codigo_cliente_fornecedor", 0.1), ("cod_cliente", 0.05)]
+
+# Índices usados pelas consultas (criados depois da carga, que fica mais rápida sem eles)
+INDICES = {
+    "geradores": [[("cod_cliente", ASCENDING)]],
+    "movimentacao": [[("codigo_cliente_fornecedor", ASCENDING), ("evento", ASCENDING), ("data", ASCENDING)]],
+    "lancamentos_completo": [
+        [("cod_gerador", ASCENDING)],
+        [("codigo_cliente_fornecedor", ASCENDING)],
+        [("cod_cliente", ASCENDING)],
+        [("codigo_cliente", ASCENDING)],
+        [("cliente_codigo", ASCENDING)]
+    ]
+}
+
+# Tamanho máximo de um documento BSON, que limita a lista de geradores_cod_cliente
+TAMANHO_MAXIMO_DOCUMENTO = 16 * 1024 * 1024
+
+# Banco do processo escritor
+db_escritor = None
+
+SEGUNDOS_DIA = 24 * 60 * 60
+
+def descricao_dados(num_clientes, semente, data_referencia=None):
+    """
+    Monta a descrição de um conjunto de dados, gravada junto com ele.
+
+    Args:
+        num_clientes: Número de clientes
+        semente: Semente do gerador
+        data_referencia: Data final do histórico (padrão: hoje)
+
+    Returns:
+        Dicionário com a versão, o número de clientes, a semente e a data de referência
+    """
+    return {
+        "versao": VERSAO_DADOS,
+        "num_clientes": num_clientes,
+        "semente": semente,
+        "data_referencia": (data_referencia or date.today()).isoformat()
+    }
+
+def dados_carregados(db, num_clientes, semente, data_referencia=None):
+    """
+    Verifica se o banco já tem o conjunto de dados pedido.
+
+    Args:
+        db: Banco de dados do benchmark
+        num_clientes: Número de clientes
+        semente: Semente do gerador
+        data_referencia: Data final do histórico (padrão: hoje)
+
+    Returns:
+        True se o conjunto carregado tem a mesma descrição
+    """
+    carregado = db[COLLECTION_DESCRICAO].find_one({"_id": "dados"}, {"_id": 0})
+    return carregado == descricao_dados(num_clientes, semente, data_referencia)
+
+def codigo_cliente(indice):
+    """Código do cliente de número indice (10 dígitos, como no ERP)."""
+    return f"{indice:010d}"
+
+def dias_nao_uteis(data_inicio, data_fim):
+    """
+    Monta o conjunto de feriados nacionais entre duas datas.
+
+    Args:
+        data_inicio: Primeira data
+        data_fim: Última data
+
+    Returns:
+        Conjunto de objetos date
+    """
+    feriados = set()
+    for ano in range(data_inicio.year, data_fim.year + 1):
+        feriados.update(datetime.fromtimestamp(feriado).date() for feriado in obter_feriados_nacionais(ano))
+    return feriados
+
+def proximo_dia_util(timestamp, feriados):
+    """Avança um timestamp até o próximo dia que não é sábado, domingo nem feriado."""
+    data = datetime.fromtimestamp(timestamp)
+    while data.weekday() >= 5 or data.date() in feriados:
+        data += timedelta(days=1)
+    return int(data.timestamp())
+
+def numero_pedidos(aleatorio, media=MEDIA_PEDIDOS_POR_CLIENTE):
+    """
+    Sorteia o número de pedidos de um cliente com uma distribuição de Pareto.
+
+    Args:
+        aleatorio: random.Random do bloco
+        media: Média de pedidos por cliente
+
+    Returns:
+        Número de pedidos (pelo menos 1, no máximo MAXIMO_PEDIDOS_POR_CLIENTE)
+    """
+    # Para a Pareto com mínimo xm, a média é alfa * xm / (alfa - 1)
+    minimo = media * (ALFA_PARETO - 1) / ALFA_PARETO
+    return max(1, min(MAXIMO_PEDIDOS_POR_CLIENTE, int(minimo * aleatorio.paretovariate(ALFA_PARETO))))
+
+def escolher_ponderado(aleatorio, opcoes):
+    """Escolhe um valor de uma lista de pares (valor, peso)."""
+    return aleatorio.choices([valor for valor, _ in opcoes], weights=[peso for _, peso in opcoes])[0]
+
+def gerar_cliente(aleatorio, indice, inicio_historico, fim_historico, feriados, media_pedidos=MEDIA_PEDIDOS_POR_CLIENTE):
+    """
+    Gera um cliente com as suas movimentações e lançamentos.
+
+    Args:
+        aleatorio: random.Random do bloco
+        indice: Número do cliente (define o _id e o código)
+        inicio_historico: Timestamp do início do histórico
+        fim_historico: Timestamp da data de referência
+        feriados: Conjunto de feriados do período (ver dias_nao_uteis)
+        media_pedidos: Média de pedidos por cliente
+
+    Returns:
+        Tupla (gerador, lista de movimentações, lista de lançamentos)
+    """
+    cod_cliente = codigo_cliente(indice)
+    gerador = {
+        "_id": ObjectId(f"{indice:024x}"),
+        "cod_cliente": cod_cliente,
+        "razao_social": f"CLIENTE SINTETICO {indice}"
+    }
+    movimentacoes = []
+    lancamentos = []
+
+    # Alguns geradores nunca compraram
+    if aleatorio.random() < PERCENTUAL_SEM_MOVIMENTACAO:
+        return gerador, movimentacoes, lancamentos
+
+    # Perfil do cliente: período de atividade, marcas, ticket, forma de pagamento e pontualidade
+    primeira_compra = aleatorio.randint(inicio_historico, fim_historico - 30 * SEGUNDOS_DIA)
+    ultima_compra = fim_historico
+    if aleatorio.random() < PERCENTUAL_INATIVOS:
+        ultima_compra = aleatorio.randint(primeira_compra, fim_historico)
+
+    marcas_cliente = aleatorio.sample(list(MARCAS), min(len(MARCAS), 1 + int(aleatorio.expovariate(0.6))))
+    fator_ticket = aleatorio.lognormvariate(0, 0.5)
+    usa_boleto = aleatorio.random() < PERCENTUAL_USA_BOLETO
+    tipo_pagamento = aleatorio.choice(TIPOS_PAGAMENTO if usa_boleto else OUTROS_PAGAMENTOS)
+    probabilidade_em_dia = aleatorio.betavariate(8, 2)
+    inadimplente = aleatorio.random() < PERCENTUAL_INADIMPLENTES
+    campo_codigo = escolher_ponderado(aleatorio, CAMPOS_CODIGO_LANCAMENTO)
+
+    datas_pedidos = sorted(
+        aleatorio.randint(primeira_compra, ultima_compra)
+        for _ in range(numero_pedidos(aleatorio, media_pedidos))
+    )
+
+    for data_pedido in datas_pedidos:
+        # Pedidos em horário comercial
+        data_pedido = data_pedido - data_pedido % SEGUNDOS_DIA + aleatorio.randint(9, 18) * 3600
+        evento_venda = aleatorio.choice(EVENTOS_VENDA)
+        cancelado = aleatorio.random() < PERCENTUAL_CANCELADAS
+        valor_pedido = 0.0
+        itens = []
+
+        for _ in range(aleatorio.randint(*ITENS_POR_PEDIDO)):
+            marca = aleatorio.choice(marcas_cliente)
+            preco_minimo, preco_maximo = MARCAS[marca]
+            qtde = max(1, int(aleatorio.expovariate(1 / 6)))
+            valor_final = round(qtde * aleatorio.uniform(preco_minimo, preco_maximo) * fator_ticket, 2)
+            valor_pedido += valor_final
+            itens.append((marca, qtde, valor_final))
+            movimentacoes.append({
+                "_id": ObjectId(f"{indice:012x}{len(movimentacoes):012x}"),
+                "codigo_cliente_fornecedor": cod_cliente,
+                "evento": evento_venda,
+                "tipo_operacao": "S",
+                "cancelada": cancelado,
+                "data": data_pedido,
+                "marca": marca,
+                "qtde": qtde,
+                "valor_final": valor_final
+            })
+
+        if cancelado:
+            continue
+
+        # Devolução de parte de um item, alguns dias depois
+        if aleatorio.random() < PERCENTUAL_PEDIDOS_COM_DEVOLUCAO:
+            marca, qtde, valor_final = aleatorio.choice(itens)
+            qtde_devolvida = aleatorio.randint(1, qtde)
+            data_devolucao = min(fim_historico, data_pedido + aleatorio.randint(3, 30) * SEGUNDOS_DIA)
+            movimentacoes.append({
+                "_id": ObjectId(f"{indice:012x}{len(movimentacoes):012x}"),
+                "codigo_cliente_fornecedor": cod_cliente,
+                "evento": aleatorio.choice(EVENTOS_DEVOLUCAO),
+                "tipo_operacao": "E",
+                "cancelada": False,
+                "data": data_devolucao,
+                "marca": marca,
+                "qtde": qtde_devolvida,
+                "valor_final": round(valor_final * qtde_devolvida / qtde, 2)
+            })
+
+        # Parcelas a receber a cada 30 dias; o vencimento pode cair em fim de semana ou feriado
+        parcelas = aleatorio.randint(*PARCELAS_POR_PEDIDO)
+        valor_parcela = round(valor_pedido / parcelas, 2)
+        for numero_parcela in range(1, parcelas + 1):
+            vencimento = data_pedido - data_pedido % SEGUNDOS_DIA + 30 * numero_parcela * SEGUNDOS_DIA
+            vencimento_util = proximo_dia_util(vencimento, feriados)
+            data_pagamento = None
+
+            if vencimento_util < fim_historico and not (inadimplente and vencimento_util > fim_historico - 120 * SEGUNDOS_DIA):
+                if aleatorio.random() < probabilidade_em_dia:
+                    # Em dia: até o vencimento ou no dia útil seguinte a um vencimento em feriado
+                    data_pagamento = vencimento_util - aleatorio.randint(0, 3) * SEGUNDOS_DIA
+                else:
+                    data_pagamento = vencimento_util + max(1, int(aleatorio.expovariate(1 / 10))) * SEGUNDOS_DIA
+                data_pagamento = min(data_pagamento, fim_historico)
+
+            lancamentos.append({
+                "_id": ObjectId(f"{indice:012x}{len(lancamentos):012x}"),
+                campo_codigo: cod_cliente,
+                "tipo": "R",
+                "substituido": aleatorio.random() < PERCENTUAL_SUBSTITUIDOS,
+                "titulo": True,
+                "tipo_pgto_descricao": tipo_pagamento,
+                "parcela": numero_parcela,
+                "data_emissao": data_pedido,
+                "data_vencimento": vencimento,
+                "data_pagamento": data_pagamento,
+                "valor_inicial": valor_parcela,
+                "valor_liquido": valor_parcela,
+                "valor_pago_recebido": valor_parcela if data_pagamento is not None else None,
+                "efetuado": data_pagamento is not None
+            })
+
+    return gerador, movimentacoes, lancamentos
+
+def periodo_historico(data_referencia=None):
+    """
+    Calcula o início e o fim do histórico gerado.
+
+    Args:
+        data_referencia: Data final do histórico (padrão: hoje)
+
+    Returns:
+        Tupla (timestamp inicial, timestamp final, conjunto de feriados do período)
+    """
+    referencia = data_referencia or date.today()
+    inicio = referencia - timedelta(days=ANOS_HISTORICO * 365)
+    # Inclui o ano seguinte, onde caem os vencimentos das últimas parcelas
+    feriados = dias_nao_uteis(inicio, referencia + timedelta(days=365))
+    return (
+        int(datetime(inicio.year, inicio.month, inicio.day).timestamp()),
+        int(datetime(referencia.year, referencia.month, referencia.day).timestamp()),
+        feriados
+    )
+
+def gerar_bloco(semente, bloco, num_clientes, data_referencia=None, media_pedidos=MEDIA_PEDIDOS_POR_CLIENTE):
+    """
+    Gera os clientes de um bloco.
+
+    A semente do bloco depende só da semente do conjunto e do número do bloco, então cada
+    bloco gera sempre os mesmos documentos, em qualquer processo e em qualquer ordem.
+
+    Args:
+        semente: Semente do conjunto
+        bloco: Número do bloco (clientes bloco * CLIENTES_POR_BLOCO + 1 em diante)
+        num_clientes: Número total de clientes do conjunto
+        data_referencia: Data final do histórico (padrão: hoje)
+        media_pedidos: Média de pedidos por cliente
+
+    Returns:
+        Gerador de tuplas (gerador, movimentações, lançamentos)
+    """
+    aleatorio = random.Random(f"{semente}:{bloco}")
+    inicio_historico, fim_historico, feriados = periodo_historico(data_referencia)
+
+    primeiro = bloco * CLIENTES_POR_BLOCO + 1
+    ultimo = min(num_clientes, primeiro + CLIENTES_POR_BLOCO - 1)
+    for indice in range(primeiro, ultimo + 1):
+        yield gerar_cliente(aleatorio, indice, inicio_historico, fim_historico, feriados, media_pedidos)
+
+def inicializar_escritor(uri, banco):
+    """Cria a conexão do processo escritor."""
+    global db_escritor
+    db_escritor = MongoClient(uri)[banco]
+
+def gravar_bloco(semente, bloco, num_clientes, data_referencia=None, media_pedidos=MEDIA_PEDIDOS_POR_CLIENTE, db=None):
+    """
+    Gera um bloco de clientes e grava os documentos com insert_many.
+
+    Args:
+        semente: Semente do conjunto
+        bloco: Número do bloco
+        num_clientes: Número total de clientes do conjunto
+        data_referencia: Data final do histórico (padrão: hoje)
+        media_pedidos: Média de pedidos por cliente
+        db: Banco de destino (padrão: o banco do processo escritor)
+
+    Returns:
+        Dicionário com o número de documentos inseridos em cada collection
+    """
+    db = db if db is not None else db_escritor
+    pendentes = {"geradores": [], "movimentacao": [], "lancamentos_completo": []}
+    totais = {nome_collection: 0 for nome_collection in pendentes}
+
+    def inserir(nome_collection, forcar=False):
+        documentos = pendentes[nome_collection]
+        if documentos and (forcar or len(documentos) >= TAMANHO_LOTE_INSERCAO):
+            db[nome_collection].insert_many(documentos, ordered=False)
+            totais[nome_collection] += len(documentos)
+            pendentes[nome_collection] = []
+
+    for gerador, movimentacoes, lancamentos in gerar_bloco(semente, bloco, num_clientes, data_referencia, media_pedidos):
+        pendentes["geradores"].append(gerador)
+        pendentes["movimentacao"].extend(movimentacoes)
+        pendentes["lancamentos_completo"].extend(lancamentos)
+        for nome_collection in pendentes:
+            inserir(nome_collection)
+
+    for nome_collection in pendentes:
+        inserir(nome_collection, forcar=True)
+
+    return totais
+
+def carregar_dados(uri, banco, num_clientes, semente=42, escritores=1, data_referencia=None,
+                   media_pedidos=MEDIA_PEDIDOS_POR_CLIENTE):
+    """
+    Apaga as collections do ERP no banco informado e carrega o conjunto de dados sintético.
+
+    Args:
+        uri: URI do MongoDB
+        banco: Banco de destino (nunca o banco de produção)
+        num_clientes: Número de clientes
+        semente: Semente do gerador
+        escritores: Número de processos gravando blocos em paralelo
+        data_referencia: Data final do histórico (padrão: hoje)
+        media_pedidos: Média de pedidos por cliente
+
+    Returns:
+        Dicionário com o número de documentos inseridos em cada collection
+    """
+    referencia = data_referencia or date.today()
+
+    with MongoClient(uri) as cliente:
+        db = cliente[banco]
+        for nome_collection in ("geradores", "geradores_cod_cliente", "movimentacao", "lancamentos_completo", COLLECTION_DESCRICAO):
+            db[nome_collection].drop()
+
+        totais = {"geradores": 0, "movimentacao": 0, "lancamentos_completo": 0}
+        num_blocos = (num_clientes + CLIENTES_POR_BLOCO - 1) // CLIENTES_POR_BLOCO
+
+        if escritores <= 1:
+            resultados = (
+                gravar_bloco(semente, bloco, num_clientes, referencia, media_pedidos, db=db)
+                for bloco in range(num_blocos)
+            )
+            for totais_bloco in resultados:
+                for nome_collection, total in totais_bloco.items():
+                    totais[nome_collection] += total
+        else:
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=escritores, initializer=inicializar_escritor, initargs=(uri, banco)
+            ) as executor:
+                futuros = [
+                    executor.submit(gravar_bloco, semente, bloco, num_clientes, referencia, media_pedidos)
+                    for bloco in range(num_blocos)
+                ]
+                for concluidos, futuro in enumerate(concurrent.futures.as_completed(futuros), start=1):
+                    for nome_collection, total in futuro.result().items():
+                        totais[nome_collection] += total
+                    if concluidos % 10 == 0 or concluidos == num_blocos:
+                        print(f"  {concluidos}/{num_blocos} blocos gravados ({totais['movimentacao']} movimentações)")
+
+        # A lista de códigos é um único documento, como no ERP; acima do limite do BSON ela não é
+        # criada e as consultas usam o método alternativo (agregação sobre movimentacao)
+        codigos = [codigo_cliente(indice) for indice in range(1, num_clientes + 1)]
+        tamanho_estimado = sum(len(codigo) + 16 for codigo in codigos)
+        if codigos and tamanho_estimado < TAMANHO_MAXIMO_DOCUMENTO:
+            db.geradores_cod_cliente.insert_one({"codigo_cliente_fornecedor": codigos})
+        else:
+            print("Aviso: clientes demais para um único documento em geradores_cod_cliente; a collection ficará vazia")
+
+        for nome_collection, indices in INDICES.items():
+            for chaves in indices:
+                db[nome_collection].create_index(chaves)
+
+        db[COLLECTION_DESCRICAO].insert_one({"_id": "dados", **descricao_dados(num_clientes, semente, referencia)})
+
+    return totais
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gerar o conjunto de dados sintético do ERP")
+    parser.add_argument("--uri", required=True, help="URI do MongoDB")
+    parser.add_argument("--banco", required=True, help="Banco de destino (as collections do ERP nele são apagadas)")
+    parser.add_argument("--clientes", type=int, default=1000, help="Número de clientes")
+    parser.add_argument("--semente", type=int, default=42, help="Semente do gerador")
+    parser.add_argument("--escritores", type=int, default=os.cpu_count() or 1, help="Processos gravando em paralelo")
+    parser.add_argument("--media-pedidos", type=float, default=MEDIA_PEDIDOS_POR_CLIENTE, help="Média de pedidos por cliente")
+    parser.add_argument("--data-referencia", help="Data final do histórico, AAAA-MM-DD (padrão: hoje)")
+    args = parser.parse_args()
+
+    referencia = date.fromisoformat(args.data_referencia) if args.data_referencia else None
+    inicio = datetime.now()
+    totais = carregar_dados(
+        args.uri, args.banco, args.clientes, semente=args.semente, escritores=args.escritores,
+        data_referencia=referencia, media_pedidos=args.media_pedidos
+    )
+    print(f"Dados gerados em {(datetime.now() - inicio).total_seconds():.1f} segundos: {totais}")
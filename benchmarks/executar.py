@@ -0,0 +1,280 @@
+"""
+Executa os benchmarks de ponta a ponta e grava as medições em uma linha de base JSON.
+
+Para cada tamanho, o conjunto de dados sintético é carregado (uma vez, no banco
+benchmark_clientinsight_<clientes>_<semente>) e cada cenário é executado em um processo
+separado, com as configurações do .env e o banco do benchmark. Nunca use o banco de produção:
+as collections do banco do benchmark são apagadas antes da carga.
+
+Uso:
+    python -m benchmarks.executar --mongod /usr/bin/mongod --tamanhos 100,1000
+    python -m benchmarks.executar --uri mongodb://localhost:27017 --baseline benchmarks/resultados/base.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+import pymongo
+from pymongo import MongoClient
+
+from .cenarios import CENARIOS
+from .dados_sinteticos import carregar_dados, dados_carregados
+from .comparar import comparar_medicoes, exibir_comparacao
+
+# Raiz do projeto, incluída no PYTHONPATH dos cenários
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Pasta padrão das linhas de base
+DIRETORIO_RESULTADOS = os.path.join(RAIZ_PROJETO, "benchmarks", "resultados")
+
+# Configurações do .env que mudam o desempenho e ficam registradas em cada linha de base
+CONFIGURACOES_REGISTRADAS = (
+    "TAMANHO_LOTE", "NUM_THREADS", "NUM_PROCESSOS", "TAMANHO_BLOCO_FILA", "TAMANHO_BLOCO_PROCESSO",
+    "CONSULTAS_CONCORRENTES", "MAX_CONSULTAS_POR_CLIENTE", "AGENDAMENTO_POR_CUSTO",
+    "FORMATO_SAIDA", "COMPRIMIR_SAIDA", "MONGO_MAX_POOL_SIZE", "MONGO_COMPRESSORES"
+)
+
+def porta_livre():
+    """Retorna uma porta TCP livre na interface local."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as conexao:
+        conexao.bind(("127.0.0.1", 0))
+        return conexao.getsockname()[1]
+
+def iniciar_mongod(binario, porta=None, tempo_limite=30):
+    """
+    Inicia um mongod local com uma pasta de dados temporária.
+
+    Args:
+        binario: Caminho do executável mongod
+        porta: Porta do servidor (padrão: uma porta livre)
+        tempo_limite: Segundos aguardando o servidor responder
+
+    Returns:
+        Tupla (processo, URI, pasta de dados)
+    """
+    diretorio = tempfile.mkdtemp(prefix="benchmark_mongod_")
+    porta = porta or porta_livre()
+    processo = subprocess.Popen(
+        [binario, "--dbpath", diretorio, "--port", str(porta), "--bind_ip", "127.0.0.1"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    uri = f"mongodb://127.0.0.1:{porta}"
+
+    limite = time.time() + tempo_limite
+    while True:
+        try:
+            with MongoClient(uri, serverSelectionTimeoutMS=500) as cliente:
+                cliente.admin.command("ping")
+            return processo, uri, diretorio
+        except Exception:
+            if processo.poll() is not None or time.time() > limite:
+                parar_mongod(processo, diretorio)
+                raise RuntimeError(f"Não foi possível iniciar o mongod em {uri}")
+            time.sleep(0.2)
+
+def parar_mongod(processo, diretorio):
+    """Encerra o mongod iniciado por iniciar_mongod e apaga a pasta de dados."""
+    if processo.poll() is None:
+        processo.terminate()
+        try:
+            processo.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            processo.kill()
+    shutil.rmtree(diretorio, ignore_errors=True)
+
+def nome_banco(num_clientes, semente):
+    """Nome do banco do benchmark para um tamanho e uma semente."""
+    return f"benchmark_clientinsight_{num_clientes}_{semente}"
+
+def executar_cenario(cenario, uri, banco, diretorio_logs):
+    """
+    Executa um cenário em um processo separado, numa pasta de trabalho temporária.
+
+    Args:
+        cenario: Nome do cenário
+        uri: URI do MongoDB
+        banco: Banco do benchmark
+        diretorio_logs: Pasta onde a saída do processo é guardada
+
+    Returns:
+        Dicionário com a medição, ou None se o cenário falhou
+    """
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as diretorio_trabalho:
+        # O .env continua valendo; as variáveis abaixo têm precedência sobre ele
+        ambiente = dict(os.environ)
+        ambiente.update({
+            "MONGODB_URI": uri,
+            "MONGODB_DATABASE": banco,
+            "PYTHONPATH": os.pathsep.join(filter(None, [RAIZ_PROJETO, os.environ.get("PYTHONPATH")])),
+            "PROCESSAR_TODOS": "true",
+            "PAUSA_ENTRE_LOTES": "0",
+            "USAR_CACHE": "false",
+            "MOSTRAR_LOGS": "false",
+            "INSTRUMENTAR_CONSULTAS": "true",
+            "ARQUIVO_HISTORICO_CUSTOS": os.path.join(diretorio_trabalho, "historico_custos.json"),
+            "ARQUIVO_CACHE": os.path.join(diretorio_trabalho, "cache_consultas.sqlite")
+        })
+
+        caminho_medicao = os.path.join(diretorio_trabalho, "medicao.json")
+        caminho_log = os.path.join(diretorio_logs, f"{banco}_{cenario}.log")
+        with open(caminho_log, "w", encoding="utf-8") as log:
+            processo = subprocess.run(
+                [sys.executable, "-m", "benchmarks.cenarios", cenario, "--saida", caminho_medicao],
+                cwd=diretorio_trabalho,
+                env=ambiente,
+                stdout=log,
+                stderr=subprocess.STDOUT
+            )
+
+        if processo.returncode != 0 or not os.path.exists(caminho_medicao):
+            print(f"  Cenário {cenario} falhou (código {processo.returncode}); veja '{caminho_log}'")
+            return None
+
+        with open(caminho_medicao, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+def executar_benchmarks(uri, tamanhos, cenarios=CENARIOS, semente=42, repeticoes=1, escritores=1,
+                        diretorio_logs=DIRETORIO_RESULTADOS):
+    """
+    Carrega os dados de cada tamanho e executa os cenários.
+
+    Args:
+        uri: URI do MongoDB
+        tamanhos: Lista com os números de clientes
+        cenarios: Cenários a executar
+        semente: Semente do conjunto de dados
+        repeticoes: Número de execuções de cada cenário (é considerada a de mais clientes/s)
+        escritores: Processos gravando o conjunto de dados em paralelo
+        diretorio_logs: Pasta onde a saída dos cenários é guardada
+
+    Returns:
+        Dicionário da linha de base, com o ambiente e as medições
+    """
+    os.makedirs(diretorio_logs, exist_ok=True)
+
+    with MongoClient(uri) as cliente:
+        versao_servidor = cliente.server_info().get("version")
+        medicoes = []
+
+        for num_clientes in tamanhos:
+            banco = nome_banco(num_clientes, semente)
+            if dados_carregados(cliente[banco], num_clientes, semente):
+                print(f"Usando os dados já carregados em {banco}")
+            else:
+                print(f"Carregando {num_clientes} clientes em {banco}...")
+                inicio = time.perf_counter()
+                totais = carregar_dados(uri, banco, num_clientes, semente, escritores=escritores)
+                print(f"  {totais} em {time.perf_counter() - inicio:.1f} segundos")
+
+            for cenario in cenarios:
+                melhor = None
+                for _ in range(repeticoes):
+                    print(f"Executando {cenario} com {num_clientes} clientes...")
+                    medicao = executar_cenario(cenario, uri, banco, diretorio_logs)
+                    if medicao and (melhor is None or medicao["clientes_por_segundo"] > melhor["clientes_por_segundo"]):
+                        melhor = medicao
+                if melhor:
+                    melhor["tamanho"] = num_clientes
+                    medicoes.append(melhor)
+
+    return {
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "ambiente": {
+            "python": platform.python_version(),
+            "pymongo": pymongo.version,
+            "mongodb": versao_servidor,
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+            "commit": commit_atual()
+        },
+        "semente": semente,
+        "configuracao": {nome: os.getenv(nome) for nome in CONFIGURACOES_REGISTRADAS if os.getenv(nome) is not None},
+        "medicoes": medicoes
+    }
+
+def commit_atual():
+    """Retorna o commit atual do repositório, ou None fora de um repositório git."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ_PROJETO,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def exibir_medicoes(medicoes):
+    """Exibe as medições em forma de tabela."""
+    print(f"\n{'Cenário':<22}{'Clientes':>10}{'Cli/s':>10}{'Consultas/cli':>15}{'p95 (ms)':>11}{'RSS (MB)':>10}")
+    for medicao in medicoes:
+        p95 = medicao["latencia_p95_ms"]
+        print(
+            f"{medicao['cenario']:<22}"
+            f"{medicao['tamanho']:>10}"
+            f"{medicao['clientes_por_segundo']:>10.1f}"
+            f"{medicao['consultas_por_cliente']:>15.1f}"
+            f"{(f'{p95:.1f}' if p95 is not None else '-'):>11}"
+            f"{medicao['pico_rss_mb']:>10.1f}"
+        )
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv(os.path.join(RAIZ_PROJETO, ".env"))
+
+    parser = argparse.ArgumentParser(description="Executar os benchmarks de ponta a ponta do ClientInsight")
+    origem = parser.add_mutually_exclusive_group(required=True)
+    origem.add_argument("--mongod", help="Executável mongod, iniciado com uma pasta de dados temporária")
+    origem.add_argument("--uri", help="URI de um MongoDB já em execução (somente para benchmark)")
+    parser.add_argument("--tamanhos", default="100,1000", help="Números de clientes, separados por vírgula")
+    parser.add_argument("--cenarios", default=",".join(CENARIOS), help="Cenários, separados por vírgula")
+    parser.add_argument("--semente", type=int, default=42, help="Semente do conjunto de dados")
+    parser.add_argument("--repeticoes", type=int, default=1, help="Execuções de cada cenário")
+    parser.add_argument("--escritores", type=int, default=os.cpu_count() or 1, help="Processos gravando os dados em paralelo")
+    parser.add_argument("--saida", help="Arquivo JSON da linha de base (padrão: benchmarks/resultados/benchmark_<data>.json)")
+    parser.add_argument("--baseline", help="Linha de base anterior para comparar com as novas medições")
+    parser.add_argument("--tolerancia", type=float, default=10.0, help="Piora aceita na comparação, em %%")
+    args = parser.parse_args()
+
+    cenarios = [cenario.strip() for cenario in args.cenarios.split(",") if cenario.strip()]
+    invalidos = [cenario for cenario in cenarios if cenario not in CENARIOS]
+    if invalidos:
+        parser.error(f"Cenários inválidos: {', '.join(invalidos)} (disponíveis: {', '.join(CENARIOS)})")
+    tamanhos = [int(tamanho) for tamanho in args.tamanhos.split(",") if tamanho.strip()]
+
+    processo_mongod = None
+    if args.mongod:
+        processo_mongod, uri, diretorio_mongod = iniciar_mongod(args.mongod)
+        print(f"mongod iniciado em {uri}")
+    else:
+        uri = args.uri
+
+    try:
+        resultado = executar_benchmarks(
+            uri, tamanhos, cenarios, semente=args.semente, repeticoes=args.repeticoes, escritores=args.escritores
+        )
+    finally:
+        if processo_mongod is not None:
+            parar_mongod(processo_mongod, diretorio_mongod)
+
+    exibir_medicoes(resultado["medicoes"])
+
+    caminho = args.saida or os.path.join(DIRETORIO_RESULTADOS, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"\nMedições salvas em '{caminho}'")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        comparacoes = comparar_medicoes(base, resultado, tolerancia=args.tolerancia)
+        exibir_comparacao(comparacoes)
+        sys.exit(1 if any(item["regressao"] for item in comparacoes) else 0)
@@ -0,0 +1,90 @@
+"""
+Compara a segmentação ótima (segmentacao_otima) com o K-means do scikit-learn usado antes nos
+scripts de análise, em faturamentos sintéticos com distribuição log-normal.
+
+Para cada tamanho, mede o tempo e a soma dos quadrados dentro dos grupos (custo) de cada método;
+o K-means é executado com os mesmos parâmetros de antes (5 grupos, n_init=10) e, por ser
+aleatório, com algumas sementes diferentes, para mostrar a variação dos limites.
+
+Uso:
+    python -m benchmarks.segmentacao
+    python -m benchmarks.segmentacao --tamanhos 1000,100000 --grupos 5 --sementes-kmeans 3
+"""
+import time
+import argparse
+import numpy as np
+
+from segmentacao_otima import segmentar, GRUPOS_FAIXAS
+
+# O scikit-learn é opcional: sem ele, apenas a segmentação ótima é medida
+try:
+    from sklearn.cluster import KMeans
+except ImportError:
+    KMeans = None
+
+def gerar_faturamentos(tamanho, semente=42):
+    """Gera faturamentos log-normais, com centavos, parecidos com os de uma base real."""
+    gerador = np.random.default_rng(semente)
+    return np.round(gerador.lognormal(mean=10, sigma=1.2, size=tamanho), 2)
+
+def custo_por_rotulos(valores, rotulos):
+    """Soma dos quadrados das distâncias à média de cada grupo."""
+    custo = 0.0
+    for rotulo in np.unique(rotulos):
+        grupo = valores[rotulos == rotulo]
+        custo += float(((grupo - grupo.mean()) ** 2).sum())
+    return custo
+
+def medir_kmeans(valores, grupos, semente):
+    """Executa o K-means como nos scripts de análise e retorna (segundos, custo, limites inferiores)."""
+    inicio = time.perf_counter()
+    modelo = KMeans(n_clusters=grupos, random_state=semente, n_init=10).fit(valores.reshape(-1, 1))
+    segundos = time.perf_counter() - inicio
+
+    limites = sorted(float(valores[modelo.labels_ == rotulo].min()) for rotulo in np.unique(modelo.labels_))
+    return segundos, custo_por_rotulos(valores, modelo.labels_), limites
+
+def medir_segmentacao(valores, grupos):
+    """Executa a segmentação ótima e retorna (segundos, custo, limites inferiores)."""
+    inicio = time.perf_counter()
+    segmentacao = segmentar(valores, grupos)
+    segundos = time.perf_counter() - inicio
+    return segundos, segmentacao["custo"], segmentacao["limites_inferiores"]
+
+def executar(tamanhos, grupos=GRUPOS_FAIXAS, sementes_kmeans=3):
+    """
+    Mede os dois métodos em cada tamanho e exibe a comparação.
+
+    Args:
+        tamanhos: Lista com o número de valores de cada medição
+        grupos: Número de grupos
+        sementes_kmeans: Quantas sementes do K-means executar por tamanho
+    """
+    if KMeans is None:
+        print("scikit-learn não instalado: apenas a segmentação ótima será medida (pip install scikit-learn)\n")
+
+    print(f"{'Valores':>10}  {'Método':<16}{'Tempo (s)':>11}{'Custo relativo':>16}  Limites inferiores")
+    for tamanho in tamanhos:
+        valores = gerar_faturamentos(tamanho)
+        segundos, custo_otimo, limites = medir_segmentacao(valores, grupos)
+        print(f"{tamanho:>10}  {'ótima':<16}{segundos:>11.3f}{1.0:>16.6f}  {[round(limite) for limite in limites]}")
+
+        if KMeans is None:
+            continue
+        for semente in range(sementes_kmeans):
+            segundos, custo, limites = medir_kmeans(valores, grupos, semente)
+            relativo = custo / custo_otimo if custo_otimo else 1.0
+            print(f"{'':>10}  {f'k-means ({semente})':<16}{segundos:>11.3f}{relativo:>16.6f}  {[round(limite) for limite in limites]}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara a segmentação ótima com o K-means")
+    parser.add_argument("--tamanhos", default="1000,10000,100000", help="Números de valores separados por vírgula")
+    parser.add_argument("--grupos", type=int, default=GRUPOS_FAIXAS, help="Número de grupos")
+    parser.add_argument("--sementes-kmeans", type=int, default=3, help="Sementes do K-means por tamanho")
+    args = parser.parse_args()
+
+    executar(
+        [int(tamanho) for tamanho in args.tamanhos.split(",") if tamanho.strip()],
+        grupos=args.grupos,
+        sementes_kmeans=args.sementes_kmeans
+    )
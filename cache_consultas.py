@@ -0,0 +1,335 @@
+"""
+Sistema de Extração de Dados do ERP - Cache de Consultas
+Este módulo guarda o resultado de cada consulta por cliente em um banco SQLite em disco, com um
+cache LRU em memória na frente. Cada entrada é identificada por (consulta, cliente, janela, data de
+referência) e vale enquanto o marcador de movimentações e lançamentos do cliente não mudar, de modo
+que uma nova execução no mesmo dia (ou após mudar apenas a classificação) não consulta o banco
+para os clientes sem alterações. Com o marcador por contagem, que não percebe cancelamentos e
+baixas, todas as entradas valem apenas no dia da execução.
+"""
+import os
+import copy
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import date
+from dotenv import load_dotenv
+from bson import json_util
+
+from consultas.titulos_pagos import CAMPOS_CLIENTE_TITULOS, filtro_titulos
+
+# Carrega as variáveis de ambiente
+load_dotenv()
+
+# Arquivo SQLite do cache e número de entradas mantidas em memória
+ARQUIVO_CACHE = os.getenv("ARQUIVO_CACHE", os.path.join("resultados", "cache_consultas.sqlite"))
+CACHE_ITENS_MEMORIA = int(os.getenv("CACHE_ITENS_MEMORIA", "10000"))
+
+# Marcador de alterações dos clientes: "contagem" (contagens respondidas pelos índices dos
+# clientes, sem ler os documentos) ou "completo" (agregações que também detectam cancelamentos
+# e baixas, mas leem os mesmos documentos que as consultas)
+MARCADOR_CACHE = os.getenv("MARCADOR_CACHE", "contagem").lower()
+
+# Janela de cada consulta. As consultas com janela relativa à data atual dependem do dia da
+# execução; as demais valem em qualquer dia enquanto o marcador completo do cliente não mudar
+# (com o marcador por contagem, também valem apenas no dia da execução).
+JANELAS_CONSULTAS = {
+    "data_primeira_compra": ("total", False),
+    "faturamento": ("12m", True),
+    "ciclos": ("6m", True),
+    "pecas": ("total", False),
+    "pagamentos": ("total", True),
+    "valor_por_marca": ("total", False),
+    "marcas": ("total", False)
+}
+
+# Valor guardado no lugar de None, para diferenciar "consulta sem dados" de "não está no cache"
+SEM_VALOR = {"$cache_sem_valor": True}
+
+# Cache do processo atual (recriado no processo filho após um fork)
+cache_processo = None
+pid_cache = None
+cache_lock = threading.Lock()
+
+def calcular_marcador_cliente(db, cod_cliente, modo=None):
+    """
+    Calcula o marcador de alterações dos dados de um cliente.
+
+    No modo "contagem", o marcador resume o número de movimentações e de lançamentos do cliente,
+    contados apenas pelos índices dos campos do cliente: inserções e exclusões mudam o marcador,
+    mas alterações de documentos existentes (cancelamentos, baixas) não, e por isso as entradas
+    do cache valem apenas no dia da execução (ver CacheConsultas.chave). No modo "completo", ele
+    resume as movimentações (quantidade, último _id e canceladas) e os lançamentos (quantidade,
+    último _id, pagos, última baixa e valor recebido), com duas agregações que leem todos os
+    documentos do cliente.
+
+    Args:
+        db: Conexão com o banco de dados
+        cod_cliente: Código do cliente
+        modo: "contagem" ou "completo" (padrão: MARCADOR_CACHE)
+
+    Returns:
+        String com o hash do marcador
+    """
+    if (modo or MARCADOR_CACHE) == "completo":
+        conteudo = calcular_marcador_completo(db, cod_cliente)
+    else:
+        conteudo = {
+            "movimentacao": db.movimentacao.count_documents({"codigo_cliente_fornecedor": cod_cliente}),
+            "lancamentos": db.lancamentos_completo.count_documents(
+                {"$or": [{campo: cod_cliente} for campo in CAMPOS_CLIENTE_TITULOS]}
+            )
+        }
+
+    marcador = json_util.dumps(conteudo, sort_keys=True)
+    return hashlib.sha1(marcador.encode("utf-8")).hexdigest()
+
+def calcular_marcador_completo(db, cod_cliente):
+    """
+    Resume as movimentações e os lançamentos de um cliente com duas agregações.
+
+    Args:
+        db: Conexão com o banco de dados
+        cod_cliente: Código do cliente
+
+    Returns:
+        Dicionário com o resumo das movimentações e dos lançamentos
+    """
+    movimentacao = list(db.movimentacao.aggregate([
+        {"$match": {"codigo_cliente_fornecedor": cod_cliente}},
+        {"$group": {
+            "_id": None,
+            "quantidade": {"$sum": 1},
+            "ultimo_id": {"$max": "$_id"},
+            "canceladas": {"$sum": {"$cond": [{"$eq": ["$cancelada", True]}, 1, 0]}}
+        }}
+    ]))
+
+    lancamentos = list(db.lancamentos_completo.aggregate([
+        {"$match": filtro_titulos(cod_cliente)},
+        {"$group": {
+            "_id": None,
+            "quantidade": {"$sum": 1},
+            "ultimo_id": {"$max": "$_id"},
+            "pagos": {"$sum": {"$cond": [{"$gt": [{"$ifNull": ["$data_pagamento", None]}, None]}, 1, 0]}},
+            "ultima_baixa": {"$max": "$data_pagamento"},
+            "valor_recebido": {"$sum": "$valor_pago_recebido"}
+        }}
+    ]))
+
+    return {
+        "movimentacao": movimentacao[0] if movimentacao else None,
+        "lancamentos": lancamentos[0] if lancamentos else None
+    }
+
+class CacheConsultas:
+    """
+    Cache persistente dos resultados das consultas por cliente.
+
+    As entradas ficam em uma tabela SQLite (modo WAL, que permite leitores e um escritor ao
+    mesmo tempo, inclusive entre processos) e as mais usadas ficam também em um LRU em memória.
+    """
+
+    def __init__(self, caminho=ARQUIVO_CACHE, itens_memoria=CACHE_ITENS_MEMORIA, data_referencia=None, modo=None):
+        """
+        Args:
+            caminho: Arquivo SQLite do cache
+            itens_memoria: Número máximo de entradas no LRU em memória
+            data_referencia: Data das consultas com janela relativa (padrão: hoje)
+            modo: Marcador usado nas entradas, "contagem" ou "completo" (padrão: MARCADOR_CACHE)
+        """
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+
+        self.caminho = caminho
+        self.itens_memoria = itens_memoria
+        self.data_referencia = (data_referencia or date.today()).isoformat()
+        self.modo = modo or MARCADOR_CACHE
+        self.acertos = 0
+        self.faltas = 0
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._conexao = sqlite3.connect(caminho, timeout=30, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("PRAGMA synchronous=NORMAL")
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS consultas ("
+            " consulta TEXT NOT NULL,"
+            " cod_cliente TEXT NOT NULL,"
+            " janela TEXT NOT NULL,"
+            " data_referencia TEXT NOT NULL,"
+            " marcador TEXT NOT NULL,"
+            " valor TEXT NOT NULL,"
+            " PRIMARY KEY (consulta, cod_cliente, janela, data_referencia))"
+        )
+
+        # As entradas de dias anteriores nunca mais serão usadas
+        self._conexao.execute(
+            "DELETE FROM consultas WHERE data_referencia != '' AND data_referencia < ?",
+            (self.data_referencia,)
+        )
+        self._conexao.commit()
+
+    def chave(self, consulta, cod_cliente):
+        """
+        Monta a chave (consulta, cliente, janela, data de referência) de uma consulta.
+
+        Com o marcador por contagem, um cancelamento ou uma baixa não muda o marcador; por isso,
+        nesse modo, todas as consultas são identificadas também pelo dia da execução.
+
+        Args:
+            consulta: Nome da consulta (ver JANELAS_CONSULTAS)
+            cod_cliente: Código do cliente
+
+        Returns:
+            Tupla com a chave
+        """
+        janela, depende_da_data = JANELAS_CONSULTAS.get(consulta, ("total", True))
+        if depende_da_data or self.modo != "completo":
+            return (consulta, str(cod_cliente), janela, self.data_referencia)
+        return (consulta, str(cod_cliente), janela, "")
+
+    def obter(self, consulta, cod_cliente, marcador):
+        """
+        Busca o resultado de uma consulta no cache.
+
+        Args:
+            consulta: Nome da consulta
+            cod_cliente: Código do cliente
+            marcador: Marcador atual do cliente (ver calcular_marcador_cliente)
+
+        Returns:
+            Tupla (encontrado, valor)
+        """
+        chave = self.chave(consulta, cod_cliente)
+
+        with self._lock:
+            entrada = self._memoria.get(chave)
+            if entrada is not None:
+                self._memoria.move_to_end(chave)
+            else:
+                linha = self._conexao.execute(
+                    "SELECT marcador, valor FROM consultas"
+                    " WHERE consulta = ? AND cod_cliente = ? AND janela = ? AND data_referencia = ?",
+                    chave
+                ).fetchone()
+                if linha is not None:
+                    entrada = (linha[0], json_util.loads(linha[1]))
+                    self._guardar_memoria(chave, entrada)
+
+            # Uma entrada com outro marcador é de dados que já mudaram
+            if entrada is None or entrada[0] != marcador:
+                self.faltas += 1
+                return False, None
+
+            self.acertos += 1
+
+        # Devolve uma cópia, para que o resultado de um cliente não altere a entrada em memória
+        valor = entrada[1]
+        return True, None if valor == SEM_VALOR else copy.deepcopy(valor)
+
+    def guardar(self, consulta, cod_cliente, marcador, valor):
+        """
+        Grava o resultado de uma consulta no cache.
+
+        Args:
+            consulta: Nome da consulta
+            cod_cliente: Código do cliente
+            marcador: Marcador atual do cliente
+            valor: Resultado da consulta (None é guardado como "sem dados")
+
+        Returns:
+            O valor como será lido do cache nas próximas execuções
+        """
+        chave = self.chave(consulta, cod_cliente)
+        texto = json_util.dumps(SEM_VALOR if valor is None else valor)
+        valor_decodificado = json_util.loads(texto)
+
+        with self._lock:
+            self._guardar_memoria(chave, (marcador, valor_decodificado))
+            self._conexao.execute(
+                "INSERT OR REPLACE INTO consultas"
+                " (consulta, cod_cliente, janela, data_referencia, marcador, valor)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                chave + (marcador, texto)
+            )
+            self._conexao.commit()
+
+        return None if valor_decodificado == SEM_VALOR else copy.deepcopy(valor_decodificado)
+
+    def obter_ou_calcular(self, consulta, cod_cliente, marcador, calcular):
+        """
+        Retorna o resultado em cache ou executa a consulta e guarda o resultado.
+
+        O valor devolvido é sempre o decodificado do cache, de modo que a primeira execução e
+        as seguintes produzem exatamente o mesmo resultado.
+
+        Args:
+            consulta: Nome da consulta
+            cod_cliente: Código do cliente
+            marcador: Marcador atual do cliente
+            calcular: Função sem argumentos que executa a consulta
+
+        Returns:
+            Resultado da consulta
+        """
+        encontrado, valor = self.obter(consulta, cod_cliente, marcador)
+        if encontrado:
+            return valor
+
+        return self.guardar(consulta, cod_cliente, marcador, calcular())
+
+    def _guardar_memoria(self, chave, entrada):
+        """Guarda uma entrada no LRU, descartando a menos usada se necessário."""
+        self._memoria[chave] = entrada
+        self._memoria.move_to_end(chave)
+        while len(self._memoria) > self.itens_memoria:
+            self._memoria.popitem(last=False)
+
+    def resumo(self):
+        """
+        Retorna os acertos e faltas do cache.
+
+        Returns:
+            Dicionário com acertos, faltas e percentual de acertos
+        """
+        with self._lock:
+            total = self.acertos + self.faltas
+            return {
+                "acertos": self.acertos,
+                "faltas": self.faltas,
+                "percentual_acertos": (self.acertos / total) * 100 if total else 0.0
+            }
+
+    def fechar(self):
+        """Fecha a conexão com o arquivo do cache."""
+        with self._lock:
+            self._conexao.close()
+
+def obter_cache():
+    """
+    Retorna o cache do processo, criando-o na primeira chamada.
+
+    Returns:
+        CacheConsultas compartilhado pelas threads do processo
+    """
+    global cache_processo, pid_cache
+    with cache_lock:
+        if cache_processo is None or pid_cache != os.getpid():
+            cache_processo = CacheConsultas()
+            pid_cache = os.getpid()
+        return cache_processo
+
+def exibir_estatisticas_cache():
+    """Exibe os acertos e faltas do cache do processo atual, se ele foi usado."""
+    if cache_processo is None or pid_cache != os.getpid():
+        return
+
+    resumo = cache_processo.resumo()
+    print(
+        f"Cache de consultas: {resumo['acertos']} acertos, {resumo['faltas']} faltas "
+        f"({resumo['percentual_acertos']:.1f}% de acertos)"
+    )
@@ -3,5 +3,6 @@ Package para classificação de clientes com base em critérios de faturamento,
 """
 
 from .classificar import classificar_cliente
+from .lote import classificar_lote
 
-__all__ = ['classificar_cliente']
+__all__ = ['classificar_cliente', 'classificar_lote']
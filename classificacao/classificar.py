@@ -202,6 +202,36 @@ def definir_categoria(pontuacao):
     else:
         return CATEGORIA_BRONZE  # Categoria padrão para qualquer pontuação abaixo de LIMITE_BRONZE
 
+def combinar_pontuacoes(
+    pontos_faturamento,
+    pontos_frequencia,
+    pontos_pontualidade,
+    pontos_volume,
+    pontos_diversificacao
+):
+    """
+    Combina as pontuações de cada critério na pontuação final ponderada.
+    
+    Args:
+        pontos_faturamento: Pontuação do faturamento (0 a 10)
+        pontos_frequencia: Pontuação da frequência (0 a 10)
+        pontos_pontualidade: Pontuação da pontualidade (0 a 10)
+        pontos_volume: Pontuação do volume de peças (0 a 10)
+        pontos_diversificacao: Pontuação da diversificação de marcas (0 a 10)
+    
+    Returns:
+        Pontuação final ponderada (0 a 10)
+    """
+    pontuacao_final = (
+        (pontos_faturamento * PESO_FATURAMENTO) +
+        (pontos_frequencia * PESO_FREQUENCIA) +
+        (pontos_pontualidade * PESO_PONTUALIDADE) +
+        (pontos_volume * PESO_VOLUME_PECAS) +
+        (pontos_diversificacao * PESO_DIVERSIFICACAO)
+    )
+    
+    return round(pontuacao_final, 2)
+
 def calcular_pontuacao(
     faturamento_liquido,
     ciclos_compra,
@@ -224,23 +254,50 @@ def calcular_pontuacao(
     Returns:
         Pontuação final ponderada (0 a 10)
     """
-    # Calcula as pontuações individuais
-    pontos_faturamento = pontuar_faturamento(faturamento_liquido)
-    pontos_frequencia = pontuar_frequencia(ciclos_compra)
-    pontos_pontualidade = pontuar_pontualidade(percentual_pagos_em_dia, percentual_pagos_ate_7_dias)
-    pontos_volume = pontuar_volume_pecas(total_pecas_liquido)
-    pontos_diversificacao = pontuar_diversificacao(numero_marcas)
-    
-    # Calcula a pontuação final ponderada
-    pontuacao_final = (
-        (pontos_faturamento * PESO_FATURAMENTO) +
-        (pontos_frequencia * PESO_FREQUENCIA) +
-        (pontos_pontualidade * PESO_PONTUALIDADE) +
-        (pontos_volume * PESO_VOLUME_PECAS) +
-        (pontos_diversificacao * PESO_DIVERSIFICACAO)
+    return combinar_pontuacoes(
+        pontuar_faturamento(faturamento_liquido),
+        pontuar_frequencia(ciclos_compra),
+        pontuar_pontualidade(percentual_pagos_em_dia, percentual_pagos_ate_7_dias),
+        pontuar_volume_pecas(total_pecas_liquido),
+        pontuar_diversificacao(numero_marcas)
     )
+
+def extrair_valores_classificacao(cliente_data):
+    """
+    Extrai do resultado de um cliente os valores usados na classificação.
     
-    return round(pontuacao_final, 2)
+    Args:
+        cliente_data: Dicionário com os dados do cliente processados pelo ClientInsight
+            (campos nulos, de métricas não calculadas, valem como ausentes)
+    
+    Returns:
+        Tupla (faturamento_liquido, ciclos_compra, percentual_pagos_em_dia,
+        percentual_pagos_ate_7_dias, total_pecas_liquido, numero_marcas)
+    """
+    faturamento_liquido = (cliente_data.get('faturamento_ultimos_12_meses') or {}).get('faturamento_liquido', 0)
+    ciclos_compra = cliente_data.get('ciclos_compra_ultimos_6_meses', 0)
+    
+    # Dados de pontualidade
+    titulos = cliente_data.get('titulos_pagos_em_dia') or {}
+    percentual_pagos_em_dia = titulos.get('percentual_pagos_em_dia', 0)
+    percentual_pagos_ate_7_dias = titulos.get('percentual_pagos_em_ate_7d', 0)
+    
+    # Volume de peças e marcas
+    total_pecas_liquido = (cliente_data.get('total_pecas') or {}).get('liquido', 0)
+    numero_marcas = cliente_data.get('numero_marcas_diferentes', 0)
+    
+    # Se numero_marcas for 0 mas há marcas na lista, usa o tamanho da lista
+    if numero_marcas == 0 and 'lista_marcas' in cliente_data and cliente_data['lista_marcas']:
+        numero_marcas = len(cliente_data['lista_marcas'])
+    
+    return (
+        faturamento_liquido,
+        ciclos_compra,
+        percentual_pagos_em_dia,
+        percentual_pagos_ate_7_dias,
+        total_pecas_liquido,
+        numero_marcas
+    )
 
 def classificar_cliente(cliente_data):
     """
@@ -257,21 +314,14 @@ def classificar_cliente(cliente_data):
     """
     try:
         # Extrai os dados necessários do dicionário do cliente
-        faturamento_liquido = cliente_data.get('faturamento_ultimos_12_meses', {}).get('faturamento_liquido', 0)
-        ciclos_compra = cliente_data.get('ciclos_compra_ultimos_6_meses', 0)
-        
-        # Dados de pontualidade
-        titulos = cliente_data.get('titulos_pagos_em_dia', {})
-        percentual_pagos_em_dia = titulos.get('percentual_pagos_em_dia', 0)
-        percentual_pagos_ate_7_dias = titulos.get('percentual_pagos_em_ate_7d', 0)
-        
-        # Volume de peças e marcas
-        total_pecas_liquido = cliente_data.get('total_pecas', {}).get('liquido', 0)
-        numero_marcas = cliente_data.get('numero_marcas_diferentes', 0)
-        
-        # Se numero_marcas for 0 mas há marcas na lista, usa o tamanho da lista
-        if numero_marcas == 0 and 'lista_marcas' in cliente_data and cliente_data['lista_marcas']:
-            numero_marcas = len(cliente_data['lista_marcas'])
+        (
+            faturamento_liquido,
+            ciclos_compra,
+            percentual_pagos_em_dia,
+            percentual_pagos_ate_7_dias,
+            total_pecas_liquido,
+            numero_marcas
+        ) = extrair_valores_classificacao(cliente_data)
         
         # Calcula as pontuações individuais
         pontos_faturamento = pontuar_faturamento(faturamento_liquido)
@@ -280,14 +330,13 @@ def classificar_cliente(cliente_data):
         pontos_volume = pontuar_volume_pecas(total_pecas_liquido)
         pontos_diversificacao = pontuar_diversificacao(numero_marcas)
         
-        # Calcula a pontuação final
-        pontuacao_final = calcular_pontuacao(
-            faturamento_liquido,
-            ciclos_compra,
-            percentual_pagos_em_dia,
-            percentual_pagos_ate_7_dias,
-            total_pecas_liquido,
-            numero_marcas
+        # Calcula a pontuação final a partir das pontuações já calculadas
+        pontuacao_final = combinar_pontuacoes(
+            pontos_faturamento,
+            pontos_frequencia,
+            pontos_pontualidade,
+            pontos_volume,
+            pontos_diversificacao
         )
         
         # Define a categoria
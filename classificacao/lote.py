@@ -0,0 +1,200 @@
+"""
+Classificação vetorizada de muitos clientes de uma vez.
+
+As entradas são colunas (arrays do NumPy) com os valores de cada critério. As pontuações de
+faturamento, pontualidade e volume de peças são obtidas com searchsorted sobre as faixas
+configuradas em classificar.py; as de frequência e diversificação, que dependem de poucos
+valores inteiros, são calculadas uma vez por valor distinto. A pontuação final e a categoria
+são calculadas com as próprias funções de classificar.py, uma vez por combinação distinta de
+pontuações (no máximo algumas centenas), de modo que o resultado é idêntico ao de
+classificar_cliente, inclusive no arredondamento.
+"""
+# O NumPy é necessário apenas para a classificação em lote
+from dependencias import np, exigir_numpy
+
+from . import classificar
+
+# Colunas de entrada, na ordem de classificar.extrair_valores_classificacao
+COLUNAS = (
+    "faturamento_liquido",
+    "ciclos_compra",
+    "percentual_pagos_em_dia",
+    "percentual_pagos_ate_7_dias",
+    "total_pecas_liquido",
+    "numero_marcas"
+)
+
+def faixas_faturamento():
+    """Faixas (limite, pontos) de faturamento, na ordem testada por pontuar_faturamento."""
+    return [
+        (classificar.FATURAMENTO_FAIXA_10, 10),
+        (classificar.FATURAMENTO_FAIXA_8, 8),
+        (classificar.FATURAMENTO_FAIXA_6, 6),
+        (classificar.FATURAMENTO_FAIXA_4, 4)
+    ]
+
+def faixas_pontualidade():
+    """Faixas (limite, pontos) de pontualidade, na ordem testada por pontuar_pontualidade."""
+    return [
+        (classificar.PONTUALIDADE_FAIXA_10, 10),
+        (classificar.PONTUALIDADE_FAIXA_8, 8),
+        (classificar.PONTUALIDADE_FAIXA_6, 6),
+        (classificar.PONTUALIDADE_FAIXA_4, 4)
+    ]
+
+def faixas_volume_pecas():
+    """Faixas (limite, pontos) de volume de peças, na ordem testada por pontuar_volume_pecas."""
+    return [
+        (classificar.PECAS_FAIXA_10, 10),
+        (classificar.PECAS_FAIXA_8, 8),
+        (classificar.PECAS_FAIXA_6, 6),
+        (classificar.PECAS_FAIXA_4, 4)
+    ]
+
+def pontuar_por_faixas(valores, faixas, padrao):
+    """
+    Pontua uma coluna por faixas do tipo "valor >= limite".
+
+    Args:
+        valores: Array com os valores
+        faixas: Lista de (limite, pontos), na ordem em que a escada if/elif testa os limites
+        padrao: Pontos de quem não atinge nenhum limite
+
+    Returns:
+        Array com os pontos de cada valor
+    """
+    limites = np.array([limite for limite, _ in reversed(faixas)], dtype=float)
+    pontos = np.array([padrao] + [pontos_faixa for _, pontos_faixa in reversed(faixas)])
+
+    # Com os limites em ordem, a posição do valor entre eles é o número de faixas atingidas
+    if np.all(np.diff(limites) >= 0):
+        return pontos[np.searchsorted(limites, valores, side="right")]
+
+    # Limites fora de ordem no .env: aplica a escada na mesma ordem do if/elif
+    resultado = np.full(valores.shape, padrao)
+    for limite, pontos_faixa in reversed(faixas):
+        resultado = np.where(valores >= limite, pontos_faixa, resultado)
+    return resultado
+
+def pontuar_por_valor(valores, pontuar):
+    """
+    Pontua uma coluna aplicando a função escalar a cada valor distinto.
+
+    Args:
+        valores: Array com os valores (sem NaN)
+        pontuar: Função escalar de classificar.py
+
+    Returns:
+        Array com os pontos de cada valor
+    """
+    distintos, posicoes = np.unique(valores, return_inverse=True)
+    pontos = np.array([pontuar(valor.item()) for valor in distintos], dtype=int)
+    return pontos[posicoes].reshape(valores.shape)
+
+def classificar_lote(
+    faturamento_liquido,
+    ciclos_compra,
+    percentual_pagos_em_dia,
+    percentual_pagos_ate_7_dias,
+    total_pecas_liquido,
+    numero_marcas
+):
+    """
+    Classifica muitos clientes de uma vez, com o mesmo resultado de classificar_cliente.
+
+    Um valor ausente (NaN) em qualquer critério, exceto nos ciclos, corresponde a um erro na
+    classificação escalar: o cliente recebe pontuação 0 e a categoria Bronze. Ciclos ausentes
+    valem 0 pontos, como em pontuar_frequencia.
+
+    Args:
+        faturamento_liquido: Array com o faturamento líquido dos últimos 12 meses
+        ciclos_compra: Array com o número de meses com compras nos últimos 6 meses
+        percentual_pagos_em_dia: Array com o percentual de títulos pagos em dia
+        percentual_pagos_ate_7_dias: Array com o percentual pago com até 7 dias de atraso
+        total_pecas_liquido: Array com o número líquido de peças compradas
+        numero_marcas: Array com o número de marcas diferentes
+
+    Returns:
+        Dicionário de arrays: pontos_faturamento, pontos_frequencia, pontos_pontualidade,
+        pontos_volume, pontos_diversificacao, pontuacao_final, categoria e erro
+    """
+    exigir_numpy("a classificação em lote")
+
+    faturamento_liquido = np.asarray(faturamento_liquido, dtype=float)
+    ciclos_compra = np.asarray(ciclos_compra, dtype=float)
+    percentual_pontual = np.asarray(percentual_pagos_em_dia, dtype=float) + np.asarray(percentual_pagos_ate_7_dias, dtype=float)
+    total_pecas_liquido = np.asarray(total_pecas_liquido, dtype=float)
+    numero_marcas = np.asarray(numero_marcas, dtype=float)
+
+    erro = np.isnan(faturamento_liquido) | np.isnan(percentual_pontual) | np.isnan(total_pecas_liquido) | np.isnan(numero_marcas)
+
+    pontos_faturamento = pontuar_por_faixas(faturamento_liquido, faixas_faturamento(), 2)
+    pontos_pontualidade = pontuar_por_faixas(percentual_pontual, faixas_pontualidade(), 2)
+    pontos_volume = pontuar_por_faixas(total_pecas_liquido, faixas_volume_pecas(), 2)
+    pontos_frequencia = pontuar_por_valor(np.nan_to_num(ciclos_compra, nan=-1.0), classificar.pontuar_frequencia)
+    pontos_diversificacao = pontuar_por_valor(np.where(erro, 0.0, numero_marcas), classificar.pontuar_diversificacao)
+
+    # Cada pontuação vai de 0 a 10, então as cinco formam um código único em base 11
+    codigos = (((pontos_faturamento * 11 + pontos_frequencia) * 11 + pontos_pontualidade) * 11 + pontos_volume) * 11 + pontos_diversificacao
+    distintos, posicoes = np.unique(codigos, return_inverse=True)
+    pontuacoes = []
+    categorias = []
+    for codigo in distintos.tolist():
+        codigo, diversificacao = divmod(codigo, 11)
+        codigo, volume = divmod(codigo, 11)
+        codigo, pontualidade = divmod(codigo, 11)
+        faturamento, frequencia = divmod(codigo, 11)
+        pontuacao = classificar.combinar_pontuacoes(faturamento, frequencia, pontualidade, volume, diversificacao)
+        pontuacoes.append(pontuacao)
+        categorias.append(classificar.definir_categoria(pontuacao))
+
+    posicoes = posicoes.reshape(codigos.shape)
+    pontuacao_final = np.array(pontuacoes, dtype=float)[posicoes]
+    categoria = np.array(categorias, dtype=object)[posicoes]
+
+    # Clientes com valores inválidos recebem a classificação padrão de classificar_cliente
+    pontuacao_final[erro] = 0.0
+    categoria[erro] = classificar.CATEGORIA_BRONZE
+
+    return {
+        "pontos_faturamento": pontos_faturamento,
+        "pontos_frequencia": pontos_frequencia,
+        "pontos_pontualidade": pontos_pontualidade,
+        "pontos_volume": pontos_volume,
+        "pontos_diversificacao": pontos_diversificacao,
+        "pontuacao_final": pontuacao_final,
+        "categoria": categoria,
+        "erro": erro
+    }
+
+def numero_ou_nan(valor):
+    """Converte um valor numérico para float; qualquer outro valor vira NaN."""
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    return float("nan")
+
+def extrair_colunas(resultados):
+    """
+    Monta as colunas de entrada de classificar_lote a partir dos resultados dos clientes.
+
+    Os valores são extraídos com classificar.extrair_valores_classificacao, as mesmas regras
+    de classificar_cliente; valores não numéricos viram NaN.
+
+    Args:
+        resultados: Iterável de dicionários de resultados (ex: persistencia.ler_resultados)
+
+    Returns:
+        Dicionário {nome da coluna: array}, com as chaves de COLUNAS
+    """
+    exigir_numpy("a classificação em lote")
+
+    colunas = {nome: [] for nome in COLUNAS}
+    for cliente in resultados:
+        try:
+            valores = classificar.extrair_valores_classificacao(cliente)
+        except Exception:
+            valores = (None,) * len(COLUNAS)
+        for nome, valor in zip(COLUNAS, valores):
+            colunas[nome].append(numero_ou_nan(valor))
+
+    return {nome: np.array(valores, dtype=float) for nome, valores in colunas.items()}
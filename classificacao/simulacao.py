@@ -0,0 +1,334 @@
+"""
+Simulação de mudanças nos pesos e nos limites das categorias sobre resultados já gerados.
+
+Os resultados são carregados uma única vez em colunas e pontuados por critério com
+classificar_lote. Como as pontuações por critério não dependem dos pesos nem dos limites das
+categorias, os clientes são agrupados pelas combinações distintas de pontuações (no máximo
+alguns milhares) e cada configuração candidata é avaliada sobre essas combinações, de forma
+vetorizada. Para cada candidata, é gerada a matriz de transição entre a categoria atual
+(configuração do .env) e a categoria simulada.
+
+Uso:
+    python -m classificacao.simulacao --grade PESO_FATURAMENTO=0.30:0.50:0.05 --grade LIMITE_OURO=7,7.5,8
+    python -m classificacao.simulacao --candidatos candidatos.json --arquivo resultados/resultado_completo_20250601_101500.ndjson
+"""
+import os
+import json
+import time
+import argparse
+import itertools
+from datetime import datetime
+
+# O NumPy é necessário apenas para a classificação em lote e a simulação
+from dependencias import np, exigir_numpy
+
+from persistencia import ler_resultados, listar_arquivos_resultados
+
+from . import classificar
+from .lote import COLUNAS, extrair_colunas, classificar_lote
+
+# Pesos, na ordem das colunas de pontuação de classificar_lote
+PARAMETROS_PESOS = (
+    "PESO_FATURAMENTO",
+    "PESO_FREQUENCIA",
+    "PESO_PONTUALIDADE",
+    "PESO_VOLUME_PECAS",
+    "PESO_DIVERSIFICACAO"
+)
+
+# Limites das categorias, da mais alta para a mais baixa (abaixo de LIMITE_PRATA é Bronze)
+PARAMETROS_LIMITES = ("LIMITE_DIAMANTE", "LIMITE_OURO", "LIMITE_PRATA")
+
+PARAMETROS = PARAMETROS_PESOS + PARAMETROS_LIMITES
+
+# Candidatas avaliadas de uma vez em simular
+CANDIDATOS_POR_BLOCO = 128
+
+COLUNAS_PONTOS = (
+    "pontos_faturamento",
+    "pontos_frequencia",
+    "pontos_pontualidade",
+    "pontos_volume",
+    "pontos_diversificacao"
+)
+
+def obter_categorias():
+    """Categorias na ordem das linhas e colunas das matrizes de transição."""
+    return [
+        classificar.CATEGORIA_DIAMANTE,
+        classificar.CATEGORIA_OURO,
+        classificar.CATEGORIA_PRATA,
+        classificar.CATEGORIA_BRONZE
+    ]
+
+def configuracao_atual():
+    """Retorna os pesos e limites atuais de classificar.py (valores do .env)."""
+    return {nome: getattr(classificar, nome) for nome in PARAMETROS}
+
+def interpretar_valores(texto):
+    """
+    Interpreta os valores de um parâmetro da grade.
+
+    Args:
+        texto: Lista separada por vírgulas ("7,7.5,8") ou intervalo inicio:fim:passo ("0.30:0.50:0.05"),
+            com o fim incluído
+
+    Returns:
+        Lista de valores
+    """
+    if ":" in texto:
+        inicio, fim, passo = (float(parte) for parte in texto.split(":"))
+        if passo <= 0:
+            raise ValueError(f"Passo inválido: {texto}")
+        quantidade = int(round((fim - inicio) / passo)) + 1
+        return [round(inicio + indice * passo, 10) for indice in range(quantidade)]
+    return [float(valor) for valor in texto.split(",") if valor.strip()]
+
+def montar_grade(valores_por_parametro):
+    """
+    Monta as configurações candidatas pelo produto cartesiano dos valores informados.
+
+    Args:
+        valores_por_parametro: Dicionário {parâmetro: lista de valores}; os parâmetros não
+            informados mantêm o valor atual
+
+    Returns:
+        Lista de dicionários com todos os parâmetros de cada candidata
+    """
+    desconhecidos = set(valores_por_parametro) - set(PARAMETROS)
+    if desconhecidos:
+        raise ValueError(f"Parâmetros desconhecidos: {', '.join(sorted(desconhecidos))}")
+
+    atual = configuracao_atual()
+    nomes = list(valores_por_parametro)
+    candidatos = []
+    for valores in itertools.product(*(valores_por_parametro[nome] for nome in nomes)):
+        candidato = dict(atual)
+        candidato.update(zip(nomes, valores))
+        candidatos.append(candidato)
+    return candidatos
+
+def carregar_base(resultados):
+    """
+    Carrega os resultados em colunas e agrupa os clientes por combinação de pontuações.
+
+    Args:
+        resultados: Iterável de dicionários de resultados (lido uma única vez)
+
+    Returns:
+        Dicionário com as combinações distintas de pontuações, a categoria atual e a quantidade
+        de clientes de cada grupo, o total de clientes e os clientes com erro na classificação
+    """
+    exigir_numpy("a simulação de pesos e limites")
+
+    colunas = extrair_colunas(resultados)
+    lote = classificar_lote(**{nome: colunas[nome] for nome in COLUNAS})
+
+    categorias = obter_categorias()
+    categoria_atual = np.array([categorias.index(categoria) for categoria in lote["categoria"].tolist()], dtype=np.int64)
+
+    # Clientes com erro ficam em Bronze em qualquer configuração, como em classificar_cliente
+    validos = ~lote["erro"]
+    pontos = np.column_stack([lote[nome][validos] for nome in COLUNAS_PONTOS]).astype(np.int64)
+    chaves = np.column_stack([pontos, categoria_atual[validos]])
+    grupos, quantidades = np.unique(chaves, axis=0, return_counts=True)
+
+    return {
+        "combinacoes": grupos[:, :len(COLUNAS_PONTOS)].astype(float),
+        "categoria_atual": grupos[:, len(COLUNAS_PONTOS)],
+        "quantidades": quantidades,
+        "total_clientes": int(len(categoria_atual)),
+        "clientes_com_erro": int(lote["erro"].sum()),
+        "distribuicao_atual": np.bincount(categoria_atual, minlength=len(categorias))
+    }
+
+def arredondar_como_python(valores, casas=2):
+    """
+    Arredonda como o round() do Python, usado em combinar_pontuacoes.
+
+    np.round multiplica por 10**casas antes de arredondar, o que pode divergir do round() nos
+    valores muito próximos de uma metade; apenas esses valores são recalculados com round().
+
+    Args:
+        valores: Array de floats
+        casas: Casas decimais
+
+    Returns:
+        Array arredondado
+    """
+    escala = 10 ** casas
+    arredondados = np.round(valores, casas)
+    fracao = np.abs(np.abs(valores * escala) % 1 - 0.5)
+    duvidosos = np.nonzero(fracao < 1e-6)
+    if duvidosos[0].size:
+        arredondados[duvidosos] = [round(valor, casas) for valor in valores[duvidosos].tolist()]
+    return arredondados
+
+def simular_bloco(base, pesos, limites):
+    """
+    Calcula as matrizes de transição de um bloco de candidatas.
+
+    Args:
+        base: Dicionário retornado por carregar_base
+        pesos: Array (candidatas x 5) com os pesos, na ordem de PARAMETROS_PESOS
+        limites: Array (candidatas x 3) com os limites, na ordem de PARAMETROS_LIMITES
+
+    Returns:
+        Array (candidatas x 4 x 4) com as matrizes de transição
+    """
+    num_categorias = len(obter_categorias())
+    num_candidatos = len(pesos)
+
+    # Soma ponderada na mesma ordem de combinar_pontuacoes: (combinações x candidatas)
+    combinacoes = base["combinacoes"]
+    pontuacoes = combinacoes[:, [0]] * pesos[:, 0]
+    for indice in range(1, len(PARAMETROS_PESOS)):
+        pontuacoes += combinacoes[:, [indice]] * pesos[:, indice]
+    pontuacoes = arredondar_como_python(pontuacoes)
+
+    # Escada de definir_categoria: Diamante, Ouro, Prata e, abaixo disso, Bronze
+    categoria_simulada = np.full(pontuacoes.shape, num_categorias - 1, dtype=np.int64)
+    for indice in reversed(range(len(PARAMETROS_LIMITES))):
+        categoria_simulada[pontuacoes >= limites[:, indice]] = indice
+
+    # Uma única contagem para o bloco: cada candidata ocupa um trecho de 16 posições
+    celulas = categoria_simulada
+    celulas += base["categoria_atual"][:, None] * num_categorias
+    celulas += np.arange(num_candidatos) * num_categorias * num_categorias
+    pesos_contagem = np.broadcast_to(base["quantidades"][:, None], celulas.shape)
+    return np.bincount(
+        celulas.ravel(),
+        weights=pesos_contagem.ravel(),
+        minlength=num_candidatos * num_categorias * num_categorias
+    ).reshape(num_candidatos, num_categorias, num_categorias).astype(np.int64)
+
+def simular(base, candidatos, candidatos_por_bloco=CANDIDATOS_POR_BLOCO):
+    """
+    Calcula a matriz de transição de categorias de cada configuração candidata.
+
+    Args:
+        base: Dicionário retornado por carregar_base
+        candidatos: Lista de dicionários com os parâmetros de cada candidata (ver montar_grade)
+        candidatos_por_bloco: Candidatas avaliadas de uma vez (limita a memória intermediária)
+
+    Returns:
+        Array (candidatas x 4 x 4) com a quantidade de clientes que vão da categoria atual
+        (linha) para a categoria simulada (coluna), na ordem de obter_categorias()
+    """
+    exigir_numpy("a simulação de pesos e limites")
+
+    num_categorias = len(obter_categorias())
+    pesos = np.array([[candidato[nome] for nome in PARAMETROS_PESOS] for candidato in candidatos], dtype=float)
+    limites = np.array([[candidato[nome] for nome in PARAMETROS_LIMITES] for candidato in candidatos], dtype=float)
+
+    matrizes = np.zeros((len(candidatos), num_categorias, num_categorias), dtype=np.int64)
+    for inicio in range(0, len(candidatos), candidatos_por_bloco):
+        fim = inicio + candidatos_por_bloco
+        matrizes[inicio:fim] = simular_bloco(base, pesos[inicio:fim], limites[inicio:fim])
+
+    # Clientes com erro permanecem em Bronze
+    matrizes[:, num_categorias - 1, num_categorias - 1] += base["clientes_com_erro"]
+    return matrizes
+
+def resumir(candidatos, matrizes):
+    """
+    Resume cada candidata: parâmetros, clientes que mudam de categoria e a nova distribuição.
+
+    Args:
+        candidatos: Lista de candidatas
+        matrizes: Matrizes de transição retornadas por simular
+
+    Returns:
+        Lista de dicionários, na ordem das candidatas
+    """
+    categorias = obter_categorias()
+    resumos = []
+    for candidato, matriz in zip(candidatos, matrizes):
+        resumos.append({
+            "parametros": candidato,
+            "mudam_de_categoria": int(matriz.sum() - np.trace(matriz)),
+            # Índices menores são categorias mais altas
+            "sobem": int(np.tril(matriz, -1).sum()),
+            "descem": int(np.triu(matriz, 1).sum()),
+            "distribuicao": dict(zip(categorias, matriz.sum(axis=0).tolist())),
+            "matriz_transicao": matriz.tolist()
+        })
+    return resumos
+
+def exibir_resumos(resumos, base, limite_exibicao=20):
+    """Exibe as candidatas em forma de tabela, com os parâmetros que variam na grade."""
+    categorias = obter_categorias()
+    variaveis = [
+        nome for nome in PARAMETROS
+        if len({resumo["parametros"][nome] for resumo in resumos}) > 1
+    ]
+
+    print(f"\nClientes: {base['total_clientes']} ({base['clientes_com_erro']} com erro na classificação)")
+    print("Distribuição atual: " + ", ".join(
+        f"{categoria}: {quantidade}" for categoria, quantidade in zip(categorias, base["distribuicao_atual"].tolist())
+    ))
+
+    cabecalho = "".join(f"{nome:>22}" for nome in variaveis)
+    cabecalho += f"{'Mudam':>9}{'Sobem':>9}{'Descem':>9}" + "".join(f"{categoria:>10}" for categoria in categorias)
+    print(f"\n{cabecalho}")
+    for resumo in resumos[:limite_exibicao]:
+        linha = "".join(f"{resumo['parametros'][nome]:>22.4g}" for nome in variaveis)
+        linha += f"{resumo['mudam_de_categoria']:>9}{resumo['sobem']:>9}{resumo['descem']:>9}"
+        linha += "".join(f"{resumo['distribuicao'][categoria]:>10}" for categoria in categorias)
+        print(linha)
+    if len(resumos) > limite_exibicao:
+        print(f"... e mais {len(resumos) - limite_exibicao} candidatas (ver o arquivo JSON)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simular mudanças de pesos e limites das categorias sobre os resultados")
+    parser.add_argument("--arquivo", help="Arquivo de resultados (padrão: o resultado completo mais recente em resultados/)")
+    parser.add_argument("--grade", action="append", default=[], metavar="PARAMETRO=VALORES",
+                        help="Valores de um parâmetro (ex: PESO_FATURAMENTO=0.3,0.4 ou LIMITE_OURO=7:8:0.25); pode ser repetido")
+    parser.add_argument("--candidatos", help="Arquivo JSON com uma lista de candidatas ({parâmetro: valor})")
+    parser.add_argument("--exibir", type=int, default=20, help="Quantidade de candidatas exibidas no console")
+    parser.add_argument("--saida", help="Arquivo JSON com as matrizes de transição (padrão: resultados/simulacao_<data>.json)")
+    args = parser.parse_args()
+
+    candidatos = []
+    if args.grade:
+        valores_por_parametro = {}
+        for item in args.grade:
+            nome, _, valores = item.partition("=")
+            valores_por_parametro[nome.strip()] = interpretar_valores(valores)
+        candidatos.extend(montar_grade(valores_por_parametro))
+    if args.candidatos:
+        with open(args.candidatos, "r", encoding="utf-8") as f:
+            for candidato in json.load(f):
+                candidatos.extend(montar_grade({nome: [valor] for nome, valor in candidato.items()}))
+    if not candidatos:
+        parser.error("informe --grade e/ou --candidatos")
+
+    arquivo = args.arquivo
+    if arquivo is None:
+        arquivos = listar_arquivos_resultados("resultados", prefixo="resultado_completo_")
+        if not arquivos:
+            parser.error("nenhum resultado completo encontrado em resultados/; informe --arquivo")
+        arquivo = arquivos[-1]
+
+    print(f"Carregando os resultados de {arquivo}...")
+    inicio = time.perf_counter()
+    base = carregar_base(ler_resultados(arquivo))
+    print(f"{base['total_clientes']} clientes em {len(base['quantidades'])} combinações de pontuações ({time.perf_counter() - inicio:.2f} s)")
+
+    inicio = time.perf_counter()
+    matrizes = simular(base, candidatos)
+    print(f"{len(candidatos)} candidatas simuladas em {time.perf_counter() - inicio:.2f} s")
+
+    resumos = resumir(candidatos, matrizes)
+    exibir_resumos(resumos, base, limite_exibicao=args.exibir)
+
+    saida = args.saida or os.path.join("resultados", f"simulacao_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump({
+            "arquivo": arquivo,
+            "categorias": obter_categorias(),
+            "configuracao_atual": configuracao_atual(),
+            "distribuicao_atual": base["distribuicao_atual"].tolist(),
+            "candidatas": resumos
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\nMatrizes de transição salvas em '{saida}'")
@@ -0,0 +1,239 @@
+"""
+Sistema de Extração de Dados do ERP - Conexão com o MongoDB
+Este módulo mantém um único MongoClient por processo, com o pool de conexões configurado pelo .env,
+compartilhado pelo processamento em lotes, pelo processamento paralelo e pelo envio dos resultados.
+Um listener de eventos do pool (CMAP) acompanha as conexões criadas, os checkouts e as esperas.
+"""
+import os
+import time
+import threading
+from dotenv import load_dotenv
+from pymongo import MongoClient, monitoring
+
+from instrumentacao import INSTRUMENTAR_CONSULTAS, obter_monitor
+
+# Carrega as variáveis de ambiente
+load_dotenv()
+
+# Configuração da conexão com o MongoDB
+MONGODB_URI = os.getenv("MONGODB_URI")
+MONGODB_DATABASE = os.getenv("MONGODB_DATABASE")
+
+# Tamanho do pool de conexões (por servidor)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+
+# Timeouts em milissegundos (0 no socket = sem limite)
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "30000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0"))
+
+# Compressão do protocolo, em ordem de preferência (ex: "zstd,snappy,zlib"); vazio desativa
+MONGO_COMPRESSORES = os.getenv("MONGO_COMPRESSORES", "")
+
+# Repete uma vez as leituras que falharem por erro de rede ou troca de primário
+MONGO_RETRY_READS = os.getenv("MONGO_RETRY_READS", "true").lower() == "true"
+
+# Checkouts mais demorados que este limite (em segundos) são contados como espera por conexão
+LIMITE_ESPERA_CHECKOUT = 0.001
+
+# Cliente do processo atual (recriado no processo filho após um fork)
+cliente_processo = None
+estatisticas_processo = None
+pid_cliente = None
+cliente_lock = threading.Lock()
+
+class EstatisticasPool(monitoring.ConnectionPoolListener):
+    """
+    Listener de eventos do pool de conexões (CMAP) que acumula as estatísticas do pool.
+
+    O checkout acontece na thread que fez a operação, então o início de cada checkout é
+    guardado por thread para medir o tempo de espera por uma conexão.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inicio_checkout = threading.local()
+        self.conexoes_criadas = 0
+        self.conexoes_fechadas = 0
+        self.checkouts = 0
+        self.falhas_checkout = 0
+        self.esperas = 0
+        self.tempo_espera_total = 0.0
+        self.tempo_espera_maximo = 0.0
+        self.em_uso = 0
+        self.pico_em_uso = 0
+        self.pools_limpos = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pools_limpos += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.conexoes_criadas += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.conexoes_fechadas += 1
+
+    def connection_check_out_started(self, event):
+        self._inicio_checkout.valor = time.perf_counter()
+
+    def _tempo_checkout(self):
+        inicio = getattr(self._inicio_checkout, "valor", None)
+        self._inicio_checkout.valor = None
+        return time.perf_counter() - inicio if inicio is not None else 0.0
+
+    def connection_check_out_failed(self, event):
+        espera = self._tempo_checkout()
+        with self._lock:
+            self.falhas_checkout += 1
+            self.tempo_espera_total += espera
+
+    def connection_checked_out(self, event):
+        espera = self._tempo_checkout()
+        with self._lock:
+            self.checkouts += 1
+            self.em_uso += 1
+            self.pico_em_uso = max(self.pico_em_uso, self.em_uso)
+            self.tempo_espera_total += espera
+            self.tempo_espera_maximo = max(self.tempo_espera_maximo, espera)
+            if espera > LIMITE_ESPERA_CHECKOUT:
+                self.esperas += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.em_uso = max(0, self.em_uso - 1)
+
+    def resumo(self):
+        """
+        Retorna as estatísticas acumuladas do pool.
+
+        Returns:
+            Dicionário com as contagens de conexões e checkouts e os tempos de espera (em segundos)
+        """
+        with self._lock:
+            return {
+                "conexoes_criadas": self.conexoes_criadas,
+                "conexoes_fechadas": self.conexoes_fechadas,
+                "checkouts": self.checkouts,
+                "falhas_checkout": self.falhas_checkout,
+                "esperas": self.esperas,
+                "tempo_espera_total": self.tempo_espera_total,
+                "tempo_espera_medio": self.tempo_espera_total / self.checkouts if self.checkouts else 0.0,
+                "tempo_espera_maximo": self.tempo_espera_maximo,
+                "em_uso": self.em_uso,
+                "pico_em_uso": self.pico_em_uso,
+                "pools_limpos": self.pools_limpos
+            }
+
+def opcoes_cliente(**substituicoes):
+    """
+    Monta as opções de conexão configuradas no .env.
+
+    As mesmas opções são aceitas pelo MongoClient e pelo AsyncIOMotorClient.
+
+    Args:
+        **substituicoes: Opções que substituem as configuradas (ex: maxPoolSize=50)
+
+    Returns:
+        Dicionário de opções para o cliente
+    """
+    opcoes = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS or None,
+        "retryReads": MONGO_RETRY_READS
+    }
+
+    compressores = [nome.strip() for nome in MONGO_COMPRESSORES.split(",") if nome.strip()]
+    if compressores:
+        opcoes["compressors"] = ",".join(compressores)
+
+    opcoes.update(substituicoes)
+    return opcoes
+
+def obter_cliente():
+    """
+    Retorna o MongoClient do processo, criando-o na primeira chamada.
+
+    O MongoClient é seguro para uso por várias threads, então todas compartilham o mesmo pool.
+    Um cliente herdado por fork não pode ser usado no processo filho; nesse caso um novo
+    cliente é criado.
+
+    Returns:
+        MongoClient compartilhado
+    """
+    global cliente_processo, estatisticas_processo, pid_cliente
+    with cliente_lock:
+        if cliente_processo is None or pid_cliente != os.getpid():
+            estatisticas_processo = EstatisticasPool()
+            listeners = [estatisticas_processo]
+            if INSTRUMENTAR_CONSULTAS:
+                listeners.append(obter_monitor())
+            cliente_processo = MongoClient(
+                MONGODB_URI,
+                event_listeners=listeners,
+                **opcoes_cliente()
+            )
+            pid_cliente = os.getpid()
+        return cliente_processo
+
+def obter_banco(nome_banco=None):
+    """
+    Retorna o banco de dados configurado usando o cliente compartilhado.
+
+    Args:
+        nome_banco: Nome do banco (padrão: MONGODB_DATABASE)
+
+    Returns:
+        Banco de dados do pymongo
+    """
+    return obter_cliente()[nome_banco or MONGODB_DATABASE]
+
+def fechar_cliente():
+    """Fecha o cliente do processo, se houver, liberando as conexões do pool."""
+    global cliente_processo, pid_cliente
+    with cliente_lock:
+        if cliente_processo is not None and pid_cliente == os.getpid():
+            cliente_processo.close()
+        cliente_processo = None
+        pid_cliente = None
+
+def estatisticas_pool():
+    """
+    Retorna as estatísticas do pool do cliente do processo.
+
+    Returns:
+        Dicionário de EstatisticasPool.resumo(), ou None se o cliente ainda não foi criado
+    """
+    if estatisticas_processo is None or pid_cliente != os.getpid():
+        return None
+    return estatisticas_processo.resumo()
+
+def exibir_estatisticas_pool():
+    """Exibe as estatísticas do pool de conexões do processo atual."""
+    estatisticas = estatisticas_pool()
+    if estatisticas is None:
+        return
+
+    print(
+        f"Pool de conexões: {estatisticas['conexoes_criadas']} conexões criadas "
+        f"(pico de {estatisticas['pico_em_uso']} em uso, máximo {MONGO_MAX_POOL_SIZE}), "
+        f"{estatisticas['checkouts']} checkouts, {estatisticas['esperas']} esperas "
+        f"(média {estatisticas['tempo_espera_medio'] * 1000:.2f} ms, máxima {estatisticas['tempo_espera_maximo'] * 1000:.2f} ms), "
+        f"{estatisticas['falhas_checkout']} falhas"
+    )
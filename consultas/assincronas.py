@@ -0,0 +1,143 @@
+"""
+Versões assíncronas (Motor) das consultas por cliente.
+
+Usam os mesmos filtros e as mesmas funções de cálculo das consultas síncronas; muda apenas
+a ida ao banco. Cada operação passa por um semáforo que limita o número de consultas em
+andamento, de modo que muitos clientes podem ser processados ao mesmo tempo sem esgotar
+o pool de conexões.
+"""
+import asyncio
+
+from .base import EVENTOS_VENDA
+from .faturamento import filtros_faturamento, calcular_faturamento
+from .ciclos_compra import filtros_ciclos_compra, extrair_meses_compra, montar_ciclos_compra
+from .pecas_compradas import filtros_pecas, calcular_total_pecas
+from .titulos_pagos import filtro_titulos, calcular_titulos_pagos, resultado_titulos_vazio
+from .valor_por_marca import filtros_valor_por_marca, calcular_valor_por_marca
+from .data_primeira_compra import filtro_primeira_compra, calcular_data_primeira_compra
+
+async def listar(semaforo, cursor):
+    """
+    Lê todos os documentos de um cursor do Motor respeitando o limite de consultas simultâneas.
+
+    Args:
+        semaforo: asyncio.Semaphore que limita as consultas em andamento
+        cursor: Cursor do Motor (ainda não executado)
+
+    Returns:
+        Lista de documentos
+    """
+    async with semaforo:
+        return await cursor.to_list(length=None)
+
+async def verificar_cliente_tem_movimentacao_async(db, cod_cliente, semaforo):
+    """
+    Verifica se um cliente tem movimentações de venda.
+
+    Args:
+        db: Banco de dados do Motor
+        cod_cliente: Código do cliente
+        semaforo: asyncio.Semaphore que limita as consultas em andamento
+
+    Returns:
+        True se o cliente tem movimentações de venda, False caso contrário
+    """
+    filtro_venda = {
+        "codigo_cliente_fornecedor": cod_cliente,
+        "evento": {"$in": EVENTOS_VENDA}
+    }
+
+    # Basta encontrar um documento; não é preciso contar todos
+    async with semaforo:
+        documento = await db.movimentacao.find_one(filtro_venda, {"_id": 1})
+
+    return documento is not None
+
+async def obter_data_primeira_compra_async(db, cod_cliente, semaforo):
+    """Versão assíncrona de obter_data_primeira_compra para um cliente."""
+    try:
+        filtro_venda_cliente = filtro_primeira_compra(cod_cliente)
+        primeira_compra = await listar(semaforo, db.movimentacao.find(filtro_venda_cliente).sort("data", 1).limit(1))
+
+        # A última compra só é consultada se houver compras
+        if not primeira_compra:
+            return None
+
+        ultima_compra = await listar(semaforo, db.movimentacao.find(filtro_venda_cliente).sort("data", -1).limit(1))
+        return calcular_data_primeira_compra(cod_cliente, primeira_compra, ultima_compra)
+    except Exception as e:
+        print(f"Erro ao obter data da primeira compra: {e}")
+        return None
+
+async def obter_faturamento_ultimos_12_meses_async(db, cod_cliente, semaforo):
+    """Versão assíncrona de obter_faturamento_ultimos_12_meses para um cliente."""
+    try:
+        filtro_venda_cliente, filtro_devolucao_cliente = filtros_faturamento(cod_cliente)
+        vendas = await listar(semaforo, db.movimentacao.find(filtro_venda_cliente))
+
+        # As devoluções só são consultadas se houver vendas
+        if sum(venda.get("valor_final", 0) for venda in vendas) == 0:
+            return None
+
+        devolucoes = await listar(semaforo, db.movimentacao.find(filtro_devolucao_cliente))
+        return calcular_faturamento(cod_cliente, vendas, devolucoes)
+    except Exception as e:
+        print(f"Erro ao calcular faturamento: {e}")
+        return None
+
+async def obter_ciclos_compra_ultimos_6_meses_async(db, cod_cliente, semaforo):
+    """Versão assíncrona de obter_ciclos_compra_ultimos_6_meses para um cliente."""
+    try:
+        filtro_6_meses, filtro_ciclo_atual = filtros_ciclos_compra(cod_cliente)
+
+        # As duas consultas são independentes e rodam ao mesmo tempo
+        vendas_6_meses, venda_ciclo_atual = await asyncio.gather(
+            listar(semaforo, db.movimentacao.find(filtro_6_meses)),
+            listar(semaforo, db.movimentacao.find(filtro_ciclo_atual, {"_id": 1}).limit(1))
+        )
+
+        return montar_ciclos_compra(cod_cliente, extrair_meses_compra(vendas_6_meses), len(venda_ciclo_atual) > 0)
+    except Exception as e:
+        print(f"Erro ao calcular ciclos de compra: {e}")
+        return None
+
+async def obter_total_pecas_compradas_async(db, cod_cliente, semaforo):
+    """Versão assíncrona de obter_total_pecas_compradas para um cliente."""
+    try:
+        filtro_venda_cliente, filtro_devolucao_cliente = filtros_pecas(cod_cliente)
+        vendas = await listar(semaforo, db.movimentacao.find(filtro_venda_cliente))
+
+        # As devoluções só são consultadas se houver compras
+        if sum(venda.get("qtde", 0) for venda in vendas) == 0:
+            return None
+
+        devolucoes = await listar(semaforo, db.movimentacao.find(filtro_devolucao_cliente))
+        return calcular_total_pecas(cod_cliente, vendas, devolucoes)
+    except Exception as e:
+        print(f"Erro ao calcular total de peças compradas: {e}")
+        return None
+
+async def obter_titulos_pagos_em_dia_async(db, cod_cliente, semaforo):
+    """Versão assíncrona de obter_titulos_pagos_em_dia para um cliente."""
+    try:
+        lancamentos = await listar(semaforo, db.lancamentos_completo.find(filtro_titulos(cod_cliente)))
+        return calcular_titulos_pagos(cod_cliente, lancamentos)
+    except Exception as e:
+        print(f"Erro ao calcular títulos pagos em dia: {e}")
+        return resultado_titulos_vazio(cod_cliente)
+
+async def obter_valor_por_marca_async(db, cod_cliente, semaforo):
+    """Versão assíncrona de obter_valor_por_marca para um cliente."""
+    try:
+        filtro_venda_cliente, filtro_devolucao_cliente = filtros_valor_por_marca(cod_cliente)
+        vendas = await listar(semaforo, db.movimentacao.find(filtro_venda_cliente))
+
+        # As devoluções só são consultadas se houver compras
+        devolucoes = []
+        if vendas:
+            devolucoes = await listar(semaforo, db.movimentacao.find(filtro_devolucao_cliente))
+
+        return calcular_valor_por_marca(cod_cliente, vendas, devolucoes)
+    except Exception as e:
+        print(f"Erro ao calcular valor por marca: {e}")
+        return None
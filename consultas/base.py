@@ -94,3 +94,40 @@ def obter_clientes_com_movimentacao(db):
     
     clientes_com_movimentacao = list(db.movimentacao.aggregate(pipeline))
     return set(doc.get("codigo_cliente_fornecedor") for doc in clientes_com_movimentacao if doc.get("codigo_cliente_fornecedor"))
+
+def obter_contagem_movimentacao_por_cliente(db, codigos_clientes=None):
+    """
+    Obtém o número de movimentações de venda de cada cliente.
+    
+    A contagem é usada como estimativa do custo de processamento de clientes
+    que ainda não têm histórico de execução.
+    
+    Args:
+        db: Conexão com o banco de dados
+        codigos_clientes: Códigos dos clientes a contar (opcional). Sem eles, conta todos os
+            clientes da collection geradores_cod_cliente
+        
+    Returns:
+        Dicionário {código do cliente: número de movimentações de venda}
+    """
+    filtro = {"evento": {"$in": EVENTOS_VENDA}}
+    
+    if codigos_clientes is not None:
+        if not codigos_clientes:
+            return {}
+        filtro["codigo_cliente_fornecedor"] = {"$in": list(codigos_clientes)}
+    else:
+        try:
+            # Restringe aos clientes da collection geradores_cod_cliente, como em obter_clientes_com_movimentacao
+            documento = db.geradores_cod_cliente.find_one({})
+            if documento and "codigo_cliente_fornecedor" in documento:
+                filtro["codigo_cliente_fornecedor"] = {"$in": documento["codigo_cliente_fornecedor"]}
+        except Exception as e:
+            print(f"Erro ao obter lista de códigos de clientes: {e}")
+    
+    pipeline = [
+        {"$match": filtro},
+        {"$group": {"_id": "$codigo_cliente_fornecedor", "total": {"$sum": 1}}}
+    ]
+    
+    return {doc["_id"]: doc["total"] for doc in db.movimentacao.aggregate(pipeline) if doc.get("_id")}
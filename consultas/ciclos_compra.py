@@ -4,6 +4,100 @@ Consulta de ciclos de compra dos clientes.
 from datetime import datetime, timedelta
 from .base import EVENTOS_VENDA
 
+def filtros_ciclos_compra(cod_cliente=None, data_referencia=None):
+    """
+    Monta os filtros de vendas dos últimos 6 meses (excluindo o mês atual) e do mês atual.
+    
+    Args:
+        cod_cliente: Código do cliente (opcional; sem ele, os filtros valem para todos os clientes)
+        data_referencia: Data usada como "hoje" (padrão: agora)
+        
+    Returns:
+        Tupla (filtro_6_meses, filtro_ciclo_atual)
+    """
+    # Calcula os limites dos últimos 6 meses (excluindo o mês atual)
+    data_atual = data_referencia or datetime.now()
+    
+    # Primeiro dia do mês atual
+    primeiro_dia_mes_atual = datetime(data_atual.year, data_atual.month, 1)
+    
+    # Primeiro dia de 6 meses atrás
+    primeiro_dia_6_meses_atras = primeiro_dia_mes_atual - timedelta(days=180)
+    
+    # Converte para timestamp
+    timestamp_6_meses_atras = int(primeiro_dia_6_meses_atras.timestamp())
+    timestamp_mes_atual = int(primeiro_dia_mes_atual.timestamp())
+    
+    # Filtro para os últimos 6 meses (excluindo o mês atual)
+    filtro_6_meses = {
+        "evento": {"$in": EVENTOS_VENDA},
+        "tipo_operacao": "S",
+        "cancelada": False,
+        "data": {"$gte": timestamp_6_meses_atras, "$lt": timestamp_mes_atual}
+    }
+    
+    # Filtro para o mês atual
+    filtro_ciclo_atual = {
+        "evento": {"$in": EVENTOS_VENDA},
+        "tipo_operacao": "S",
+        "cancelada": False,
+        "data": {"$gte": timestamp_mes_atual}
+    }
+    
+    if cod_cliente:
+        filtro_6_meses["codigo_cliente_fornecedor"] = cod_cliente
+        filtro_ciclo_atual["codigo_cliente_fornecedor"] = cod_cliente
+    
+    return filtro_6_meses, filtro_ciclo_atual
+
+def extrair_meses_compra(vendas):
+    """
+    Extrai os meses distintos (AAAA-MM) em que houve vendas.
+    
+    Args:
+        vendas: Iterável com as vendas do cliente
+        
+    Returns:
+        Lista ordenada de meses no formato AAAA-MM
+    """
+    # Conjunto para armazenar os meses distintos
+    meses_compra = set()
+    
+    # Para cada venda, extrai o mês e adiciona ao conjunto
+    for venda in vendas:
+        try:
+            # Converte o timestamp para datetime
+            data_venda = datetime.fromtimestamp(venda.get("data"))
+            
+            # Extrai o ano e mês
+            ano_mes = f"{data_venda.year}-{data_venda.month:02d}"
+            
+            # Adiciona ao conjunto
+            meses_compra.add(ano_mes)
+        except Exception:
+            pass
+    
+    return sorted(list(meses_compra))
+
+def montar_ciclos_compra(cod_cliente, meses_compra_6_meses, comprou_ciclo_atual):
+    """
+    Monta o resultado da consulta de ciclos de compra.
+    
+    Args:
+        cod_cliente: Código do cliente
+        meses_compra_6_meses: Lista de meses com compra (extrair_meses_compra)
+        comprou_ciclo_atual: Se o cliente comprou no mês atual
+        
+    Returns:
+        Dicionário com os ciclos de compra do cliente
+    """
+    return {
+        "codigo_cliente": cod_cliente,
+        "num_ciclos_6_meses": len(meses_compra_6_meses),
+        "meses_compra_6_meses": meses_compra_6_meses,
+        "comprou_ciclo_atual": comprou_ciclo_atual
+    }
+
 def obter_ciclos_compra_ultimos_6_meses(db, cliente_id=None, cod_cliente=None):
     """
     Calcula o número de ciclos (meses) em que o cliente comprou nos últimos 6 meses.
@@ -17,35 +111,6 @@ def obter_ciclos_compra_ultimos_6_meses(db, cliente_id=None, cod_cliente=None):
         Número de ciclos de compra ou lista de ciclos se cliente_id/cod_cliente não for fornecido
     """
     try:
-        # Calcula os limites dos últimos 6 meses (excluindo o mês atual)
-        data_atual = datetime.now()
-        
-        # Primeiro dia do mês atual
-        primeiro_dia_mes_atual = datetime(data_atual.year, data_atual.month, 1)
-        
-        # Primeiro dia de 6 meses atrás
-        primeiro_dia_6_meses_atras = primeiro_dia_mes_atual - timedelta(days=180)
-        
-        # Converte para timestamp
-        timestamp_6_meses_atras = int(primeiro_dia_6_meses_atras.timestamp())
-        timestamp_mes_atual = int(primeiro_dia_mes_atual.timestamp())
-        
-        # Filtro base para os últimos 6 meses (excluindo o mês atual)
-        filtro_base_6_meses = {
-            "evento": {"$in": EVENTOS_VENDA},
-            "tipo_operacao": "S",
-            "cancelada": False,
-            "data": {"$gte": timestamp_6_meses_atras, "$lt": timestamp_mes_atual}
-        }
-        
-        # Filtro base para o mês atual
-        filtro_base_ciclo_atual = {
-            "evento": {"$in": EVENTOS_VENDA},
-            "tipo_operacao": "S",
-            "cancelada": False,
-            "data": {"$gte": timestamp_mes_atual}
-        }
-        
         # Se cliente_id for fornecido, busca apenas esse cliente
         if cliente_id:
             cliente = db.geradores.find_one({"_id": cliente_id})
@@ -56,45 +121,15 @@ def obter_ciclos_compra_ultimos_6_meses(db, cliente_id=None, cod_cliente=None):
         
         # Se cod_cliente for fornecido, calcula apenas para esse cliente
         if cod_cliente:
-            # Filtro para vendas do cliente nos últimos 6 meses
-            filtro_6_meses = {**filtro_base_6_meses, "codigo_cliente_fornecedor": cod_cliente}
-            
-            # Busca todas as vendas do cliente nos últimos 6 meses
-            vendas_6_meses = db.movimentacao.find(filtro_6_meses)
-            
-            # Conjunto para armazenar os meses distintos
-            meses_compra_6_meses = set()
-            
-            # Para cada venda, extrai o mês e adiciona ao conjunto
-            for venda in vendas_6_meses:
-                try:
-                    # Converte o timestamp para datetime
-                    data_venda = datetime.fromtimestamp(venda.get("data"))
-                    
-                    # Extrai o ano e mês
-                    ano_mes = f"{data_venda.year}-{data_venda.month:02d}"
-                    
-                    # Adiciona ao conjunto
-                    meses_compra_6_meses.add(ano_mes)
-                except Exception:
-                    pass
-            
-            # Conta o número de meses distintos nos últimos 6 meses
-            num_ciclos_6_meses = len(meses_compra_6_meses)
+            filtro_6_meses, filtro_ciclo_atual = filtros_ciclos_compra(cod_cliente)
             
-            # Lista os meses para referência
-            meses_lista_6_meses = sorted(list(meses_compra_6_meses))
+            # Meses distintos com vendas nos últimos 6 meses
+            meses_lista_6_meses = extrair_meses_compra(db.movimentacao.find(filtro_6_meses))
             
             # Verifica se o cliente comprou no ciclo atual (mês atual)
-            filtro_ciclo_atual = {**filtro_base_ciclo_atual, "codigo_cliente_fornecedor": cod_cliente}
             comprou_ciclo_atual = db.movimentacao.count_documents(filtro_ciclo_atual) > 0
             
-            return {
-                "codigo_cliente": cod_cliente,
-                "num_ciclos_6_meses": num_ciclos_6_meses,
-                "meses_compra_6_meses": meses_lista_6_meses,
-                "comprou_ciclo_atual": comprou_ciclo_atual
-            }
+            return montar_ciclos_compra(cod_cliente, meses_lista_6_meses, comprou_ciclo_atual)
         
         # Se cliente_id/cod_cliente não for fornecido, calcula para todos os clientes
         # Primeiro, obtém a lista de todos os clientes
@@ -112,50 +147,26 @@ def obter_ciclos_compra_ultimos_6_meses(db, cliente_id=None, cod_cliente=None):
             if not cod_cliente:
                 continue
             
-            # Filtro para vendas do cliente nos últimos 6 meses
-            filtro_6_meses = {**filtro_base_6_meses, "codigo_cliente_fornecedor": cod_cliente}
-            
-            # Busca todas as vendas do cliente nos últimos 6 meses
-            vendas_6_meses = db.movimentacao.find(filtro_6_meses)
-            
-            # Conjunto para armazenar os meses distintos
-            meses_compra_6_meses = set()
+            filtro_6_meses, filtro_ciclo_atual = filtros_ciclos_compra(cod_cliente)
             
-            # Para cada venda, extrai o mês e adiciona ao conjunto
-            for venda in vendas_6_meses:
-                try:
-                    # Converte o timestamp para datetime
-                    data_venda = datetime.fromtimestamp(venda.get("data"))
-                    
-                    # Extrai o ano e mês
-                    ano_mes = f"{data_venda.year}-{data_venda.month:02d}"
-                    
-                    # Adiciona ao conjunto
-                    meses_compra_6_meses.add(ano_mes)
-                except Exception:
-                    pass
+            # Meses distintos com vendas nos últimos 6 meses
+            meses_lista_6_meses = extrair_meses_compra(db.movimentacao.find(filtro_6_meses))
             
             # Se não houver compras nos últimos 6 meses, pula para o próximo cliente
-            if len(meses_compra_6_meses) == 0:
+            if len(meses_lista_6_meses) == 0:
                 continue
             
-            # Conta o número de meses distintos nos últimos 6 meses
-            num_ciclos_6_meses = len(meses_compra_6_meses)
-            
-            # Lista os meses para referência
-            meses_lista_6_meses = sorted(list(meses_compra_6_meses))
-            
             # Verifica se o cliente comprou no ciclo atual (mês atual)
-            filtro_ciclo_atual = {**filtro_base_ciclo_atual, "codigo_cliente_fornecedor": cod_cliente}
             comprou_ciclo_atual = db.movimentacao.count_documents(filtro_ciclo_atual) > 0
+            ciclos = montar_ciclos_compra(cod_cliente, meses_lista_6_meses, comprou_ciclo_atual)
             
             resultados.append({
                 "id": cliente.get("_id"),
                 "codigo_cliente": cod_cliente,
                 "nome": cliente.get("razao_social", ""),
-                "num_ciclos_6_meses": num_ciclos_6_meses,
-                "meses_compra_6_meses": meses_lista_6_meses,
-                "comprou_ciclo_atual": comprou_ciclo_atual
+                "num_ciclos_6_meses": ciclos["num_ciclos_6_meses"],
+                "meses_compra_6_meses": ciclos["meses_compra_6_meses"],
+                "comprou_ciclo_atual": ciclos["comprou_ciclo_atual"]
             })
         
         return resultados
@@ -4,6 +4,54 @@ Consulta de data da primeira compra dos clientes.
 from datetime import datetime
 from .base import EVENTOS_VENDA
 
+def filtro_primeira_compra(cod_cliente):
+    """
+    Monta o filtro de vendas de um cliente usado para encontrar a primeira e a última compra.
+    
+    Args:
+        cod_cliente: Código do cliente
+        
+    Returns:
+        Filtro da consulta (ordenar por "data" crescente para a primeira compra e decrescente para a última)
+    """
+    return {
+        "codigo_cliente_fornecedor": cod_cliente,
+        "evento": {"$in": EVENTOS_VENDA}
+    }
+
+def calcular_data_primeira_compra(cod_cliente, primeira_compra, ultima_compra):
+    """
+    Monta o resultado a partir da primeira e da última venda do cliente.
+    
+    A última venda só é lida se houver uma primeira venda.
+    
+    Args:
+        cod_cliente: Código do cliente
+        primeira_compra: Iterável com a venda mais antiga (ex: cursor ordenado com limit(1))
+        ultima_compra: Iterável com a venda mais recente
+        
+    Returns:
+        Dicionário com as datas da primeira e da última compra ou None se não houver compras
+    """
+    primeira_compra = list(primeira_compra)
+    
+    # Se não houver compras, retorna None
+    if not primeira_compra:
+        return None
+    
+    ultima_compra = list(ultima_compra)
+    
+    # Formata a data da primeira compra
+    data_timestamp = primeira_compra[0].get("data")
+    data_formatada = datetime.fromtimestamp(data_timestamp).strftime("%Y-%m-%d") if data_timestamp else None
+    
+    return {
+        "codigo_cliente": cod_cliente,
+        "data": data_timestamp,
+        "data_formatada": data_formatada,
+        "data_ultima_compra": ultima_compra[0].get("data") if ultima_compra else None
+    }
+
 def obter_data_primeira_compra(db, cliente_id=None, cod_cliente=None):
     """
     Obtém a data da primeira compra do cliente.
@@ -27,35 +75,14 @@ def obter_data_primeira_compra(db, cliente_id=None, cod_cliente=None):
         
         # Se cod_cliente for fornecido, calcula apenas para esse cliente
         if cod_cliente:
-            # Filtro para vendas do cliente
-            filtro_venda_cliente = {
-                "codigo_cliente_fornecedor": cod_cliente,
-                "evento": {"$in": EVENTOS_VENDA}
-            }
-            
-            # Busca a primeira compra do cliente (ordenada por data)
-            primeira_compra = list(db.movimentacao.find(filtro_venda_cliente).sort("data", 1).limit(1))
-            
-            # Se não houver compras, retorna None
-            if not primeira_compra:
-                return None
-            
-            # Busca a última compra do cliente (ordenada por data decrescente)
-            ultima_compra = list(db.movimentacao.find(filtro_venda_cliente).sort("data", -1).limit(1))
+            filtro_venda_cliente = filtro_primeira_compra(cod_cliente)
             
-            # Formata a data da primeira compra
-            data_timestamp = primeira_compra[0].get("data")
-            data_formatada = datetime.fromtimestamp(data_timestamp).strftime("%Y-%m-%d") if data_timestamp else None
-            
-            # Adiciona o campo formatado ao resultado
-            primeira_compra[0]["data_"] = data_formatada
-            
-            return {
-                "codigo_cliente": cod_cliente,
-                "data": data_timestamp,
-                "data_formatada": data_formatada,
-                "data_ultima_compra": ultima_compra[0].get("data") if ultima_compra else None
-            }
+            # Busca a primeira e a última compra do cliente (a última só é consultada se houver compras)
+            return calcular_data_primeira_compra(
+                cod_cliente,
+                db.movimentacao.find(filtro_venda_cliente).sort("data", 1).limit(1),
+                db.movimentacao.find(filtro_venda_cliente).sort("data", -1).limit(1)
+            )
         
         # Se cliente_id/cod_cliente não for fornecido, calcula para todos os clientes
         # Primeiro, obtém a lista de todos os clientes
@@ -73,36 +100,24 @@ def obter_data_primeira_compra(db, cliente_id=None, cod_cliente=None):
             if not cod_cliente:
                 continue
             
-            # Filtro para vendas do cliente
-            filtro_venda_cliente = {
-                "codigo_cliente_fornecedor": cod_cliente,
-                "evento": {"$in": EVENTOS_VENDA}
-            }
-            
-            # Busca a primeira compra do cliente (ordenada por data)
-            primeira_compra = list(db.movimentacao.find(filtro_venda_cliente).sort("data", 1).limit(1))
+            filtro_venda_cliente = filtro_primeira_compra(cod_cliente)
+            datas = calcular_data_primeira_compra(
+                cod_cliente,
+                db.movimentacao.find(filtro_venda_cliente).sort("data", 1).limit(1),
+                db.movimentacao.find(filtro_venda_cliente).sort("data", -1).limit(1)
+            )
             
             # Se não houver compras, pula para o próximo cliente
-            if not primeira_compra:
+            if datas is None:
                 continue
             
-            # Busca a última compra do cliente (ordenada por data decrescente)
-            ultima_compra = list(db.movimentacao.find(filtro_venda_cliente).sort("data", -1).limit(1))
-            
-            # Formata a data da primeira compra
-            data_timestamp = primeira_compra[0].get("data")
-            data_formatada = datetime.fromtimestamp(data_timestamp).strftime("%Y-%m-%d") if data_timestamp else None
-            
-            # Adiciona o campo formatado ao resultado
-            primeira_compra[0]["data_"] = data_formatada
-            
             resultados.append({
                 "id": cliente.get("_id"),
                 "codigo_cliente": cod_cliente,
                 "nome": cliente.get("razao_social", ""),
-                "data": primeira_compra[0].get("data"),
-                "data_formatada": primeira_compra[0].get("data_"),
-                "data_ultima_compra": ultima_compra[0].get("data") if ultima_compra else None
+                "data": datas["data"],
+                "data_formatada": datas["data_formatada"],
+                "data_ultima_compra": datas["data_ultima_compra"]
             })
         
         return resultados
@@ -4,6 +4,76 @@ Consulta de faturamento dos clientes.
 from datetime import datetime, timedelta
 from .base import EVENTOS_VENDA, EVENTOS_DEVOLUCAO
 
+def filtros_faturamento(cod_cliente, data_referencia=None):
+    """
+    Monta os filtros de vendas e devoluções dos últimos 12 meses de um cliente.
+    
+    Args:
+        cod_cliente: Código do cliente
+        data_referencia: Data final da janela (padrão: agora)
+        
+    Returns:
+        Tupla (filtro_venda, filtro_devolucao)
+    """
+    # Calcula a data de 12 meses atrás
+    data_atual = data_referencia or datetime.now()
+    data_12_meses_atras = int((data_atual - timedelta(days=365)).timestamp())
+    
+    # Filtro para vendas do cliente
+    filtro_venda_cliente = {
+        "codigo_cliente_fornecedor": cod_cliente,
+        "evento": {"$in": EVENTOS_VENDA},
+        "tipo_operacao": "S",
+        "cancelada": False,
+        "data": {"$gte": data_12_meses_atras}
+    }
+    
+    # Filtro para devoluções do cliente
+    filtro_devolucao_cliente = {
+        "codigo_cliente_fornecedor": cod_cliente,
+        "evento": {"$in": EVENTOS_DEVOLUCAO},
+        "tipo_operacao": "E",
+        "cancelada": False,
+        "data": {"$gte": data_12_meses_atras}
+    }
+    
+    return filtro_venda_cliente, filtro_devolucao_cliente
+
+def calcular_faturamento(cod_cliente, vendas, devolucoes):
+    """
+    Calcula o faturamento a partir dos documentos de vendas e devoluções.
+    
+    As devoluções só são percorridas se houver vendas, então um cursor ainda não
+    executado pode ser passado sem custo quando o cliente não tem vendas.
+    
+    Args:
+        cod_cliente: Código do cliente
+        vendas: Iterável com as vendas do cliente
+        devolucoes: Iterável com as devoluções do cliente
+        
+    Returns:
+        Dicionário com o faturamento ou None se não houver vendas
+    """
+    # Calcula o valor total de vendas
+    total_vendas = sum(venda.get("valor_final", 0) for venda in vendas)
+    
+    # Se não houver vendas, não há faturamento
+    if total_vendas == 0:
+        return None
+    
+    # Calcula o valor total de devoluções
+    total_devolucoes = sum(devolucao.get("valor_final", 0) for devolucao in devolucoes)
+    
+    # Calcula o faturamento líquido
+    faturamento_liquido = total_vendas - total_devolucoes
+    
+    return {
+        "codigo_cliente": cod_cliente,
+        "total_vendas": total_vendas,
+        "total_devolucoes": total_devolucoes,
+        "faturamento_liquido": faturamento_liquido
+    }
+
 def obter_faturamento_ultimos_12_meses(db, cliente_id=None, cod_cliente=None):
     """
     Calcula o faturamento total nos últimos 12 meses.
@@ -17,10 +87,6 @@ def obter_faturamento_ultimos_12_meses(db, cliente_id=None, cod_cliente=None):
         Valor total faturado nos últimos 12 meses ou lista de faturamentos se cliente_id/cod_cliente não for fornecido
     """
     try:
-        # Calcula a data de 12 meses atrás
-        data_atual = datetime.now()
-        data_12_meses_atras = int((data_atual - timedelta(days=365)).timestamp())
-        
         # Se cliente_id for fornecido, busca apenas esse cliente
         if cliente_id:
             cliente = db.geradores.find_one({"_id": cliente_id})
@@ -31,45 +97,14 @@ def obter_faturamento_ultimos_12_meses(db, cliente_id=None, cod_cliente=None):
         
         # Se cod_cliente for fornecido, calcula apenas para esse cliente
         if cod_cliente:
-            # Filtro para vendas do cliente
-            filtro_venda_cliente = {
-                "codigo_cliente_fornecedor": cod_cliente,
-                "evento": {"$in": EVENTOS_VENDA},
-                "tipo_operacao": "S",
-                "cancelada": False,
-                "data": {"$gte": data_12_meses_atras}
-            }
-            
-            # Filtro para devoluções do cliente
-            filtro_devolucao_cliente = {
-                "codigo_cliente_fornecedor": cod_cliente,
-                "evento": {"$in": EVENTOS_DEVOLUCAO},
-                "tipo_operacao": "E",
-                "cancelada": False,
-                "data": {"$gte": data_12_meses_atras}
-            }
-            
-            # Calcula o valor total de vendas
-            vendas = db.movimentacao.find(filtro_venda_cliente)
-            total_vendas = sum(venda.get("valor_final", 0) for venda in vendas)
-            
-            # Se não houver vendas, pula para o próximo cliente
-            if total_vendas == 0:
-                return None
-            
-            # Calcula o valor total de devoluções
-            devolucoes = db.movimentacao.find(filtro_devolucao_cliente)
-            total_devolucoes = sum(devolucao.get("valor_final", 0) for devolucao in devolucoes)
+            filtro_venda_cliente, filtro_devolucao_cliente = filtros_faturamento(cod_cliente)
             
-            # Calcula o faturamento líquido
-            faturamento_liquido = total_vendas - total_devolucoes
-            
-            return {
-                "codigo_cliente": cod_cliente,
-                "total_vendas": total_vendas,
-                "total_devolucoes": total_devolucoes,
-                "faturamento_liquido": faturamento_liquido
-            }
+            # O cursor de devoluções só é executado se houver vendas
+            return calcular_faturamento(
+                cod_cliente,
+                db.movimentacao.find(filtro_venda_cliente),
+                db.movimentacao.find(filtro_devolucao_cliente)
+            )
         
         # Se cliente_id/cod_cliente não for fornecido, calcula para todos os clientes
         # Primeiro, obtém a lista de todos os clientes
@@ -87,46 +122,24 @@ def obter_faturamento_ultimos_12_meses(db, cliente_id=None, cod_cliente=None):
             if not cod_cliente:
                 continue
             
-            # Filtro para vendas do cliente
-            filtro_venda_cliente = {
-                "codigo_cliente_fornecedor": cod_cliente,
-                "evento": {"$in": EVENTOS_VENDA},
-                "tipo_operacao": "S",
-                "cancelada": False,
-                "data": {"$gte": data_12_meses_atras}
-            }
-            
-            # Filtro para devoluções do cliente
-            filtro_devolucao_cliente = {
-                "codigo_cliente_fornecedor": cod_cliente,
-                "evento": {"$in": EVENTOS_DEVOLUCAO},
-                "tipo_operacao": "E",
-                "cancelada": False,
-                "data": {"$gte": data_12_meses_atras}
-            }
-            
-            # Calcula o valor total de vendas
-            vendas = db.movimentacao.find(filtro_venda_cliente)
-            total_vendas = sum(venda.get("valor_final", 0) for venda in vendas)
+            filtro_venda_cliente, filtro_devolucao_cliente = filtros_faturamento(cod_cliente)
+            faturamento = calcular_faturamento(
+                cod_cliente,
+                db.movimentacao.find(filtro_venda_cliente),
+                db.movimentacao.find(filtro_devolucao_cliente)
+            )
             
             # Se não houver vendas, pula para o próximo cliente
-            if total_vendas == 0:
+            if faturamento is None:
                 continue
             
-            # Calcula o valor total de devoluções
-            devolucoes = db.movimentacao.find(filtro_devolucao_cliente)
-            total_devolucoes = sum(devolucao.get("valor_final", 0) for devolucao in devolucoes)
-            
-            # Calcula o faturamento líquido
-            faturamento_liquido = total_vendas - total_devolucoes
-            
             resultados.append({
                 "id": cliente.get("_id"),
                 "codigo_cliente": cod_cliente,
                 "nome": cliente.get("razao_social", ""),
-                "total_vendas": total_vendas,
-                "total_devolucoes": total_devolucoes,
-                "faturamento_liquido": faturamento_liquido
+                "total_vendas": faturamento["total_vendas"],
+                "total_devolucoes": faturamento["total_devolucoes"],
+                "faturamento_liquido": faturamento["faturamento_liquido"]
             })
         
         return resultados
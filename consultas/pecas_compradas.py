@@ -3,6 +3,68 @@ Consulta de total de peças compradas pelos clientes.
 """
 from .base import EVENTOS_VENDA, EVENTOS_DEVOLUCAO
 
+def filtros_pecas(cod_cliente):
+    """
+    Monta os filtros de vendas e devoluções (sem limite de data) de um cliente.
+    
+    Args:
+        cod_cliente: Código do cliente
+        
+    Returns:
+        Tupla (filtro_venda, filtro_devolucao)
+    """
+    # Filtro para vendas do cliente
+    filtro_venda_cliente = {
+        "codigo_cliente_fornecedor": cod_cliente,
+        "evento": {"$in": EVENTOS_VENDA},
+        "tipo_operacao": "S",
+        "cancelada": False
+    }
+    
+    # Filtro para devoluções do cliente
+    filtro_devolucao_cliente = {
+        "codigo_cliente_fornecedor": cod_cliente,
+        "evento": {"$in": EVENTOS_DEVOLUCAO},
+        "tipo_operacao": "E",
+        "cancelada": False
+    }
+    
+    return filtro_venda_cliente, filtro_devolucao_cliente
+
+def calcular_total_pecas(cod_cliente, vendas, devolucoes):
+    """
+    Calcula o total de peças a partir dos documentos de vendas e devoluções.
+    
+    As devoluções só são percorridas se houver peças compradas.
+    
+    Args:
+        cod_cliente: Código do cliente
+        vendas: Iterável com as vendas do cliente
+        devolucoes: Iterável com as devoluções do cliente
+        
+    Returns:
+        Dicionário com os totais de peças ou None se não houver compras
+    """
+    # Calcula o total de peças compradas
+    total_pecas_compradas = sum(venda.get("qtde", 0) for venda in vendas)
+    
+    # Se não houver compras, não há total
+    if total_pecas_compradas == 0:
+        return None
+    
+    # Calcula o total de peças devolvidas
+    total_pecas_devolvidas = sum(devolucao.get("qtde", 0) for devolucao in devolucoes)
+    
+    # Calcula o total líquido
+    total_liquido = total_pecas_compradas - total_pecas_devolvidas
+    
+    return {
+        "codigo_cliente": cod_cliente,
+        "total_bruto": total_pecas_compradas,
+        "total_devolucoes": total_pecas_devolvidas,
+        "total_liquido": total_liquido
+    }
+
 def obter_total_pecas_compradas(db, cliente_id=None, cod_cliente=None):
     """
     Calcula o número total de peças compradas pelo cliente.
@@ -26,47 +88,14 @@ def obter_total_pecas_compradas(db, cliente_id=None, cod_cliente=None):
         
         # Se cod_cliente for fornecido, calcula apenas para esse cliente
         if cod_cliente:
-            # Filtro para vendas do cliente
-            filtro_venda_cliente = {
-                "codigo_cliente_fornecedor": cod_cliente,
-                "evento": {"$in": EVENTOS_VENDA},
-                "tipo_operacao": "S",
-                "cancelada": False
-            }
-            
-            # Filtro para devoluções do cliente
-            filtro_devolucao_cliente = {
-                "codigo_cliente_fornecedor": cod_cliente,
-                "evento": {"$in": EVENTOS_DEVOLUCAO},
-                "tipo_operacao": "E",
-                "cancelada": False
-            }
-            
-            # Busca todas as compras do cliente
-            vendas = db.movimentacao.find(filtro_venda_cliente)
-            
-            # Calcula o total de peças compradas
-            total_pecas_compradas = sum(venda.get("qtde", 0) for venda in vendas)
-            
-            # Se não houver compras, pula para o próximo cliente
-            if total_pecas_compradas == 0:
-                return None
-            
-            # Busca todas as devoluções do cliente
-            devolucoes = db.movimentacao.find(filtro_devolucao_cliente)
-            
-            # Calcula o total de peças devolvidas
-            total_pecas_devolvidas = sum(devolucao.get("qtde", 0) for devolucao in devolucoes)
-            
-            # Calcula o total líquido
-            total_liquido = total_pecas_compradas - total_pecas_devolvidas
-            
-            return {
-                "codigo_cliente": cod_cliente,
-                "total_bruto": total_pecas_compradas,
-                "total_devolucoes": total_pecas_devolvidas,
-                "total_liquido": total_liquido
-            }
+            filtro_venda_cliente, filtro_devolucao_cliente = filtros_pecas(cod_cliente)
+            
+            # O cursor de devoluções só é executado se houver compras
+            return calcular_total_pecas(
+                cod_cliente,
+                db.movimentacao.find(filtro_venda_cliente),
+                db.movimentacao.find(filtro_devolucao_cliente)
+            )
         
         # Se cliente_id/cod_cliente não for fornecido, calcula para todos os clientes
         # Primeiro, obtém a lista de todos os clientes
@@ -84,48 +113,24 @@ def obter_total_pecas_compradas(db, cliente_id=None, cod_cliente=None):
             if not cod_cliente:
                 continue
             
-            # Filtro para vendas do cliente
-            filtro_venda_cliente = {
-                "codigo_cliente_fornecedor": cod_cliente,
-                "evento": {"$in": EVENTOS_VENDA},
-                "tipo_operacao": "S",
-                "cancelada": False
-            }
-            
-            # Filtro para devoluções do cliente
-            filtro_devolucao_cliente = {
-                "codigo_cliente_fornecedor": cod_cliente,
-                "evento": {"$in": EVENTOS_DEVOLUCAO},
-                "tipo_operacao": "E",
-                "cancelada": False
-            }
-            
-            # Busca todas as compras do cliente
-            vendas = db.movimentacao.find(filtro_venda_cliente)
-            
-            # Calcula o total de peças compradas
-            total_pecas_compradas = sum(venda.get("qtde", 0) for venda in vendas)
+            filtro_venda_cliente, filtro_devolucao_cliente = filtros_pecas(cod_cliente)
+            pecas = calcular_total_pecas(
+                cod_cliente,
+                db.movimentacao.find(filtro_venda_cliente),
+                db.movimentacao.find(filtro_devolucao_cliente)
+            )
             
             # Se não houver compras, pula para o próximo cliente
-            if total_pecas_compradas == 0:
+            if pecas is None:
                 continue
             
-            # Busca todas as devoluções do cliente
-            devolucoes = db.movimentacao.find(filtro_devolucao_cliente)
-            
-            # Calcula o total de peças devolvidas
-            total_pecas_devolvidas = sum(devolucao.get("qtde", 0) for devolucao in devolucoes)
-            
-            # Calcula o total líquido
-            total_liquido = total_pecas_compradas - total_pecas_devolvidas
-            
             resultados.append({
                 "id": cliente.get("_id"),
                 "codigo_cliente": cod_cliente,
                 "nome": cliente.get("razao_social", ""),
-                "total_bruto": total_pecas_compradas,
-                "total_devolucoes": total_pecas_devolvidas,
-                "total_liquido": total_liquido
+                "total_bruto": pecas["total_bruto"],
+                "total_devolucoes": pecas["total_devolucoes"],
+                "total_liquido": pecas["total_liquido"]
             })
         
         return resultados
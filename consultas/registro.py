@@ -0,0 +1,633 @@
+"""
+Registro das métricas e planejador de consultas.
+
+Cada métrica declara a collection que lê, os conjuntos de documentos de que precisa (com o
+filtro e a janela de datas de cada um, montados pelas funções de filtro do próprio módulo da
+consulta), os campos usados no cálculo e a função que calcula o resultado a partir desses
+conjuntos. O planejador junta as métricas pedidas em uma única consulta por collection: o
+filtro é o mais restrito que ainda cobre todos os conjuntos (eventos unidos, janelas de datas
+unidas) e a projeção traz apenas os campos usados. Os documentos lidos são separados em Python
+entre os conjuntos de cada métrica, com os filtros exatos de cada um.
+
+O mesmo plano serve para um cliente ou para um lote de clientes (a condição do cliente passa a
+ser um $in), de modo que as métricas de um lote saem de uma consulta em movimentacao e uma em
+lancamentos_completo, e uma nova métrica sobre essas collections não acrescenta idas ao banco.
+
+Uso (exibe o plano das métricas pedidas):
+    python -m consultas.registro --metricas faturamento,pecas
+"""
+import sys
+import math
+import argparse
+from datetime import datetime
+from bson import json_util
+
+from .base import EVENTOS_VENDA, EVENTOS_DEVOLUCAO
+from .data_primeira_compra import filtro_primeira_compra, calcular_data_primeira_compra
+from .faturamento import filtros_faturamento, calcular_faturamento
+from .ciclos_compra import filtros_ciclos_compra, extrair_meses_compra, montar_ciclos_compra
+from .pecas_compradas import filtros_pecas, calcular_total_pecas
+from .titulos_pagos import (
+    TIPOS_PAGAMENTO, CAMPOS_CLIENTE_TITULOS, filtro_base_titulos, calcular_titulos_pagos, resultado_titulos_vazio
+)
+from .valor_por_marca import filtros_valor_por_marca, calcular_valor_por_marca, calcular_marcas_diferentes
+
+# Campos que identificam o cliente em cada collection lida pelas métricas; com mais de um
+# campo, o documento pertence ao cliente se qualquer um deles tiver o código
+CHAVES_CLIENTE = {
+    "movimentacao": ("codigo_cliente_fornecedor",),
+    "lancamentos_completo": CAMPOS_CLIENTE_TITULOS
+}
+
+# Operadores aceitos nos filtros dos conjuntos (avaliados também em Python)
+OPERADORES_COMPARACAO = {"$gte", "$gt", "$lt", "$lte"}
+
+def sem_cliente(filtro):
+    """Retira a condição do cliente de um filtro de movimentações."""
+    return {campo: condicao for campo, condicao in filtro.items() if campo != "codigo_cliente_fornecedor"}
+
+def conjuntos_primeira_compra(data_referencia):
+    """Vendas (de qualquer data) usadas para a primeira e a última compra."""
+    return {"vendas": sem_cliente(filtro_primeira_compra(None))}
+
+def conjuntos_faturamento(data_referencia):
+    """Vendas e devoluções dos últimos 12 meses."""
+    filtro_venda, filtro_devolucao = filtros_faturamento(None, data_referencia)
+    return {"vendas": sem_cliente(filtro_venda), "devolucoes": sem_cliente(filtro_devolucao)}
+
+def conjuntos_ciclos(data_referencia):
+    """Vendas dos últimos 6 meses (sem o mês atual) e do mês atual."""
+    filtro_6_meses, filtro_ciclo_atual = filtros_ciclos_compra(None, data_referencia)
+    return {"vendas_6_meses": filtro_6_meses, "vendas_ciclo_atual": filtro_ciclo_atual}
+
+def conjuntos_pecas(data_referencia):
+    """Vendas e devoluções (de qualquer data) com a quantidade de peças."""
+    filtro_venda, filtro_devolucao = filtros_pecas(None)
+    return {"vendas": sem_cliente(filtro_venda), "devolucoes": sem_cliente(filtro_devolucao)}
+
+def conjuntos_pagamentos(data_referencia):
+    """Títulos a receber do cliente."""
+    return {"lancamentos": filtro_base_titulos()}
+
+def conjuntos_valor_por_marca(data_referencia):
+    """Vendas e devoluções (de qualquer data), sem as restrições de operação e cancelamento."""
+    filtro_venda, filtro_devolucao = filtros_valor_por_marca(None)
+    return {"vendas": sem_cliente(filtro_venda), "devolucoes": sem_cliente(filtro_devolucao)}
+
+def ordem_bson(valor):
+    """
+    Chave de ordenação equivalente à do MongoDB entre tipos diferentes (nulo antes dos números,
+    números antes dos textos etc.), usada para reproduzir o sort("data") em Python.
+    """
+    if valor is None:
+        return (0, 0)
+    if isinstance(valor, bool):
+        return (7, valor)
+    if isinstance(valor, (int, float)):
+        return (1, valor)
+    if isinstance(valor, str):
+        return (2, valor)
+    if isinstance(valor, datetime):
+        return (8, valor)
+    return (3, 0)
+
+def calcular_primeira_compra(cod_cliente, conjuntos):
+    """Primeira e última compra: a menor e a maior data entre as vendas do cliente."""
+    vendas = conjuntos["vendas"]
+    if not vendas:
+        return calcular_data_primeira_compra(cod_cliente, [], [])
+
+    def chave(venda):
+        return ordem_bson(venda.get("data"))
+
+    return calcular_data_primeira_compra(cod_cliente, [min(vendas, key=chave)], [max(vendas, key=chave)])
+
+# Métricas registradas, na ordem das consultas. Cada uma declara:
+# - colecao: collection lida (ver CHAVES_CLIENTE)
+# - janela: janela de datas, para exibição (as datas estão nos filtros dos conjuntos)
+# - conjuntos: função (data_referencia) -> {conjunto: filtro sem a condição do cliente}
+# - campos: campos dos documentos usados no cálculo (além dos campos dos filtros)
+# - calcular: função (cod_cliente, {conjunto: documentos}) -> retorno da métrica
+# - em_erro: função (cod_cliente) -> retorno quando a consulta ou o cálculo falha
+# As métricas derivadas ("derivada_de") são calculadas a partir do retorno de outra métrica,
+# sem consultas próprias.
+REGISTRO_METRICAS = {
+    "data_primeira_compra": {
+        "colecao": "movimentacao",
+        "janela": "total",
+        "conjuntos": conjuntos_primeira_compra,
+        "campos": ("data",),
+        "calcular": calcular_primeira_compra,
+        "em_erro": lambda cod_cliente: None
+    },
+    "faturamento": {
+        "colecao": "movimentacao",
+        "janela": "12m",
+        "conjuntos": conjuntos_faturamento,
+        "campos": ("valor_final",),
+        "calcular": lambda cod_cliente, conjuntos: calcular_faturamento(
+            cod_cliente, conjuntos["vendas"], conjuntos["devolucoes"]
+        ),
+        "em_erro": lambda cod_cliente: None
+    },
+    "ciclos": {
+        "colecao": "movimentacao",
+        "janela": "6m",
+        "conjuntos": conjuntos_ciclos,
+        "campos": ("data",),
+        "calcular": lambda cod_cliente, conjuntos: montar_ciclos_compra(
+            cod_cliente,
+            extrair_meses_compra(conjuntos["vendas_6_meses"]),
+            len(conjuntos["vendas_ciclo_atual"]) > 0
+        ),
+        "em_erro": lambda cod_cliente: None
+    },
+    "pecas": {
+        "colecao": "movimentacao",
+        "janela": "total",
+        "conjuntos": conjuntos_pecas,
+        "campos": ("qtde",),
+        "calcular": lambda cod_cliente, conjuntos: calcular_total_pecas(
+            cod_cliente, conjuntos["vendas"], conjuntos["devolucoes"]
+        ),
+        "em_erro": lambda cod_cliente: None
+    },
+    "pagamentos": {
+        "colecao": "lancamentos_completo",
+        "janela": "total",
+        "conjuntos": conjuntos_pagamentos,
+        "campos": (
+            "valor_pago_recebido", "valor_liquido", "valor_inicial", "data_vencimento",
+            "data_pagamento", "tipo_pgto", "tipo_pgto_descricao", "efetuado"
+        ),
+        "calcular": lambda cod_cliente, conjuntos: calcular_titulos_pagos(cod_cliente, conjuntos["lancamentos"]),
+        "em_erro": resultado_titulos_vazio
+    },
+    "valor_por_marca": {
+        "colecao": "movimentacao",
+        "janela": "total",
+        "conjuntos": conjuntos_valor_por_marca,
+        "campos": ("marca", "valor_final", "preco_bruto", "valor_total", "valor"),
+        "calcular": lambda cod_cliente, conjuntos: calcular_valor_por_marca(
+            cod_cliente, conjuntos["vendas"], conjuntos["devolucoes"]
+        ),
+        "em_erro": lambda cod_cliente: None
+    },
+    "marcas": {
+        "derivada_de": "valor_por_marca",
+        "janela": "total",
+        "calcular": calcular_marcas_diferentes,
+        "em_erro": lambda cod_cliente: None
+    }
+}
+
+def iguais(valor, esperado):
+    """Igualdade como no MongoDB: booleanos só são iguais a booleanos (False não é 0)."""
+    if isinstance(valor, bool) or isinstance(esperado, bool):
+        return isinstance(valor, bool) and isinstance(esperado, bool) and valor == esperado
+    return valor == esperado
+
+def comparaveis(valor, limite):
+    """Indica se o valor e o limite são do mesmo tipo para uma comparação ($gte, $lt etc.)."""
+    numeros = (int, float)
+    if isinstance(valor, bool) or isinstance(limite, bool):
+        return False
+    if isinstance(valor, numeros) and isinstance(limite, numeros):
+        return not (isinstance(valor, float) and math.isnan(valor))
+    return type(valor) is type(limite)
+
+def comparar(valor, operador, limite):
+    """Avalia uma comparação ($gte, $gt, $lt, $lte); valores de tipos diferentes nunca a atendem."""
+    if not comparaveis(valor, limite):
+        return False
+    if operador == "$gte":
+        return valor >= limite
+    if operador == "$gt":
+        return valor > limite
+    if operador == "$lt":
+        return valor < limite
+    return valor <= limite
+
+def atende_condicao(valor, condicao):
+    """
+    Avalia a condição de um campo do filtro sobre o valor de um documento.
+
+    Como no MongoDB, um campo com uma lista atende a cada operador se algum dos seus itens o
+    atender (a igualdade também aceita a lista inteira).
+
+    Args:
+        valor: Valor do campo no documento (None se não existir)
+        condicao: Valor esperado, {"$in": [...]} ou comparações ($gte, $gt, $lt, $lte)
+
+    Returns:
+        True se o valor atende à condição
+    """
+    if not isinstance(condicao, dict):
+        if isinstance(valor, list):
+            return any(iguais(item, condicao) for item in valor) or iguais(valor, condicao)
+        return iguais(valor, condicao)
+
+    for operador, esperado in condicao.items():
+        if operador == "$in":
+            valores = valor if isinstance(valor, list) else [valor]
+            if not any(iguais(item, opcao) for item in valores for opcao in esperado):
+                return False
+        elif operador in OPERADORES_COMPARACAO:
+            valores = valor if isinstance(valor, list) else [valor]
+            if not any(comparar(item, operador, esperado) for item in valores):
+                return False
+        else:
+            raise ValueError(f"Operador não suportado no registro de métricas: {operador}")
+    return True
+
+def atende(documento, filtro):
+    """Indica se um documento atende a todas as condições de um filtro de conjunto."""
+    return all(atende_condicao(documento.get(campo), condicao) for campo, condicao in filtro.items())
+
+def validar_filtro(filtro):
+    """Garante que o filtro de um conjunto usa apenas condições que atende() sabe avaliar."""
+    for campo, condicao in filtro.items():
+        if campo.startswith("$") or "." in campo:
+            raise ValueError(f"Campo não suportado no registro de métricas: {campo}")
+        if isinstance(condicao, dict):
+            desconhecidos = set(condicao) - OPERADORES_COMPARACAO - {"$in"}
+            if desconhecidos:
+                raise ValueError(f"Operador não suportado no registro de métricas: {', '.join(sorted(desconhecidos))}")
+
+def unir_condicoes(condicoes):
+    """
+    Une as condições de um mesmo campo em uma condição que aceita tudo o que cada uma aceita.
+
+    Valores e listas $in viram a união dos valores; intervalos viram o menor intervalo que
+    contém todos (um limite só é mantido se todos o tiverem e forem comparáveis entre si).
+    Combinações sem união simples retornam None, e o campo fica de fora do filtro da consulta.
+
+    Args:
+        condicoes: Lista de condições do campo, uma por conjunto
+
+    Returns:
+        Condição unida ou None
+    """
+    if all(not isinstance(c, dict) or set(c) == {"$in"} for c in condicoes):
+        valores = []
+        for condicao in condicoes:
+            for valor in (condicao["$in"] if isinstance(condicao, dict) else [condicao]):
+                if not any(iguais(valor, existente) and type(valor) is type(existente) for existente in valores):
+                    valores.append(valor)
+        if len(valores) == 1 and not any(isinstance(c, dict) for c in condicoes):
+            return valores[0]
+        return {"$in": valores}
+
+    if all(isinstance(c, dict) and set(c) <= {"$gte", "$lt"} for c in condicoes):
+        unida = {}
+        for operador, escolher in (("$gte", min), ("$lt", max)):
+            limites = [c[operador] for c in condicoes if operador in c]
+            if len(limites) == len(condicoes) and all(comparaveis(limite, limites[0]) for limite in limites):
+                unida[operador] = escolher(limites)
+        return unida or None
+
+    return None
+
+def unir_filtros(filtros):
+    """
+    Monta um filtro que aceita todos os documentos aceitos por qualquer um dos filtros.
+
+    Apenas os campos presentes em todos os filtros entram no resultado, com as condições
+    unidas por unir_condicoes; o filtro resultante pode aceitar documentos a mais, que são
+    descartados na separação dos conjuntos.
+
+    Args:
+        filtros: Lista de filtros dos conjuntos
+
+    Returns:
+        Filtro unido
+    """
+    unido = {}
+    for campo in filtros[0]:
+        if all(campo in filtro for filtro in filtros[1:]):
+            condicao = unir_condicoes([filtro[campo] for filtro in filtros])
+            if condicao is not None:
+                unido[campo] = condicao
+    return unido
+
+def condicao_codigos(codigos_clientes):
+    """Condição do código do cliente: o próprio código (um cliente) ou $in (vários clientes)."""
+    return codigos_clientes[0] if len(codigos_clientes) == 1 else {"$in": list(codigos_clientes)}
+
+def condicao_faixa(inicio, fim=None):
+    """Condição de uma faixa de códigos de clientes: de inicio (inclusive) a fim (exclusive)."""
+    condicao = {"$gte": inicio}
+    if fim is not None:
+        condicao["$lt"] = fim
+    return condicao
+
+def filtro_clientes(colecao, condicao):
+    """
+    Monta a condição dos clientes de uma collection.
+
+    Args:
+        colecao: Nome da collection (ver CHAVES_CLIENTE)
+        condicao: Condição do código (ver condicao_codigos e condicao_faixa)
+
+    Returns:
+        Filtro com a condição em cada campo do cliente
+    """
+    chaves = CHAVES_CLIENTE[colecao]
+    if len(chaves) == 1:
+        return {chaves[0]: condicao}
+    return {"$or": [{chave: condicao} for chave in chaves]}
+
+def filtro_consulta(consulta, condicao):
+    """Filtro completo de uma consulta do plano com a condição dos clientes."""
+    clientes = filtro_clientes(consulta["colecao"], condicao)
+    if "$or" in clientes:
+        return {"$and": [consulta["filtro"], clientes]}
+    return {**clientes, **consulta["filtro"]}
+
+def planejar(metricas=None, data_referencia=None):
+    """
+    Monta o plano de consultas das métricas pedidas.
+
+    Args:
+        metricas: Métricas a calcular, com os nomes de REGISTRO_METRICAS (padrão: todas)
+        data_referencia: Data usada como "hoje" nas janelas (padrão: agora)
+
+    Returns:
+        Dicionário com as métricas pedidas, a data de referência, as consultas (uma por
+        collection, com o filtro sem a condição do cliente, a projeção e os conjuntos de cada
+        métrica) e as métricas derivadas
+    """
+    data_referencia = data_referencia or datetime.now()
+    metricas = list(REGISTRO_METRICAS) if metricas is None else list(metricas)
+
+    desconhecidas = [nome for nome in metricas if nome not in REGISTRO_METRICAS]
+    if desconhecidas:
+        raise ValueError(f"Métricas não registradas: {', '.join(desconhecidas)}")
+
+    # As métricas derivadas precisam da métrica de origem, calculada mesmo que não tenha sido pedida
+    necessarias = set(metricas)
+    necessarias.update(
+        REGISTRO_METRICAS[nome]["derivada_de"] for nome in metricas if "derivada_de" in REGISTRO_METRICAS[nome]
+    )
+
+    consultas = {}
+    derivadas = []
+    for nome, metrica in REGISTRO_METRICAS.items():
+        if nome not in necessarias:
+            continue
+        if "derivada_de" in metrica:
+            derivadas.append(nome)
+            continue
+
+        consulta = consultas.setdefault(metrica["colecao"], {
+            "colecao": metrica["colecao"],
+            "metricas": [],
+            "conjuntos": []
+        })
+        consulta["metricas"].append(nome)
+        for conjunto, filtro in metrica["conjuntos"](data_referencia).items():
+            validar_filtro(filtro)
+            consulta["conjuntos"].append({"metrica": nome, "conjunto": conjunto, "filtro": filtro})
+
+    for consulta in consultas.values():
+        filtros = [conjunto["filtro"] for conjunto in consulta["conjuntos"]]
+        consulta["filtro"] = unir_filtros(filtros)
+
+        # Projeção: campos do cliente, dos filtros dos conjuntos e usados nos cálculos
+        campos = list(CHAVES_CLIENTE[consulta["colecao"]])
+        for filtro in filtros:
+            campos.extend(filtro)
+        for nome in consulta["metricas"]:
+            campos.extend(REGISTRO_METRICAS[nome]["campos"])
+        consulta["projecao"] = {"_id": 0, **{campo: 1 for campo in dict.fromkeys(campos)}}
+
+    return {
+        "metricas": metricas,
+        "data_referencia": data_referencia,
+        "consultas": list(consultas.values()),
+        "derivadas": derivadas
+    }
+
+def codigos_documento(documento, chaves, codigos):
+    """Códigos de clientes pedidos presentes nos campos do cliente de um documento."""
+    encontrados = []
+    for chave in chaves:
+        valor = documento.get(chave)
+        try:
+            if valor in codigos and valor not in encontrados:
+                encontrados.append(valor)
+        except TypeError:
+            # Valores não hasheáveis (listas, documentos) não são códigos de cliente
+            continue
+    return encontrados
+
+def destinos_documento(consulta, documento):
+    """Conjuntos (métrica, conjunto) da consulta cujos filtros o documento atende."""
+    return [
+        (conjunto["metrica"], conjunto["conjunto"])
+        for conjunto in consulta["conjuntos"]
+        if atende(documento, conjunto["filtro"])
+    ]
+
+def separar_documentos(consulta, documentos, codigos_clientes):
+    """
+    Separa os documentos lidos por uma consulta do plano por cliente e por conjunto.
+
+    Args:
+        consulta: Consulta do plano (ver planejar)
+        documentos: Iterável com os documentos (ex: cursor da consulta)
+        codigos_clientes: Conjunto de códigos dos clientes considerados
+
+    Returns:
+        Dicionário {código do cliente: {(métrica, conjunto): [documentos]}}, apenas com os
+        clientes que têm documentos
+    """
+    chaves = CHAVES_CLIENTE[consulta["colecao"]]
+    separados = {}
+    for documento in documentos:
+        destinos = destinos_documento(consulta, documento)
+        if not destinos:
+            continue
+        for cod_cliente in codigos_documento(documento, chaves, codigos_clientes):
+            documentos_cliente = separados.setdefault(cod_cliente, {})
+            for destino in destinos:
+                documentos_cliente.setdefault(destino, []).append(documento)
+    return separados
+
+def executar_consulta(db, consulta, codigos_clientes, tamanho_batch=None):
+    """
+    Executa uma consulta do plano e separa os documentos por cliente e por conjunto.
+
+    Args:
+        db: Conexão com o banco de dados
+        consulta: Consulta do plano (ver planejar)
+        codigos_clientes: Lista de códigos de clientes
+        tamanho_batch: batch_size do cursor (padrão: o do driver)
+
+    Returns:
+        Dicionário {código do cliente: {(métrica, conjunto): [documentos]}}
+    """
+    cursor = db[consulta["colecao"]].find(
+        filtro_consulta(consulta, condicao_codigos(codigos_clientes)), consulta["projecao"]
+    )
+    if tamanho_batch:
+        cursor = cursor.batch_size(tamanho_batch)
+
+    separados = separar_documentos(consulta, cursor, set(codigos_clientes))
+    return {cod_cliente: separados.get(cod_cliente, {}) for cod_cliente in codigos_clientes}
+
+def calcular_metricas(consulta, cod_cliente, documentos_cliente):
+    """
+    Calcula as métricas de uma consulta do plano para um cliente.
+
+    Args:
+        consulta: Consulta do plano (ver planejar)
+        cod_cliente: Código do cliente
+        documentos_cliente: Dicionário {(métrica, conjunto): [documentos]} do cliente
+
+    Returns:
+        Dicionário {métrica: retorno}
+    """
+    retornos = {}
+    for nome in consulta["metricas"]:
+        metrica = REGISTRO_METRICAS[nome]
+        conjuntos = {
+            conjunto["conjunto"]: documentos_cliente.get((nome, conjunto["conjunto"]), [])
+            for conjunto in consulta["conjuntos"]
+            if conjunto["metrica"] == nome
+        }
+        try:
+            retornos[nome] = metrica["calcular"](cod_cliente, conjuntos)
+        except Exception as e:
+            print(f"Erro ao calcular {nome} do cliente {cod_cliente}: {e}")
+            retornos[nome] = metrica["em_erro"](cod_cliente)
+    return retornos
+
+def finalizar_metricas(plano, cod_cliente, retornos):
+    """
+    Calcula as métricas derivadas de um cliente e mantém apenas as métricas pedidas.
+
+    Args:
+        plano: Plano montado por planejar
+        cod_cliente: Código do cliente
+        retornos: Dicionário {métrica: retorno} com as métricas das consultas do plano
+
+    Returns:
+        Dicionário {métrica: retorno} com as métricas pedidas, na ordem do pedido
+    """
+    for nome in plano["derivadas"]:
+        origem = retornos.get(REGISTRO_METRICAS[nome]["derivada_de"])
+        try:
+            retornos[nome] = REGISTRO_METRICAS[nome]["calcular"](cod_cliente, origem)
+        except Exception as e:
+            print(f"Erro ao calcular {nome} do cliente {cod_cliente}: {e}")
+            retornos[nome] = REGISTRO_METRICAS[nome]["em_erro"](cod_cliente)
+
+    return {nome: retornos.get(nome) for nome in plano["metricas"]}
+
+def executar_plano(db, plano, codigos_clientes, tamanho_batch=None):
+    """
+    Executa o plano para um ou mais clientes.
+
+    Cada consulta do plano é executada uma única vez para todos os clientes informados; os
+    documentos de uma collection são descartados assim que as suas métricas são calculadas.
+
+    Args:
+        db: Conexão com o banco de dados
+        plano: Plano montado por planejar
+        codigos_clientes: Código de um cliente ou lista de códigos (por exemplo, um lote)
+        tamanho_batch: batch_size dos cursores (padrão: o do driver)
+
+    Returns:
+        Dicionário {código do cliente: {métrica: retorno}}, apenas com as métricas pedidas
+    """
+    if isinstance(codigos_clientes, (str, int)):
+        codigos_clientes = [codigos_clientes]
+    codigos_clientes = list(dict.fromkeys(codigos_clientes))
+    calculados = {cod_cliente: {} for cod_cliente in codigos_clientes}
+    if not codigos_clientes:
+        return calculados
+
+    for consulta in plano["consultas"]:
+        try:
+            documentos = executar_consulta(db, consulta, codigos_clientes, tamanho_batch=tamanho_batch)
+        except Exception as e:
+            print(f"Erro na consulta de {consulta['colecao']} do plano: {e}")
+            for cod_cliente in codigos_clientes:
+                for nome in consulta["metricas"]:
+                    calculados[cod_cliente][nome] = REGISTRO_METRICAS[nome]["em_erro"](cod_cliente)
+            continue
+
+        for cod_cliente in codigos_clientes:
+            calculados[cod_cliente].update(calcular_metricas(consulta, cod_cliente, documentos.pop(cod_cliente)))
+
+    return {
+        cod_cliente: finalizar_metricas(plano, cod_cliente, retornos)
+        for cod_cliente, retornos in calculados.items()
+    }
+
+# Listas exibidas pelo nome no plano, em vez de todos os valores
+LISTAS_CONHECIDAS = {
+    "EVENTOS_VENDA": EVENTOS_VENDA,
+    "EVENTOS_DEVOLUCAO": EVENTOS_DEVOLUCAO,
+    "TIPOS_PAGAMENTO": TIPOS_PAGAMENTO
+}
+
+def abreviar_listas(valor):
+    """Troca as listas formadas por listas conhecidas (ex: eventos de venda) pelos seus nomes."""
+    if isinstance(valor, dict):
+        return {chave: abreviar_listas(item) for chave, item in valor.items()}
+    if not isinstance(valor, list):
+        return valor
+
+    nomes = []
+    posicao = 0
+    while posicao < len(valor):
+        for nome, lista in LISTAS_CONHECIDAS.items():
+            if valor[posicao:posicao + len(lista)] == list(lista):
+                nomes.append(nome)
+                posicao += len(lista)
+                break
+        else:
+            return [abreviar_listas(item) for item in valor]
+    return " + ".join(nomes)
+
+def descrever_filtro(filtro):
+    """Texto de um filtro em JSON estendido, para a exibição do plano."""
+    return json_util.dumps(abreviar_listas(filtro), ensure_ascii=False)
+
+def exibir_plano(plano, condicao="<cliente>"):
+    """
+    Exibe as consultas escolhidas pelo planejador, com o filtro, a projeção e os conjuntos de cada métrica.
+
+    Args:
+        plano: Plano montado por planejar
+        condicao: Condição do cliente exibida nos filtros (ex: condicao_faixa("<inicio>", "<fim>"))
+    """
+    print(f"Plano de consultas para: {', '.join(plano['metricas'])}")
+    print(f"Data de referência das janelas: {plano['data_referencia'].strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Consultas por cliente ou por lote: {len(plano['consultas'])}")
+
+    for numero, consulta in enumerate(plano["consultas"], start=1):
+        print(f"\nConsulta {numero}: {consulta['colecao']} ({', '.join(consulta['metricas']) or 'apenas os clientes com vendas'})")
+        print(f"  Filtro: {descrever_filtro(filtro_consulta(consulta, condicao))}")
+        print(f"  Projeção: {', '.join(campo for campo in consulta['projecao'] if campo != '_id')}")
+        for conjunto in consulta["conjuntos"]:
+            janela = REGISTRO_METRICAS[conjunto["metrica"]]["janela"]
+            print(f"  - {conjunto['metrica']}.{conjunto['conjunto']} [{janela}]: {descrever_filtro(conjunto['filtro'])}")
+
+    for nome in plano["derivadas"]:
+        print(f"\nDerivada: {nome} (a partir de {REGISTRO_METRICAS[nome]['derivada_de']}, sem consultas)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exibe o plano de consultas das métricas")
+    parser.add_argument("--metricas", default="",
+                        help="Métricas separadas por vírgula (padrão: todas)")
+    args = parser.parse_args()
+
+    nomes = [nome.strip() for nome in args.metricas.split(",") if nome.strip()]
+    try:
+        exibir_plano(planejar(nomes or None))
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
@@ -3,6 +3,167 @@ Consulta de valor por marca para os clientes.
 """
 from .base import EVENTOS_VENDA, EVENTOS_DEVOLUCAO
 
+def normalizar_marca(documento):
+    """
+    Retorna a marca de uma movimentação, usando "INDEFINIDO" quando ela não estiver preenchida.
+    
+    Args:
+        documento: Documento da movimentação
+        
+    Returns:
+        Nome da marca
+    """
+    # Garante que marca nunca seja None - substitui por "Sem marca" ou "INDEFINIDO"
+    marca = documento.get("marca")
+    if marca is None or marca == "null" or marca == "":
+        marca = "INDEFINIDO"
+    return marca
+
+def extrair_valor(documento):
+    """
+    Obtém o valor de uma movimentação a partir do primeiro campo de valor preenchido.
+    
+    Args:
+        documento: Documento da movimentação
+        
+    Returns:
+        Valor da movimentação (0 se nenhum campo puder ser convertido)
+    """
+    # Verifica os diferentes campos que podem conter o valor
+    valor = 0
+    # Prioridade 1: usar valor_final (preço após descontos)
+    if "valor_final" in documento and documento["valor_final"]:
+        try:
+            valor = float(documento["valor_final"])
+        except (ValueError, TypeError):
+            pass
+    # Prioridade 2: usar preco_bruto
+    elif "preco_bruto" in documento and documento["preco_bruto"]:
+        try:
+            valor = float(documento["preco_bruto"])
+        except (ValueError, TypeError):
+            pass
+    # Tentativas adicionais para outros campos possíveis de valor
+    elif "valor_total" in documento and documento["valor_total"]:
+        try:
+            valor = float(documento["valor_total"])
+        except (ValueError, TypeError):
+            pass
+    elif "valor" in documento and documento["valor"]:
+        try:
+            valor = float(documento["valor"])
+        except (ValueError, TypeError):
+            pass
+    return valor
+
+def filtros_valor_por_marca(cod_cliente):
+    """
+    Monta os filtros de vendas e devoluções (sem limite de data) usados no valor por marca.
+    
+    Args:
+        cod_cliente: Código do cliente
+        
+    Returns:
+        Tupla (filtro_venda, filtro_devolucao)
+    """
+    # Filtro para vendas do cliente
+    filtro_venda_cliente = {
+        "codigo_cliente_fornecedor": cod_cliente,
+        "evento": {"$in": EVENTOS_VENDA}
+    }
+    
+    # Filtro para devoluções do cliente
+    filtro_devolucao_cliente = {
+        "codigo_cliente_fornecedor": cod_cliente,
+        "evento": {"$in": EVENTOS_DEVOLUCAO}
+    }
+    
+    return filtro_venda_cliente, filtro_devolucao_cliente
+
+def calcular_valor_por_marca(cod_cliente, vendas, devolucoes):
+    """
+    Calcula o valor líquido por marca a partir das vendas e devoluções.
+    
+    As devoluções só são percorridas se houver vendas.
+    
+    Args:
+        cod_cliente: Código do cliente
+        vendas: Iterável com as vendas do cliente
+        devolucoes: Iterável com as devoluções do cliente
+        
+    Returns:
+        Dicionário com o valor por marca, ordenado do maior para o menor valor
+    """
+    vendas = list(vendas)
+    
+    # Se não houver compras, retorna o dicionário vazio
+    if not vendas:
+        return {
+            "codigo_cliente": cod_cliente,
+            "valor_por_marca": {}
+        }
+    
+    # Dicionário para armazenar o valor por marca
+    valor_por_marca = {}
+    
+    # Processa cada venda
+    for venda in vendas:
+        marca = normalizar_marca(venda)
+        valor = extrair_valor(venda)
+        
+        # Adiciona o valor ao dicionário
+        if marca in valor_por_marca:
+            valor_por_marca[marca] += valor
+        else:
+            valor_por_marca[marca] = valor
+    
+    # Processa cada devolução
+    for devolucao in devolucoes:
+        marca = normalizar_marca(devolucao)
+        
+        # Subtrai o valor do dicionário
+        if marca in valor_por_marca:
+            valor_por_marca[marca] -= extrair_valor(devolucao)
+    
+    # Arredonda todos os valores para 2 casas decimais
+    valor_por_marca = {marca: round(valor, 2) for marca, valor in valor_por_marca.items()}
+    
+    # Ordena o dicionário por valor em ordem decrescente
+    valor_por_marca_ordenado = dict(sorted(valor_por_marca.items(), key=lambda x: x[1], reverse=True))
+    
+    return {
+        "codigo_cliente": cod_cliente,
+        "valor_por_marca": valor_por_marca_ordenado
+    }
+
+def calcular_marcas_diferentes(cod_cliente, resultado_valor_por_marca):
+    """
+    Obtém o número e a lista de marcas a partir do resultado de calcular_valor_por_marca.
+    
+    Args:
+        cod_cliente: Código do cliente
+        resultado_valor_por_marca: Dicionário retornado por calcular_valor_por_marca
+        
+    Returns:
+        Dicionário com o total de marcas e a lista de marcas ordenada pelo valor
+    """
+    if not resultado_valor_por_marca or not resultado_valor_por_marca.get("valor_por_marca"):
+        # Se não houver valores por marca, retorna 0
+        return {
+            "codigo_cliente": cod_cliente,
+            "total_marcas": 0,
+            "lista_marcas": []
+        }
+    
+    # Usa as marcas já ordenadas pelo valor
+    marcas_ordenadas = list(resultado_valor_por_marca["valor_por_marca"].keys())
+    
+    return {
+        "codigo_cliente": cod_cliente,
+        "total_marcas": len(marcas_ordenadas),
+        "lista_marcas": marcas_ordenadas
+    }
+
 def obter_valor_por_marca(db, cliente_id=None, cod_cliente=None):
     """
     Calcula o valor total de compras por marca para o cliente.
@@ -26,120 +187,14 @@ def obter_valor_por_marca(db, cliente_id=None, cod_cliente=None):
         
         # Se cod_cliente for fornecido, calcula apenas para esse cliente
         if cod_cliente:
-            # Filtro para vendas do cliente
-            filtro_venda_cliente = {
-                "codigo_cliente_fornecedor": cod_cliente,
-                "evento": {"$in": EVENTOS_VENDA}
-            }
-            
-            # Filtro para devoluções do cliente
-            filtro_devolucao_cliente = {
-                "codigo_cliente_fornecedor": cod_cliente,
-                "evento": {"$in": EVENTOS_DEVOLUCAO}
-            }
-            
-            # Busca todas as compras do cliente
-            vendas = list(db.movimentacao.find(filtro_venda_cliente))
-            
-            # Se não houver compras, retorna None
-            if not vendas:
-                return {
-                    "codigo_cliente": cod_cliente,
-                    "valor_por_marca": {}
-                }
-            
-            # Busca todas as devoluções do cliente
-            devolucoes = list(db.movimentacao.find(filtro_devolucao_cliente))
-            
-            # Dicionário para armazenar o valor por marca
-            valor_por_marca = {}
-            
-            # Processa cada venda
-            for venda in vendas:
-                # Garante que marca nunca seja None - substitui por "Sem marca" ou "INDEFINIDO"
-                marca = venda.get("marca")
-                if marca is None or marca == "null" or marca == "":
-                    marca = "INDEFINIDO"
-                
-                # Verifica os diferentes campos que podem conter o valor
-                valor = 0
-                # Prioridade 1: usar valor_final (preço após descontos)
-                if "valor_final" in venda and venda["valor_final"]:
-                    try:
-                        valor = float(venda["valor_final"])
-                    except (ValueError, TypeError):
-                        pass
-                # Prioridade 2: usar preco_bruto
-                elif "preco_bruto" in venda and venda["preco_bruto"]:
-                    try:
-                        valor = float(venda["preco_bruto"])
-                    except (ValueError, TypeError):
-                        pass
-                # Tentativas adicionais para outros campos possíveis de valor
-                elif "valor_total" in venda and venda["valor_total"]:
-                    try:
-                        valor = float(venda["valor_total"])
-                    except (ValueError, TypeError):
-                        pass
-                elif "valor" in venda and venda["valor"]:
-                    try:
-                        valor = float(venda["valor"])
-                    except (ValueError, TypeError):
-                        pass
-                
-                # Adiciona o valor ao dicionário
-                if marca in valor_por_marca:
-                    valor_por_marca[marca] += valor
-                else:
-                    valor_por_marca[marca] = valor
-            
-            # Processa cada devolução
-            for devolucao in devolucoes:
-                # Garante que marca nunca seja None - substitui por "Sem marca" ou "INDEFINIDO"
-                marca = devolucao.get("marca")
-                if marca is None or marca == "null" or marca == "":
-                    marca = "INDEFINIDO"
-                
-                # Verifica os diferentes campos que podem conter o valor
-                valor = 0
-                # Prioridade 1: usar valor_final (preço após descontos)
-                if "valor_final" in devolucao and devolucao["valor_final"]:
-                    try:
-                        valor = float(devolucao["valor_final"])
-                    except (ValueError, TypeError):
-                        pass
-                # Prioridade 2: usar preco_bruto
-                elif "preco_bruto" in devolucao and devolucao["preco_bruto"]:
-                    try:
-                        valor = float(devolucao["preco_bruto"])
-                    except (ValueError, TypeError):
-                        pass
-                # Tentativas adicionais para outros campos possíveis de valor
-                elif "valor_total" in devolucao and devolucao["valor_total"]:
-                    try:
-                        valor = float(devolucao["valor_total"])
-                    except (ValueError, TypeError):
-                        pass
-                elif "valor" in devolucao and devolucao["valor"]:
-                    try:
-                        valor = float(devolucao["valor"])
-                    except (ValueError, TypeError):
-                        pass
-                
-                # Subtrai o valor do dicionário
-                if marca in valor_por_marca:
-                    valor_por_marca[marca] -= valor
-            
-            # Arredonda todos os valores para 2 casas decimais
-            valor_por_marca = {marca: round(valor, 2) for marca, valor in valor_por_marca.items()}
-            
-            # Ordena o dicionário por valor em ordem decrescente
-            valor_por_marca_ordenado = dict(sorted(valor_por_marca.items(), key=lambda x: x[1], reverse=True))
+            filtro_venda_cliente, filtro_devolucao_cliente = filtros_valor_por_marca(cod_cliente)
             
-            return {
-                "codigo_cliente": cod_cliente,
-                "valor_por_marca": valor_por_marca_ordenado
-            }
+            # O cursor de devoluções só é executado se houver compras
+            return calcular_valor_por_marca(
+                cod_cliente,
+                db.movimentacao.find(filtro_venda_cliente),
+                db.movimentacao.find(filtro_devolucao_cliente)
+            )
         
         # Se cliente_id/cod_cliente não for fornecido, calcula para todos os clientes
         # Primeiro, obtém a lista de todos os clientes
@@ -157,118 +212,22 @@ def obter_valor_por_marca(db, cliente_id=None, cod_cliente=None):
             if not cod_cliente:
                 continue
             
-            # Filtro para vendas do cliente
-            filtro_venda_cliente = {
-                "codigo_cliente_fornecedor": cod_cliente,
-                "evento": {"$in": EVENTOS_VENDA}
-            }
-            
-            # Filtro para devoluções do cliente
-            filtro_devolucao_cliente = {
-                "codigo_cliente_fornecedor": cod_cliente,
-                "evento": {"$in": EVENTOS_DEVOLUCAO}
-            }
-            
-            # Busca todas as compras do cliente
-            vendas = list(db.movimentacao.find(filtro_venda_cliente))
+            filtro_venda_cliente, filtro_devolucao_cliente = filtros_valor_por_marca(cod_cliente)
+            resultado_valor_por_marca = calcular_valor_por_marca(
+                cod_cliente,
+                db.movimentacao.find(filtro_venda_cliente),
+                db.movimentacao.find(filtro_devolucao_cliente)
+            )
             
             # Se não houver compras, pula para o próximo cliente
-            if not vendas:
+            if not resultado_valor_por_marca["valor_por_marca"]:
                 continue
             
-            # Busca todas as devoluções do cliente
-            devolucoes = list(db.movimentacao.find(filtro_devolucao_cliente))
-            
-            # Dicionário para armazenar o valor por marca
-            valor_por_marca = {}
-            
-            # Processa cada venda
-            for venda in vendas:
-                # Garante que marca nunca seja None - substitui por "Sem marca" ou "INDEFINIDO"
-                marca = venda.get("marca")
-                if marca is None or marca == "null" or marca == "":
-                    marca = "INDEFINIDO"
-                
-                # Verifica os diferentes campos que podem conter o valor
-                valor = 0
-                # Prioridade 1: usar valor_final (preço após descontos)
-                if "valor_final" in venda and venda["valor_final"]:
-                    try:
-                        valor = float(venda["valor_final"])
-                    except (ValueError, TypeError):
-                        pass
-                # Prioridade 2: usar preco_bruto
-                elif "preco_bruto" in venda and venda["preco_bruto"]:
-                    try:
-                        valor = float(venda["preco_bruto"])
-                    except (ValueError, TypeError):
-                        pass
-                # Tentativas adicionais para outros campos possíveis de valor
-                elif "valor_total" in venda and venda["valor_total"]:
-                    try:
-                        valor = float(venda["valor_total"])
-                    except (ValueError, TypeError):
-                        pass
-                elif "valor" in venda and venda["valor"]:
-                    try:
-                        valor = float(venda["valor"])
-                    except (ValueError, TypeError):
-                        pass
-                
-                # Adiciona o valor ao dicionário
-                if marca in valor_por_marca:
-                    valor_por_marca[marca] += valor
-                else:
-                    valor_por_marca[marca] = valor
-            
-            # Processa cada devolução
-            for devolucao in devolucoes:
-                # Garante que marca nunca seja None - substitui por "Sem marca" ou "INDEFINIDO"
-                marca = devolucao.get("marca")
-                if marca is None or marca == "null" or marca == "":
-                    marca = "INDEFINIDO"
-                
-                # Verifica os diferentes campos que podem conter o valor
-                valor = 0
-                # Prioridade 1: usar valor_final (preço após descontos)
-                if "valor_final" in devolucao and devolucao["valor_final"]:
-                    try:
-                        valor = float(devolucao["valor_final"])
-                    except (ValueError, TypeError):
-                        pass
-                # Prioridade 2: usar preco_bruto
-                elif "preco_bruto" in devolucao and devolucao["preco_bruto"]:
-                    try:
-                        valor = float(devolucao["preco_bruto"])
-                    except (ValueError, TypeError):
-                        pass
-                # Tentativas adicionais para outros campos possíveis de valor
-                elif "valor_total" in devolucao and devolucao["valor_total"]:
-                    try:
-                        valor = float(devolucao["valor_total"])
-                    except (ValueError, TypeError):
-                        pass
-                elif "valor" in devolucao and devolucao["valor"]:
-                    try:
-                        valor = float(devolucao["valor"])
-                    except (ValueError, TypeError):
-                        pass
-                
-                # Subtrai o valor do dicionário
-                if marca in valor_por_marca:
-                    valor_por_marca[marca] -= valor
-            
-            # Arredonda todos os valores para 2 casas decimais
-            valor_por_marca = {marca: round(valor, 2) for marca, valor in valor_por_marca.items()}
-            
-            # Ordena o dicionário por valor em ordem decrescente
-            valor_por_marca_ordenado = dict(sorted(valor_por_marca.items(), key=lambda x: x[1], reverse=True))
-            
             resultados.append({
                 "id": cliente.get("_id"),
                 "codigo_cliente": cod_cliente,
                 "nome": cliente.get("razao_social", ""),
-                "valor_por_marca": valor_por_marca_ordenado
+                "valor_por_marca": resultado_valor_por_marca["valor_por_marca"]
             })
         
         return resultados
@@ -302,24 +261,7 @@ def obter_numero_marcas_diferentes(db, cliente_id=None, cod_cliente=None):
         if cod_cliente:
             # Primeiro, obtém o valor por marca ordenado
             resultado_valor_por_marca = obter_valor_por_marca(db, cliente_id=cliente_id, cod_cliente=cod_cliente)
-            
-            if not resultado_valor_por_marca or not resultado_valor_por_marca.get("valor_por_marca"):
-                # Se não houver valores por marca, retorna 0
-                return {
-                    "codigo_cliente": cod_cliente,
-                    "total_marcas": 0,
-                    "lista_marcas": []
-                }
-            
-            # Usa as marcas já ordenadas pelo valor
-            valor_por_marca = resultado_valor_por_marca.get("valor_por_marca", {})
-            marcas_ordenadas = list(valor_por_marca.keys())
-            
-            return {
-                "codigo_cliente": cod_cliente,
-                "total_marcas": len(marcas_ordenadas),
-                "lista_marcas": marcas_ordenadas
-            }
+            return calcular_marcas_diferentes(cod_cliente, resultado_valor_por_marca)
         
         # Se cliente_id/cod_cliente não for fornecido, calcula para todos os clientes
         # Primeiro, obtém a lista de todos os clientes
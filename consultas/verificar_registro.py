@@ -0,0 +1,173 @@
+"""
+Verificação das regras de comparação e de união de filtros do registro de métricas.
+
+O planejador (consultas.registro) reproduz em Python as regras do MongoDB que decidem quais
+documentos cada métrica recebe: igualdade sem misturar booleanos e números, comparações apenas
+entre valores do mesmo tipo, listas nos campos dos documentos e a união dos filtros dos
+conjuntos em um filtro por collection. Este script verifica essas funções isoladamente, com
+casos fixos e com filtros sorteados, e termina com código 1 se algum caso falhar. Execute-o
+após qualquer mudança em iguais, comparaveis, atende_condicao, unir_condicoes ou unir_filtros.
+
+Uso:
+    python -m consultas.verificar_registro
+    python -m consultas.verificar_registro --sorteios 5000 --semente 7
+"""
+import sys
+import random
+import argparse
+from datetime import datetime
+
+from .registro import iguais, comparaveis, atende_condicao, atende, unir_condicoes, unir_filtros
+
+# Datas usadas nas janelas dos casos fixos
+JANEIRO = datetime(2025, 1, 1)
+MARCO = datetime(2025, 3, 1)
+JUNHO = datetime(2025, 6, 1)
+DEZEMBRO = datetime(2025, 12, 1)
+
+# Casos fixos: (descrição, valor obtido, valor esperado)
+CASOS = [
+    # Booleanos e números
+    ("True não é igual a 1", iguais(True, 1), False),
+    ("0 não é igual a False", iguais(0, False), False),
+    ("True é igual a True", iguais(True, True), True),
+    ("1 é igual a 1.0", iguais(1, 1.0), True),
+    ("False não atende ao valor 0", atende_condicao(False, 0), False),
+    ("True não atende a $in [1]", atende_condicao(True, {"$in": [1]}), False),
+    ("1 não atende a $in [True]", atende_condicao(1, {"$in": [True]}), False),
+    ("False atende ao valor False", atende_condicao(False, False), True),
+    ("True não atende a $gte 0", atende_condicao(True, {"$gte": 0}), False),
+    ("1 não é comparável com True", comparaveis(1, True), False),
+
+    # Tipos misturados nas comparações
+    ("int e float são comparáveis", comparaveis(5, 1.5), True),
+    ("5 atende a $gte 1.5", atende_condicao(5, {"$gte": 1.5}), True),
+    ("texto não atende a $gte número", atende_condicao("5", {"$gte": 1}), False),
+    ("texto não atende a $lt número", atende_condicao("5", {"$lt": 10}), False),
+    ("número não atende a $gte data", atende_condicao(1735689600, {"$gte": JANEIRO}), False),
+    ("data não atende a $lt número", atende_condicao(MARCO, {"$lt": 2000000000}), False),
+    ("campo ausente não atende a $lt", atende_condicao(None, {"$lt": 10}), False),
+    ("NaN não atende a $gte 0", atende_condicao(float("nan"), {"$gte": 0}), False),
+    ("data dentro da janela", atende_condicao(MARCO, {"$gte": JANEIRO, "$lt": JUNHO}), True),
+    ("limite $lt é exclusivo", atende_condicao(JUNHO, {"$gte": JANEIRO, "$lt": JUNHO}), False),
+    ("limite $gte é inclusivo", atende_condicao(JANEIRO, {"$gte": JANEIRO, "$lt": JUNHO}), True),
+
+    # Listas nos documentos e no $in
+    ("lista atende a $in com um dos itens", atende_condicao(["A", "B"], {"$in": ["B", "C"]}), True),
+    ("lista sem itens do $in", atende_condicao(["A", "B"], {"$in": ["C"]}), False),
+    ("lista vazia não atende a $in", atende_condicao([], {"$in": ["A"]}), False),
+    ("$in vazio não aceita nada", atende_condicao("A", {"$in": []}), False),
+    ("lista atende ao valor de um item", atende_condicao(["A", "B"], "A"), True),
+    ("lista atende à lista inteira", atende_condicao(["A", "B"], ["A", "B"]), True),
+    ("lista com ordem diferente", atende_condicao(["A", "B"], ["B", "A"]), False),
+    ("lista atende a $gte por algum item", atende_condicao([1, 20], {"$gte": 10}), True),
+    ("itens diferentes em $gte e $lt", atende_condicao([1, 20], {"$gte": 10, "$lt": 5}), True),
+    ("lista sem item comparável", atende_condicao(["x", None], {"$gte": 0}), False),
+    ("campo ausente atende a $in [None]", atende_condicao(None, {"$in": [None, "A"]}), True),
+    ("documento sem o campo", atende({"evento": "1"}, {"cancelada": False}), False),
+    ("documento com todos os campos", atende({"evento": "1", "cancelada": False},
+                                              {"evento": {"$in": ["1", "2"]}, "cancelada": False}), True),
+
+    # União das condições
+    ("valores iguais continuam um valor", unir_condicoes(["R", "R"]), "R"),
+    ("valores diferentes viram $in", unir_condicoes(["1", {"$in": ["2", "1"]}]), {"$in": ["1", "2"]}),
+    ("$in mantém True e 1 separados", unir_condicoes([{"$in": [1]}, True]), {"$in": [1, True]}),
+    ("janelas sobrepostas são alargadas",
+     unir_condicoes([{"$gte": JANEIRO, "$lt": JUNHO}, {"$gte": MARCO, "$lt": DEZEMBRO}]),
+     {"$gte": JANEIRO, "$lt": DEZEMBRO}),
+    ("janelas separadas cobrem o intervalo entre elas",
+     unir_condicoes([{"$gte": JANEIRO, "$lt": MARCO}, {"$gte": JUNHO, "$lt": DEZEMBRO}]),
+     {"$gte": JANEIRO, "$lt": DEZEMBRO}),
+    ("janela sem fim mantém apenas o início",
+     unir_condicoes([{"$gte": MARCO}, {"$gte": JANEIRO, "$lt": JUNHO}]), {"$gte": JANEIRO}),
+    ("janela sem início e sem fim não restringe",
+     unir_condicoes([{"$gte": MARCO}, {"$lt": JUNHO}]), None),
+    ("limites de tipos diferentes não são unidos",
+     unir_condicoes([{"$gte": JANEIRO}, {"$gte": 1735689600}]), None),
+    ("valor e intervalo não são unidos", unir_condicoes(["R", {"$gte": 1}]), None),
+    ("campo de apenas um filtro fica de fora",
+     unir_filtros([{"tipo": "R", "cancelada": False}, {"tipo": "R"}]), {"tipo": "R"}),
+]
+
+# Valores sorteados para os documentos e para os filtros (tipos misturados de propósito)
+VALORES = [None, True, False, 0, 1, 2, 1.5, "0", "1", "A", "B", JANEIRO, MARCO, JUNHO, DEZEMBRO]
+CAMPOS = ("evento", "data", "cancelada")
+
+def sortear_condicao(gerador):
+    """Sorteia a condição de um campo: um valor, um $in ou um intervalo."""
+    tipo = gerador.choice(("valor", "in", "intervalo"))
+    if tipo == "valor":
+        return gerador.choice(VALORES)
+    if tipo == "in":
+        return {"$in": gerador.sample(VALORES, gerador.randint(1, 3))}
+    inicio, fim = sorted(gerador.sample([JANEIRO, MARCO, JUNHO, DEZEMBRO], 2))
+    intervalo = {"$gte": inicio, "$lt": fim}
+    return {operador: limite for operador, limite in intervalo.items() if gerador.random() < 0.8} or intervalo
+
+def sortear_documento(gerador):
+    """Sorteia um documento; alguns campos ficam ausentes e alguns têm listas."""
+    documento = {}
+    for campo in CAMPOS:
+        sorteio = gerador.random()
+        if sorteio < 0.15:
+            continue
+        if sorteio < 0.3:
+            documento[campo] = gerador.sample(VALORES[1:], 2)
+        else:
+            documento[campo] = gerador.choice(VALORES)
+    return documento
+
+def verificar_uniao(sorteios, semente):
+    """
+    Verifica que o filtro unido aceita todo documento aceito por algum dos filtros.
+
+    Args:
+        sorteios: Número de conjuntos de filtros sorteados
+        semente: Semente do sorteio
+
+    Returns:
+        Lista de falhas (filtros, filtro unido e documento)
+    """
+    gerador = random.Random(semente)
+    falhas = []
+    for _ in range(sorteios):
+        filtros = [
+            {campo: sortear_condicao(gerador) for campo in CAMPOS if gerador.random() < 0.8}
+            for _ in range(gerador.randint(1, 3))
+        ]
+        unido = unir_filtros(filtros)
+        for _ in range(20):
+            documento = sortear_documento(gerador)
+            if any(atende(documento, filtro) for filtro in filtros) and not atende(documento, unido):
+                falhas.append((filtros, unido, documento))
+                break
+    return falhas
+
+def main(sorteios=2000, semente=42):
+    """
+    Executa os casos fixos e a verificação da união com filtros sorteados.
+
+    Returns:
+        Número de falhas
+    """
+    falhas = 0
+    for descricao, obtido, esperado in CASOS:
+        if obtido != esperado or type(obtido) is not type(esperado):
+            print(f"FALHA: {descricao}: obtido {obtido!r}, esperado {esperado!r}")
+            falhas += 1
+    print(f"Casos fixos: {len(CASOS) - falhas}/{len(CASOS)} corretos")
+
+    falhas_uniao = verificar_uniao(sorteios, semente)
+    for filtros, unido, documento in falhas_uniao[:5]:
+        print(f"FALHA: união {unido!r} de {filtros!r} recusa {documento!r}")
+    print(f"União de filtros: {sorteios - len(falhas_uniao)}/{sorteios} sorteios corretos")
+
+    return falhas + len(falhas_uniao)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verifica as regras de comparação e de união do registro de métricas")
+    parser.add_argument("--sorteios", type=int, default=2000, help="Conjuntos de filtros sorteados (padrão: 2000)")
+    parser.add_argument("--semente", type=int, default=42, help="Semente do sorteio (padrão: 42)")
+    args = parser.parse_args()
+
+    sys.exit(1 if main(args.sorteios, args.semente) else 0)
@@ -0,0 +1,20 @@
+"""
+Sistema de Extração de Dados do ERP - Dependências Opcionais
+Este módulo importa o NumPy, necessário apenas para a classificação em lote, a simulação, a
+segmentação ótima, a leitura colunar e as estimativas da amostra, de modo que o processamento
+dos clientes funcione sem ele e os recursos que o usam informem como instalá-lo.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def exigir_numpy(recurso):
+    """
+    Interrompe com uma mensagem clara se o NumPy não estiver instalado.
+
+    Args:
+        recurso: Recurso que precisa do NumPy (ex: "a leitura colunar")
+    """
+    if np is None:
+        raise ImportError(f"O NumPy é necessário para {recurso}. Instale com: pip install numpy")
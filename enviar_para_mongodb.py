@@ -1,17 +1,17 @@
 """
 Script para enviar os resultados de processamento para o MongoDB.
 Este script limpa a collection ClientInsight antes do primeiro envio e depois
-carrega todos os arquivos JSON de resultados para essa collection.
+carrega todos os arquivos de resultados (JSON, NDJSON ou BSON) para essa collection.
 """
 import os
-import json
-import glob
 from datetime import datetime
 from dotenv import load_dotenv
-from pymongo import MongoClient
-from bson import json_util
 import argparse
 
+from conexao import obter_banco
+from persistencia import ler_resultados, listar_arquivos_resultados, enviar_bson_upsert
+from selecao_metricas import campos_omitidos, remover_omitidos
+
 # Carrega as variáveis de ambiente
 load_dotenv()
 
@@ -25,10 +25,9 @@ def log(mensagem, nivel=0, sempre_mostrar=True):
     print(f"{indentacao}{mensagem}")
 
 def conectar_mongodb():
-    """Estabelece conexão com o MongoDB."""
+    """Estabelece conexão com o MongoDB, reutilizando o cliente compartilhado do processo."""
     try:
-        client = MongoClient(MONGODB_URI)
-        db = client[MONGODB_DATABASE]
+        db = obter_banco()
         log(f"Conexão estabelecida com o banco de dados: {MONGODB_DATABASE}")
         return db
     except Exception as e:
@@ -46,26 +45,30 @@ def limpar_collection(db, nome_collection):
 
 def enviar_arquivos_para_mongodb(db, diretorio_resultados, nome_collection):
     """
-    Envia todos os arquivos JSON de um diretório para uma collection do MongoDB.
+    Envia todos os arquivos de resultados de um diretório para uma collection do MongoDB.
     
     Args:
         db: Conexão com o banco de dados MongoDB
-        diretorio_resultados: Diretório que contém os arquivos JSON
+        diretorio_resultados: Diretório que contém os arquivos de resultados (JSON, NDJSON ou BSON)
         nome_collection: Nome da collection para onde enviar os dados
     """
     try:
         # Obtém a collection
         collection = db[nome_collection]
         
-        # Obtém todos os arquivos JSON no diretório de resultados
-        padrao_arquivos = os.path.join(diretorio_resultados, "*.json")
-        arquivos_json = glob.glob(padrao_arquivos)
+        # Obtém os arquivos de resultados do diretório (.json, .ndjson, .jsonl, .bson, com ou sem .gz);
+        # os demais arquivos de resultados/ (histórico de custos, esboços, perfis) não são resultados,
+        # e os resultados de amostras não são enviados para a collection
+        arquivos_json = [
+            arquivo for arquivo in listar_arquivos_resultados(diretorio_resultados, prefixo="resultado")
+            if not os.path.basename(arquivo).startswith("resultado_amostra_")
+        ]
         
         if not arquivos_json:
-            log(f"Nenhum arquivo JSON encontrado em {diretorio_resultados}")
+            log(f"Nenhum arquivo de resultados encontrado em {diretorio_resultados}")
             return
         
-        log(f"Encontrados {len(arquivos_json)} arquivos JSON para enviar")
+        log(f"Encontrados {len(arquivos_json)} arquivos de resultados para enviar")
         
         # Contador para acompanhar o progresso
         contador = 0
@@ -78,66 +81,48 @@ def enviar_arquivos_para_mongodb(db, diretorio_resultados, nome_collection):
             log(f"Processando arquivo: {nome_arquivo}", nivel=1)
             
             try:
-                # Carrega o conteúdo do arquivo JSON
-                with open(arquivo, "r", encoding="utf-8") as f:
-                    dados = json.load(f)
-                
-                # Verifica se os dados são uma lista ou um objeto individual
-                if isinstance(dados, list):
-                    # Trata dados como lista de objetos cliente
-                    for cliente in dados:
-                        if "codigo_cliente" not in cliente:
+                # Arquivos BSON são enviados em lote, sem decodificar os documentos
+                if arquivo.endswith((".bson", ".bson.gz")):
+                    inseridos, atualizados, ignorados = enviar_bson_upsert(
+                        collection, arquivo, nome_arquivo, campos_omitidos=campos_omitidos
+                    )
+                    documentos_inseridos += inseridos
+                    documentos_atualizados += atualizados
+                    if ignorados:
+                        log(f"Ignorados {ignorados} clientes sem código no arquivo {nome_arquivo}", nivel=2)
+                else:
+                    # Lê os clientes do arquivo um a um, sem carregar o arquivo inteiro
+                    for cliente in ler_resultados(arquivo):
+                        if not isinstance(cliente, dict) or "codigo_cliente" not in cliente:
                             log(f"Ignorando cliente sem código no arquivo {nome_arquivo}", nivel=2)
                             continue
-                            
+                        
+                        # Campos de métricas não calculadas (--metricas) não sobrescrevem os valores já gravados
+                        remover_omitidos(cliente)
+                        
                         # Adiciona metadados sobre o arquivo
                         cliente["_arquivo_origem"] = nome_arquivo
                         cliente["_data_importacao"] = datetime.now()
-                        
+                    
                         # Usa o código do cliente como chave para upsert
                         codigo_cliente = cliente["codigo_cliente"]
                         filtro = {"codigo_cliente": codigo_cliente}
-                        
+                    
                         # Insere ou atualiza o documento na collection
                         resultado = collection.update_one(
                             filtro, 
                             {"$set": cliente}, 
                             upsert=True
                         )
-                        
+                    
                         if resultado.upserted_id:
                             documentos_inseridos += 1
+                            log(f"Documento inserido para cliente {codigo_cliente}", nivel=2)
                         elif resultado.modified_count > 0:
                             documentos_atualizados += 1
-                else:
-                    # Trata como um único objeto cliente
-                    if "codigo_cliente" not in dados:
-                        log(f"Ignorando cliente sem código no arquivo {nome_arquivo}", nivel=2)
-                        continue
-                        
-                    # Adiciona metadados sobre o arquivo
-                    dados["_arquivo_origem"] = nome_arquivo
-                    dados["_data_importacao"] = datetime.now()
-                    
-                    # Usa o código do cliente como chave para upsert
-                    codigo_cliente = dados["codigo_cliente"]
-                    filtro = {"codigo_cliente": codigo_cliente}
-                    
-                    # Insere ou atualiza o documento na collection
-                    resultado = collection.update_one(
-                        filtro, 
-                        {"$set": dados}, 
-                        upsert=True
-                    )
-                    
-                    if resultado.upserted_id:
-                        documentos_inseridos += 1
-                        log(f"Documento inserido para cliente {codigo_cliente}", nivel=2)
-                    elif resultado.modified_count > 0:
-                        documentos_atualizados += 1
-                        log(f"Documento atualizado para cliente {codigo_cliente}", nivel=2)
-                    else:
-                        log(f"Nenhuma alteração para cliente {codigo_cliente}", nivel=2)
+                            log(f"Documento atualizado para cliente {codigo_cliente}", nivel=2)
+                        else:
+                            log(f"Nenhuma alteração para cliente {codigo_cliente}", nivel=2)
                 
             except Exception as e:
                 log(f"Erro ao processar arquivo {nome_arquivo}: {e}", nivel=2)
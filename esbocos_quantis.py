@@ -0,0 +1,335 @@
+"""
+Sistema de Extração de Dados do ERP - Esboços de Quantis
+Este módulo mantém esboços KLL (Karnin, Lang e Liberty) das métricas usadas na classificação,
+atualizados à medida que cada cliente é processado. Cada esboço ocupa memória limitada,
+independente do número de clientes, e pode ser mesclado com outros (uma thread ou processo por
+esboço), de modo que os percentis usados nas sugestões de faixas ficam disponíveis ao final da
+execução, sem uma segunda leitura dos resultados.
+
+Uso:
+    python esbocos_quantis.py                      # percentis dos esboços mais recentes
+    python esbocos_quantis.py resultados/esbocos_20250601_101500.json
+"""
+import os
+import sys
+import glob
+import json
+import math
+import random
+from datetime import datetime
+from dotenv import load_dotenv
+
+from classificacao.classificar import extrair_valores_classificacao
+
+# Carrega as variáveis de ambiente
+load_dotenv()
+
+# Coleta os esboços durante o processamento e grava um arquivo por execução
+COLETAR_ESBOCOS = os.getenv("COLETAR_ESBOCOS", "true").lower() == "true"
+
+# Tamanho do maior compactador (maior = mais preciso e mais memória; 200 erra ~1% no posto)
+TAMANHO_ESBOCOS = int(os.getenv("TAMANHO_ESBOCOS", "200"))
+
+# Fator de redução da capacidade de cada nível em relação ao nível acima
+FATOR_CAPACIDADE = 2 / 3
+
+# Métricas com esboço; apenas valores positivos são registrados, como nos scripts de análise
+METRICAS_ESBOCOS = ("faturamento_liquido", "total_pecas", "numero_marcas", "pontualidade")
+
+class EsbocoKLL:
+    """
+    Esboço KLL de quantis de uma sequência de números.
+
+    Os itens ficam em níveis (compactadores); um item do nível h representa 2**h itens
+    originais. Quando um nível enche, ele é ordenado e metade dos itens (os de posição par ou
+    ímpar, por sorteio) sobe para o nível seguinte.
+    """
+
+    def __init__(self, tamanho=TAMANHO_ESBOCOS, semente=None):
+        """
+        Args:
+            tamanho: Capacidade do nível mais alto (k)
+            semente: Semente do sorteio das compactações (opcional)
+        """
+        self.tamanho = tamanho
+        self.niveis = [[]]
+        self.contagem = 0
+        self.soma = 0.0
+        self.minimo = None
+        self.maximo = None
+        self._itens_guardados = 0
+        self._capacidade_total = self.capacidade_total()
+        self._aleatorio = random.Random(semente)
+
+    def capacidade(self, nivel):
+        """Capacidade de um nível: os níveis mais baixos guardam menos itens."""
+        profundidade = len(self.niveis) - nivel - 1
+        return int(math.ceil(self.tamanho * FATOR_CAPACIDADE ** profundidade)) + 1
+
+    def capacidade_total(self):
+        """Soma das capacidades de todos os níveis."""
+        return sum(self.capacidade(nivel) for nivel in range(len(self.niveis)))
+
+    def adicionar_nivel(self):
+        """Cria um nível acima dos existentes (as capacidades dos demais diminuem)."""
+        self.niveis.append([])
+        self._capacidade_total = self.capacidade_total()
+
+    def atualizar(self, valor):
+        """Registra um valor no esboço."""
+        valor = float(valor)
+        self.niveis[0].append(valor)
+        self._itens_guardados += 1
+        self.contagem += 1
+        self.soma += valor
+        if self.minimo is None or valor < self.minimo:
+            self.minimo = valor
+        if self.maximo is None or valor > self.maximo:
+            self.maximo = valor
+
+        if self._itens_guardados >= self._capacidade_total:
+            self.compactar()
+
+    def compactar(self):
+        """Compacta os níveis cheios até o esboço voltar a caber na capacidade total."""
+        nivel = 0
+        while self._itens_guardados >= self._capacidade_total and nivel < len(self.niveis):
+            itens = self.niveis[nivel]
+            if len(itens) >= self.capacidade(nivel):
+                if nivel + 1 == len(self.niveis):
+                    self.adicionar_nivel()
+
+                itens.sort()
+                # Com um número ímpar de itens, o menor permanece no nível
+                sobra = itens[:len(itens) % 2]
+                deslocamento = self._aleatorio.randint(0, 1)
+                promovidos = itens[len(sobra) + deslocamento::2]
+
+                self.niveis[nivel] = sobra
+                self.niveis[nivel + 1].extend(promovidos)
+                self._itens_guardados = sum(len(itens_nivel) for itens_nivel in self.niveis)
+            nivel += 1
+
+    def mesclar(self, outro):
+        """
+        Incorpora outro esboço (de outra thread, processo ou execução) a este.
+
+        Args:
+            outro: EsbocoKLL a ser mesclado
+        """
+        if outro.contagem == 0:
+            return
+
+        while len(self.niveis) < len(outro.niveis):
+            self.adicionar_nivel()
+        for nivel, itens in enumerate(outro.niveis):
+            self.niveis[nivel].extend(itens)
+
+        self.contagem += outro.contagem
+        self.soma += outro.soma
+        self.minimo = outro.minimo if self.minimo is None else min(self.minimo, outro.minimo)
+        self.maximo = outro.maximo if self.maximo is None else max(self.maximo, outro.maximo)
+        self._itens_guardados = sum(len(itens) for itens in self.niveis)
+
+        while self._itens_guardados >= self._capacidade_total:
+            antes = self._itens_guardados
+            self.compactar()
+            if self._itens_guardados == antes:
+                break
+
+    def itens_ponderados(self):
+        """Retorna os itens guardados, ordenados, com o peso (2**nível) de cada um."""
+        return sorted(
+            (valor, 2 ** nivel)
+            for nivel, itens in enumerate(self.niveis)
+            for valor in itens
+        )
+
+    def quantis(self, fracoes):
+        """
+        Estima vários quantis de uma vez.
+
+        Args:
+            fracoes: Lista de frações entre 0 e 1 (ex: 0.95 para o percentil 95)
+
+        Returns:
+            Lista de valores estimados, na ordem das frações (None se o esboço estiver vazio)
+        """
+        if self.contagem == 0:
+            return [None for _ in fracoes]
+
+        itens = self.itens_ponderados()
+        peso_total = sum(peso for _, peso in itens)
+        resultado = []
+        for fracao in fracoes:
+            if fracao <= 0:
+                resultado.append(self.minimo)
+                continue
+            if fracao >= 1:
+                resultado.append(self.maximo)
+                continue
+
+            alvo = fracao * peso_total
+            acumulado = 0
+            estimado = self.maximo
+            for valor, peso in itens:
+                acumulado += peso
+                if acumulado >= alvo:
+                    estimado = valor
+                    break
+            resultado.append(estimado)
+        return resultado
+
+    def quantil(self, fracao):
+        """Estima um quantil (fração entre 0 e 1)."""
+        return self.quantis([fracao])[0]
+
+    def media(self):
+        """Média exata dos valores registrados."""
+        return self.soma / self.contagem if self.contagem else None
+
+    def para_dict(self):
+        """Converte o esboço para um dicionário serializável em JSON."""
+        return {
+            "tamanho": self.tamanho,
+            "contagem": self.contagem,
+            "soma": self.soma,
+            "minimo": self.minimo,
+            "maximo": self.maximo,
+            "niveis": self.niveis
+        }
+
+    @classmethod
+    def de_dict(cls, dados):
+        """Reconstrói um esboço a partir de para_dict()."""
+        esboco = cls(tamanho=dados.get("tamanho", TAMANHO_ESBOCOS))
+        esboco.niveis = [list(itens) for itens in dados.get("niveis", [[]])] or [[]]
+        esboco.contagem = dados.get("contagem", 0)
+        esboco.soma = dados.get("soma", 0.0)
+        esboco.minimo = dados.get("minimo")
+        esboco.maximo = dados.get("maximo")
+        esboco._itens_guardados = sum(len(itens) for itens in esboco.niveis)
+        esboco._capacidade_total = esboco.capacidade_total()
+        return esboco
+
+def valores_para_esbocos(resultado):
+    """
+    Extrai de um resultado os valores de cada métrica com esboço.
+
+    Args:
+        resultado: Dicionário de resultados de um cliente
+
+    Returns:
+        Dicionário {métrica: valor}, apenas com os valores numéricos
+    """
+    (
+        faturamento_liquido,
+        _,
+        percentual_pagos_em_dia,
+        percentual_pagos_ate_7_dias,
+        total_pecas_liquido,
+        numero_marcas
+    ) = extrair_valores_classificacao(resultado)
+
+    valores = {
+        "faturamento_liquido": faturamento_liquido,
+        "total_pecas": total_pecas_liquido,
+        "numero_marcas": numero_marcas
+    }
+    if isinstance(percentual_pagos_em_dia, (int, float)) and isinstance(percentual_pagos_ate_7_dias, (int, float)):
+        # Pagamentos com até 7 dias de atraso contam como pontuais, como na classificação
+        valores["pontualidade"] = percentual_pagos_em_dia + percentual_pagos_ate_7_dias
+
+    return {
+        metrica: valor for metrica, valor in valores.items()
+        if isinstance(valor, (int, float)) and not isinstance(valor, bool)
+    }
+
+class ColetorEsbocos:
+    """
+    Conjunto de esboços das métricas de uma execução (um esboço por métrica).
+
+    Não é seguro entre threads: no processamento paralelo, cada thread usa o seu próprio
+    coletor, e os coletores são mesclados ao final.
+    """
+
+    def __init__(self, tamanho=TAMANHO_ESBOCOS):
+        self.esbocos = {metrica: EsbocoKLL(tamanho) for metrica in METRICAS_ESBOCOS}
+
+    def registrar(self, resultado):
+        """Registra os valores positivos de cada métrica de um cliente."""
+        try:
+            valores = valores_para_esbocos(resultado)
+        except Exception as e:
+            print(f"Erro ao registrar cliente nos esboços: {e}")
+            return
+
+        for metrica, valor in valores.items():
+            if valor > 0:
+                self.esbocos[metrica].atualizar(valor)
+
+    def mesclar(self, outro):
+        """Incorpora os esboços de outro coletor."""
+        for metrica, esboco in outro.esbocos.items():
+            self.esbocos.setdefault(metrica, EsbocoKLL(esboco.tamanho)).mesclar(esboco)
+
+    def para_dict(self):
+        """Converte os esboços para um dicionário serializável em JSON."""
+        return {metrica: esboco.para_dict() for metrica, esboco in self.esbocos.items()}
+
+    @classmethod
+    def de_dict(cls, dados):
+        """Reconstrói o coletor a partir de para_dict()."""
+        coletor = cls()
+        coletor.esbocos.update({metrica: EsbocoKLL.de_dict(esboco) for metrica, esboco in dados.items()})
+        return coletor
+
+def salvar_esbocos(coletor, caminho):
+    """
+    Grava os esboços de uma execução em JSON.
+
+    Args:
+        coletor: ColetorEsbocos da execução
+        caminho: Caminho do arquivo (ex: resultados/esbocos_20250601_101500.json)
+    """
+    diretorio = os.path.dirname(caminho)
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump({
+            "gerado_em": datetime.now().isoformat(timespec="seconds"),
+            "esbocos": coletor.para_dict()
+        }, f)
+
+def carregar_esbocos(caminho):
+    """Carrega os esboços gravados por salvar_esbocos."""
+    with open(caminho, "r", encoding="utf-8") as f:
+        return ColetorEsbocos.de_dict(json.load(f).get("esbocos", {}))
+
+def localizar_esbocos(diretorio="resultados"):
+    """Retorna o arquivo de esboços mais recente do diretório, ou None se não houver."""
+    arquivos = glob.glob(os.path.join(diretorio, "esbocos_*.json"))
+    return max(arquivos, key=os.path.getmtime) if arquivos else None
+
+def exibir_esbocos(coletor, percentis=(10, 25, 50, 75, 90, 95, 99)):
+    """Exibe a contagem, a média e os percentis de cada métrica."""
+    print(f"{'Métrica':<22}{'Clientes':>10}{'Média':>12}" + "".join(f"{'P' + str(p):>12}" for p in percentis))
+    for metrica, esboco in coletor.esbocos.items():
+        if esboco.contagem == 0:
+            print(f"{metrica:<22}{0:>10}")
+            continue
+        valores = esboco.quantis([p / 100 for p in percentis])
+        print(
+            f"{metrica:<22}{esboco.contagem:>10}{esboco.media():>12.2f}"
+            + "".join(f"{valor:>12.2f}" for valor in valores)
+        )
+
+if __name__ == "__main__":
+    caminho = sys.argv[1] if len(sys.argv) > 1 else localizar_esbocos()
+    if not caminho:
+        print("Nenhum arquivo de esboços encontrado em 'resultados'.")
+        sys.exit(1)
+
+    print(f"Esboços de '{caminho}':\n")
+    exibir_esbocos(carregar_esbocos(caminho))
@@ -0,0 +1,375 @@
+"""
+Sistema de Extração de Dados do ERP - Instrumentação das Consultas
+Este módulo registra um CommandListener do pymongo que atribui cada comando enviado ao MongoDB
+à consulta que o originou (faturamento, ciclos, títulos...) e ao lote em andamento. Para cada
+consulta e cada lote são acumulados o número de comandos, a latência (total, p50, p95 e p99),
+os documentos retornados e o tamanho das respostas, exibidos e salvos em JSON ao final da execução.
+"""
+import os
+import json
+import math
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from dotenv import load_dotenv
+import bson
+from pymongo import monitoring
+
+# Carrega as variáveis de ambiente
+load_dotenv()
+
+# Ativa a instrumentação dos comandos enviados ao MongoDB
+INSTRUMENTAR_CONSULTAS = os.getenv("INSTRUMENTAR_CONSULTAS", "false").lower() == "true"
+
+# Razão entre os limites de duas faixas consecutivas do histograma (erro máximo de 5% nos percentis)
+FATOR_HISTOGRAMA = 1.05
+
+# Menor latência representada no histograma (1 microssegundo)
+LATENCIA_MINIMA = 1e-6
+
+# Consulta e lote do comando em andamento; são lidos pelo listener na mesma thread da operação
+consulta_atual = ContextVar("consulta_atual", default="outros")
+lote_atual = ContextVar("lote_atual", default=None)
+
+# Tempo total gasto em cada consulta (ativado pelo perfil de um cliente, ver perfil.py)
+tempos_consultas = ContextVar("tempos_consultas", default=None)
+
+# Monitor do processo atual (recriado no processo filho após um fork)
+monitor_processo = None
+pid_monitor = None
+monitor_lock = threading.Lock()
+
+@contextmanager
+def marcar_consulta(nome_consulta):
+    """
+    Atribui à consulta informada todos os comandos executados dentro do bloco.
+
+    Quando há um registro de tempos ativo (perfil de um cliente), o tempo gasto no bloco
+    também é somado ao da consulta.
+
+    Args:
+        nome_consulta: Nome da consulta (ex: "faturamento")
+    """
+    token = consulta_atual.set(nome_consulta)
+    tempos = tempos_consultas.get()
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        consulta_atual.reset(token)
+        if tempos is not None:
+            tempos.registrar(nome_consulta, time.perf_counter() - inicio)
+
+@contextmanager
+def marcar_lote(nome_lote):
+    """
+    Atribui ao lote informado todos os comandos executados dentro do bloco.
+
+    Args:
+        nome_lote: Identificação do lote (ex: "lote 3" ou "grupo 2")
+    """
+    token = lote_atual.set(str(nome_lote))
+    try:
+        yield
+    finally:
+        lote_atual.reset(token)
+
+class HistogramaLatencia:
+    """
+    Histograma de latências em faixas de crescimento geométrico.
+
+    Ocupa memória proporcional ao número de faixas usadas, e não ao número de comandos, e pode
+    ser somado ao de outro processo. Os percentis são estimados pelo limite superior da faixa.
+    """
+
+    def __init__(self):
+        self.contagens = {}
+        self.total = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def registrar(self, segundos):
+        """
+        Registra uma latência.
+
+        Args:
+            segundos: Duração do comando em segundos
+        """
+        faixa = int(math.log(max(segundos, LATENCIA_MINIMA) / LATENCIA_MINIMA, FATOR_HISTOGRAMA))
+        self.contagens[faixa] = self.contagens.get(faixa, 0) + 1
+        self.total += 1
+        self.soma += segundos
+        self.maximo = max(self.maximo, segundos)
+
+    def percentil(self, percentual):
+        """
+        Estima um percentil das latências registradas.
+
+        Args:
+            percentual: Percentil desejado, de 0 a 100
+
+        Returns:
+            Latência em segundos (0 se não houver registros)
+        """
+        if self.total == 0:
+            return 0.0
+
+        posicao = math.ceil(self.total * percentual / 100)
+        acumulado = 0
+        for faixa in sorted(self.contagens):
+            acumulado += self.contagens[faixa]
+            if acumulado >= posicao:
+                return min(LATENCIA_MINIMA * FATOR_HISTOGRAMA ** (faixa + 1), self.maximo)
+        return self.maximo
+
+    def mesclar(self, outro):
+        """
+        Soma ao histograma os registros de outro histograma.
+
+        Args:
+            outro: HistogramaLatencia
+        """
+        for faixa, contagem in outro.contagens.items():
+            self.contagens[faixa] = self.contagens.get(faixa, 0) + contagem
+        self.total += outro.total
+        self.soma += outro.soma
+        self.maximo = max(self.maximo, outro.maximo)
+
+class EstatisticasComandos:
+    """Acumula os comandos de uma consulta (ou de um lote)."""
+
+    def __init__(self):
+        self.comandos = 0
+        self.falhas = 0
+        self.documentos_retornados = 0
+        self.bytes_resposta = 0
+        self.latencia = HistogramaLatencia()
+        self.por_comando = {}
+
+    def registrar(self, nome_comando, segundos, documentos=0, bytes_resposta=0, falhou=False):
+        """Registra um comando concluído (ou que falhou)."""
+        self.comandos += 1
+        self.falhas += 1 if falhou else 0
+        self.documentos_retornados += documentos
+        self.bytes_resposta += bytes_resposta
+        self.latencia.registrar(segundos)
+        self.por_comando[nome_comando] = self.por_comando.get(nome_comando, 0) + 1
+
+    def mesclar(self, outra):
+        """Soma às estatísticas as de outro processo."""
+        self.comandos += outra.comandos
+        self.falhas += outra.falhas
+        self.documentos_retornados += outra.documentos_retornados
+        self.bytes_resposta += outra.bytes_resposta
+        self.latencia.mesclar(outra.latencia)
+        for nome_comando, contagem in outra.por_comando.items():
+            self.por_comando[nome_comando] = self.por_comando.get(nome_comando, 0) + contagem
+
+    def resumo(self):
+        """
+        Retorna as estatísticas acumuladas.
+
+        Returns:
+            Dicionário com as contagens, as latências em milissegundos e os bytes das respostas
+        """
+        return {
+            "comandos": self.comandos,
+            "falhas": self.falhas,
+            "latencia_total_ms": self.latencia.soma * 1000,
+            "latencia_media_ms": (self.latencia.soma / self.comandos) * 1000 if self.comandos else 0.0,
+            "latencia_p50_ms": self.latencia.percentil(50) * 1000,
+            "latencia_p95_ms": self.latencia.percentil(95) * 1000,
+            "latencia_p99_ms": self.latencia.percentil(99) * 1000,
+            "latencia_maxima_ms": self.latencia.maximo * 1000,
+            "documentos_retornados": self.documentos_retornados,
+            "bytes_resposta": self.bytes_resposta,
+            "por_comando": dict(self.por_comando)
+        }
+
+def contar_documentos_resposta(resposta):
+    """
+    Conta os documentos retornados por um comando a partir da resposta do servidor.
+
+    Args:
+        resposta: Documento de resposta do comando
+
+    Returns:
+        Número de documentos do lote retornado (find, aggregate e getMore) ou 0
+    """
+    cursor = resposta.get("cursor") if isinstance(resposta, dict) else None
+    if not cursor:
+        return 0
+    return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+
+class MonitorComandos(monitoring.CommandListener):
+    """
+    CommandListener que acumula as estatísticas dos comandos por consulta e por lote.
+
+    Os eventos de início e de conclusão de um comando síncrono acontecem na thread que executou
+    a operação, então a consulta e o lote são lidos das ContextVars no início do comando.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._em_andamento = {}
+        self.por_consulta = {}
+        self.por_lote = {}
+
+    def started(self, event):
+        with self._lock:
+            self._em_andamento[(event.request_id, event.connection_id)] = (consulta_atual.get(), lote_atual.get())
+
+    def _concluir(self, event, documentos=0, bytes_resposta=0, falhou=False):
+        with self._lock:
+            consulta, lote = self._em_andamento.pop((event.request_id, event.connection_id), ("outros", None))
+            segundos = event.duration_micros / 1_000_000
+
+            self.por_consulta.setdefault(consulta, EstatisticasComandos()).registrar(
+                event.command_name, segundos, documentos, bytes_resposta, falhou
+            )
+            if lote is not None:
+                self.por_lote.setdefault(lote, EstatisticasComandos()).registrar(
+                    event.command_name, segundos, documentos, bytes_resposta, falhou
+                )
+
+    def succeeded(self, event):
+        try:
+            bytes_resposta = len(bson.encode(event.reply))
+        except Exception:
+            bytes_resposta = 0
+        self._concluir(event, contar_documentos_resposta(event.reply), bytes_resposta)
+
+    def failed(self, event):
+        self._concluir(event, falhou=True)
+
+    def coletar(self, zerar=False):
+        """
+        Retorna as estatísticas acumuladas, para mesclagem em outro processo.
+
+        Args:
+            zerar: Se True, zera as estatísticas após a coleta
+
+        Returns:
+            Tupla (por_consulta, por_lote) com dicionários de EstatisticasComandos
+        """
+        with self._lock:
+            coletado = (self.por_consulta, self.por_lote)
+            if zerar:
+                self.por_consulta = {}
+                self.por_lote = {}
+            return coletado
+
+    def mesclar(self, coletado):
+        """
+        Soma as estatísticas coletadas em outro processo.
+
+        Args:
+            coletado: Tupla retornada por coletar()
+        """
+        por_consulta, por_lote = coletado
+        with self._lock:
+            for destino, origem in ((self.por_consulta, por_consulta), (self.por_lote, por_lote)):
+                for nome, estatisticas in origem.items():
+                    destino.setdefault(nome, EstatisticasComandos()).mesclar(estatisticas)
+
+    def relatorio(self):
+        """
+        Monta o relatório por consulta e por lote.
+
+        Returns:
+            Dicionário com o relatório, com as consultas ordenadas pela latência total
+        """
+        with self._lock:
+            por_consulta = {nome: estatisticas.resumo() for nome, estatisticas in self.por_consulta.items()}
+            por_lote = {nome: estatisticas.resumo() for nome, estatisticas in self.por_lote.items()}
+
+        por_consulta = dict(sorted(por_consulta.items(), key=lambda item: item[1]["latencia_total_ms"], reverse=True))
+        latencia_total = sum(resumo["latencia_total_ms"] for resumo in por_consulta.values())
+        for resumo in por_consulta.values():
+            resumo["percentual_latencia"] = (resumo["latencia_total_ms"] / latencia_total) * 100 if latencia_total else 0.0
+
+        return {
+            "gerado_em": datetime.now().isoformat(timespec="seconds"),
+            "por_consulta": por_consulta,
+            "por_lote": por_lote
+        }
+
+def obter_monitor():
+    """
+    Retorna o monitor de comandos do processo, criando-o na primeira chamada.
+
+    Returns:
+        MonitorComandos
+    """
+    global monitor_processo, pid_monitor
+    with monitor_lock:
+        if monitor_processo is None or pid_monitor != os.getpid():
+            monitor_processo = MonitorComandos()
+            pid_monitor = os.getpid()
+        return monitor_processo
+
+def exibir_relatorio(relatorio):
+    """
+    Exibe o relatório de instrumentação no console.
+
+    Args:
+        relatorio: Dicionário retornado por MonitorComandos.relatorio()
+    """
+    if not relatorio["por_consulta"]:
+        return
+
+    print("\nComandos enviados ao MongoDB por consulta:")
+    print(f"{'Consulta':<24}{'Comandos':>10}{'Total (ms)':>13}{'%':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'Docs':>10}{'KB':>11}")
+    for nome, resumo in relatorio["por_consulta"].items():
+        print(
+            f"{nome:<24}"
+            f"{resumo['comandos']:>10}"
+            f"{resumo['latencia_total_ms']:>13.1f}"
+            f"{resumo['percentual_latencia']:>7.1f}"
+            f"{resumo['latencia_p50_ms']:>9.2f}"
+            f"{resumo['latencia_p95_ms']:>9.2f}"
+            f"{resumo['latencia_p99_ms']:>9.2f}"
+            f"{resumo['documentos_retornados']:>10}"
+            f"{resumo['bytes_resposta'] / 1024:>11.1f}"
+        )
+
+    if relatorio["por_lote"]:
+        print("\nComandos enviados ao MongoDB por lote:")
+        print(f"{'Lote':<24}{'Comandos':>10}{'Total (ms)':>13}{'p50':>9}{'p95':>9}{'p99':>9}{'Docs':>10}{'KB':>11}")
+        for nome, resumo in relatorio["por_lote"].items():
+            print(
+                f"{nome:<24}"
+                f"{resumo['comandos']:>10}"
+                f"{resumo['latencia_total_ms']:>13.1f}"
+                f"{resumo['latencia_p50_ms']:>9.2f}"
+                f"{resumo['latencia_p95_ms']:>9.2f}"
+                f"{resumo['latencia_p99_ms']:>9.2f}"
+                f"{resumo['documentos_retornados']:>10}"
+                f"{resumo['bytes_resposta'] / 1024:>11.1f}"
+            )
+
+def finalizar_instrumentacao(diretorio="resultados"):
+    """
+    Exibe o relatório de instrumentação e o salva em JSON, se a instrumentação estiver ativa.
+
+    Args:
+        diretorio: Pasta onde o relatório é salvo
+
+    Returns:
+        Caminho do relatório salvo, ou None se a instrumentação estiver desativada
+    """
+    if not INSTRUMENTAR_CONSULTAS:
+        return None
+
+    relatorio = obter_monitor().relatorio()
+    exibir_relatorio(relatorio)
+
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, f"instrumentacao_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    print(f"Relatório de instrumentação salvo em '{caminho}'")
+
+    return caminho
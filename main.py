@@ -8,19 +8,24 @@ import time
 import traceback
 from datetime import datetime
 import glob
+import argparse
+import threading
+import contextvars
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from pymongo import MongoClient
 from bson import json_util
 
 # Importa as consultas do pacote consultas
-from consultas.base import verificar_cliente_tem_movimentacao, obter_clientes_com_movimentacao
+from consultas.base import verificar_cliente_tem_movimentacao, obter_clientes_com_movimentacao, obter_contagem_movimentacao_por_cliente
 from consultas.faturamento import obter_faturamento_ultimos_12_meses
 from consultas.ciclos_compra import obter_ciclos_compra_ultimos_6_meses
 from consultas.pecas_compradas import obter_total_pecas_compradas
 from consultas.titulos_pagos import obter_titulos_pagos_em_dia
-from consultas.valor_por_marca import obter_valor_por_marca, obter_numero_marcas_diferentes
+from consultas.valor_por_marca import obter_valor_por_marca, obter_numero_marcas_diferentes, calcular_marcas_diferentes
 from consultas.data_primeira_compra import obter_data_primeira_compra
 from consultas.cliente import obter_codigo_cliente, obter_nome_completo
+from consultas.registro import planejar, executar_plano, exibir_plano as exibir_plano_consultas
 
 # Importa a funcionalidade de classificação
 from classificacao.classificar import classificar_cliente
@@ -28,6 +33,39 @@ from classificacao.classificar import classificar_cliente
 # Importa o módulo de envio para MongoDB
 import enviar_para_mongodb
 
+# Importa a gravação em streaming dos resultados
+from persistencia import abrir_escritor
+
+# Importa o cliente do MongoDB compartilhado pelo processo
+from conexao import obter_banco, exibir_estatisticas_pool
+
+# Importa o cache persistente das consultas
+from cache_consultas import obter_cache, calcular_marcador_cliente, exibir_estatisticas_cache
+
+# Importa a instrumentação dos comandos enviados ao MongoDB
+from instrumentacao import marcar_consulta, marcar_lote, finalizar_instrumentacao
+
+# Importa o perfil das consultas de um cliente (explain de cada comando)
+from perfil import perfilar_cliente, exibir_perfil, salvar_perfil
+
+# Importa os esboços de quantis das métricas (percentis para as sugestões de faixas)
+from esbocos_quantis import COLETAR_ESBOCOS, ColetorEsbocos, salvar_esbocos
+
+# Importa o agendamento por custo (histórico de tempo por cliente e estimativa de término)
+from agendamento import (
+    RegistroCustos, EstimadorTermino, carregar_historico_custos,
+    estimar_custos
+)
+
+# Importa a seleção das métricas calculadas (atualizações pontuais de algumas métricas)
+from selecao_metricas import (
+    METRICAS_SELECIONADAS, interpretar_metricas, validar_metricas_ambiente, selecao_completa,
+    marcar_omitidas, pode_classificar, omitir_classificacao
+)
+
+# Importa a amostragem estratificada (processamento de uma amostra para ajustar as faixas)
+from amostragem import AMOSTRA_CLIENTES, sortear_amostra, exibir_plano
+
 # Carrega as variáveis de ambiente
 load_dotenv()
 
@@ -39,13 +77,30 @@ MONGODB_DATABASE = os.getenv("MONGODB_DATABASE")
 CLIENTE_TESTE = os.getenv("CLIENTE_TESTE")
 PROCESSAR_TODOS = os.getenv("PROCESSAR_TODOS", "false").lower() == "true"
 TAMANHO_LOTE = int(os.getenv("TAMANHO_LOTE", "20"))
+PAUSA_ENTRE_LOTES = float(os.getenv("PAUSA_ENTRE_LOTES", "2"))
 USAR_CACHE = os.getenv("USAR_CACHE", "false").lower() == "true"
 USAR_PARALELO = os.getenv("USAR_PARALELO", "false").lower() == "true"
 NUM_THREADS = int(os.getenv("NUM_THREADS", "2"))
 
+# Executa as consultas de cada cliente ao mesmo tempo, em um pool de threads compartilhado
+CONSULTAS_CONCORRENTES = os.getenv("CONSULTAS_CONCORRENTES", "false").lower() == "true"
+MAX_CONSULTAS_POR_CLIENTE = int(os.getenv("MAX_CONSULTAS_POR_CLIENTE", "6"))
+
+# Calcula as métricas pelo plano de consultas (uma consulta por collection, por cliente ou por lote)
+PLANEJAR_CONSULTAS = os.getenv("PLANEJAR_CONSULTAS", "false").lower() == "true"
+
+# Formato dos arquivos de resultados ("json", "ndjson" ou "bson") e compressão gzip
+FORMATO_SAIDA = os.getenv("FORMATO_SAIDA", "json").lower()
+COMPRIMIR_SAIDA = os.getenv("COMPRIMIR_SAIDA", "false").lower() == "true"
+
 # Configuração de logs
 MOSTRAR_LOGS = os.getenv("MOSTRAR_LOGS", "true").lower() == "true"
 
+# Pool de threads das consultas concorrentes (criado no primeiro uso, um por processo)
+executor_consultas = None
+pid_executor_consultas = None
+executor_lock = threading.Lock()
+
 def log(mensagem, nivel=0, sempre_mostrar=False):
     """
     Função para exibir logs com base na configuração.
@@ -60,39 +115,25 @@ def log(mensagem, nivel=0, sempre_mostrar=False):
         print(f"{indentacao}{mensagem}")
 
 def conectar_mongodb():
-    """Estabelece conexão com o MongoDB."""
+    """Estabelece conexão com o MongoDB, usando o cliente compartilhado do processo."""
     try:
-        client = MongoClient(MONGODB_URI)
-        db = client[MONGODB_DATABASE]
+        db = obter_banco()
         log(f"Conexão estabelecida com o banco de dados: {MONGODB_DATABASE}", sempre_mostrar=True)
         return db
     except Exception as e:
         log(f"Erro ao conectar ao MongoDB: {e}", sempre_mostrar=True)
         return None
 
-def processar_cliente_individual(db, cliente_id, usar_cache=True):
+def criar_resultado_cliente(cliente):
     """
-    Processa um cliente individual, executando todas as consultas necessárias.
+    Cria o dicionário de resultados de um cliente, com os valores padrão de cada consulta.
     
     Args:
-        db: Conexão com o banco de dados MongoDB
-        cliente_id: ID do cliente a ser processado
-        usar_cache: Se True, usa cache para consultas já realizadas
+        cliente: Documento do cliente na collection geradores
         
     Returns:
-        Dicionário com todas as informações consolidadas do cliente
+        Dicionário de resultados do cliente
     """
-    if db is None:
-        return None
-        
-    # Obtém informações básicas do cliente
-    cliente = db.geradores.find_one({"_id": cliente_id})
-    if not cliente:
-        log(f"Cliente com ID {cliente_id} não encontrado.")
-        return None
-        
-    cod_cliente = cliente.get("cod_cliente")
-    nome_cliente = cliente.get("razao_social", "")
     data_cadastro_timestamp = cliente.get("data_cadastro")
     
     # Formata a data de cadastro se disponível
@@ -103,17 +144,10 @@ def processar_cliente_individual(db, cliente_id, usar_cache=True):
         except:
             pass
     
-    # VALIDAÇÃO CRÍTICA: Verifica se o cliente realmente tem movimentações
-    # Verifica se existem movimentações para este cliente
-    if not verificar_cliente_tem_movimentacao(db, cod_cliente):
-        log(f"  [AVISO] Cliente {cod_cliente} - {nome_cliente} não possui movimentações. Ignorando.", nivel=1)
-        return None
-    
-    # Inicializa o dicionário de resultados para o cliente
-    resultado_cliente = {
-        "id": cliente_id,
-        "codigo_cliente": cod_cliente,
-        "nome_completo": nome_cliente,
+    return {
+        "id": cliente.get("_id"),
+        "codigo_cliente": cliente.get("cod_cliente"),
+        "nome_completo": cliente.get("razao_social", ""),
         "data_cadastro": data_cadastro_formatada,
         "data_cadastro_timestamp": data_cadastro_timestamp,
         "data_primeira_compra": None,
@@ -163,10 +197,25 @@ def processar_cliente_individual(db, cliente_id, usar_cache=True):
         "numero_marcas_diferentes": 0,
         "lista_marcas": [],
     }
+
+def preencher_resultado_cliente(resultado_cliente, cliente, data_primeira_compra=None, faturamento=None, ciclos=None,
+                                pecas=None, pagamentos=None, valor_por_marca=None, marcas=None):
+    """
+    Preenche o resultado do cliente com o retorno de cada consulta.
     
+    É usada tanto pelo processamento síncrono quanto pelo assíncrono, de modo que os dois
+    produzem exatamente o mesmo documento.
+    
+    Args:
+        resultado_cliente: Dicionário criado por criar_resultado_cliente
+        cliente: Documento do cliente na collection geradores
+        data_primeira_compra, faturamento, ciclos, pecas, pagamentos, valor_por_marca, marcas:
+            Retorno de cada consulta (None quando a consulta não retornou dados)
+        
+    Returns:
+        O próprio dicionário de resultados, preenchido
+    """
     # Consulta 3: Data da primeira compra
-    log("Obtendo data da primeira compra...", nivel=2)
-    data_primeira_compra = obter_data_primeira_compra(db, cliente_id=cliente_id)
     if data_primeira_compra:
         resultado_cliente["data_primeira_compra"] = data_primeira_compra.get("data_formatada")
         resultado_cliente["data_primeira_compra_timestamp"] = data_primeira_compra.get("data")
@@ -183,8 +232,6 @@ def processar_cliente_individual(db, cliente_id, usar_cache=True):
                 pass
     
     # Consulta 4: Faturamento total nos últimos 12 meses
-    log("Calculando faturamento...", nivel=2)
-    faturamento = obter_faturamento_ultimos_12_meses(db, cliente_id=cliente_id)
     if faturamento:
         resultado_cliente["faturamento_ultimos_12_meses"] = {
             "total_vendas": faturamento.get("total_vendas", 0),
@@ -193,16 +240,12 @@ def processar_cliente_individual(db, cliente_id, usar_cache=True):
         }
     
     # Consulta 5: Número de ciclos em que comprou nos últimos 6 meses
-    log("Calculando ciclos de compra...", nivel=2)
-    ciclos = obter_ciclos_compra_ultimos_6_meses(db, cliente_id=cliente_id)
     if ciclos:
         resultado_cliente["ciclos_compra_ultimos_6_meses"] = ciclos.get("num_ciclos_6_meses", 0)
         resultado_cliente["ciclo_atual"] = ciclos.get("comprou_ciclo_atual", False)
         resultado_cliente["meses_compra"] = ciclos.get("meses_compra_6_meses", [])
     
     # Consulta 6: Número total de peças compradas
-    log("Calculando total de peças...", nivel=2)
-    pecas = obter_total_pecas_compradas(db, cliente_id=cliente_id)
     if pecas:
         resultado_cliente["total_pecas"] = {
             "compradas": pecas.get("total_bruto", 0),
@@ -211,38 +254,43 @@ def processar_cliente_individual(db, cliente_id, usar_cache=True):
         }
     
     # Consulta 7: Total de títulos pagos em dia
-    log("Calculando títulos pagos em dia...", nivel=2)
-    pagamentos = obter_titulos_pagos_em_dia(db, cliente_id=cliente_id)
-    
-    # Adiciona informações sobre limite de crédito
-    cliente_obj = db.geradores.find_one({"_id": cliente_id})
-    limite_credito = cliente_obj.get("limite_credito", 0) if cliente_obj else 0
-    
     if pagamentos:
         # Calcula o limite de crédito utilizado (total_a_vencer_valor + inadimplente_valor)
         limite_credito_utilizado = pagamentos.get("total_a_vencer_valor", 0) + pagamentos.get("inadimplente_valor", 0)
         
         resultado_cliente["titulos_pagos_em_dia"] = pagamentos
-        resultado_cliente["limite_credito"] = limite_credito
+        resultado_cliente["limite_credito"] = cliente.get("limite_credito", 0)
         resultado_cliente["limite_credito_utilizado"] = limite_credito_utilizado
     
     # Consulta 8: Valor total por marca
-    log("Calculando valor por marca...", nivel=2)
-    valor_por_marca = obter_valor_por_marca(db, cliente_id=cliente_id)
     if valor_por_marca:
         resultado_cliente["valor_por_marca"] = valor_por_marca
     
     # Consulta 9: Número de marcas diferentes
-    log("Calculando número de marcas diferentes...", nivel=2)
-    marcas = obter_numero_marcas_diferentes(db, cliente_id=cliente_id)
     if marcas:
         resultado_cliente["numero_marcas_diferentes"] = marcas.get("total_marcas", 0)
         resultado_cliente["lista_marcas"] = marcas.get("lista_marcas", [])
     
+    return resultado_cliente
+
+def classificar_resultado_cliente(resultado_cliente):
+    """
+    Classifica o cliente e adiciona a categoria e os detalhes da classificação ao resultado.
+    
+    Args:
+        resultado_cliente: Dicionário de resultados do cliente, já preenchido
+        
+    Returns:
+        O próprio dicionário de resultados, com a classificação
+    """
+    cod_cliente = resultado_cliente.get("codigo_cliente")
+    nome_cliente = resultado_cliente.get("nome_completo", "")
+    
     # NOVA FUNCIONALIDADE: Realiza a classificação do cliente
     log(f"  Classificando cliente {cod_cliente} - {nome_cliente}...", nivel=2)
     try:
-        resultado_classificacao = classificar_cliente(resultado_cliente)
+        with marcar_consulta("classificar_cliente"):
+            resultado_classificacao = classificar_cliente(resultado_cliente)
         
         # Adiciona a categoria diretamente ao nível principal do resultado
         resultado_cliente["categoria"] = resultado_classificacao["categoria"]
@@ -262,8 +310,252 @@ def processar_cliente_individual(db, cliente_id, usar_cache=True):
     
     return resultado_cliente
 
-def main():
-    """Função principal para processar clientes."""
+def obter_executor_consultas():
+    """
+    Retorna o pool de threads usado pelas consultas concorrentes, criando-o se necessário.
+    
+    O pool é compartilhado por todos os clientes do processo. Após um fork (modo de processos
+    do processamento paralelo) as threads do pai não existem no filho, então um novo pool é criado.
+    
+    Returns:
+        ThreadPoolExecutor com até MAX_CONSULTAS_POR_CLIENTE threads
+    """
+    global executor_consultas, pid_executor_consultas
+    with executor_lock:
+        if executor_consultas is None or pid_executor_consultas != os.getpid():
+            executor_consultas = ThreadPoolExecutor(
+                max_workers=MAX_CONSULTAS_POR_CLIENTE,
+                thread_name_prefix="consulta"
+            )
+            pid_executor_consultas = os.getpid()
+        return executor_consultas
+
+def consultar(cache, marcador, nome_consulta, cod_cliente, calcular):
+    """
+    Executa uma consulta, usando o cache quando ele estiver ativo.
+    
+    Args:
+        cache: CacheConsultas ou None para consultar sempre o banco
+        marcador: Marcador atual do cliente (ver cache_consultas.calcular_marcador_cliente)
+        nome_consulta: Nome da consulta no cache (ver cache_consultas.JANELAS_CONSULTAS)
+        cod_cliente: Código do cliente
+        calcular: Função sem argumentos que executa a consulta (ex: functools.partial)
+        
+    Returns:
+        Resultado da consulta
+    """
+    # Os comandos enviados ao banco são atribuídos à consulta na instrumentação
+    with marcar_consulta(nome_consulta):
+        if cache is None:
+            return calcular()
+        return cache.obter_ou_calcular(nome_consulta, cod_cliente, marcador, calcular)
+
+def executar_consultas_concorrentes(db, cod_cliente, cache=None, marcador=None, metricas=None):
+    """
+    Executa as consultas de um cliente ao mesmo tempo.
+    
+    As consultas são independentes entre si, então o tempo total passa a ser o da consulta
+    mais lenta em vez da soma de todas. O número de marcas é obtido do próprio valor por marca,
+    sem repetir as consultas de vendas e devoluções.
+    
+    Args:
+        db: Conexão com o banco de dados MongoDB
+        cod_cliente: Código do cliente
+        cache: CacheConsultas ou None para consultar sempre o banco
+        marcador: Marcador atual do cliente (usado apenas com cache)
+        metricas: Métricas a calcular (padrão: METRICAS_SELECIONADAS)
+        
+    Returns:
+        Dicionário com o retorno de cada consulta executada, nos mesmos nomes usados por preencher_resultado_cliente
+    """
+    if metricas is None:
+        metricas = METRICAS_SELECIONADAS
+    
+    executor = obter_executor_consultas()
+    consultas = {
+        "data_primeira_compra": obter_data_primeira_compra,
+        "faturamento": obter_faturamento_ultimos_12_meses,
+        "ciclos": obter_ciclos_compra_ultimos_6_meses,
+        "pecas": obter_total_pecas_compradas,
+        "pagamentos": obter_titulos_pagos_em_dia,
+        "valor_por_marca": obter_valor_por_marca
+    }
+    
+    # O número de marcas depende do valor por marca, que é consultado também quando só as marcas são pedidas
+    selecionadas = set(metricas) | ({"valor_por_marca"} if "marcas" in metricas else set())
+    
+    # O código do cliente já é conhecido, então cada consulta dispensa a busca em geradores.
+    # Cada tarefa roda em uma cópia do contexto atual, para manter o lote da instrumentação.
+    futuros = {
+        nome: executor.submit(
+            contextvars.copy_context().run,
+            consultar, cache, marcador, nome, cod_cliente, partial(funcao, db, cod_cliente=cod_cliente)
+        )
+        for nome, funcao in consultas.items()
+        if nome in selecionadas
+    }
+    
+    # Cada consulta já trata os próprios erros e retorna None (ou o resultado vazio)
+    retornos = {nome: futuro.result() for nome, futuro in futuros.items()}
+    
+    if "marcas" in metricas:
+        valor_por_marca = retornos["valor_por_marca"]
+        retornos["marcas"] = calcular_marcas_diferentes(cod_cliente, valor_por_marca) if valor_por_marca else None
+    
+    # O valor por marca consultado apenas para as marcas não conta como métrica calculada
+    return {nome: retornos[nome] for nome in metricas}
+
+# Consultas executadas uma a uma quando as consultas concorrentes estão desativadas, com a
+# mensagem de log de cada uma
+CONSULTAS_SEQUENCIAIS = (
+    ("data_primeira_compra", "Obtendo data da primeira compra...", obter_data_primeira_compra),
+    ("faturamento", "Calculando faturamento...", obter_faturamento_ultimos_12_meses),
+    ("ciclos", "Calculando ciclos de compra...", obter_ciclos_compra_ultimos_6_meses),
+    ("pecas", "Calculando total de peças...", obter_total_pecas_compradas),
+    ("pagamentos", "Calculando títulos pagos em dia...", obter_titulos_pagos_em_dia),
+    ("valor_por_marca", "Calculando valor por marca...", obter_valor_por_marca),
+    ("marcas", "Calculando número de marcas diferentes...", obter_numero_marcas_diferentes)
+)
+
+def executar_plano_cliente(db, cod_cliente, metricas, cache=None, marcador=None):
+    """
+    Calcula as métricas de um cliente pelo plano de consultas (ver consultas.registro).
+    
+    Com o cache, apenas as métricas que não estão nele entram no plano.
+    
+    Args:
+        db: Conexão com o banco de dados MongoDB
+        cod_cliente: Código do cliente
+        metricas: Métricas a calcular
+        cache: CacheConsultas ou None para consultar sempre o banco
+        marcador: Marcador atual do cliente (usado apenas com cache)
+        
+    Returns:
+        Dicionário com o retorno de cada métrica, nos mesmos nomes usados por preencher_resultado_cliente
+    """
+    retornos = {}
+    faltantes = []
+    for nome in metricas:
+        encontrado, valor = cache.obter(nome, cod_cliente, marcador) if cache is not None else (False, None)
+        if encontrado:
+            retornos[nome] = valor
+        else:
+            faltantes.append(nome)
+    
+    if faltantes:
+        with marcar_consulta("plano_consultas"):
+            calculados = executar_plano(db, planejar(faltantes), [cod_cliente])[cod_cliente]
+        for nome in faltantes:
+            valor = calculados[nome]
+            retornos[nome] = cache.guardar(nome, cod_cliente, marcador, valor) if cache is not None else valor
+    
+    return {nome: retornos[nome] for nome in metricas}
+
+def finalizar_resultado_cliente(resultado_cliente, metricas_calculadas):
+    """
+    Marca as métricas não calculadas e classifica o cliente quando a classificação tem todos os dados.
+    
+    Args:
+        resultado_cliente: Dicionário de resultados do cliente, já preenchido
+        metricas_calculadas: Métricas cujas consultas foram executadas
+        
+    Returns:
+        O próprio dicionário de resultados
+    """
+    marcar_omitidas(resultado_cliente, metricas_calculadas)
+    if not pode_classificar(metricas_calculadas):
+        log("Classificação omitida: nem todas as métricas usadas por ela foram calculadas.", nivel=2)
+        return omitir_classificacao(resultado_cliente)
+    return classificar_resultado_cliente(resultado_cliente)
+
+def processar_cliente_individual(db, cliente_id, usar_cache=None, metricas=None, retornos=None):
+    """
+    Processa um cliente individual, executando as consultas das métricas selecionadas.
+    
+    Args:
+        db: Conexão com o banco de dados MongoDB
+        cliente_id: ID do cliente a ser processado
+        usar_cache: Se True, usa o cache persistente das consultas (padrão: USAR_CACHE)
+        metricas: Métricas a calcular (padrão: METRICAS_SELECIONADAS, ver selecao_metricas); os
+            campos das demais ficam nulos e a classificação só é feita com todas as que ela usa
+        retornos: Retorno das métricas já calculado pelo plano de consultas do lote (dispensa
+            as consultas do cliente)
+        
+    Returns:
+        Dicionário com todas as informações consolidadas do cliente
+    """
+    if db is None:
+        return None
+    if metricas is None:
+        metricas = METRICAS_SELECIONADAS
+        
+    # Obtém informações básicas do cliente
+    with marcar_consulta("cliente"):
+        cliente = db.geradores.find_one({"_id": cliente_id})
+    if not cliente:
+        log(f"Cliente com ID {cliente_id} não encontrado.")
+        return None
+        
+    cod_cliente = cliente.get("cod_cliente")
+    nome_cliente = cliente.get("razao_social", "")
+    
+    # VALIDAÇÃO CRÍTICA: Verifica se o cliente realmente tem movimentações
+    # Verifica se existem movimentações para este cliente
+    with marcar_consulta("verificar_movimentacao"):
+        tem_movimentacao = verificar_cliente_tem_movimentacao(db, cod_cliente)
+    if not tem_movimentacao:
+        log(f"  [AVISO] Cliente {cod_cliente} - {nome_cliente} não possui movimentações. Ignorando.", nivel=1)
+        return None
+    
+    # Inicializa o dicionário de resultados para o cliente
+    resultado_cliente = criar_resultado_cliente(cliente)
+    
+    # Com o cache, as consultas só vão ao banco se os dados do cliente mudaram
+    cache = None
+    marcador = None
+    if usar_cache is None:
+        usar_cache = USAR_CACHE
+    if usar_cache and retornos is None:
+        cache = obter_cache()
+        with marcar_consulta("marcador_cache"):
+            marcador = calcular_marcador_cliente(db, cod_cliente)
+    
+    if retornos is not None:
+        # Métricas já calculadas pelo plano de consultas do lote
+        retornos = {nome: retornos.get(nome) for nome in metricas}
+    elif PLANEJAR_CONSULTAS:
+        # Uma consulta por collection para todas as métricas do cliente
+        log("Executando o plano de consultas...", nivel=2)
+        retornos = executar_plano_cliente(db, cod_cliente, metricas, cache=cache, marcador=marcador)
+    elif CONSULTAS_CONCORRENTES:
+        # Com as consultas concorrentes, todas são disparadas de uma vez no pool de threads
+        log("Executando as consultas concorrentemente...", nivel=2)
+        retornos = executar_consultas_concorrentes(db, cod_cliente, cache=cache, marcador=marcador, metricas=metricas)
+    else:
+        # Executa apenas as consultas das métricas selecionadas, na ordem habitual
+        retornos = {}
+        for nome, mensagem, funcao in CONSULTAS_SEQUENCIAIS:
+            if nome in metricas:
+                log(mensagem, nivel=2)
+                retornos[nome] = consultar(cache, marcador, nome, cod_cliente, partial(funcao, db, cliente_id=cliente_id))
+    
+    preencher_resultado_cliente(resultado_cliente, cliente, **retornos)
+    return finalizar_resultado_cliente(resultado_cliente, retornos)
+
+def main(perfil=False, metricas=None):
+    """
+    Função principal para processar clientes.
+    
+    Args:
+        perfil: Se True, o cliente de teste é processado com o perfil das consultas (explain
+            de cada comando e tempo gasto em Python), salvo ao lado do arquivo de resultado
+        metricas: Métricas a calcular (padrão: METRICAS_SELECIONADAS); com uma seleção parcial,
+            a collection ClientInsight não é limpa e cada cliente mantém os campos não calculados
+    """
+    if metricas is None:
+        metricas = METRICAS_SELECIONADAS
+    atualizacao_parcial = not selecao_completa(metricas)
+    
     try:
         # Conecta ao MongoDB
         db = conectar_mongodb()
@@ -272,6 +564,12 @@ def main():
             log("Não foi possível estabelecer conexão com o MongoDB.", sempre_mostrar=True)
             return
         
+        if atualizacao_parcial:
+            log(f"Calculando apenas as métricas: {', '.join(metricas)}", sempre_mostrar=True)
+        
+        if PLANEJAR_CONSULTAS and MOSTRAR_LOGS:
+            exibir_plano_consultas(planejar(metricas))
+        
         # Se processar todos, faz a consulta para todos os clientes
         if PROCESSAR_TODOS:
             log("Processando todos os clientes com movimentações...", sempre_mostrar=True)
@@ -286,18 +584,54 @@ def main():
                 total_clientes = len(clientes_com_movimentacao)
                 log(f"Total de clientes com movimentações: {total_clientes}", sempre_mostrar=True)
                 
+                # No modo de amostragem, processa apenas uma amostra estratificada pelo número de movimentações
+                contagem_movimentacao = {}
+                plano_amostra = None
+                if AMOSTRA_CLIENTES > 0:
+                    log("Contando movimentações por cliente para a amostragem estratificada...")
+                    contagem_movimentacao = obter_contagem_movimentacao_por_cliente(db)
+                    plano_amostra = sortear_amostra(clientes_com_movimentacao, contagem_movimentacao, AMOSTRA_CLIENTES)
+                    exibir_plano(plano_amostra)
+                    clientes_com_movimentacao = plano_amostra["codigos"]
+                    total_clientes = len(clientes_com_movimentacao)
+                
+                # Estima o custo de cada cliente pelo histórico (ou pelo número de movimentações)
+                historico_custos = carregar_historico_custos()
+                custos = estimar_custos(clientes_com_movimentacao, historico_custos, contagem_movimentacao)
+                registro_custos = RegistroCustos(historico_custos, contagem_movimentacao)
+                estimador = EstimadorTermino(custos)
+                
+                # Lotes de até TAMANHO_LOTE clientes, na ordem de leitura
+                lotes = [
+                    clientes_com_movimentacao[i:i+TAMANHO_LOTE]
+                    for i in range(0, total_clientes, TAMANHO_LOTE)
+                ]
+                
                 # Cria o diretório de resultados se não existir
                 os.makedirs("resultados", exist_ok=True)
                 os.makedirs("resultados/lotes", exist_ok=True)
                 
+                # Abre o arquivo de resultados completos, gravado cliente a cliente
+                timestamp_inicio = datetime.now().strftime("%Y%m%d_%H%M%S")
+                prefixo_arquivo = "resultado_amostra" if plano_amostra else "resultado_completo"
+                escritor_completo = abrir_escritor(
+                    f"resultados/{prefixo_arquivo}_{timestamp_inicio}",
+                    formato=FORMATO_SAIDA,
+                    comprimir=COMPRIMIR_SAIDA
+                )
+                
+                # Esboços de quantis das métricas, atualizados a cada cliente classificado; uma amostra
+                # não gera esboços, pois os seus percentis precisam dos pesos de cada cliente, e uma
+                # atualização parcial também não, pois as métricas omitidas ficariam sem valores
+                esbocos = ColetorEsbocos() if COLETAR_ESBOCOS and not plano_amostra and not atualizacao_parcial else None
+                
                 # Processa os clientes em lotes
-                resultados_totais = []
                 lote_atual = 1
                 primeiro_lote = True
+                processados_antes_do_lote = 0
                 
-                for i in range(0, total_clientes, TAMANHO_LOTE):
+                for codigos_clientes_lote in lotes:
                     # Define o lote atual
-                    codigos_clientes_lote = clientes_com_movimentacao[i:i+TAMANHO_LOTE]
                     total_no_lote = len(codigos_clientes_lote)
                     
                     log(f"Processando lote {lote_atual} ({total_no_lote} clientes)...", sempre_mostrar=True)
@@ -308,12 +642,23 @@ def main():
                     # Contador para acompanhar o progresso no lote
                     contador = 0
                     
+                    # Com o plano de consultas, as métricas de todo o lote saem de uma consulta por
+                    # collection; com o cache, o plano é executado por cliente, só para o que faltar
+                    retornos_lote = {}
+                    if PLANEJAR_CONSULTAS and not USAR_CACHE:
+                        try:
+                            with marcar_lote(f"lote {lote_atual}"), marcar_consulta("plano_consultas"):
+                                retornos_lote = executar_plano(db, planejar(metricas), codigos_clientes_lote)
+                        except Exception as e:
+                            log(f"Erro ao executar o plano de consultas do lote {lote_atual}: {e}", sempre_mostrar=True)
+                    
                     # Processa cada cliente no lote atual
                     for cod_cliente in codigos_clientes_lote:
                         # Busca informações completas do cliente pelo código
                         cliente = db.geradores.find_one({"cod_cliente": cod_cliente})
                         if not cliente:
                             log(f"Cliente com código {cod_cliente} não encontrado no banco.")
+                            estimador.concluir(cod_cliente)
                             contador += 1
                             continue
                             
@@ -322,74 +667,122 @@ def main():
                         
                         log(f"Processando cliente {contador+1}/{total_no_lote} do lote {lote_atual}: {cod_cliente} - {nome_cliente}")
                         
+                        inicio_cliente = time.time()
                         try:
-                            resultado = processar_cliente_individual(db, cliente_id, usar_cache=USAR_CACHE)
+                            with marcar_lote(f"lote {lote_atual}"):
+                                resultado = processar_cliente_individual(
+                                    db, cliente_id, usar_cache=USAR_CACHE, metricas=metricas,
+                                    retornos=retornos_lote.get(cod_cliente)
+                                )
                             if resultado:
+                                if plano_amostra:
+                                    resultado["amostra"] = plano_amostra["clientes"][cod_cliente]
                                 resultados_lote.append(resultado)
-                                resultados_totais.append(resultado)
+                                escritor_completo.escrever(resultado)
+                                if esbocos is not None:
+                                    esbocos.registrar(resultado)
+                                # O tempo de uma atualização parcial não representa o custo do cliente
+                                if not atualizacao_parcial:
+                                    registro_custos.registrar(
+                                        cod_cliente,
+                                        time.time() - inicio_cliente,
+                                        lancamentos=resultado.get("titulos_pagos_em_dia", {}).get("total_lancamentos")
+                                    )
                         except Exception as e:
                             log(f"Erro ao processar cliente {cod_cliente}: {e}")
                             log(traceback.format_exc())
                         
+                        estimador.concluir(cod_cliente)
                         contador += 1
                         
                         # Exibe progresso a cada 10 clientes
                         if contador % 10 == 0 or contador == total_no_lote:
                             percentual_lote = (contador / total_no_lote) * 100
-                            percentual_total = ((i + contador) / total_clientes) * 100
+                            processados_total = processados_antes_do_lote + contador
+                            percentual_total = (processados_total / total_clientes) * 100
                             log(f"Progresso: {contador}/{total_no_lote} clientes no lote ({percentual_lote:.1f}%) | " + 
-                                f"Total: {i+contador}/{total_clientes} ({percentual_total:.1f}%)", sempre_mostrar=True)
+                                f"Total: {processados_total}/{total_clientes} ({percentual_total:.1f}%) | " +
+                                estimador.descricao(), sempre_mostrar=True)
                     
-                    # Salva os resultados do lote atual em um arquivo JSON
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    nome_arquivo_lote = f"resultados/lotes/resultado_lote_{lote_atual}_{timestamp}.json"
+                    processados_antes_do_lote += total_no_lote
                     
-                    with open(nome_arquivo_lote, "w", encoding="utf-8") as f:
-                        json.dump(resultados_lote, f, default=json_util.default, ensure_ascii=False, indent=2)
+                    # Atualiza o histórico de custos a cada lote, para aproveitá-lo mesmo se a execução for interrompida
+                    try:
+                        registro_custos.salvar()
+                    except Exception as e:
+                        log(f"Erro ao salvar histórico de custos: {e}")
+                    
+                    # Salva os resultados do lote atual em arquivo
+                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                    with abrir_escritor(
+                        f"resultados/lotes/resultado_lote_{lote_atual}_{timestamp}",
+                        formato=FORMATO_SAIDA,
+                        comprimir=COMPRIMIR_SAIDA
+                    ) as escritor_lote:
+                        escritor_lote.escrever_varios(resultados_lote)
+                    nome_arquivo_lote = escritor_lote.caminho
                     
                     log(f"Resultados do lote {lote_atual} salvos em '{nome_arquivo_lote}'", sempre_mostrar=True)
                     log(f"Total de clientes processados no lote {lote_atual}: {len(resultados_lote)}", sempre_mostrar=True)
                     
-                    # Envia os resultados do lote para o MongoDB
-                    log(f"Enviando resultados do lote {lote_atual} para o MongoDB...", sempre_mostrar=True)
-                    diretorio_lote = os.path.dirname(nome_arquivo_lote)
-                    limpar_collection = primeiro_lote  # Limpa apenas no primeiro lote
-                    
-                    # Chama a função de envio para MongoDB e aguarda a conclusão
-                    envio_sucesso = enviar_para_mongodb.main(
-                        limpar_collection_antes=limpar_collection, 
-                        diretorio_resultados=diretorio_lote
-                    )
-                    
-                    if envio_sucesso:
-                        log(f"Lote {lote_atual} enviado com sucesso para o MongoDB.", sempre_mostrar=True)
+                    # A amostra serve apenas para a análise das faixas e não substitui a collection ClientInsight
+                    if plano_amostra:
+                        log(f"Lote {lote_atual} da amostra não enviado para o MongoDB.")
                     else:
-                        log(f"Erro ao enviar lote {lote_atual} para o MongoDB. Interrompendo processamento.", sempre_mostrar=True)
-                        # Se o envio falhar, interrompe o processamento
-                        break
+                        # Envia os resultados do lote para o MongoDB
+                        log(f"Enviando resultados do lote {lote_atual} para o MongoDB...", sempre_mostrar=True)
+                        diretorio_lote = os.path.dirname(nome_arquivo_lote)
+                        limpar_collection = primeiro_lote and not atualizacao_parcial  # Limpa apenas no primeiro lote de uma execução completa
+                        
+                        # Chama a função de envio para MongoDB e aguarda a conclusão
+                        with marcar_consulta("envio_clientinsight"):
+                            envio_sucesso = enviar_para_mongodb.main(
+                                limpar_collection_antes=limpar_collection, 
+                                diretorio_resultados=diretorio_lote
+                            )
+                        
+                        if envio_sucesso:
+                            log(f"Lote {lote_atual} enviado com sucesso para o MongoDB.", sempre_mostrar=True)
+                        else:
+                            log(f"Erro ao enviar lote {lote_atual} para o MongoDB. Interrompendo processamento.", sempre_mostrar=True)
+                            # Se o envio falhar, interrompe o processamento
+                            break
                     
                     # Incrementa o contador de lotes e marca que não é mais o primeiro lote
                     lote_atual += 1
                     primeiro_lote = False
                     
                     # Aguarda um momento antes de iniciar o próximo lote para não sobrecarregar o sistema
-                    log(f"Aguardando 2 segundos antes de iniciar o próximo lote...", sempre_mostrar=True)
-                    time.sleep(2)
-                
-                # Após processar todos os lotes, salva o resultado completo em um único arquivo
-                timestamp_final = datetime.now().strftime("%Y%m%d_%H%M%S")
-                nome_arquivo_completo = f"resultados/resultado_completo_{timestamp_final}.json"
+                    if PAUSA_ENTRE_LOTES > 0:
+                        log(f"Aguardando {PAUSA_ENTRE_LOTES:g} segundos antes de iniciar o próximo lote...", sempre_mostrar=True)
+                        time.sleep(PAUSA_ENTRE_LOTES)
                 
-                with open(nome_arquivo_completo, "w", encoding="utf-8") as f:
-                    json.dump(resultados_totais, f, default=json_util.default, ensure_ascii=False, indent=2)
+                # Após processar todos os lotes, finaliza o arquivo de resultados completos
+                escritor_completo.fechar()
+                nome_arquivo_completo = escritor_completo.caminho
                 
                 log(f"Resultados completos salvos em '{nome_arquivo_completo}'", sempre_mostrar=True)
-                log(f"Total de clientes processados: {len(resultados_totais)}", sempre_mostrar=True)
+                log(f"Total de clientes processados: {escritor_completo.total_escritos}", sempre_mostrar=True)
+                if plano_amostra and escritor_completo.total_escritos < len(plano_amostra["codigos"]):
+                    log(
+                        f"{len(plano_amostra['codigos']) - escritor_completo.total_escritos} clientes sorteados sem resultado; "
+                        "os pesos da amostra são recalculados na análise pelos clientes gravados de cada estrato.",
+                        sempre_mostrar=True
+                    )
+                
+                # Grava os esboços da execução, usados pelos scripts de análise de faixas
+                if esbocos is not None:
+                    try:
+                        nome_arquivo_esbocos = f"resultados/esbocos_{timestamp_inicio}.json"
+                        salvar_esbocos(esbocos, nome_arquivo_esbocos)
+                        log(f"Esboços de quantis salvos em '{nome_arquivo_esbocos}'", sempre_mostrar=True)
+                    except Exception as e:
+                        log(f"Erro ao salvar esboços de quantis: {e}", sempre_mostrar=True)
                 
                 # Apaga os arquivos de lotes temporários
                 try:
                     log("Removendo arquivos de lotes temporários...", sempre_mostrar=True)
-                    arquivos_lote = glob.glob(os.path.join("resultados/lotes", "resultado_lote_*.json"))
+                    arquivos_lote = glob.glob(os.path.join("resultados/lotes", "resultado_lote_*"))
                     contador_removidos = 0
                     
                     for arquivo in arquivos_lote:
@@ -419,7 +812,12 @@ def main():
                 
                 log(f"Processando cliente: {CLIENTE_TESTE} - {nome_cliente}", sempre_mostrar=True)
                 
-                resultado = processar_cliente_individual(db, cliente_id)
+                relatorio_perfil = None
+                if perfil:
+                    log("Perfil ativado: os comandos serão repetidos com explain ao final.", sempre_mostrar=True)
+                    resultado, relatorio_perfil = perfilar_cliente(partial(processar_cliente_individual, metricas=metricas), cliente_id)
+                else:
+                    resultado = processar_cliente_individual(db, cliente_id, metricas=metricas)
                 
                 if resultado:
                     # Gera um timestamp para o nome do arquivo
@@ -435,15 +833,23 @@ def main():
                     
                     log(f"Resultado salvo em '{nome_arquivo}'", sempre_mostrar=True)
                     
+                    # Salva o perfil ao lado do resultado, para ser anexado a chamados
+                    if relatorio_perfil:
+                        exibir_perfil(relatorio_perfil)
+                        nome_arquivo_perfil = f"resultados/perfil_{CLIENTE_TESTE}_{timestamp}.json"
+                        salvar_perfil(relatorio_perfil, nome_arquivo_perfil)
+                        log(f"Perfil salvo em '{nome_arquivo_perfil}'", sempre_mostrar=True)
+                    
                     # Exibe algumas informações para verificação
                     if MOSTRAR_LOGS and resultado:
-                        faturamento = resultado.get("faturamento_ultimos_12_meses", {}).get("faturamento_liquido", 0)
-                        ciclos = resultado.get("ciclos_compra_ultimos_6_meses", 0)
-                        total_pecas = resultado.get("total_pecas", {}).get("liquido", 0)
-                        marcas_diferentes = resultado.get("numero_marcas_diferentes", 0)
-                        lista_marcas = resultado.get("lista_marcas", [])
+                        faturamento = (resultado.get("faturamento_ultimos_12_meses") or {}).get("faturamento_liquido")
+                        ciclos = resultado.get("ciclos_compra_ultimos_6_meses")
+                        total_pecas = (resultado.get("total_pecas") or {}).get("liquido")
+                        marcas_diferentes = resultado.get("numero_marcas_diferentes")
+                        lista_marcas = resultado.get("lista_marcas") or []
                         
-                        log(f"  Faturamento últimos 12 meses: {faturamento:.2f}")
+                        # Métricas não calculadas (--metricas) aparecem como None
+                        log(f"  Faturamento últimos 12 meses: {faturamento:.2f}" if faturamento is not None else "  Faturamento últimos 12 meses: None")
                         log(f"  Ciclos de compra últimos 6 meses: {ciclos}")
                         log(f"  Total de peças compradas: {total_pecas}")
                         log(f"   Número de marcas diferentes: {marcas_diferentes}")
@@ -454,7 +860,7 @@ def main():
                     
                     # Chama a função de envio para MongoDB
                     envio_sucesso = enviar_para_mongodb.main(
-                        limpar_collection_antes=True, 
+                        limpar_collection_antes=not atualizacao_parcial, 
                         diretorio_resultados="resultados"
                     )
                     
@@ -474,13 +880,31 @@ def main():
         log(traceback.format_exc(), sempre_mostrar=True)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Processar e classificar os clientes do ERP")
+    parser.add_argument("--perfil", action="store_true",
+                        help="Gera o perfil das consultas do cliente de teste (CLIENTE_TESTE) com explain de cada comando")
+    parser.add_argument("--metricas", default=None,
+                        help="Métricas a calcular, separadas por vírgula (ex: faturamento,pecas); padrão: variável METRICAS ou todas")
+    args = parser.parse_args()
+    try:
+        metricas = interpretar_metricas(args.metricas) if args.metricas is not None else None
+    except ValueError as e:
+        parser.error(str(e))
+    if metricas is None:
+        validar_metricas_ambiente()
+    
     # Sempre mostra a hora de início, independente da configuração de log
     start_time = time.time()
     start_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"[INÍCIO] Processamento iniciado em: {start_datetime}")
     
     # Executa o processamento principal
-    main()
+    main(perfil=args.perfil, metricas=metricas)
+    
+    # Mostra o uso do pool de conexões compartilhado, do cache e dos comandos por consulta
+    exibir_estatisticas_pool()
+    exibir_estatisticas_cache()
+    finalizar_instrumentacao()
     
     # Sempre mostra a hora de término e o tempo total, independente da configuração de log
     end_time = time.time()
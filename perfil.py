@@ -0,0 +1,275 @@
+"""
+Sistema de Extração de Dados do ERP - Perfil de um Cliente
+Este módulo processa um único cliente registrando todos os comandos enviados ao MongoDB e, em
+seguida, executa cada um deles novamente com explain("executionStats"). O relatório mostra, por
+comando, o plano vencedor, as chaves e documentos examinados em relação aos retornados, as etapas
+de ordenação e o tempo no servidor, além do tempo gasto em Python em cada consulta e na classificação.
+"""
+import json
+import time
+import threading
+from datetime import datetime
+from bson import SON, json_util
+from pymongo import MongoClient, monitoring
+
+from conexao import MONGODB_URI, MONGODB_DATABASE, opcoes_cliente
+from instrumentacao import consulta_atual, tempos_consultas, contar_documentos_resposta
+
+# Comandos que aceitam explain; os demais (getMore, por exemplo) aparecem só no tempo de banco
+COMANDOS_EXPLICAVEIS = ("find", "aggregate", "count", "distinct")
+
+# Campos adicionados pelo driver que não fazem parte do comando original
+CAMPOS_DO_DRIVER = ("lsid", "$db", "$clusterTime", "$readPreference", "txnNumber", "$audit", "apiVersion")
+
+class RegistroTempos:
+    """Soma o tempo total gasto em cada consulta (ver instrumentacao.marcar_consulta)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.segundos = {}
+
+    def registrar(self, nome_consulta, segundos):
+        with self._lock:
+            self.segundos[nome_consulta] = self.segundos.get(nome_consulta, 0.0) + segundos
+
+class CapturaComandos(monitoring.CommandListener):
+    """CommandListener que guarda cada comando enviado, com a consulta que o originou."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._em_andamento = {}
+        self.comandos = []
+
+    def started(self, event):
+        comando = SON((chave, valor) for chave, valor in event.command.items() if chave not in CAMPOS_DO_DRIVER)
+        with self._lock:
+            self._em_andamento[(event.request_id, event.connection_id)] = {
+                "consulta": consulta_atual.get(),
+                "comando": event.command_name,
+                "documento": comando
+            }
+
+    def succeeded(self, event):
+        with self._lock:
+            registro = self._em_andamento.pop((event.request_id, event.connection_id), None)
+            if registro is not None:
+                registro["segundos"] = event.duration_micros / 1_000_000
+                registro["documentos_retornados"] = contar_documentos_resposta(event.reply)
+                self.comandos.append(registro)
+
+    def failed(self, event):
+        with self._lock:
+            registro = self._em_andamento.pop((event.request_id, event.connection_id), None)
+            if registro is not None:
+                registro["segundos"] = event.duration_micros / 1_000_000
+                registro["erro"] = str(event.failure)
+                self.comandos.append(registro)
+
+def localizar_execution_stats(explain):
+    """
+    Localiza o bloco com queryPlanner e executionStats em um resultado de explain.
+
+    No explain de um aggregate, os dados do plano podem ficar dentro da primeira etapa
+    ($cursor) em vez de no nível principal.
+
+    Args:
+        explain: Documento retornado pelo comando explain
+
+    Returns:
+        Dicionário com queryPlanner e executionStats, ou None
+    """
+    if not isinstance(explain, dict):
+        return None
+    if "executionStats" in explain:
+        return explain
+    for etapa in explain.get("stages", []):
+        cursor = etapa.get("$cursor") if isinstance(etapa, dict) else None
+        if cursor and "executionStats" in cursor:
+            return cursor
+    return None
+
+def resumir_plano(plano):
+    """
+    Resume um plano de execução como a cadeia de etapas, da raiz às folhas.
+
+    Args:
+        plano: winningPlan do queryPlanner
+
+    Returns:
+        Tupla (lista de etapas como "IXSCAN {indice}", lista de índices usados)
+    """
+    etapas = []
+    indices = []
+    pendentes = [plano] if plano else []
+
+    while pendentes:
+        etapa = pendentes.pop(0)
+        # Planos do mecanismo SBE trazem o plano clássico em queryPlan
+        etapa = etapa.get("queryPlan", etapa)
+        nome = etapa.get("stage", "?")
+        if etapa.get("indexName"):
+            etapas.append(f"{nome} {etapa['indexName']}")
+            indices.append(etapa["indexName"])
+        else:
+            etapas.append(nome)
+
+        if etapa.get("inputStage"):
+            pendentes.append(etapa["inputStage"])
+        pendentes.extend(etapa.get("inputStages", []))
+
+    return etapas, indices
+
+def explicar_comando(db, registro):
+    """
+    Executa um comando registrado novamente com explain("executionStats").
+
+    Args:
+        db: Banco de dados onde o comando foi executado
+        registro: Comando registrado por CapturaComandos
+
+    Returns:
+        Dicionário com o plano vencedor, as contagens examinadas e retornadas e o tempo no servidor
+    """
+    resumo = {
+        "consulta": registro["consulta"],
+        "comando": registro["comando"],
+        "filtro": registro["documento"].get("filter", registro["documento"].get("query", registro["documento"].get("pipeline"))),
+        "tempo_cliente_ms": registro.get("segundos", 0) * 1000,
+        "documentos_retornados": registro.get("documentos_retornados", 0)
+    }
+    if registro.get("erro"):
+        resumo["erro"] = registro["erro"]
+        return resumo
+
+    if registro["comando"] not in COMANDOS_EXPLICAVEIS:
+        return resumo
+
+    try:
+        explain = db.command(SON([("explain", registro["documento"]), ("verbosity", "executionStats")]))
+    except Exception as e:
+        resumo["erro_explain"] = str(e)
+        return resumo
+
+    dados_plano = localizar_execution_stats(explain)
+    if dados_plano is None:
+        resumo["erro_explain"] = "explain sem executionStats"
+        return resumo
+
+    estatisticas = dados_plano["executionStats"]
+    etapas, indices = resumir_plano(dados_plano.get("queryPlanner", {}).get("winningPlan"))
+
+    chaves_examinadas = estatisticas.get("totalKeysExamined", 0)
+    documentos_examinados = estatisticas.get("totalDocsExamined", 0)
+    retornados = estatisticas.get("nReturned", 0)
+
+    resumo.update({
+        "plano_vencedor": etapas,
+        "indices": indices,
+        "varredura_colecao": "COLLSCAN" in etapas,
+        "etapas_ordenacao": [etapa for etapa in etapas if etapa.startswith("SORT")],
+        "chaves_examinadas": chaves_examinadas,
+        "documentos_examinados": documentos_examinados,
+        "retornados_explain": retornados,
+        "examinados_por_retornado": documentos_examinados / retornados if retornados else float(documentos_examinados),
+        "tempo_servidor_ms": estatisticas.get("executionTimeMillis", 0)
+    })
+    return resumo
+
+def perfilar_cliente(processar_cliente, cliente_id):
+    """
+    Processa um cliente registrando os comandos e os tempos de cada consulta.
+
+    O processamento usa uma conexão própria, com o listener de captura, e não usa o cache
+    de consultas, para que todos os comandos sejam de fato enviados ao banco.
+
+    Args:
+        processar_cliente: Função de processamento (main.processar_cliente_individual)
+        cliente_id: ID do cliente na collection geradores
+
+    Returns:
+        Tupla (resultado do cliente, relatório do perfil)
+    """
+    captura = CapturaComandos()
+    client = MongoClient(MONGODB_URI, event_listeners=[captura], **opcoes_cliente())
+    db = client[MONGODB_DATABASE]
+
+    tempos = RegistroTempos()
+    token = tempos_consultas.set(tempos)
+    inicio = time.perf_counter()
+    try:
+        resultado = processar_cliente(db, cliente_id, usar_cache=False)
+    finally:
+        tempo_total = time.perf_counter() - inicio
+        tempos_consultas.reset(token)
+
+    # Os explains são executados depois, para não interferirem nos tempos medidos
+    comandos = [explicar_comando(db, registro) for registro in captura.comandos]
+    client.close()
+
+    # Tempo em Python = tempo total da consulta menos o tempo esperando o banco
+    tempo_banco = {}
+    for comando in comandos:
+        tempo_banco[comando["consulta"]] = tempo_banco.get(comando["consulta"], 0.0) + comando["tempo_cliente_ms"] / 1000
+
+    por_consulta = {}
+    for nome, segundos in sorted(tempos.segundos.items(), key=lambda item: item[1], reverse=True):
+        por_consulta[nome] = {
+            "tempo_total_ms": segundos * 1000,
+            "tempo_banco_ms": tempo_banco.get(nome, 0.0) * 1000,
+            "tempo_python_ms": max(0.0, segundos - tempo_banco.get(nome, 0.0)) * 1000,
+            "comandos": sum(1 for comando in comandos if comando["consulta"] == nome)
+        }
+
+    relatorio = {
+        "cliente_id": cliente_id,
+        "codigo_cliente": resultado.get("codigo_cliente") if resultado else None,
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "tempo_total_ms": tempo_total * 1000,
+        "por_consulta": por_consulta,
+        "comandos": comandos
+    }
+    return resultado, relatorio
+
+def exibir_perfil(relatorio):
+    """
+    Exibe o relatório do perfil de um cliente no console.
+
+    Args:
+        relatorio: Dicionário retornado por perfilar_cliente
+    """
+    print(f"\nPerfil do cliente {relatorio['codigo_cliente']} ({relatorio['tempo_total_ms']:.1f} ms no total):")
+    print(f"{'Consulta':<24}{'Total (ms)':>12}{'Banco (ms)':>12}{'Python (ms)':>13}{'Comandos':>10}")
+    for nome, tempos in relatorio["por_consulta"].items():
+        print(
+            f"{nome:<24}"
+            f"{tempos['tempo_total_ms']:>12.1f}"
+            f"{tempos['tempo_banco_ms']:>12.1f}"
+            f"{tempos['tempo_python_ms']:>13.1f}"
+            f"{tempos['comandos']:>10}"
+        )
+
+    print(f"\n{'Consulta':<24}{'Comando':<11}{'Plano vencedor':<40}{'Chaves':>9}{'Docs':>9}{'Retorn.':>9}{'ms':>7}")
+    for comando in relatorio["comandos"]:
+        if "plano_vencedor" not in comando:
+            continue
+        plano = " <- ".join(comando["plano_vencedor"])
+        print(
+            f"{comando['consulta']:<24}"
+            f"{comando['comando']:<11}"
+            f"{plano[:39]:<40}"
+            f"{comando['chaves_examinadas']:>9}"
+            f"{comando['documentos_examinados']:>9}"
+            f"{comando['retornados_explain']:>9}"
+            f"{comando['tempo_servidor_ms']:>7}"
+        )
+
+def salvar_perfil(relatorio, caminho):
+    """
+    Salva o relatório do perfil em JSON.
+
+    Args:
+        relatorio: Dicionário retornado por perfilar_cliente
+        caminho: Caminho do arquivo (ex: resultados/perfil_<cliente>_<data>.json)
+    """
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, default=json_util.default, ensure_ascii=False, indent=2)
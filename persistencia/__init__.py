@@ -0,0 +1,22 @@
+"""
+Pacote de persistência dos resultados do sistema ClientInsight.
+Este pacote contém os escritores e leitores de arquivos de resultados usados pelo processamento e pelas análises.
+"""
+
+from .resultados import (
+    FORMATOS_SAIDA,
+    EscritorResultados,
+    abrir_escritor,
+    extensao_arquivo,
+    ler_resultados,
+    listar_arquivos_resultados,
+)
+from .bson_arquivo import EscritorBSON, ler_bson, enviar_bson_upsert
+from .colunas import carregar_colunas, ler_colunas
+from .checkpoints import (
+    abrir_checkpoint,
+    listar_checkpoints,
+    ler_checkpoint,
+    mesclar_checkpoints,
+    remover_checkpoints,
+)
@@ -0,0 +1,170 @@
+"""
+Arquivos de resultados em BSON.
+
+O arquivo é uma sequência de documentos BSON concatenados (cada um começa com o seu
+tamanho em 4 bytes), o mesmo formato gerado pelo mongodump. Isso permite restaurar os
+resultados com mongorestore e enviá-los ao MongoDB sem decodificar os documentos em Python.
+"""
+import gzip
+from datetime import datetime
+import bson
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pymongo import UpdateOne
+
+# Opções para ler os documentos sem decodificá-los
+CODEC_BRUTO = CodecOptions(document_class=RawBSONDocument)
+
+# Número de documentos enviados por chamada ao MongoDB
+TAMANHO_LOTE_ENVIO = 1000
+
+def _abrir_binario(caminho, modo):
+    """Abre um arquivo binário, usando gzip quando a extensão for .gz."""
+    if caminho.endswith(".gz"):
+        return gzip.open(caminho, modo + "b")
+    return open(caminho, modo + "b")
+
+class EscritorBSON:
+    """
+    Grava resultados de clientes em um arquivo BSON, um documento por cliente.
+
+    Tem a mesma interface de EscritorResultados, de modo que pode ser usado no lugar dele.
+    """
+
+    def __init__(self, caminho, comprimir=None, descarregar_a_cada=1):
+        """
+        Args:
+            caminho: Caminho do arquivo de saída
+            comprimir: Se True, grava com gzip. Se None, decide pela extensão do caminho
+            descarregar_a_cada: Número de clientes entre chamadas de flush no arquivo
+        """
+        if comprimir and not caminho.endswith(".gz"):
+            caminho += ".gz"
+
+        self.caminho = caminho
+        self.formato = "bson"
+        self.descarregar_a_cada = max(1, int(descarregar_a_cada))
+        self.total_escritos = 0
+        self._arquivo = _abrir_binario(caminho, "w")
+
+    def escrever(self, resultado):
+        """
+        Grava o resultado de um cliente no arquivo.
+
+        Args:
+            resultado: Dicionário (ou RawBSONDocument) com o resultado do cliente
+        """
+        if isinstance(resultado, RawBSONDocument):
+            self._arquivo.write(resultado.raw)
+        else:
+            self._arquivo.write(bson.encode(resultado))
+
+        self.total_escritos += 1
+
+        if self.total_escritos % self.descarregar_a_cada == 0:
+            self._arquivo.flush()
+
+    def escrever_varios(self, resultados):
+        """
+        Grava vários resultados no arquivo.
+
+        Args:
+            resultados: Iterável com os resultados dos clientes
+        """
+        for resultado in resultados:
+            self.escrever(resultado)
+
+    def fechar(self):
+        """Fecha o arquivo."""
+        if self._arquivo is None:
+            return
+
+        self._arquivo.close()
+        self._arquivo = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_excecao, excecao, rastreamento):
+        self.fechar()
+        return False
+
+def ler_bson(caminho, brutos=False):
+    """
+    Lê um arquivo BSON de forma preguiçosa, retornando um documento por vez.
+
+    Args:
+        caminho: Caminho do arquivo .bson (ou .bson.gz)
+        brutos: Se True, retorna RawBSONDocument, sem decodificar os documentos
+
+    Returns:
+        Gerador de documentos
+    """
+    opcoes = CODEC_BRUTO if brutos else bson.DEFAULT_CODEC_OPTIONS
+
+    with _abrir_binario(caminho, "r") as arquivo:
+        yield from bson.decode_file_iter(arquivo, codec_options=opcoes)
+
+def _operacao_upsert(documento, nome_arquivo, data_importacao):
+    """
+    Monta o upsert de um documento bruto, equivalente a update_one({"$set": documento}, upsert=True).
+
+    O documento é inserido no pipeline de atualização como literal, então o driver
+    envia os bytes originais sem precisar decodificá-los.
+    """
+    return UpdateOne(
+        {"codigo_cliente": documento["codigo_cliente"]},
+        [{"$replaceWith": {"$mergeObjects": [
+            "$$ROOT",
+            {"$literal": documento},
+            {"_arquivo_origem": nome_arquivo, "_data_importacao": data_importacao}
+        ]}}],
+        upsert=True
+    )
+
+def enviar_bson_upsert(collection, caminho, nome_arquivo, tamanho_lote=TAMANHO_LOTE_ENVIO, campos_omitidos=None):
+    """
+    Envia um arquivo BSON para a collection usando upserts em lote pelo código do cliente.
+
+    Args:
+        collection: Collection de destino
+        caminho: Caminho do arquivo .bson
+        nome_arquivo: Nome gravado no campo _arquivo_origem
+        tamanho_lote: Número de documentos por chamada de bulk_write
+        campos_omitidos: Função opcional que recebe o documento bruto e retorna os campos que não
+            devem ser enviados; apenas os documentos com campos a retirar são decodificados
+
+    Returns:
+        Tupla (documentos_inseridos, documentos_atualizados, documentos_ignorados)
+    """
+    inseridos = 0
+    atualizados = 0
+    ignorados = 0
+    data_importacao = datetime.now()
+    operacoes = []
+
+    def enviar_operacoes():
+        nonlocal inseridos, atualizados
+        resultado = collection.bulk_write(operacoes, ordered=False)
+        inseridos += resultado.upserted_count
+        atualizados += resultado.modified_count
+        operacoes.clear()
+
+    for documento in ler_bson(caminho, brutos=True):
+        # Apenas o campo codigo_cliente é decodificado para montar o filtro
+        if "codigo_cliente" not in documento:
+            ignorados += 1
+            continue
+
+        campos = campos_omitidos(documento) if campos_omitidos else None
+        if campos:
+            documento = {chave: valor for chave, valor in bson.decode(documento.raw).items() if chave not in campos}
+
+        operacoes.append(_operacao_upsert(documento, nome_arquivo, data_importacao))
+        if len(operacoes) >= tamanho_lote:
+            enviar_operacoes()
+
+    if operacoes:
+        enviar_operacoes()
+
+    return inseridos, atualizados, ignorados
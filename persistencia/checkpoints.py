@@ -0,0 +1,165 @@
+"""
+Checkpoints dos grupos do processamento paralelo.
+
+Cada grupo (thread) grava os seus resultados em um arquivo NDJSON próprio, aberto em modo
+de acréscimo e descarregado a cada cliente. Como nenhum arquivo é compartilhado, não é
+preciso lock, e cada cliente é gravado uma única vez, em vez de a lista do grupo inteira ser
+reescrita periodicamente. No final, os checkpoints são mesclados em streaming no arquivo de
+resultados completos.
+"""
+import os
+import glob
+import json
+from bson import json_util
+
+from .resultados import EscritorResultados
+
+# Prefixo dos arquivos de checkpoint na pasta temporária
+PREFIXO_CHECKPOINT = "checkpoint"
+
+def caminho_checkpoint(diretorio, execucao, grupo_id):
+    """
+    Monta o caminho do checkpoint de um grupo.
+
+    Args:
+        diretorio: Pasta dos checkpoints (ex: resultados/temp)
+        execucao: Identificador da execução (ex: data e hora de início)
+        grupo_id: ID do grupo
+
+    Returns:
+        Caminho do arquivo NDJSON do grupo
+    """
+    return os.path.join(diretorio, f"{PREFIXO_CHECKPOINT}_{execucao}_grupo_{grupo_id}.ndjson")
+
+def descartar_linha_incompleta(caminho, tamanho_bloco=65536):
+    """
+    Remove do final de um checkpoint a linha incompleta deixada por uma gravação interrompida.
+
+    Args:
+        caminho: Caminho do checkpoint
+        tamanho_bloco: Bytes lidos de cada vez, do final para o início do arquivo
+
+    Returns:
+        Número de bytes removidos
+    """
+    if not os.path.exists(caminho):
+        return 0
+
+    with open(caminho, "rb+") as arquivo:
+        tamanho = arquivo.seek(0, os.SEEK_END)
+        fim = tamanho
+        # Procura a última quebra de linha; tudo depois dela é a linha incompleta
+        while fim > 0:
+            inicio = max(0, fim - tamanho_bloco)
+            arquivo.seek(inicio)
+            bloco = arquivo.read(fim - inicio)
+            posicao = bloco.rfind(b"\n")
+            if posicao != -1:
+                fim = inicio + posicao + 1
+                break
+            fim = inicio
+        if fim < tamanho:
+            arquivo.truncate(fim)
+    return tamanho - fim
+
+def abrir_checkpoint(diretorio, execucao, grupo_id):
+    """
+    Abre o checkpoint de um grupo para acréscimo, com flush a cada cliente.
+
+    Se o arquivo já existir (execução retomada), os novos clientes são acrescentados ao final;
+    antes, a linha incompleta de uma gravação interrompida é removida, para que o primeiro
+    cliente acrescentado não seja gravado na mesma linha.
+
+    Args:
+        diretorio: Pasta dos checkpoints
+        execucao: Identificador da execução
+        grupo_id: ID do grupo
+
+    Returns:
+        EscritorResultados no formato NDJSON
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = caminho_checkpoint(diretorio, execucao, grupo_id)
+    removidos = descartar_linha_incompleta(caminho)
+    if removidos:
+        print(f"Aviso: linha incompleta ({removidos} bytes) removida do final de '{caminho}'")
+    return EscritorResultados(
+        caminho,
+        formato="ndjson",
+        descarregar_a_cada=1,
+        anexar=True
+    )
+
+def listar_checkpoints(diretorio, execucao="*"):
+    """
+    Lista os checkpoints de uma execução (ou de todas), ordenados pelo ID do grupo.
+
+    Args:
+        diretorio: Pasta dos checkpoints
+        execucao: Identificador da execução (padrão: todas)
+
+    Returns:
+        Lista de caminhos
+    """
+    def id_grupo(caminho):
+        nome = os.path.basename(caminho)[:-len(".ndjson")]
+        sufixo = nome.rsplit("_grupo_", 1)[-1]
+        return (nome.rsplit("_grupo_", 1)[0], int(sufixo) if sufixo.isdigit() else 0)
+
+    caminhos = glob.glob(os.path.join(diretorio, f"{PREFIXO_CHECKPOINT}_{execucao}_grupo_*.ndjson"))
+    return sorted(caminhos, key=id_grupo)
+
+def ler_checkpoint(caminho):
+    """
+    Lê um checkpoint linha a linha, convertendo os tipos estendidos (ex: {"$oid": ...}).
+
+    Uma última linha incompleta (execução interrompida durante a gravação) é ignorada com
+    um aviso; qualquer outra linha inválida gera erro.
+
+    Args:
+        caminho: Caminho do checkpoint
+
+    Returns:
+        Gerador de dicionários com os resultados dos clientes
+    """
+    with open(caminho, "r", encoding="utf-8") as arquivo:
+        for numero_linha, linha in enumerate(arquivo, start=1):
+            if not linha.strip():
+                continue
+            try:
+                yield json.loads(linha, object_hook=json_util.object_hook)
+            except json.JSONDecodeError as e:
+                # Só a última linha pode estar incompleta (não termina com quebra de linha)
+                if not linha.endswith("\n"):
+                    print(f"Aviso: última linha incompleta ignorada em '{caminho}'")
+                    return
+                raise ValueError(f"Linha {numero_linha} inválida em '{caminho}': {e}") from e
+
+def mesclar_checkpoints(caminhos, escritor):
+    """
+    Grava o conteúdo dos checkpoints no escritor informado, um cliente por vez.
+
+    Args:
+        caminhos: Lista de caminhos de checkpoints
+        escritor: Escritor de destino (EscritorResultados ou EscritorBSON)
+
+    Returns:
+        Número de clientes gravados
+    """
+    total = 0
+    for caminho in caminhos:
+        for resultado in ler_checkpoint(caminho):
+            escritor.escrever(resultado)
+            total += 1
+    return total
+
+def remover_checkpoints(caminhos):
+    """
+    Remove os arquivos de checkpoint informados.
+
+    Args:
+        caminhos: Lista de caminhos de checkpoints
+    """
+    for caminho in caminhos:
+        if os.path.exists(caminho):
+            os.remove(caminho)
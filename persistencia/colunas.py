@@ -0,0 +1,159 @@
+"""
+Leitura colunar dos arquivos de resultados.
+
+Os scripts de análise usam poucos campos de cada cliente (faturamento, peças, marcas,
+pontualidade). Os arquivos são percorridos em streaming com ler_resultados e apenas os campos
+pedidos são guardados, em buffers tipados (array.array), convertidos em colunas do NumPy ao
+final: a memória usada é proporcional às colunas selecionadas, e não aos documentos completos.
+Quando há vários arquivos (por exemplo, a pasta de lotes), cada arquivo é lido em um processo.
+"""
+import os
+import math
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+# O NumPy é necessário apenas para a leitura colunar
+from dependencias import np, exigir_numpy
+
+from .resultados import ler_resultados, listar_arquivos_resultados
+
+# Tipos de coluna aceitos e o código do array.array usado como buffer de cada um
+# - float: float64, com NaN quando o campo não existe ou não é numérico
+# - int: int64, com 0 quando o campo não existe ou não é numérico
+# - str: objetos (texto), com None quando o campo não existe
+TIPOS_COLUNAS = {"float": "d", "int": "q", "str": None}
+
+def normalizar_campos(campos):
+    """
+    Normaliza a especificação das colunas.
+
+    Args:
+        campos: Dicionário {coluna: caminho} ou {coluna: (caminho, tipo)}, com o caminho do campo
+            aninhado separado por pontos (ex: "total_pecas.liquido"); o tipo padrão é "float"
+
+    Returns:
+        Lista de (coluna, chaves do caminho, tipo)
+    """
+    normalizados = []
+    for nome, especificacao in campos.items():
+        caminho, tipo = (especificacao, "float") if isinstance(especificacao, str) else especificacao
+        if tipo not in TIPOS_COLUNAS:
+            raise ValueError(f"Tipo de coluna inválido para '{nome}': {tipo}. Use um de {', '.join(TIPOS_COLUNAS)}")
+        normalizados.append((nome, tuple(caminho.split(".")), tipo))
+    return normalizados
+
+def valor_campo(documento, chaves):
+    """Retorna o valor do campo aninhado, ou None se algum nível não existir."""
+    valor = documento
+    for chave in chaves:
+        if not isinstance(valor, dict):
+            return None
+        valor = valor.get(chave)
+    return valor
+
+def ler_colunas(caminho, campos):
+    """
+    Lê as colunas pedidas de um único arquivo de resultados (JSON, NDJSON ou BSON).
+
+    Um erro de leitura interrompe o arquivo, mas as colunas dos clientes já lidos são mantidas,
+    como nos scripts de análise.
+
+    Args:
+        caminho: Caminho do arquivo
+        campos: Especificação das colunas (ver normalizar_campos)
+
+    Returns:
+        Dicionário {coluna: array do NumPy}
+    """
+    exigir_numpy("a leitura colunar")
+
+    especificacao = normalizar_campos(campos)
+    buffers = {nome: array(TIPOS_COLUNAS[tipo]) if TIPOS_COLUNAS[tipo] else [] for nome, _, tipo in especificacao}
+
+    try:
+        for documento in ler_resultados(caminho):
+            # Arquivos antigos podem ter listas de clientes dentro da lista principal
+            for cliente in documento if isinstance(documento, list) else (documento,):
+                for nome, chaves, tipo in especificacao:
+                    valor = valor_campo(cliente, chaves)
+                    numerico = isinstance(valor, (int, float)) and not isinstance(valor, bool)
+                    if tipo == "float":
+                        buffers[nome].append(valor if numerico else math.nan)
+                    elif tipo == "int":
+                        buffers[nome].append(int(valor) if numerico and math.isfinite(valor) else 0)
+                    else:
+                        buffers[nome].append(None if valor is None else str(valor))
+    except Exception as e:
+        print(f"Erro ao carregar {caminho}: {e}")
+
+    colunas = {}
+    for nome, _, tipo in especificacao:
+        if tipo == "str":
+            colunas[nome] = np.array(buffers[nome], dtype=object)
+        else:
+            # O buffer é copiado para que o array não dependa do array.array
+            colunas[nome] = np.frombuffer(buffers[nome], dtype=np.float64 if tipo == "float" else np.int64).copy()
+    return colunas
+
+def expandir_origens(origens, prefixo="resultado"):
+    """
+    Converte arquivos e diretórios em uma lista de arquivos de resultados.
+
+    Args:
+        origens: Caminho ou lista de caminhos; um diretório (ex: resultados/lotes) contribui com
+            os arquivos de resultados que ele contém, dos mais antigos para os mais recentes
+        prefixo: Prefixo dos arquivos procurados nos diretórios
+
+    Returns:
+        Lista de caminhos de arquivos
+    """
+    if isinstance(origens, (str, os.PathLike)):
+        origens = [origens]
+
+    arquivos = []
+    for origem in origens:
+        if os.path.isdir(origem):
+            arquivos.extend(listar_arquivos_resultados(origem, prefixo=prefixo))
+        else:
+            arquivos.append(os.fspath(origem))
+    return arquivos
+
+def carregar_colunas(origens, campos, processos=None):
+    """
+    Carrega as colunas pedidas de um ou mais arquivos de resultados.
+
+    Exemplo:
+        colunas = carregar_colunas("resultados/lotes", {
+            "faturamento": "faturamento_ultimos_12_meses.faturamento_liquido",
+            "marcas": ("numero_marcas_diferentes", "int")
+        })
+
+    Args:
+        origens: Arquivo, diretório ou lista de arquivos e diretórios (ver expandir_origens)
+        campos: Dicionário {coluna: caminho} ou {coluna: (caminho, tipo)} (ver normalizar_campos)
+        processos: Número de processos de leitura (padrão: um por arquivo, até o número de CPUs;
+            1 lê os arquivos no próprio processo)
+
+    Returns:
+        Dicionário {coluna: array do NumPy}, com os clientes na ordem dos arquivos
+    """
+    exigir_numpy("a leitura colunar")
+
+    especificacao = normalizar_campos(campos)
+    arquivos = expandir_origens(origens)
+    if processos is None:
+        processos = min(len(arquivos), os.cpu_count() or 1)
+
+    if processos > 1 and len(arquivos) > 1:
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            partes = list(executor.map(ler_colunas, arquivos, [campos] * len(arquivos)))
+    else:
+        partes = [ler_colunas(arquivo, campos) for arquivo in arquivos]
+
+    colunas = {}
+    for nome, _, tipo in especificacao:
+        if partes:
+            colunas[nome] = np.concatenate([parte[nome] for parte in partes])
+        else:
+            colunas[nome] = np.array([], dtype=object if tipo == "str" else np.float64 if tipo == "float" else np.int64)
+    return colunas
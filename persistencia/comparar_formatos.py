@@ -0,0 +1,83 @@
+"""
+Compara o desempenho de escrita e leitura dos formatos de arquivo de resultados.
+
+Uso:
+    python -m persistencia.comparar_formatos resultados/resultado_completo_20250421_222201.json
+"""
+import os
+import time
+import argparse
+import tempfile
+
+from .resultados import FORMATOS_SAIDA, abrir_escritor, ler_resultados
+
+def comparar_formatos(caminho_origem, repeticoes=3, comprimir=False):
+    """
+    Mede o tempo de escrita e de leitura de um conjunto de resultados em cada formato.
+
+    Args:
+        caminho_origem: Arquivo de resultados usado como amostra (qualquer formato suportado)
+        repeticoes: Número de repetições de cada medição (é considerado o melhor tempo)
+        comprimir: Se True, mede também o custo da compressão gzip
+
+    Returns:
+        Lista de dicionários com as medições de cada formato
+    """
+    # Carrega a amostra com os tipos BSON para que todos os formatos gravem os mesmos dados
+    documentos = list(ler_resultados(caminho_origem, converter_tipos=True))
+    if not documentos:
+        print(f"Nenhum cliente encontrado em {caminho_origem}")
+        return []
+
+    medicoes = []
+    with tempfile.TemporaryDirectory() as diretorio:
+        for formato in FORMATOS_SAIDA:
+            melhor_escrita = None
+            melhor_leitura = None
+            caminho = None
+
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                with abrir_escritor(os.path.join(diretorio, "amostra"), formato=formato, comprimir=comprimir) as escritor:
+                    escritor.escrever_varios(documentos)
+                tempo_escrita = time.perf_counter() - inicio
+                caminho = escritor.caminho
+
+                inicio = time.perf_counter()
+                total_lidos = sum(1 for _ in ler_resultados(caminho))
+                tempo_leitura = time.perf_counter() - inicio
+
+                melhor_escrita = tempo_escrita if melhor_escrita is None else min(melhor_escrita, tempo_escrita)
+                melhor_leitura = tempo_leitura if melhor_leitura is None else min(melhor_leitura, tempo_leitura)
+
+            medicoes.append({
+                "formato": formato + (" + gzip" if comprimir else ""),
+                "clientes": total_lidos,
+                "tamanho_bytes": os.path.getsize(caminho),
+                "escrita_segundos": melhor_escrita,
+                "leitura_segundos": melhor_leitura,
+                "escrita_clientes_por_segundo": len(documentos) / melhor_escrita if melhor_escrita else 0,
+                "leitura_clientes_por_segundo": total_lidos / melhor_leitura if melhor_leitura else 0,
+            })
+
+    return medicoes
+
+def exibir_medicoes(medicoes):
+    """Exibe as medições em forma de tabela."""
+    print(f"\n{'Formato':<16}{'Tamanho (KB)':>14}{'Escrita (cli/s)':>18}{'Leitura (cli/s)':>18}")
+    for medicao in medicoes:
+        print(
+            f"{medicao['formato']:<16}"
+            f"{medicao['tamanho_bytes'] / 1024:>14.1f}"
+            f"{medicao['escrita_clientes_por_segundo']:>18.0f}"
+            f"{medicao['leitura_clientes_por_segundo']:>18.0f}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Comparar formatos de arquivo de resultados (JSON, NDJSON e BSON)")
+    parser.add_argument("arquivo", help="Arquivo de resultados usado como amostra")
+    parser.add_argument("--repeticoes", type=int, default=3, help="Número de repetições de cada medição")
+    parser.add_argument("--gzip", action="store_true", help="Mede os formatos com compressão gzip")
+    args = parser.parse_args()
+
+    exibir_medicoes(comparar_formatos(args.arquivo, repeticoes=args.repeticoes, comprimir=args.gzip))
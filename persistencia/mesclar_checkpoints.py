@@ -0,0 +1,32 @@
+"""
+Mescla os checkpoints do processamento paralelo em um arquivo de resultados.
+
+Útil para recuperar os resultados de uma execução interrompida antes da mesclagem final.
+
+Uso:
+    python -m persistencia.mesclar_checkpoints resultados/temp resultados/resultados_recuperados --execucao 20250421_222201
+"""
+import argparse
+
+from .resultados import FORMATOS_SAIDA, abrir_escritor
+from .checkpoints import listar_checkpoints, mesclar_checkpoints, remover_checkpoints
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mesclar os checkpoints do processamento paralelo em um arquivo de resultados")
+    parser.add_argument("diretorio", help="Pasta dos checkpoints (ex: resultados/temp)")
+    parser.add_argument("destino", help="Caminho do arquivo de saída, sem extensão")
+    parser.add_argument("--execucao", default="*", help="Identificador da execução (padrão: todas)")
+    parser.add_argument("--formato", choices=FORMATOS_SAIDA, default="json", help="Formato do arquivo de saída")
+    parser.add_argument("--gzip", action="store_true", help="Grava o arquivo de saída com gzip")
+    parser.add_argument("--remover", action="store_true", help="Remove os checkpoints após a mesclagem")
+    args = parser.parse_args()
+
+    caminhos = listar_checkpoints(args.diretorio, args.execucao)
+    if not caminhos:
+        print(f"Nenhum checkpoint encontrado em {args.diretorio}")
+    else:
+        with abrir_escritor(args.destino, formato=args.formato, comprimir=args.gzip) as escritor:
+            total = mesclar_checkpoints(caminhos, escritor)
+        print(f"{total} clientes de {len(caminhos)} checkpoints mesclados em '{escritor.caminho}'")
+        if args.remover:
+            remover_checkpoints(caminhos)
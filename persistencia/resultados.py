@@ -0,0 +1,297 @@
+"""
+Escrita e leitura em streaming dos arquivos de resultados.
+
+Os resultados de cada cliente são gravados no arquivo à medida que são produzidos,
+de modo que a memória usada pelo processamento não cresce com o número de clientes.
+"""
+import os
+import glob
+import gzip
+import json
+from bson import json_util
+
+from .bson_arquivo import EscritorBSON, ler_bson
+
+# Formatos de saída suportados
+# - json: lista JSON (mesmo formato dos arquivos antigos), gravada item a item
+# - ndjson: um documento JSON compacto por linha
+# - bson: documentos BSON concatenados (formato do mongodump)
+FORMATOS_SAIDA = ("json", "ndjson", "bson")
+
+# Extensões reconhecidas na leitura
+EXTENSOES_NDJSON = (".ndjson", ".jsonl")
+EXTENSOES_JSON = (".json",)
+EXTENSOES_BSON = (".bson",)
+
+# Tamanho do bloco lido do disco ao percorrer listas JSON
+TAMANHO_BLOCO_LEITURA = 1024 * 1024
+
+def extensao_arquivo(formato, comprimir=False):
+    """
+    Retorna a extensão de arquivo correspondente ao formato de saída.
+
+    Args:
+        formato: Formato de saída ("json", "ndjson" ou "bson")
+        comprimir: Se True, acrescenta a extensão .gz
+
+    Returns:
+        Extensão do arquivo, incluindo o ponto inicial
+    """
+    if formato not in FORMATOS_SAIDA:
+        raise ValueError(f"Formato de saída inválido: {formato}. Use um de {', '.join(FORMATOS_SAIDA)}")
+
+    extensao = "." + formato
+    return extensao + ".gz" if comprimir else extensao
+
+def _abrir_texto(caminho, modo):
+    """Abre um arquivo texto em UTF-8, usando gzip quando a extensão for .gz."""
+    if caminho.endswith(".gz"):
+        return gzip.open(caminho, modo + "t", encoding="utf-8")
+    return open(caminho, modo, encoding="utf-8")
+
+class EscritorResultados:
+    """
+    Grava resultados de clientes em arquivo, um cliente por vez.
+
+    No formato "ndjson" cada cliente ocupa uma linha compacta. No formato "json" o arquivo
+    continua sendo uma lista JSON indentada, compatível com os arquivos antigos, mas é
+    escrito incrementalmente em vez de ser serializado de uma só vez no final.
+    """
+
+    def __init__(self, caminho, formato="ndjson", comprimir=None, descarregar_a_cada=1, anexar=False):
+        """
+        Args:
+            caminho: Caminho do arquivo de saída
+            formato: Formato de saída ("json" ou "ndjson")
+            comprimir: Se True, grava com gzip. Se None, decide pela extensão do caminho
+            descarregar_a_cada: Número de clientes entre chamadas de flush no arquivo
+            anexar: Se True, acrescenta ao final de um arquivo existente (apenas ndjson)
+        """
+        if formato not in ("json", "ndjson"):
+            raise ValueError(f"Formato de saída inválido: {formato}. Use json ou ndjson (para bson use EscritorBSON)")
+
+        if anexar and formato != "ndjson":
+            raise ValueError("Apenas arquivos ndjson podem ser abertos para acréscimo")
+
+        if comprimir and not caminho.endswith(".gz"):
+            caminho += ".gz"
+
+        self.caminho = caminho
+        self.formato = formato
+        self.descarregar_a_cada = max(1, int(descarregar_a_cada))
+        self.total_escritos = 0
+        self._arquivo = _abrir_texto(caminho, "a" if anexar else "w")
+
+        if self.formato == "json":
+            self._arquivo.write("[")
+
+    def escrever(self, resultado):
+        """
+        Grava o resultado de um cliente no arquivo.
+
+        Args:
+            resultado: Dicionário com o resultado do cliente
+        """
+        if self.formato == "ndjson":
+            linha = json_util.dumps(resultado, ensure_ascii=False, separators=(",", ":"))
+            self._arquivo.write(linha)
+            self._arquivo.write("\n")
+        else:
+            documento = json_util.dumps(resultado, ensure_ascii=False, indent=2)
+            # Indenta o documento para manter o mesmo layout de json.dump(lista, indent=2)
+            documento = documento.replace("\n", "\n  ")
+            separador = "\n  " if self.total_escritos == 0 else ",\n  "
+            self._arquivo.write(separador + documento)
+
+        self.total_escritos += 1
+
+        if self.total_escritos % self.descarregar_a_cada == 0:
+            self._arquivo.flush()
+
+    def escrever_varios(self, resultados):
+        """
+        Grava vários resultados no arquivo.
+
+        Args:
+            resultados: Iterável com os resultados dos clientes
+        """
+        for resultado in resultados:
+            self.escrever(resultado)
+
+    def fechar(self):
+        """Finaliza e fecha o arquivo."""
+        if self._arquivo is None:
+            return
+
+        if self.formato == "json":
+            self._arquivo.write("\n]" if self.total_escritos else "]")
+
+        self._arquivo.close()
+        self._arquivo = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_excecao, excecao, rastreamento):
+        self.fechar()
+        return False
+
+def abrir_escritor(caminho_base, formato="ndjson", comprimir=False, descarregar_a_cada=1):
+    """
+    Cria um escritor de resultados acrescentando a extensão do formato ao caminho.
+
+    Args:
+        caminho_base: Caminho do arquivo sem extensão (ex: "resultados/resultado_completo_20250421")
+        formato: Formato de saída ("json", "ndjson" ou "bson")
+        comprimir: Se True, grava com gzip
+        descarregar_a_cada: Número de clientes entre chamadas de flush no arquivo
+
+    Returns:
+        Instância de EscritorResultados ou EscritorBSON
+    """
+    caminho = caminho_base + extensao_arquivo(formato, comprimir)
+    if formato == "bson":
+        return EscritorBSON(caminho, descarregar_a_cada=descarregar_a_cada)
+    return EscritorResultados(caminho, formato=formato, descarregar_a_cada=descarregar_a_cada)
+
+def _formato_por_extensao(caminho):
+    """Identifica o formato de um arquivo de resultados pela extensão."""
+    nome = caminho[:-3] if caminho.endswith(".gz") else caminho
+
+    if nome.endswith(EXTENSOES_BSON):
+        return "bson"
+    if nome.endswith(EXTENSOES_NDJSON):
+        return "ndjson"
+    if nome.endswith(EXTENSOES_JSON):
+        return "json"
+    return None
+
+def _iterar_ndjson(arquivo, object_hook):
+    """Percorre um arquivo NDJSON linha a linha."""
+    for numero_linha, linha in enumerate(arquivo, start=1):
+        linha = linha.strip()
+        if not linha:
+            continue
+        try:
+            yield json.loads(linha, object_hook=object_hook)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Linha {numero_linha} inválida: {e}") from e
+
+def _iterar_json(arquivo, object_hook, tamanho_bloco=TAMANHO_BLOCO_LEITURA):
+    """
+    Percorre um arquivo JSON sem carregá-lo inteiro.
+
+    Se o conteúdo for uma lista, cada elemento é retornado assim que termina de ser lido.
+    Se for um objeto único (arquivo de um cliente), o próprio objeto é retornado.
+    """
+    decodificador = json.JSONDecoder(object_hook=object_hook)
+    buffer = ""
+    posicao = 0
+    fim_arquivo = False
+    dentro_lista = None
+
+    def ler_bloco():
+        nonlocal buffer, posicao, fim_arquivo
+        bloco = arquivo.read(tamanho_bloco)
+        if not bloco:
+            fim_arquivo = True
+        # Descarta a parte já consumida do buffer
+        buffer = buffer[posicao:] + bloco
+        posicao = 0
+
+    def pular_espacos():
+        nonlocal posicao
+        while True:
+            while posicao < len(buffer) and buffer[posicao] in " \t\r\n":
+                posicao += 1
+            if posicao < len(buffer) or fim_arquivo:
+                return
+            ler_bloco()
+
+    while True:
+        pular_espacos()
+        if posicao >= len(buffer):
+            return
+
+        caractere = buffer[posicao]
+
+        if dentro_lista is None:
+            if caractere == "[":
+                dentro_lista = True
+                posicao += 1
+                continue
+            dentro_lista = False
+        elif dentro_lista:
+            if caractere == "]":
+                return
+            if caractere == ",":
+                posicao += 1
+                continue
+
+        # Decodifica o próximo valor; se ele estiver incompleto, lê mais um bloco
+        try:
+            valor, fim = decodificador.raw_decode(buffer, posicao)
+        except json.JSONDecodeError:
+            if fim_arquivo:
+                raise
+            ler_bloco()
+            continue
+
+        # Um número no final do buffer pode estar cortado; garante que o valor terminou
+        if fim == len(buffer) and not fim_arquivo:
+            ler_bloco()
+            continue
+
+        posicao = fim
+        yield valor
+
+        if not dentro_lista:
+            return
+
+def ler_resultados(caminho, converter_tipos=False):
+    """
+    Lê um arquivo de resultados de forma preguiçosa, retornando um cliente por vez.
+
+    Aceita listas JSON (formato antigo), arquivos de um único cliente, NDJSON e BSON,
+    comprimidos ou não com gzip. Arquivos BSON preservam os tipos originais (ObjectId, datas).
+
+    Args:
+        caminho: Caminho do arquivo de resultados
+        converter_tipos: Se True, converte tipos estendidos do JSON (ex: {"$oid": ...}) para tipos BSON
+
+    Returns:
+        Gerador de dicionários com os resultados dos clientes
+    """
+    formato = _formato_por_extensao(caminho)
+    if formato is None:
+        raise ValueError(f"Extensão de arquivo de resultados não reconhecida: {caminho}")
+
+    if formato == "bson":
+        yield from ler_bson(caminho)
+        return
+
+    object_hook = json_util.object_hook if converter_tipos else None
+
+    with _abrir_texto(caminho, "r") as arquivo:
+        if formato == "ndjson":
+            yield from _iterar_ndjson(arquivo, object_hook)
+        else:
+            yield from _iterar_json(arquivo, object_hook)
+
+def listar_arquivos_resultados(diretorio, prefixo="resultado"):
+    """
+    Lista os arquivos de resultados de um diretório, em qualquer formato suportado.
+
+    Args:
+        diretorio: Diretório onde procurar
+        prefixo: Prefixo do nome dos arquivos
+
+    Returns:
+        Lista de caminhos ordenada pela data de modificação (mais antigos primeiro)
+    """
+    arquivos = []
+    for extensao in EXTENSOES_JSON + EXTENSOES_NDJSON + EXTENSOES_BSON:
+        arquivos.extend(glob.glob(os.path.join(diretorio, f"{prefixo}*{extensao}")))
+        arquivos.extend(glob.glob(os.path.join(diretorio, f"{prefixo}*{extensao}.gz")))
+
+    return sorted(set(arquivos), key=os.path.getmtime)
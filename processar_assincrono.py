@@ -0,0 +1,273 @@
+"""
+Sistema de Extração de Dados do ERP - Processamento Assíncrono
+Este módulo processa os clientes com asyncio e o driver Motor: as consultas de muitos clientes
+ficam em andamento ao mesmo tempo em uma única thread, de modo que a vazão passa a ser limitada
+pelo servidor e não pela latência de cada ida e volta ao banco.
+"""
+import os
+import time
+import asyncio
+import traceback
+from datetime import datetime
+from dotenv import load_dotenv
+
+# O Motor é necessário apenas para este modo de processamento
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+except ImportError:
+    AsyncIOMotorClient = None
+
+# Importa as funções do módulo principal
+from main import (
+    conectar_mongodb, log, criar_resultado_cliente,
+    preencher_resultado_cliente, finalizar_resultado_cliente
+)
+from selecao_metricas import METRICAS_SELECIONADAS, CAMPO_OMITIDAS, validar_metricas_ambiente
+from consultas.base import obter_clientes_com_movimentacao, obter_contagem_movimentacao_por_cliente
+from consultas.valor_por_marca import calcular_marcas_diferentes
+from consultas.assincronas import (
+    verificar_cliente_tem_movimentacao_async,
+    obter_data_primeira_compra_async,
+    obter_faturamento_ultimos_12_meses_async,
+    obter_ciclos_compra_ultimos_6_meses_async,
+    obter_total_pecas_compradas_async,
+    obter_titulos_pagos_em_dia_async,
+    obter_valor_por_marca_async
+)
+from conexao import opcoes_cliente
+from persistencia import abrir_escritor
+from agendamento import (
+    RegistroCustos, EstimadorTermino, carregar_historico_custos,
+    estimar_custos, clientes_sem_historico, ordenar_por_custo
+)
+
+# Carrega as variáveis de ambiente
+load_dotenv()
+
+# Configuração da conexão com o MongoDB
+MONGODB_URI = os.getenv("MONGODB_URI")
+MONGODB_DATABASE = os.getenv("MONGODB_DATABASE")
+
+# Número máximo de clientes e de consultas em andamento ao mesmo tempo
+MAX_CLIENTES_SIMULTANEOS = int(os.getenv("MAX_CLIENTES_SIMULTANEOS", "100"))
+MAX_CONSULTAS_SIMULTANEAS = int(os.getenv("MAX_CONSULTAS_SIMULTANEAS", "50"))
+
+# Formato do arquivo de resultados completos ("json", "ndjson" ou "bson") e compressão gzip
+FORMATO_SAIDA = os.getenv("FORMATO_SAIDA", "json").lower()
+COMPRIMIR_SAIDA = os.getenv("COMPRIMIR_SAIDA", "false").lower() == "true"
+
+# Ordena os clientes do maior para o menor custo estimado (LPT)
+AGENDAMENTO_POR_CUSTO = os.getenv("AGENDAMENTO_POR_CUSTO", "true").lower() == "true"
+
+# Número de clientes buscados de uma vez na collection geradores
+TAMANHO_CONSULTA_CLIENTES = 1000
+
+async def processar_cliente_individual_async(db, cliente, semaforo_consultas, metricas=None):
+    """
+    Processa um cliente, executando as consultas ao mesmo tempo.
+
+    Produz o mesmo resultado de main.processar_cliente_individual.
+
+    Args:
+        db: Banco de dados do Motor
+        cliente: Documento do cliente na collection geradores
+        semaforo_consultas: asyncio.Semaphore que limita as consultas em andamento
+        metricas: Métricas a calcular (padrão: METRICAS_SELECIONADAS, ver selecao_metricas)
+
+    Returns:
+        Dicionário com todas as informações consolidadas do cliente, ou None se ele não tiver movimentações
+    """
+    if metricas is None:
+        metricas = METRICAS_SELECIONADAS
+    cod_cliente = cliente.get("cod_cliente")
+    nome_cliente = cliente.get("razao_social", "")
+
+    # VALIDAÇÃO CRÍTICA: Verifica se o cliente realmente tem movimentações
+    if not await verificar_cliente_tem_movimentacao_async(db, cod_cliente, semaforo_consultas):
+        log(f"  [AVISO] Cliente {cod_cliente} - {nome_cliente} não possui movimentações. Ignorando.", nivel=1)
+        return None
+
+    resultado_cliente = criar_resultado_cliente(cliente)
+
+    # As consultas das métricas selecionadas são independentes entre si e rodam ao mesmo tempo;
+    # o número de marcas vem do próprio valor por marca, consultado também quando só as marcas são pedidas
+    consultas = {
+        "data_primeira_compra": obter_data_primeira_compra_async,
+        "faturamento": obter_faturamento_ultimos_12_meses_async,
+        "ciclos": obter_ciclos_compra_ultimos_6_meses_async,
+        "pecas": obter_total_pecas_compradas_async,
+        "pagamentos": obter_titulos_pagos_em_dia_async,
+        "valor_por_marca": obter_valor_por_marca_async
+    }
+    selecionadas = [
+        nome for nome in consultas
+        if nome in metricas or (nome == "valor_por_marca" and "marcas" in metricas)
+    ]
+    retornos = dict(zip(selecionadas, await asyncio.gather(
+        *(consultas[nome](db, cod_cliente, semaforo_consultas) for nome in selecionadas)
+    )))
+
+    if "marcas" in metricas:
+        valor_por_marca = retornos["valor_por_marca"]
+        retornos["marcas"] = calcular_marcas_diferentes(cod_cliente, valor_por_marca) if valor_por_marca else None
+
+    # O valor por marca consultado apenas para as marcas não conta como métrica calculada
+    retornos = {nome: retornos[nome] for nome in metricas}
+
+    preencher_resultado_cliente(resultado_cliente, cliente, **retornos)
+    return finalizar_resultado_cliente(resultado_cliente, retornos)
+
+async def percorrer_clientes_async(db, codigos):
+    """
+    Busca os documentos dos clientes na ordem dos códigos informados.
+
+    Args:
+        db: Banco de dados do Motor
+        codigos: Lista de códigos de clientes
+
+    Returns:
+        Gerador assíncrono de documentos de clientes
+    """
+    for i in range(0, len(codigos), TAMANHO_CONSULTA_CLIENTES):
+        bloco_codigos = codigos[i:i+TAMANHO_CONSULTA_CLIENTES]
+        encontrados = {}
+        async for cliente in db.geradores.find({"cod_cliente": {"$in": bloco_codigos}}):
+            encontrados.setdefault(cliente["cod_cliente"], cliente)
+        for cod_cliente in bloco_codigos:
+            if cod_cliente in encontrados:
+                yield encontrados[cod_cliente]
+
+async def processar_clientes_assincrono(max_clientes_simultaneos=MAX_CLIENTES_SIMULTANEOS,
+                                        max_consultas_simultaneas=MAX_CONSULTAS_SIMULTANEAS,
+                                        limite_clientes=None):
+    """
+    Processa todos os clientes com movimentações usando asyncio.
+
+    Um semáforo limita os clientes em andamento e outro limita as consultas em andamento.
+    Os resultados são gravados no arquivo assim que cada cliente termina.
+
+    Args:
+        max_clientes_simultaneos: Número máximo de clientes processados ao mesmo tempo
+        max_consultas_simultaneas: Número máximo de consultas em andamento ao mesmo tempo
+        limite_clientes: Limite de clientes a serem processados (opcional)
+
+    Returns:
+        Caminho do arquivo com os resultados completos, ou None em caso de falha
+    """
+    if AsyncIOMotorClient is None:
+        print("O processamento assíncrono requer o pacote motor (pip install motor).")
+        return None
+
+    try:
+        print(f"Iniciando processamento assíncrono com até {max_clientes_simultaneos} clientes e {max_consultas_simultaneas} consultas simultâneas...")
+        inicio_total = time.time()
+        os.makedirs("resultados", exist_ok=True)
+
+        # A lista de clientes e as contagens são obtidas uma única vez, com a conexão síncrona
+        db_sincrono = conectar_mongodb()
+        if db_sincrono is None:
+            print("Falha ao conectar ao MongoDB.")
+            return None
+
+        codigos_clientes = obter_clientes_com_movimentacao(db_sincrono)
+        print(f"Total de {len(codigos_clientes)} clientes com movimentações encontrados.")
+
+        # Estima o custo de cada cliente e define a ordem de processamento
+        historico_custos = carregar_historico_custos()
+        contagem_movimentacao = {}
+        if AGENDAMENTO_POR_CUSTO:
+            # Apenas os clientes sem histórico precisam da contagem de movimentações
+            sem_historico = clientes_sem_historico(codigos_clientes, historico_custos)
+            if sem_historico:
+                print(f"Contando movimentações de {len(sem_historico)} clientes sem histórico de custo...")
+                contagem_movimentacao = obter_contagem_movimentacao_por_cliente(db_sincrono, sem_historico)
+        custos = estimar_custos(codigos_clientes, historico_custos, contagem_movimentacao)
+        if AGENDAMENTO_POR_CUSTO:
+            ordem = ordenar_por_custo(codigos_clientes, custos)
+        else:
+            ordem = sorted(codigos_clientes)
+        if limite_clientes:
+            ordem = ordem[:limite_clientes]
+            custos = {cod: custos[cod] for cod in ordem}
+        registro_custos = RegistroCustos(historico_custos, contagem_movimentacao)
+        estimador = EstimadorTermino(custos, paralelismo=max_clientes_simultaneos)
+
+        # Cliente assíncrono com as opções do .env e pool suficiente para as consultas simultâneas
+        client = AsyncIOMotorClient(MONGODB_URI, **opcoes_cliente(maxPoolSize=max_consultas_simultaneas))
+        db = client[MONGODB_DATABASE]
+
+        semaforo_clientes = asyncio.Semaphore(max_clientes_simultaneos)
+        semaforo_consultas = asyncio.Semaphore(max_consultas_simultaneas)
+
+        data_hora = datetime.now().strftime("%Y%m%d_%H%M%S")
+        escritor = abrir_escritor(
+            os.path.join("resultados", f"resultados_completos_assincrono_{data_hora}"),
+            formato=FORMATO_SAIDA,
+            comprimir=COMPRIMIR_SAIDA
+        )
+
+        erros = 0
+        concluidos = 0
+
+        async def processar(cliente):
+            nonlocal erros, concluidos
+            cod_cliente = cliente.get("cod_cliente")
+            inicio_cliente = time.time()
+            try:
+                resultado = await processar_cliente_individual_async(db, cliente, semaforo_consultas)
+                if resultado:
+                    # Toda a gravação acontece na mesma thread do loop de eventos, sem lock
+                    escritor.escrever(resultado)
+                    # O tempo de uma atualização parcial (METRICAS) não representa o custo do cliente
+                    if not resultado.get(CAMPO_OMITIDAS):
+                        registro_custos.registrar(
+                            cod_cliente,
+                            time.time() - inicio_cliente,
+                            lancamentos=resultado.get("titulos_pagos_em_dia", {}).get("total_lancamentos")
+                        )
+            except Exception as e:
+                erros += 1
+                print(f"Erro ao processar cliente {cod_cliente}: {e}")
+                traceback.print_exc()
+            finally:
+                semaforo_clientes.release()
+                estimador.concluir(cod_cliente)
+                concluidos += 1
+                if concluidos % 100 == 0 or concluidos == len(ordem):
+                    print(f"Progresso: {concluidos}/{len(ordem)} clientes | {estimador.descricao()}")
+
+        with escritor:
+            tarefas = set()
+            async for cliente in percorrer_clientes_async(db, ordem):
+                # Aguarda uma vaga antes de criar a próxima tarefa, limitando a memória usada
+                await semaforo_clientes.acquire()
+                tarefa = asyncio.create_task(processar(cliente))
+                tarefas.add(tarefa)
+                tarefa.add_done_callback(tarefas.discard)
+
+            if tarefas:
+                await asyncio.gather(*tarefas)
+
+        client.close()
+
+        # Atualiza o histórico de custos para as próximas execuções
+        try:
+            registro_custos.salvar()
+        except Exception as e:
+            print(f"Erro ao salvar histórico de custos: {e}")
+
+        tempo_total = time.time() - inicio_total
+        vazao = concluidos / tempo_total if tempo_total > 0 else 0
+        print(f"Processamento assíncrono concluído para {escritor.total_escritos} clientes em {tempo_total:.2f} segundos ({vazao:.2f} clientes/s, {erros} erros).")
+        print(f"Resultados completos salvos em '{escritor.caminho}'")
+
+        return escritor.caminho
+
+    except Exception as e:
+        print(f"Erro no processamento assíncrono: {e}")
+        traceback.print_exc()
+        return None
+
+if __name__ == "__main__":
+    validar_metricas_ambiente()
+    asyncio.run(processar_clientes_assincrono())
@@ -3,20 +3,26 @@ Sistema de Extração de Dados do ERP - Processamento Paralelo
 Este módulo implementa o processamento paralelo de clientes para otimizar o tempo de execução.
 """
 import os
-import json
 import time
 import traceback
 from datetime import datetime
 from dotenv import load_dotenv
-from pymongo import MongoClient
-from bson import json_util
 import concurrent.futures
-import threading
-import glob
+import queue
 
 # Importa as funções do módulo principal
 from main import processar_cliente_individual, conectar_mongodb
-from consultas.base import obter_clientes_com_movimentacao
+from selecao_metricas import METRICAS_SELECIONADAS, CAMPO_OMITIDAS, validar_metricas_ambiente, selecao_completa
+from consultas.base import obter_clientes_com_movimentacao, obter_contagem_movimentacao_por_cliente
+from conexao import obter_banco, exibir_estatisticas_pool
+from cache_consultas import exibir_estatisticas_cache
+from instrumentacao import INSTRUMENTAR_CONSULTAS, marcar_lote, obter_monitor, finalizar_instrumentacao
+from persistencia import abrir_escritor, abrir_checkpoint, mesclar_checkpoints, remover_checkpoints
+from esbocos_quantis import COLETAR_ESBOCOS, ColetorEsbocos, salvar_esbocos
+from agendamento import (
+    RegistroCustos, EstimadorTermino, carregar_historico_custos,
+    estimar_custos, clientes_sem_historico, ordenar_por_custo
+)
 
 # Carrega as variáveis de ambiente
 load_dotenv()
@@ -30,91 +36,532 @@ TAMANHO_LOTE = int(os.getenv("TAMANHO_LOTE", "10"))
 NUM_THREADS = int(os.getenv("NUM_THREADS", "4"))
 USAR_CACHE = os.getenv("USAR_CACHE", "false").lower() == "true"
 
-# Lock para escrita em arquivos
-file_lock = threading.Lock()
+# Formato do arquivo de resultados completos ("json", "ndjson" ou "bson") e compressão gzip
+FORMATO_SAIDA = os.getenv("FORMATO_SAIDA", "json").lower()
+COMPRIMIR_SAIDA = os.getenv("COMPRIMIR_SAIDA", "false").lower() == "true"
 
-def processar_grupo_clientes(db, grupo_clientes, grupo_id):
+# Número de clientes retirados da fila de uma vez por cada thread
+TAMANHO_BLOCO_FILA = int(os.getenv("TAMANHO_BLOCO_FILA", "1"))
+
+# Enfileira os clientes do maior para o menor custo estimado (LPT)
+AGENDAMENTO_POR_CUSTO = os.getenv("AGENDAMENTO_POR_CUSTO", "true").lower() == "true"
+
+# Número de códigos por consulta $in ao buscar os clientes na ordem de custo
+TAMANHO_CONSULTA_ORDENADA = 1000
+
+# Modo de execução: "threads" (uma conexão compartilhada) ou "processos" (uma conexão por processo)
+MODO_PARALELO = os.getenv("MODO_PARALELO", "threads").lower()
+NUM_PROCESSOS = int(os.getenv("NUM_PROCESSOS", str(os.cpu_count() or 2)))
+
+# Número de clientes enviados de uma vez para cada processo
+TAMANHO_BLOCO_PROCESSO = int(os.getenv("TAMANHO_BLOCO_PROCESSO", "5"))
+
+# Marcador que indica às threads que não há mais clientes na fila
+FIM_DA_FILA = None
+
+# Segundos de espera por uma vaga na fila antes de verificar se as threads ainda estão ativas
+INTERVALO_FILA = 1.0
+
+# Conexão própria de cada processo de trabalho (criada por inicializar_processo)
+db_processo = None
+
+def consumir_fila(fila):
+    """
+    Retira blocos de clientes da fila compartilhada até encontrar o marcador de fim.
+    
+    Args:
+        fila: Fila com blocos (listas) de clientes
+        
+    Returns:
+        Gerador que retorna um cliente por vez
     """
-    Processa um grupo de clientes em paralelo.
+    while True:
+        bloco = fila.get()
+        try:
+            if bloco is FIM_DA_FILA:
+                return
+            yield from bloco
+        finally:
+            fila.task_done()
+
+def percorrer_clientes(db, codigos_validos, ordem=None):
+    """
+    Percorre os clientes da collection geradores que têm movimentações.
     
     Args:
         db: Conexão com o banco de dados
-        grupo_clientes: Lista de clientes a serem processados
-        grupo_id: ID do grupo para identificação
+        codigos_validos: Conjunto de códigos de clientes com movimentações
+        ordem: Lista de códigos na ordem desejada (opcional). Sem ela, segue a ordem do cursor
         
     Returns:
-        Lista de resultados dos clientes processados
+        Gerador de documentos de clientes (_id, cod_cliente e razao_social)
     """
-    print(f"Iniciando processamento do grupo {grupo_id} com {len(grupo_clientes)} clientes...")
-    inicio_grupo = time.time()
+    projection = {"_id": 1, "cod_cliente": 1, "razao_social": 1}
+    
+    if ordem is None:
+        query = {"cod_cliente": {"$exists": True, "$ne": None}}
+        for cliente in db.geradores.find(query, projection, batch_size=1000):
+            # Ignora clientes sem movimentações de venda
+            if cliente.get("cod_cliente") in codigos_validos:
+                yield cliente
+        return
+    
+    # Busca os clientes em blocos de códigos, preservando a ordem pedida dentro de cada bloco
+    codigos = [cod for cod in ordem if cod in codigos_validos]
+    for i in range(0, len(codigos), TAMANHO_CONSULTA_ORDENADA):
+        bloco_codigos = codigos[i:i+TAMANHO_CONSULTA_ORDENADA]
+        encontrados = {}
+        for cliente in db.geradores.find({"cod_cliente": {"$in": bloco_codigos}}, projection):
+            encontrados.setdefault(cliente["cod_cliente"], cliente)
+        for cod_cliente in bloco_codigos:
+            if cod_cliente in encontrados:
+                yield encontrados[cod_cliente]
+
+def agrupar_em_blocos(clientes, tamanho_bloco, limite_clientes=None):
+    """
+    Agrupa um iterável de clientes em blocos (listas) de tamanho fixo.
+    
+    Args:
+        clientes: Iterável de clientes
+        tamanho_bloco: Número de clientes por bloco
+        limite_clientes: Limite total de clientes (opcional)
+        
+    Returns:
+        Gerador de listas de clientes
+    """
+    total = 0
+    bloco = []
+    for cliente in clientes:
+        bloco.append(cliente)
+        total += 1
+        
+        if len(bloco) >= tamanho_bloco:
+            yield bloco
+            bloco = []
+        
+        if limite_clientes and total >= limite_clientes:
+            break
+    
+    if bloco:
+        yield bloco
+
+def colocar_na_fila(fila, item, futures=None):
+    """
+    Coloca um item na fila limitada, esperando por uma vaga enquanto houver threads ativas.
+    
+    Args:
+        fila: Fila compartilhada com as threads
+        item: Bloco de clientes ou marcador de fim
+        futures: Futures das threads que consomem a fila (opcional)
+        
+    Returns:
+        True se o item foi enfileirado, False se todas as threads já terminaram
+    """
+    while True:
+        try:
+            fila.put(item, timeout=INTERVALO_FILA)
+            return True
+        except queue.Full:
+            if futures is not None and all(future.done() for future in futures):
+                return False
+
+def alimentar_fila(db, fila, codigos_validos, tamanho_bloco=TAMANHO_BLOCO_FILA, limite_clientes=None, ordem=None,
+                   futures=None):
+    """
+    Percorre os clientes e coloca-os na fila em blocos, sem materializar a lista.
+    
+    A fila é limitada, então esta função espera enquanto as threads estiverem ocupadas; se todas
+    as threads terminarem antes do fim (ex: por um erro), o enfileiramento é interrompido.
     
-    # Cria a pasta de resultados se não existir
-    resultados_dir = os.path.join(os.getcwd(), "resultados")
-    if not os.path.exists(resultados_dir):
-        os.makedirs(resultados_dir)
+    Args:
+        db: Conexão com o banco de dados
+        fila: Fila compartilhada com as threads
+        codigos_validos: Conjunto de códigos de clientes com movimentações
+        tamanho_bloco: Número de clientes por bloco
+        limite_clientes: Limite de clientes a serem enfileirados (opcional)
+        ordem: Lista de códigos na ordem de enfileiramento (opcional, ex: maior custo primeiro)
+        futures: Futures das threads que consomem a fila (opcional)
+        
+    Returns:
+        Total de clientes enfileirados
+    """
+    total = 0
+    for bloco in agrupar_em_blocos(percorrer_clientes(db, codigos_validos, ordem), tamanho_bloco, limite_clientes):
+        if not colocar_na_fila(fila, bloco, futures):
+            print(f"Todas as threads terminaram; enfileiramento interrompido após {total} clientes.")
+            break
+        total += len(bloco)
     
-    # Cria a pasta temporária se não existir
-    temp_dir = os.path.join(resultados_dir, "temp")
-    if not os.path.exists(temp_dir):
-        os.makedirs(temp_dir)
+    return total
+
+def processar_grupo_clientes(db, grupo_clientes, grupo_id, checkpoint, registro_custos=None, estimador=None,
+                             esbocos=None):
+    """
+    Processa os clientes recebidos por uma thread, gravando cada resultado assim que fica pronto.
     
-    # Lista para armazenar os resultados
-    resultados = []
+    Cada grupo grava no seu próprio checkpoint (NDJSON, um cliente por linha, com flush a cada
+    cliente), então as threads não disputam nenhum lock de arquivo.
     
-    # Contador para salvamento parcial
+    Args:
+        db: Conexão com o banco de dados
+        grupo_clientes: Iterável de clientes a serem processados (ex: consumir_fila(fila))
+        grupo_id: ID do grupo (thread) para identificação
+        checkpoint: Escritor do checkpoint do grupo (ver persistencia.abrir_checkpoint)
+        registro_custos: RegistroCustos onde o tempo de cada cliente é registrado (opcional)
+        estimador: EstimadorTermino atualizado a cada cliente concluído (opcional)
+        esbocos: ColetorEsbocos exclusivo da thread, atualizado a cada cliente (opcional)
+        
+    Returns:
+        Dicionário com as estatísticas de processamento da thread
+    """
+    print(f"Iniciando processamento do grupo {grupo_id}...")
+    inicio_grupo = time.time()
+    
+    # Contadores do grupo
     contador = 0
+    clientes_recebidos = 0
+    erros = 0
+    tempo_ocupado = 0.0
     
-    # Processa cada cliente do grupo
+    # Processa cada cliente retirado da fila
     for cliente in grupo_clientes:
         inicio_cliente = time.time()
         cliente_id = cliente.get("_id")
         cod_cliente = cliente.get("cod_cliente")
         nome_cliente = cliente.get("razao_social", "")
+        clientes_recebidos += 1
         
         print(f"  [Grupo {grupo_id}] Processando cliente: {cod_cliente} - {nome_cliente}")
         
-        # Processa o cliente individualmente
-        resultado = processar_cliente_individual(db, cliente_id, USAR_CACHE)
-        if resultado:
-            resultados.append(resultado)
-            contador += 1
+        # Processa o cliente individualmente; um erro na gravação também não interrompe a thread
+        try:
+            with marcar_lote(f"grupo {grupo_id}"):
+                resultado = processar_cliente_individual(db, cliente_id, USAR_CACHE)
+            
+            if resultado:
+                # Acrescenta apenas este cliente ao checkpoint do grupo
+                checkpoint.escrever(resultado)
+                if esbocos is not None:
+                    esbocos.registrar(resultado)
+                contador += 1
             
-            # Salva resultados parciais a cada 10 clientes
-            if contador % 10 == 0:
-                with file_lock:
-                    arquivo_parcial = os.path.join(temp_dir, f'resultados_parciais_grupo_{grupo_id}.json')
-                    with open(arquivo_parcial, 'w', encoding='utf-8') as f:
-                        json.dump(resultados, f, default=json_util.default, ensure_ascii=False, indent=2)
-                    print(f"  [Grupo {grupo_id}] Resultados parciais salvos com {contador} clientes processados.")
+            # O tempo de uma atualização parcial (METRICAS) não representa o custo do cliente
+            if resultado and registro_custos is not None and not resultado.get(CAMPO_OMITIDAS):
+                registro_custos.registrar(
+                    cod_cliente,
+                    time.time() - inicio_cliente,
+                    lancamentos=resultado.get("titulos_pagos_em_dia", {}).get("total_lancamentos")
+                )
+        except Exception as e:
+            print(f"  [Grupo {grupo_id}] Erro ao processar cliente {cod_cliente}: {e}")
+            traceback.print_exc()
+            erros += 1
         
         fim_cliente = time.time()
-        print(f"  [Grupo {grupo_id}] Cliente processado em {fim_cliente - inicio_cliente:.2f} segundos.")
-    
-    # Salva os resultados finais do grupo
-    with file_lock:
-        arquivo_grupo = os.path.join(temp_dir, f'resultados_grupo_{grupo_id}.json')
-        with open(arquivo_grupo, 'w', encoding='utf-8') as f:
-            json.dump(resultados, f, default=json_util.default, ensure_ascii=False, indent=2)
+        tempo_ocupado += fim_cliente - inicio_cliente
+        
+        eta = ""
+        if estimador is not None:
+            estimador.concluir(cod_cliente)
+            eta = f" | {estimador.descricao()}"
+        print(f"  [Grupo {grupo_id}] Cliente processado em {fim_cliente - inicio_cliente:.2f} segundos.{eta}")
     
     fim_grupo = time.time()
-    print(f"Grupo {grupo_id} concluído em {fim_grupo - inicio_grupo:.2f} segundos. Total de {len(resultados)} clientes processados.")
+    print(f"Grupo {grupo_id} concluído em {fim_grupo - inicio_grupo:.2f} segundos. Total de {contador} clientes processados.")
+    
+    return {
+        "grupo_id": grupo_id,
+        "clientes_recebidos": clientes_recebidos,
+        "clientes_processados": contador,
+        "erros": erros,
+        "tempo_total": fim_grupo - inicio_grupo,
+        "tempo_ocupado": tempo_ocupado
+    }
+
+def inicializar_processo():
+    """
+    Cria a conexão do processo de trabalho.
+    
+    É executada em cada processo depois do fork, de modo que cada processo tem o seu
+    próprio MongoClient (e o seu pool de conexões) em vez de herdar o do processo principal.
+    """
+    global db_processo
+    db_processo = obter_banco()
+
+def processar_bloco_processo(bloco_clientes):
+    """
+    Processa um bloco de clientes dentro de um processo de trabalho.
+    
+    Os resultados não são gravados aqui: eles voltam ao processo principal, que é o único
+    a escrever no arquivo de resultados.
+    
+    Args:
+        bloco_clientes: Lista de clientes (_id, cod_cliente e razao_social)
+        
+    Returns:
+        Dicionário com o PID do processo e, para cada cliente, o resultado, o tempo e o erro (se houver)
+    """
+    processados = []
+    for cliente in bloco_clientes:
+        inicio_cliente = time.time()
+        erro = None
+        try:
+            with marcar_lote(f"processo {os.getpid()}"):
+                resultado = processar_cliente_individual(db_processo, cliente.get("_id"), USAR_CACHE)
+        except Exception as e:
+            resultado = None
+            erro = f"{e}\n{traceback.format_exc()}"
+        
+        processados.append({
+            "cod_cliente": cliente.get("cod_cliente"),
+            "resultado": resultado,
+            "segundos": time.time() - inicio_cliente,
+            "erro": erro
+        })
+    
+    # As estatísticas dos comandos do bloco voltam ao processo principal junto com os resultados
+    instrumentacao = obter_monitor().coletar(zerar=True) if INSTRUMENTAR_CONSULTAS else None
+    
+    return {"pid": os.getpid(), "clientes": processados, "instrumentacao": instrumentacao}
+
+def executar_com_threads(db, num_threads, codigos_validos, escritor, registro_custos, estimador,
+                         limite_clientes=None, ordem=None, diretorio_checkpoints=None, execucao=None,
+                         esbocos=None):
+    """
+    Processa os clientes com threads que compartilham a mesma conexão e retiram clientes de uma fila.
+    
+    Cada thread grava no seu próprio checkpoint; ao final, os checkpoints são mesclados em
+    streaming no arquivo de resultados completos e removidos. Se a mesclagem falhar, eles são
+    mantidos e podem ser mesclados depois com python -m persistencia.mesclar_checkpoints.
+    
+    Args:
+        db: Conexão com o banco de dados
+        num_threads: Número de threads
+        codigos_validos: Conjunto de códigos de clientes com movimentações
+        escritor: Escritor do arquivo de resultados completos
+        registro_custos: RegistroCustos onde o tempo de cada cliente é registrado
+        estimador: EstimadorTermino atualizado a cada cliente concluído
+        limite_clientes: Limite de clientes a serem processados (opcional)
+        ordem: Lista de códigos na ordem de processamento (opcional)
+        diretorio_checkpoints: Pasta dos checkpoints (padrão: resultados/temp)
+        execucao: Identificador da execução usado no nome dos checkpoints (padrão: data e hora atual)
+        esbocos: ColetorEsbocos onde os esboços das threads são mesclados ao final (opcional)
+        
+    Returns:
+        Lista com as estatísticas de cada thread
+    """
+    diretorio_checkpoints = diretorio_checkpoints or os.path.join(os.getcwd(), "resultados", "temp")
+    execucao = execucao or datetime.now().strftime("%Y%m%d_%H%M%S")
+    
+    # Fila limitada compartilhada entre as threads
+    fila = queue.Queue(maxsize=num_threads * 2)
+    estatisticas = []
+    
+    # Um checkpoint por thread, sem arquivos compartilhados
+    checkpoints = [abrir_checkpoint(diretorio_checkpoints, execucao, i+1) for i in range(num_threads)]
+    
+    # Um coletor de esboços por thread, mesclados ao final, sem lock por cliente
+    esbocos_threads = [ColetorEsbocos() if esbocos is not None else None for _ in range(num_threads)]
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
+        # Inicia as threads, que aguardam clientes na fila
+        futures = [
+            executor.submit(
+                processar_grupo_clientes, db, consumir_fila(fila), i+1, checkpoints[i],
+                registro_custos, estimador, esbocos_threads[i]
+            )
+            for i in range(num_threads)
+        ]
+        
+        # Alimenta a fila a partir do cursor e, ao final, sinaliza o fim para cada thread
+        try:
+            total_clientes = alimentar_fila(
+                db, fila, codigos_validos,
+                limite_clientes=limite_clientes, ordem=ordem, futures=futures
+            )
+            print(f"Total de {total_clientes} clientes ativos enviados para processamento.")
+        finally:
+            # Não espera por vagas na fila se as threads já tiverem terminado
+            for _ in range(num_threads):
+                if not colocar_na_fila(fila, FIM_DA_FILA, futures):
+                    break
+        
+        # Aguarda a conclusão das threads
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                estatisticas.append(future.result())
+            except Exception as e:
+                print(f"Erro ao processar grupo: {e}")
+                traceback.print_exc()
+    
+    for checkpoint in checkpoints:
+        checkpoint.fechar()
+    
+    if esbocos is not None:
+        for esbocos_thread in esbocos_threads:
+            esbocos.mesclar(esbocos_thread)
+    
+    # Mescla os checkpoints no arquivo de resultados completos, um cliente por vez
+    caminhos = [checkpoint.caminho for checkpoint in checkpoints]
+    try:
+        total_mesclados = mesclar_checkpoints(caminhos, escritor)
+        print(f"{total_mesclados} clientes mesclados a partir de {len(caminhos)} checkpoints.")
+        remover_checkpoints(caminhos)
+    except Exception as e:
+        print(f"Erro ao mesclar checkpoints (mantidos em '{diretorio_checkpoints}'): {e}")
+        traceback.print_exc()
+    
+    return estatisticas
+
+def executar_com_processos(db, num_processos, codigos_validos, escritor, registro_custos, estimador,
+                           limite_clientes=None, ordem=None, tamanho_bloco=TAMANHO_BLOCO_PROCESSO,
+                           esbocos=None):
+    """
+    Processa os clientes em processos separados, cada um com a sua própria conexão.
+    
+    O trabalho de Python (decodificação BSON, cálculo dos títulos, classificação) deixa de
+    disputar o GIL. Os blocos de clientes são enviados aos processos à medida que eles ficam
+    livres, e os resultados voltam ao processo principal, que é o único a gravar o arquivo.
     
-    return resultados
+    Args:
+        db: Conexão com o banco de dados (usada apenas para listar os clientes)
+        num_processos: Número de processos de trabalho
+        codigos_validos: Conjunto de códigos de clientes com movimentações
+        escritor: Escritor do arquivo de resultados completos
+        registro_custos: RegistroCustos onde o tempo de cada cliente é registrado
+        estimador: EstimadorTermino atualizado a cada cliente concluído
+        limite_clientes: Limite de clientes a serem processados (opcional)
+        ordem: Lista de códigos na ordem de processamento (opcional)
+        tamanho_bloco: Número de clientes enviados de uma vez para cada processo
+        esbocos: ColetorEsbocos atualizado com os resultados recebidos dos processos (opcional)
+        
+    Returns:
+        Lista com as estatísticas de cada processo
+    """
+    inicio = time.time()
+    estatisticas_por_pid = {}
+    total_clientes = 0
+    
+    def tratar_bloco(future):
+        try:
+            resposta = future.result()
+        except Exception as e:
+            print(f"Erro ao processar bloco de clientes: {e}")
+            traceback.print_exc()
+            return
+        
+        if resposta["pid"] not in estatisticas_por_pid:
+            estatisticas_por_pid[resposta["pid"]] = {
+                "grupo_id": len(estatisticas_por_pid) + 1,
+                "clientes_recebidos": 0,
+                "clientes_processados": 0,
+                "erros": 0,
+                "tempo_total": 0.0,
+                "tempo_ocupado": 0.0
+            }
+        estatistica = estatisticas_por_pid[resposta["pid"]]
+        grupo_id = estatistica["grupo_id"]
+        
+        if resposta.get("instrumentacao"):
+            obter_monitor().mesclar(resposta["instrumentacao"])
+        
+        for processado in resposta["clientes"]:
+            cod_cliente = processado["cod_cliente"]
+            resultado = processado["resultado"]
+            estatistica["clientes_recebidos"] += 1
+            estatistica["tempo_ocupado"] += processado["segundos"]
+            
+            if processado["erro"]:
+                estatistica["erros"] += 1
+                print(f"  [Processo {grupo_id}] Erro ao processar cliente {cod_cliente}: {processado['erro']}")
+            
+            if resultado:
+                escritor.escrever(resultado)
+                if esbocos is not None:
+                    esbocos.registrar(resultado)
+                estatistica["clientes_processados"] += 1
+                if not resultado.get(CAMPO_OMITIDAS):
+                    registro_custos.registrar(
+                        cod_cliente,
+                        processado["segundos"],
+                        lancamentos=resultado.get("titulos_pagos_em_dia", {}).get("total_lancamentos")
+                    )
+            
+            estimador.concluir(cod_cliente)
+            print(f"  [Processo {grupo_id}] Cliente {cod_cliente} processado em {processado['segundos']:.2f} segundos. | {estimador.descricao()}")
+    
+    with concurrent.futures.ProcessPoolExecutor(max_workers=num_processos, initializer=inicializar_processo) as executor:
+        pendentes = set()
+        blocos = agrupar_em_blocos(percorrer_clientes(db, codigos_validos, ordem), tamanho_bloco, limite_clientes)
+        
+        for bloco in blocos:
+            # Mantém no máximo dois blocos por processo em andamento, sem materializar a lista de clientes
+            if len(pendentes) >= num_processos * 2:
+                concluidos, pendentes = concurrent.futures.wait(pendentes, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in concluidos:
+                    tratar_bloco(future)
+            
+            pendentes.add(executor.submit(processar_bloco_processo, bloco))
+            total_clientes += len(bloco)
+        
+        print(f"Total de {total_clientes} clientes ativos enviados para processamento.")
+        
+        for future in concurrent.futures.as_completed(pendentes):
+            tratar_bloco(future)
+    
+    tempo_total = time.time() - inicio
+    for estatistica in estatisticas_por_pid.values():
+        estatistica["tempo_total"] = tempo_total
+    
+    return list(estatisticas_por_pid.values())
 
-def processar_clientes_paralelo(num_threads=NUM_THREADS, tamanho_lote=TAMANHO_LOTE, limite_clientes=None):
+def exibir_estatisticas_threads(estatisticas):
     """
-    Processa os clientes em paralelo usando múltiplas threads.
+    Exibe a vazão de cada thread ao final do processamento.
+    
+    Args:
+        estatisticas: Lista de dicionários retornados por processar_grupo_clientes
+    """
+    print("\n=== ESTATÍSTICAS POR THREAD ===")
+    print(f"{'Grupo':>6}{'Recebidos':>11}{'Processados':>13}{'Erros':>7}{'Ocupado (s)':>13}{'Total (s)':>11}{'Clientes/s':>12}")
+    for estatistica in sorted(estatisticas, key=lambda e: e["grupo_id"]):
+        vazao = estatistica["clientes_recebidos"] / estatistica["tempo_ocupado"] if estatistica["tempo_ocupado"] > 0 else 0
+        print(
+            f"{estatistica['grupo_id']:>6}"
+            f"{estatistica['clientes_recebidos']:>11}"
+            f"{estatistica['clientes_processados']:>13}"
+            f"{estatistica['erros']:>7}"
+            f"{estatistica['tempo_ocupado']:>13.2f}"
+            f"{estatistica['tempo_total']:>11.2f}"
+            f"{vazao:>12.2f}"
+        )
+
+def processar_clientes_paralelo(num_threads=NUM_THREADS, tamanho_lote=TAMANHO_LOTE, limite_clientes=None,
+                                modo=MODO_PARALELO, num_processos=NUM_PROCESSOS):
+    """
+    Processa os clientes em paralelo usando múltiplas threads ou múltiplos processos.
+    
+    Os clientes são lidos do cursor de geradores e distribuídos aos poucos;
+    cada thread (ou processo) recebe um bloco de clientes por vez, de modo que todos
+    terminam juntos mesmo quando alguns clientes são muito mais demorados que outros.
     
     Args:
-        num_threads: Número de threads para processamento paralelo
+        num_threads: Número de threads para processamento paralelo (modo "threads")
         tamanho_lote: Tamanho do lote para processamento em lotes
         limite_clientes: Limite de clientes a serem processados (opcional)
+        modo: "threads" ou "processos"
+        num_processos: Número de processos de trabalho (modo "processos")
         
     Returns:
-        Lista de resultados dos clientes processados
+        Caminho do arquivo com os resultados completos, ou None em caso de falha
     """
     try:
-        print(f"Iniciando processamento paralelo com {num_threads} threads...")
+        if modo not in ("threads", "processos"):
+            print(f"Modo de processamento paralelo inválido: {modo}. Use threads ou processos.")
+            return None
+        
+        num_trabalhadores = num_processos if modo == "processos" else num_threads
+        print(f"Iniciando processamento paralelo com {num_trabalhadores} {modo}...")
         inicio_total = datetime.now()
         
         # Cria a pasta de resultados se não existir
@@ -133,84 +580,95 @@ def processar_clientes_paralelo(num_threads=NUM_THREADS, tamanho_lote=TAMANHO_LO
         db = conectar_mongodb()
         if db is None:
             print("Falha ao conectar ao MongoDB.")
-            return []
+            return None
         
         # Obtém apenas os clientes com movimentações
         codigos_clientes_com_movimentacao = obter_clientes_com_movimentacao(db)
         print(f"Total de {len(codigos_clientes_com_movimentacao)} clientes com movimentações encontrados.")
         
-        # Obtém os clientes correspondentes
-        query = {
-            "cod_cliente": {"$in": list(codigos_clientes_com_movimentacao)},
-            "cod_cliente": {"$exists": True, "$ne": None}
-        }
-        projection = {"_id": 1, "cod_cliente": 1, "razao_social": 1}
-        
+        # Estima o custo de cada cliente e define a ordem da fila (maior custo primeiro)
+        historico_custos = carregar_historico_custos()
+        contagem_movimentacao = {}
+        ordem = None
+        if AGENDAMENTO_POR_CUSTO:
+            # Apenas os clientes sem histórico precisam da contagem de movimentações
+            sem_historico = clientes_sem_historico(codigos_clientes_com_movimentacao, historico_custos)
+            if sem_historico:
+                print(f"Contando movimentações de {len(sem_historico)} clientes sem histórico de custo...")
+                contagem_movimentacao = obter_contagem_movimentacao_por_cliente(db, sem_historico)
+        custos = estimar_custos(codigos_clientes_com_movimentacao, historico_custos, contagem_movimentacao)
+        if AGENDAMENTO_POR_CUSTO:
+            ordem = ordenar_por_custo(codigos_clientes_com_movimentacao, custos)
+        elif limite_clientes:
+            # Com limite, a fila segue a ordem dos códigos, para que a estimativa cubra os mesmos clientes
+            ordem = sorted(codigos_clientes_com_movimentacao)
         if limite_clientes:
-            clientes = list(db.geradores.find(query, projection).limit(limite_clientes))
-        else:
-            clientes = list(db.geradores.find(query, projection))
-        
-        total_clientes = len(clientes)
-        print(f"Total de {total_clientes} clientes ativos a processar.")
-        
-        # Divide os clientes em grupos para processamento paralelo
-        grupos_clientes = []
-        tamanho_grupo = (total_clientes + num_threads - 1) // num_threads
+            custos = {cod: custos[cod] for cod in ordem[:limite_clientes]}
+        registro_custos = RegistroCustos(historico_custos, contagem_movimentacao)
+        estimador = EstimadorTermino(custos, paralelismo=num_trabalhadores)
+        print(f"Custo estimado: {sum(custos.values()):.1f} segundos de processamento | {estimador.descricao()}")
         
-        for i in range(0, total_clientes, tamanho_grupo):
-            grupos_clientes.append(clientes[i:i+tamanho_grupo])
+        # Abre o arquivo de resultados completos; cada cliente é gravado assim que termina,
+        # sem acumular os resultados em memória
+        data_hora = datetime.now().strftime("%Y%m%d_%H%M%S")
+        escritor = abrir_escritor(
+            os.path.join(resultados_dir, f'resultados_completos_paralelo_{data_hora}'),
+            formato=FORMATO_SAIDA,
+            comprimir=COMPRIMIR_SAIDA
+        )
         
-        print(f"Clientes divididos em {len(grupos_clientes)} grupos para processamento paralelo.")
+        # Esboços de quantis das métricas, gravados ao lado dos resultados; uma atualização parcial
+        # não gera esboços, pois as métricas omitidas ficariam sem valores
+        esbocos = ColetorEsbocos() if COLETAR_ESBOCOS and selecao_completa(METRICAS_SELECIONADAS) else None
         
-        # Processa os grupos em paralelo
-        resultados_completos = []
+        with escritor:
+            if modo == "processos":
+                estatisticas = executar_com_processos(
+                    db, num_processos, codigos_clientes_com_movimentacao, escritor,
+                    registro_custos, estimador, limite_clientes=limite_clientes, ordem=ordem,
+                    esbocos=esbocos
+                )
+            else:
+                estatisticas = executar_com_threads(
+                    db, num_threads, codigos_clientes_com_movimentacao, escritor,
+                    registro_custos, estimador, limite_clientes=limite_clientes, ordem=ordem,
+                    diretorio_checkpoints=temp_dir, execucao=data_hora, esbocos=esbocos
+                )
         
-        with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
-            # Submete as tarefas para o executor
-            futures = []
-            for i, grupo in enumerate(grupos_clientes):
-                future = executor.submit(processar_grupo_clientes, db, grupo, i+1)
-                futures.append(future)
-            
-            # Processa os resultados à medida que são concluídos
-            for future in concurrent.futures.as_completed(futures):
-                try:
-                    resultados_grupo = future.result()
-                    resultados_completos.extend(resultados_grupo)
-                except Exception as e:
-                    print(f"Erro ao processar grupo: {e}")
-                    traceback.print_exc()
-        
-        # Combina todos os resultados em um único arquivo
-        data_hora = datetime.now().strftime("%Y%m%d_%H%M%S")
-        arquivo_final = os.path.join(resultados_dir, f'resultados_completos_paralelo_{data_hora}.json')
+        arquivo_final = escritor.caminho
         
-        with open(arquivo_final, 'w', encoding='utf-8') as f:
-            json.dump(resultados_completos, f, default=json_util.default, ensure_ascii=False, indent=2)
+        if esbocos is not None:
+            try:
+                arquivo_esbocos = os.path.join(resultados_dir, f"esbocos_{data_hora}.json")
+                salvar_esbocos(esbocos, arquivo_esbocos)
+                print(f"Esboços de quantis salvos em '{arquivo_esbocos}'")
+            except Exception as e:
+                print(f"Erro ao salvar esboços de quantis: {e}")
         
-        # Remove arquivos temporários
+        # Atualiza o histórico de custos para as próximas execuções
         try:
-            for arquivo in glob.glob(os.path.join(temp_dir, "resultados_parciais_*.json")):
-                os.remove(arquivo)
-            for arquivo in glob.glob(os.path.join(temp_dir, "resultados_grupo_*.json")):
-                os.remove(arquivo)
-            print("Arquivos temporários removidos com sucesso.")
+            registro_custos.salvar()
         except Exception as e:
-            print(f"Erro ao remover arquivos temporários: {e}")
+            print(f"Erro ao salvar histórico de custos: {e}")
         
         fim_total = datetime.now()
         tempo_total = (fim_total - inicio_total).total_seconds()
-        print(f"Processamento paralelo concluído para {len(resultados_completos)} clientes em {tempo_total:.2f} segundos.")
+        exibir_estatisticas_threads(estatisticas)
+        exibir_estatisticas_pool()
+        exibir_estatisticas_cache()
+        finalizar_instrumentacao()
+        print(f"Processamento paralelo concluído para {escritor.total_escritos} clientes em {tempo_total:.2f} segundos.")
         print(f"Resultados completos salvos em '{arquivo_final}'")
         
-        return resultados_completos
+        return arquivo_final
     
     except Exception as e:
         print(f"Erro no processamento paralelo: {e}")
         traceback.print_exc()
-        return []
+        return None
 
 if __name__ == "__main__":
+    validar_metricas_ambiente()
+    
     # Processa os clientes em paralelo
-    processar_clientes_paralelo(num_threads=NUM_THREADS, tamanho_lote=TAMANHO_LOTE)
+    processar_clientes_paralelo(num_threads=NUM_THREADS, tamanho_lote=TAMANHO_LOTE, modo=MODO_PARALELO)
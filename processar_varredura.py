@@ -0,0 +1,365 @@
+"""
+Sistema de Extração de Dados do ERP - Processamento por Varredura Ordenada
+Este módulo recalcula todos os clientes com uma única leitura da collection movimentacao,
+ordenada por codigo_cliente_fornecedor, em vez de consultar o índice uma vez por cliente.
+
+Os códigos dos clientes são divididos em faixas contíguas, distribuídas entre processos de
+trabalho; cada processo lê as movimentações da sua faixa em ordem de cliente (com a projeção e
+o filtro do plano de consultas e um batch_size grande) e, a cada troca de cliente no cursor,
+calcula as métricas do cliente que terminou e grava o resultado. A memória de cada processo
+fica limitada às movimentações de um cliente, além dos cadastros e dos títulos da faixa, lidos
+com uma consulta por faixa. Indicado para as atualizações noturnas completas, em que todos os
+clientes precisam ser recalculados.
+
+Uso:
+    python processar_varredura.py
+"""
+import os
+import time
+import traceback
+import concurrent.futures
+from itertools import groupby
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Importa as funções do módulo principal
+from main import (
+    MOSTRAR_LOGS, conectar_mongodb, log, criar_resultado_cliente,
+    preencher_resultado_cliente, finalizar_resultado_cliente
+)
+from selecao_metricas import METRICAS_SELECIONADAS, validar_metricas_ambiente, selecao_completa
+from consultas.base import EVENTOS_VENDA
+from consultas.registro import (
+    planejar, unir_filtros, atende, condicao_faixa, filtro_consulta, destinos_documento,
+    separar_documentos, calcular_metricas, finalizar_metricas, exibir_plano
+)
+from conexao import obter_banco, exibir_estatisticas_pool
+from persistencia import abrir_escritor, abrir_checkpoint, mesclar_checkpoints, remover_checkpoints
+from esbocos_quantis import COLETAR_ESBOCOS, ColetorEsbocos, salvar_esbocos
+
+# Carrega as variáveis de ambiente
+load_dotenv()
+
+# Processos de trabalho e faixas de clientes por processo (faixas menores equilibram melhor a carga)
+VARREDURA_PROCESSOS = int(os.getenv("VARREDURA_PROCESSOS", str(os.cpu_count() or 2)))
+VARREDURA_FAIXAS_POR_PROCESSO = int(os.getenv("VARREDURA_FAIXAS_POR_PROCESSO", "4"))
+
+# Documentos trazidos por ida ao servidor nos cursores da varredura
+VARREDURA_BATCH_SIZE = int(os.getenv("VARREDURA_BATCH_SIZE", "10000"))
+
+# Formato do arquivo de resultados completos ("json", "ndjson" ou "bson") e compressão gzip
+FORMATO_SAIDA = os.getenv("FORMATO_SAIDA", "json").lower()
+COMPRIMIR_SAIDA = os.getenv("COMPRIMIR_SAIDA", "false").lower() == "true"
+
+# Vendas que indicam que o cliente tem movimentações (como em verificar_cliente_tem_movimentacao)
+FILTRO_VENDAS = {"evento": {"$in": EVENTOS_VENDA}}
+
+# Conexão própria de cada processo de trabalho (criada por inicializar_processo)
+db_processo = None
+
+def planejar_varredura(metricas=None, data_referencia=None):
+    """
+    Monta o plano de consultas da varredura.
+
+    A consulta de movimentacao também cobre todas as vendas, sem janela de datas, para que a
+    varredura encontre os mesmos clientes que o processamento por cliente (os que têm alguma
+    venda), mesmo quando as métricas pedidas leem apenas um período ou outra collection.
+
+    Args:
+        metricas: Métricas a calcular (padrão: METRICAS_SELECIONADAS)
+        data_referencia: Data usada como "hoje" nas janelas (padrão: agora)
+
+    Returns:
+        Plano (ver consultas.registro.planejar), com a consulta de movimentacao em primeiro lugar
+    """
+    plano = planejar(METRICAS_SELECIONADAS if metricas is None else metricas, data_referencia)
+
+    movimentacao = next((consulta for consulta in plano["consultas"] if consulta["colecao"] == "movimentacao"), None)
+    if movimentacao is None:
+        movimentacao = {
+            "colecao": "movimentacao",
+            "metricas": [],
+            "conjuntos": [],
+            "filtro": dict(FILTRO_VENDAS),
+            "projecao": {"_id": 0, "codigo_cliente_fornecedor": 1, "evento": 1}
+        }
+    else:
+        plano["consultas"].remove(movimentacao)
+        movimentacao["filtro"] = unir_filtros([movimentacao["filtro"], FILTRO_VENDAS])
+        movimentacao["projecao"].setdefault("evento", 1)
+
+    plano["consultas"].insert(0, movimentacao)
+    return plano
+
+def listar_codigos_clientes(db):
+    """
+    Lista, em ordem, os códigos dos clientes cadastrados em geradores.
+
+    Como em obter_clientes_com_movimentacao, a lista é restrita aos códigos da collection
+    geradores_cod_cliente, quando ela existir. Apenas códigos de texto entram nas faixas.
+
+    Args:
+        db: Conexão com o banco de dados
+
+    Returns:
+        Lista ordenada de códigos
+    """
+    codigos = set()
+    for cliente in db.geradores.find({"cod_cliente": {"$exists": True, "$ne": None}}, {"_id": 0, "cod_cliente": 1}, batch_size=VARREDURA_BATCH_SIZE):
+        if isinstance(cliente.get("cod_cliente"), str):
+            codigos.add(cliente["cod_cliente"])
+
+    try:
+        documento = db.geradores_cod_cliente.find_one({})
+        if documento and "codigo_cliente_fornecedor" in documento:
+            codigos &= set(documento["codigo_cliente_fornecedor"])
+    except Exception as e:
+        print(f"Erro ao obter lista de códigos de clientes: {e}")
+
+    return sorted(codigos)
+
+def dividir_em_faixas(codigos, num_faixas):
+    """
+    Divide os códigos ordenados em faixas contíguas com o mesmo número de clientes.
+
+    Args:
+        codigos: Lista ordenada de códigos
+        num_faixas: Número de faixas desejado
+
+    Returns:
+        Lista de faixas {"numero", "inicio", "fim", "codigos"}, com o fim (exclusive) igual ao
+        início da faixa seguinte e None na última
+    """
+    num_faixas = max(1, min(num_faixas, len(codigos)))
+    tamanho, sobra = divmod(len(codigos), num_faixas)
+
+    faixas = []
+    posicao = 0
+    for numero in range(1, num_faixas + 1):
+        quantidade = tamanho + (1 if numero <= sobra else 0)
+        faixas.append({"numero": numero, "codigos": codigos[posicao:posicao + quantidade]})
+        posicao += quantidade
+
+    for faixa, seguinte in zip(faixas, faixas[1:] + [None]):
+        faixa["inicio"] = faixa["codigos"][0]
+        faixa["fim"] = seguinte["codigos"][0] if seguinte else None
+    return faixas
+
+def inicializar_processo():
+    """Cria a conexão do processo de trabalho, depois do fork (ver processar_paralelo)."""
+    global db_processo
+    db_processo = obter_banco()
+
+def processar_faixa(plano, faixa, diretorio_checkpoints, execucao, db=None):
+    """
+    Processa uma faixa de clientes com uma leitura ordenada das movimentações.
+
+    Os cadastros e os documentos das demais collections do plano (títulos) são lidos antes,
+    com uma consulta por faixa. Em seguida, as movimentações da faixa são percorridas em ordem
+    de cliente; quando o código muda, as métricas do cliente anterior são calculadas e o
+    resultado é gravado no checkpoint da faixa.
+
+    Args:
+        plano: Plano montado por planejar_varredura
+        faixa: Faixa de clientes (ver dividir_em_faixas)
+        diretorio_checkpoints: Pasta dos checkpoints
+        execucao: Identificador da execução usado no nome dos checkpoints
+        db: Conexão com o banco de dados (padrão: a do processo de trabalho)
+
+    Returns:
+        Dicionário com o número da faixa, o caminho do checkpoint, as estatísticas e os
+        esboços de quantis da faixa
+    """
+    inicio = time.time()
+    db = db if db is not None else db_processo
+    condicao = condicao_faixa(faixa["inicio"], faixa["fim"])
+    codigos = set(faixa["codigos"])
+
+    # Cadastros da faixa (o primeiro documento de cada código, como no find_one por código)
+    clientes = {}
+    for cliente in db.geradores.find({"cod_cliente": condicao}, batch_size=VARREDURA_BATCH_SIZE):
+        clientes.setdefault(cliente.get("cod_cliente"), cliente)
+
+    # Documentos das demais collections, separados por cliente
+    movimentacao, *outras_consultas = plano["consultas"]
+    outros_documentos = [
+        (consulta, separar_documentos(
+            consulta,
+            db[consulta["colecao"]].find(filtro_consulta(consulta, condicao), consulta["projecao"], batch_size=VARREDURA_BATCH_SIZE),
+            codigos
+        ))
+        for consulta in outras_consultas
+    ]
+
+    checkpoint = abrir_checkpoint(diretorio_checkpoints, execucao, faixa["numero"])
+    esbocos = ColetorEsbocos() if COLETAR_ESBOCOS and selecao_completa(plano["metricas"]) else None
+    processados = 0
+    erros = 0
+    linhas = 0
+
+    cursor = db.movimentacao.find(
+        filtro_consulta(movimentacao, condicao), movimentacao["projecao"], batch_size=VARREDURA_BATCH_SIZE
+    ).sort("codigo_cliente_fornecedor", 1)
+
+    try:
+        for cod_cliente, documentos in groupby(cursor, key=lambda documento: documento.get("codigo_cliente_fornecedor")):
+            # Apenas os documentos do cliente atual ficam em memória
+            documentos_cliente = {}
+            tem_venda = False
+            for documento in documentos:
+                linhas += 1
+                tem_venda = tem_venda or atende(documento, FILTRO_VENDAS)
+                for destino in destinos_documento(movimentacao, documento):
+                    documentos_cliente.setdefault(destino, []).append(documento)
+
+            cliente = clientes.get(cod_cliente)
+            if not tem_venda or cliente is None or cod_cliente not in codigos:
+                continue
+
+            try:
+                retornos = calcular_metricas(movimentacao, cod_cliente, documentos_cliente)
+                for consulta, separados in outros_documentos:
+                    retornos.update(calcular_metricas(consulta, cod_cliente, separados.pop(cod_cliente, {})))
+                retornos = finalizar_metricas(plano, cod_cliente, retornos)
+
+                resultado = criar_resultado_cliente(cliente)
+                preencher_resultado_cliente(resultado, cliente, **retornos)
+                finalizar_resultado_cliente(resultado, retornos)
+            except Exception as e:
+                print(f"  [Faixa {faixa['numero']}] Erro ao processar cliente {cod_cliente}: {e}")
+                traceback.print_exc()
+                erros += 1
+                continue
+
+            checkpoint.escrever(resultado)
+            if esbocos is not None:
+                esbocos.registrar(resultado)
+            processados += 1
+    finally:
+        checkpoint.fechar()
+
+    return {
+        "numero": faixa["numero"],
+        "caminho": checkpoint.caminho,
+        "clientes_processados": processados,
+        "erros": erros,
+        "movimentacoes_lidas": linhas,
+        "segundos": time.time() - inicio,
+        "esbocos": esbocos.para_dict() if esbocos is not None else None
+    }
+
+def processar_clientes_varredura(num_processos=VARREDURA_PROCESSOS, faixas_por_processo=VARREDURA_FAIXAS_POR_PROCESSO,
+                                 metricas=None):
+    """
+    Recalcula todos os clientes com uma leitura ordenada de movimentacao, dividida em faixas.
+
+    Cada faixa grava o seu próprio checkpoint; ao final, os checkpoints são mesclados, na ordem
+    das faixas (e, portanto, dos códigos), no arquivo de resultados completos. Os checkpoints de
+    faixas com erro são mantidos na pasta temporária.
+
+    Args:
+        num_processos: Número de processos de trabalho (1 processa as faixas no próprio processo)
+        faixas_por_processo: Número de faixas de clientes por processo
+        metricas: Métricas a calcular (padrão: METRICAS_SELECIONADAS)
+
+    Returns:
+        Caminho do arquivo com os resultados completos, ou None em caso de falha
+    """
+    try:
+        inicio_total = datetime.now()
+
+        db = conectar_mongodb()
+        if db is None:
+            print("Falha ao conectar ao MongoDB.")
+            return None
+
+        resultados_dir = os.path.join(os.getcwd(), "resultados")
+        temp_dir = os.path.join(resultados_dir, "temp")
+        os.makedirs(temp_dir, exist_ok=True)
+
+        plano = planejar_varredura(metricas)
+        if MOSTRAR_LOGS:
+            exibir_plano(plano, condicao_faixa("<inicio>", "<fim>"))
+
+        codigos = listar_codigos_clientes(db)
+        if not codigos:
+            print("Nenhum cliente encontrado.")
+            return None
+
+        faixas = dividir_em_faixas(codigos, max(1, num_processos) * max(1, faixas_por_processo))
+        print(f"Varredura de {len(codigos)} clientes em {len(faixas)} faixas com {num_processos} processos...")
+
+        data_hora = inicio_total.strftime("%Y%m%d_%H%M%S")
+        execucao = f"varredura_{data_hora}"
+        respostas = {}
+
+        def tratar_faixa(faixa, obter_resposta):
+            try:
+                resposta = obter_resposta()
+            except Exception as e:
+                print(f"Erro ao processar a faixa {faixa['numero']} ({faixa['inicio']} a {faixa['fim']}): {e}")
+                traceback.print_exc()
+                return
+            respostas[faixa["numero"]] = resposta
+            print(
+                f"Faixa {len(respostas)}/{len(faixas)} concluída: {resposta['clientes_processados']} clientes, "
+                f"{resposta['movimentacoes_lidas']} movimentações em {resposta['segundos']:.2f} segundos."
+            )
+
+        if num_processos <= 1:
+            for faixa in faixas:
+                tratar_faixa(faixa, lambda: processar_faixa(plano, faixa, temp_dir, execucao, db=db))
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=num_processos, initializer=inicializar_processo) as executor:
+                futuros = {
+                    executor.submit(processar_faixa, plano, faixa, temp_dir, execucao): faixa
+                    for faixa in faixas
+                }
+                for futuro in concurrent.futures.as_completed(futuros):
+                    tratar_faixa(futuros[futuro], futuro.result)
+
+        # Mescla os checkpoints das faixas concluídas, na ordem dos códigos
+        escritor = abrir_escritor(
+            os.path.join(resultados_dir, f"resultados_completos_varredura_{data_hora}"),
+            formato=FORMATO_SAIDA,
+            comprimir=COMPRIMIR_SAIDA
+        )
+        caminhos = [respostas[faixa["numero"]]["caminho"] for faixa in faixas if faixa["numero"] in respostas]
+        with escritor:
+            total_mesclados = mesclar_checkpoints(caminhos, escritor)
+        remover_checkpoints(caminhos)
+
+        if len(respostas) < len(faixas):
+            print(f"{len(faixas) - len(respostas)} faixas com erro; os seus checkpoints foram mantidos em '{temp_dir}'.")
+
+        # Uma atualização parcial não gera esboços, pois as métricas omitidas ficariam sem valores
+        if COLETAR_ESBOCOS and selecao_completa(plano["metricas"]):
+            try:
+                esbocos = ColetorEsbocos()
+                for resposta in respostas.values():
+                    esbocos.mesclar(ColetorEsbocos.de_dict(resposta["esbocos"]))
+                arquivo_esbocos = os.path.join(resultados_dir, f"esbocos_{data_hora}.json")
+                salvar_esbocos(esbocos, arquivo_esbocos)
+                print(f"Esboços de quantis salvos em '{arquivo_esbocos}'")
+            except Exception as e:
+                print(f"Erro ao salvar esboços de quantis: {e}")
+
+        tempo_total = (datetime.now() - inicio_total).total_seconds()
+        movimentacoes = sum(resposta["movimentacoes_lidas"] for resposta in respostas.values())
+        erros = sum(resposta["erros"] for resposta in respostas.values())
+        vazao = total_mesclados / tempo_total if tempo_total > 0 else 0
+        exibir_estatisticas_pool()
+        log(f"{movimentacoes} movimentações lidas em uma única varredura.", sempre_mostrar=True)
+        print(f"Varredura concluída para {total_mesclados} clientes em {tempo_total:.2f} segundos ({vazao:.2f} clientes/s, {erros} erros).")
+        print(f"Resultados completos salvos em '{escritor.caminho}'")
+
+        return escritor.caminho
+
+    except Exception as e:
+        print(f"Erro no processamento por varredura: {e}")
+        traceback.print_exc()
+        return None
+
+if __name__ == "__main__":
+    validar_metricas_ambiente()
+    processar_clientes_varredura()
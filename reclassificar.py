@@ -0,0 +1,328 @@
+"""
+Script para reclassificar os clientes já enviados à collection ClientInsight.
+
+Quando apenas os pesos (PESO_*), os limites das categorias (LIMITE_*) ou as faixas de pontuação
+(*_FAIXA_*, MARCAS_PARA_*) mudam no .env, as métricas gravadas na ClientInsight continuam válidas
+e não é preciso consultar o ERP novamente. Este script converte a configuração de
+classificacao/classificar.py em um pipeline de atualização (escadas $switch na mesma ordem dos
+if/elif e soma ponderada) e reescreve `categoria` e `classificacao` de todos os documentos no
+próprio servidor, com um único update_many.
+
+Uso:
+    python reclassificar.py
+    python reclassificar.py --mostrar-pipeline
+"""
+import json
+import time
+import argparse
+from datetime import datetime
+from dotenv import load_dotenv
+
+from conexao import obter_banco
+from classificacao import classificar
+
+# Carrega as variáveis de ambiente
+load_dotenv()
+
+# Campo temporário usado pelo pipeline e removido ao final
+CAMPO_TEMPORARIO = "_reclassificacao"
+
+def log(mensagem, nivel=0):
+    """Função para exibir logs."""
+    indentacao = "    " * nivel
+    print(f"{indentacao}{mensagem}")
+
+def valor_ou_zero(caminho):
+    """Expressão que retorna o campo ou 0 quando ele não existe, como o .get(campo, 0) da classificação."""
+    return {"$cond": [{"$eq": [{"$type": caminho}, "missing"]}, 0, caminho]}
+
+def escada_faixas(expressao, faixas, padrao):
+    """
+    Monta um $switch com faixas do tipo "valor >= limite", testadas na ordem informada.
+
+    Args:
+        expressao: Expressão com o valor a pontuar
+        faixas: Lista de (limite, pontos), na ordem dos if/elif de classificar.py
+        padrao: Pontos de quem não atinge nenhum limite
+
+    Returns:
+        Expressão $switch
+    """
+    return {
+        "$switch": {
+            "branches": [{"case": {"$gte": [expressao, limite]}, "then": pontos} for limite, pontos in faixas],
+            "default": padrao
+        }
+    }
+
+def escada_frequencia(expressao):
+    """$switch equivalente a classificar.pontuar_frequencia."""
+    return {
+        "$switch": {
+            "branches": [
+                {"case": {"$eq": [expressao, 6]}, "then": 10},
+                {"case": {"$eq": [expressao, 5]}, "then": 8},
+                {"case": {"$eq": [expressao, 4]}, "then": 6},
+                {"case": {"$in": [expressao, [2, 3]]}, "then": 4},
+                {"case": {"$eq": [expressao, 1]}, "then": 2}
+            ],
+            "default": 0
+        }
+    }
+
+def escada_diversificacao(expressao):
+    """$switch equivalente a classificar.pontuar_diversificacao."""
+    def entre(minimo, maximo):
+        return {"$and": [{"$gte": [expressao, minimo]}, {"$lte": [expressao, maximo]}]}
+
+    return {
+        "$switch": {
+            "branches": [
+                {"case": {"$gte": [expressao, classificar.MARCAS_PARA_10_PONTOS]}, "then": 10},
+                {"case": entre(classificar.MARCAS_PARA_8_PONTOS_MIN, classificar.MARCAS_PARA_8_PONTOS_MAX), "then": 8},
+                {"case": entre(classificar.MARCAS_PARA_6_PONTOS_MIN, classificar.MARCAS_PARA_6_PONTOS_MAX), "then": 6},
+                {"case": {"$eq": [expressao, classificar.MARCAS_PARA_4_PONTOS]}, "then": 4}
+            ],
+            "default": 0
+        }
+    }
+
+def escada_categoria(expressao):
+    """$switch equivalente a classificar.definir_categoria."""
+    return {
+        "$switch": {
+            "branches": [
+                {"case": {"$gte": [expressao, classificar.LIMITE_DIAMANTE]}, "then": classificar.CATEGORIA_DIAMANTE},
+                {"case": {"$gte": [expressao, classificar.LIMITE_OURO]}, "then": classificar.CATEGORIA_OURO},
+                {"case": {"$gte": [expressao, classificar.LIMITE_PRATA]}, "then": classificar.CATEGORIA_PRATA}
+            ],
+            "default": classificar.CATEGORIA_BRONZE
+        }
+    }
+
+def expressoes_valores():
+    """
+    Expressões com os valores usados na classificação, extraídos dos mesmos campos de
+    classificar.extrair_valores_classificacao (campos ausentes valem 0).
+
+    Returns:
+        Dicionário {faturamento, ciclos, em_dia, ate_7d, pecas, marcas: expressão}
+    """
+    lista_marcas = {"$cond": [{"$isArray": "$lista_marcas"}, "$lista_marcas", []]}
+    return {
+        "faturamento": valor_ou_zero("$faturamento_ultimos_12_meses.faturamento_liquido"),
+        "ciclos": valor_ou_zero("$ciclos_compra_ultimos_6_meses"),
+        "em_dia": valor_ou_zero("$titulos_pagos_em_dia.percentual_pagos_em_dia"),
+        "ate_7d": valor_ou_zero("$titulos_pagos_em_dia.percentual_pagos_em_ate_7d"),
+        "pecas": valor_ou_zero("$total_pecas.liquido"),
+        "marcas": {
+            "$let": {
+                "vars": {"numero": valor_ou_zero("$numero_marcas_diferentes")},
+                "in": {
+                    # Se numero_marcas for 0 mas há marcas na lista, usa o tamanho da lista
+                    "$cond": [
+                        {"$and": [{"$eq": ["$$numero", 0]}, {"$gt": [{"$size": lista_marcas}, 0]}]},
+                        {"$size": lista_marcas},
+                        "$$numero"
+                    ]
+                }
+            }
+        }
+    }
+
+def compilar_pipeline(data_reclassificacao=None):
+    """
+    Converte a configuração atual da classificação em um pipeline de atualização.
+
+    Os valores são extraídos dos mesmos campos de classificar.extrair_valores_classificacao.
+    Documentos com valores não numéricos recebem a classificação padrão de classificar_cliente
+    em caso de erro (pontuação 0 e categoria Bronze).
+
+    Args:
+        data_reclassificacao: Data gravada em classificacao.reclassificado_em (padrão: agora)
+
+    Returns:
+        Lista de estágios para update_many
+    """
+    if data_reclassificacao is None:
+        data_reclassificacao = datetime.now()
+
+    valores = f"${CAMPO_TEMPORARIO}"
+    pesos = {
+        "faturamento": classificar.PESO_FATURAMENTO,
+        "frequencia": classificar.PESO_FREQUENCIA,
+        "pontualidade": classificar.PESO_PONTUALIDADE,
+        "volume_pecas": classificar.PESO_VOLUME_PECAS,
+        "diversificacao": classificar.PESO_DIVERSIFICACAO
+    }
+
+    # 1. Valores usados na classificação (campos ausentes valem 0)
+    extrair_valores = {"$set": {CAMPO_TEMPORARIO: expressoes_valores()}}
+
+    # 2. Validação: a classificação escalar falha com valores não numéricos nesses critérios
+    validar = {
+        "$set": {
+            f"{CAMPO_TEMPORARIO}.valido": {
+                "$and": [
+                    {"$isNumber": f"{valores}.{campo}"}
+                    for campo in ("faturamento", "em_dia", "ate_7d", "pecas", "marcas")
+                ]
+            }
+        }
+    }
+
+    # 3. Pontuação de cada critério
+    pontuar = {
+        "$set": {
+            f"{CAMPO_TEMPORARIO}.pontos": {
+                "$cond": [
+                    f"{valores}.valido",
+                    {
+                        "faturamento": escada_faixas(f"{valores}.faturamento", [
+                            (classificar.FATURAMENTO_FAIXA_10, 10),
+                            (classificar.FATURAMENTO_FAIXA_8, 8),
+                            (classificar.FATURAMENTO_FAIXA_6, 6),
+                            (classificar.FATURAMENTO_FAIXA_4, 4)
+                        ], 2),
+                        "frequencia": escada_frequencia(f"{valores}.ciclos"),
+                        "pontualidade": escada_faixas({"$add": [f"{valores}.em_dia", f"{valores}.ate_7d"]}, [
+                            (classificar.PONTUALIDADE_FAIXA_10, 10),
+                            (classificar.PONTUALIDADE_FAIXA_8, 8),
+                            (classificar.PONTUALIDADE_FAIXA_6, 6),
+                            (classificar.PONTUALIDADE_FAIXA_4, 4)
+                        ], 2),
+                        "volume_pecas": escada_faixas(f"{valores}.pecas", [
+                            (classificar.PECAS_FAIXA_10, 10),
+                            (classificar.PECAS_FAIXA_8, 8),
+                            (classificar.PECAS_FAIXA_6, 6),
+                            (classificar.PECAS_FAIXA_4, 4)
+                        ], 2),
+                        "diversificacao": escada_diversificacao(f"{valores}.marcas")
+                    },
+                    None
+                ]
+            }
+        }
+    }
+
+    # 4. Pontuação final ponderada, arredondada como em combinar_pontuacoes
+    ponderar = {
+        "$set": {
+            f"{CAMPO_TEMPORARIO}.pontuacao_final": {
+                "$cond": [
+                    f"{valores}.valido",
+                    {"$round": [{"$add": [
+                        {"$multiply": [f"{valores}.pontos.{criterio}", peso]} for criterio, peso in pesos.items()
+                    ]}, 2]},
+                    0
+                ]
+            }
+        }
+    }
+
+    # 5. Categoria e detalhes no mesmo formato de classificar_cliente
+    def detalhe(criterio, campos_valor):
+        detalhes = dict(campos_valor)
+        detalhes.update({
+            "pontuacao": f"{valores}.pontos.{criterio}",
+            "peso": {"$literal": pesos[criterio]},
+            "ponderado": {"$round": [{"$multiply": [f"{valores}.pontos.{criterio}", pesos[criterio]]}, 2]}
+        })
+        return detalhes
+
+    categoria = escada_categoria(f"{valores}.pontuacao_final")
+    classificar_documento = {
+        "$set": {
+            "categoria": {"$cond": [f"{valores}.valido", categoria, classificar.CATEGORIA_BRONZE]},
+            "classificacao": {
+                "$cond": [
+                    f"{valores}.valido",
+                    {
+                        "pontuacao_final": f"{valores}.pontuacao_final",
+                        "categoria": categoria,
+                        "pontuacoes_criterios": {
+                            "faturamento": detalhe("faturamento", {"valor": f"{valores}.faturamento"}),
+                            "frequencia": detalhe("frequencia", {"valor": f"{valores}.ciclos"}),
+                            "pontualidade": detalhe("pontualidade", {
+                                "valor_pagos_em_dia": f"{valores}.em_dia",
+                                "valor_pagos_ate_7d": f"{valores}.ate_7d"
+                            }),
+                            "volume_pecas": detalhe("volume_pecas", {"valor": f"{valores}.pecas"}),
+                            "diversificacao": detalhe("diversificacao", {"valor": f"{valores}.marcas"})
+                        },
+                        "reclassificado_em": {"$literal": data_reclassificacao}
+                    },
+                    {
+                        "pontuacao_final": 0,
+                        "categoria": classificar.CATEGORIA_BRONZE,
+                        "erro": "Valores não numéricos nos critérios da classificação",
+                        "reclassificado_em": {"$literal": data_reclassificacao}
+                    }
+                ]
+            }
+        }
+    }
+
+    return [extrair_valores, validar, pontuar, ponderar, classificar_documento, {"$unset": CAMPO_TEMPORARIO}]
+
+def contar_categorias(collection):
+    """Retorna a quantidade de documentos por categoria."""
+    return {
+        item["_id"]: item["total"]
+        for item in collection.aggregate([{"$group": {"_id": "$categoria", "total": {"$sum": 1}}}])
+    }
+
+def reclassificar(db, nome_collection="ClientInsight"):
+    """
+    Reescreve a categoria e a classificação de todos os documentos da collection no servidor.
+
+    Args:
+        db: Conexão com o banco de dados MongoDB
+        nome_collection: Collection com os resultados enviados por enviar_para_mongodb.py
+
+    Returns:
+        Dicionário com os documentos encontrados e alterados, o tempo e as categorias antes e depois
+    """
+    collection = db[nome_collection]
+
+    categorias_antes = contar_categorias(collection)
+
+    inicio = time.perf_counter()
+    resultado = collection.update_many({}, compilar_pipeline())
+    segundos = time.perf_counter() - inicio
+
+    return {
+        "encontrados": resultado.matched_count,
+        "alterados": resultado.modified_count,
+        "segundos": segundos,
+        "categorias_antes": categorias_antes,
+        "categorias_depois": contar_categorias(collection)
+    }
+
+def exibir_resumo(resumo):
+    """Exibe o resultado da reclassificação e a mudança na distribuição das categorias."""
+    log(f"Documentos reclassificados: {resumo['encontrados']} ({resumo['alterados']} alterados) em {resumo['segundos']:.2f} segundos")
+    log("Distribuição das categorias (antes -> depois):")
+    categorias = [
+        classificar.CATEGORIA_DIAMANTE,
+        classificar.CATEGORIA_OURO,
+        classificar.CATEGORIA_PRATA,
+        classificar.CATEGORIA_BRONZE
+    ]
+    outras = set(resumo["categorias_antes"]) | set(resumo["categorias_depois"])
+    categorias += sorted((categoria for categoria in outras if categoria not in categorias), key=str)
+    for categoria in categorias:
+        antes = resumo["categorias_antes"].get(categoria, 0)
+        depois = resumo["categorias_depois"].get(categoria, 0)
+        log(f"{str(categoria):<12} {antes:>8} -> {depois:>8}", nivel=1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reclassificar no servidor os clientes da collection ClientInsight")
+    parser.add_argument("--collection", default="ClientInsight", help="Collection com os resultados")
+    parser.add_argument("--mostrar-pipeline", action="store_true", help="Apenas exibir o pipeline gerado, sem alterar a collection")
+    args = parser.parse_args()
+
+    if args.mostrar_pipeline:
+        print(json.dumps(compilar_pipeline(), ensure_ascii=False, indent=2, default=str))
+    else:
+        exibir_resumo(reclassificar(obter_banco(), nome_collection=args.collection))
@@ -0,0 +1,238 @@
+"""
+Sistema de Extração de Dados do ERP - Segmentação Ótima em Uma Dimensão
+Este módulo divide uma coluna de valores (faturamento, peças, pontualidade) em k grupos
+contíguos com a menor soma dos quadrados das distâncias à média de cada grupo, o mesmo critério
+do K-means, mas com a solução exata e determinística (quebras naturais de Jenks / Ckmeans.1d.dp).
+
+Os valores são ordenados e agrupados por valor distinto (com o número de repetições como peso),
+e a programação dinâmica usa somas acumuladas, de modo que o custo de qualquer grupo sai em O(1).
+Cada uma das k camadas é resolvida por divisão e conquista, aproveitando que o ponto de corte
+ótimo nunca recua quando o fim do grupo avança: cada nível da recursão avalia O(n) candidatos
+de uma vez com o NumPy, em O(k·n·log n) no total.
+
+Uso:
+    python segmentacao_otima.py resultados/resultado_completo_20250601_101500.json
+"""
+import sys
+
+# O NumPy é necessário apenas para a segmentação
+from dependencias import np, exigir_numpy
+
+# Número de grupos usado nas sugestões de faixas (um por nível de pontuação: 2, 4, 6, 8 e 10)
+GRUPOS_FAIXAS = 5
+
+# Candidatos avaliados de uma vez em cada nível da divisão e conquista (mantém os arrays
+# temporários no cache do processador)
+CANDIDATOS_POR_BLOCO = 1 << 16
+
+def custo_grupos(acumulados, inicios, fins):
+    """
+    Soma dos quadrados das distâncias à média dos grupos valores[inicio:fim].
+
+    Args:
+        acumulados: Tupla (pesos, somas, somas dos quadrados) acumulados, com um zero inicial
+        inicios: Array com o início (inclusive) de cada grupo
+        fins: Array com o fim (exclusive) de cada grupo
+
+    Returns:
+        Array com o custo de cada grupo
+    """
+    pesos, somas, quadrados = acumulados
+    peso = pesos[fins] - pesos[inicios]
+    soma = somas[fins] - somas[inicios]
+    custo = quadrados[fins] - quadrados[inicios] - soma * soma / peso
+    # Arredondamentos das somas acumuladas podem gerar custos levemente negativos
+    return np.maximum(custo, 0.0)
+
+def avaliar_intervalos(anterior, acumulados, meios, inicios_j, quantidades):
+    """
+    Encontra o melhor corte para o fim central de cada intervalo.
+
+    Args:
+        anterior: Custos ótimos da camada anterior
+        acumulados: Somas acumuladas (ver custo_grupos)
+        meios: Array com o fim central de cada intervalo
+        inicios_j: Array com o primeiro corte candidato de cada intervalo
+        quantidades: Array com o número de cortes candidatos de cada intervalo
+
+    Returns:
+        Tupla (minimos, melhores): o menor custo e o primeiro corte que o atinge, por intervalo
+    """
+    posicoes = np.cumsum(quantidades) - quantidades
+    total = int(posicoes[-1] + quantidades[-1])
+
+    # Os candidatos de todos os intervalos ficam em um único array; as somas do fim de cada
+    # intervalo são lidas uma vez e repetidas para os seus candidatos
+    candidatos = np.arange(total) - np.repeat(posicoes - inicios_j, quantidades)
+    peso, soma, quadrados = (
+        np.repeat(acumulado[meios], quantidades) - acumulado[candidatos]
+        for acumulado in acumulados
+    )
+    valores = np.maximum(quadrados - soma * soma / peso, 0.0)
+    valores += anterior[candidatos]
+
+    # O primeiro candidato com o menor custo garante um desempate determinístico
+    minimos = np.minimum.reduceat(valores, posicoes)
+    empates = np.flatnonzero(valores == np.repeat(minimos, quantidades))
+    return minimos, candidatos[empates[np.searchsorted(empates, posicoes)]]
+
+def resolver_camada(anterior, acumulados, grupos_anteriores, n):
+    """
+    Calcula uma camada da programação dinâmica por divisão e conquista.
+
+    Para cada fim i (exclusive), o custo da camada é o menor anterior[j] + custo(j, i), com j
+    entre o número de grupos anteriores e i - 1. Todas as posições centrais de um nível da
+    recursão são resolvidas juntas, em blocos de até CANDIDATOS_POR_BLOCO candidatos, que
+    cabem no cache do processador.
+
+    Args:
+        anterior: Custos ótimos da camada anterior, indexados pelo fim do último grupo
+        acumulados: Somas acumuladas (ver custo_grupos)
+        grupos_anteriores: Número de grupos da camada anterior
+        n: Número de valores distintos
+
+    Returns:
+        Tupla (custos, cortes): o custo ótimo e o início do último grupo para cada fim
+    """
+    custos = np.full(n + 1, np.inf)
+    cortes = np.zeros(n + 1, dtype=np.int64)
+
+    # Intervalos pendentes: fins de inicio_i a fim_i, com cortes entre inicio_j e fim_j
+    inicio_i = np.array([grupos_anteriores + 1])
+    fim_i = np.array([n])
+    inicio_j = np.array([grupos_anteriores])
+    fim_j = np.array([n - 1])
+
+    while len(inicio_i):
+        meio = (inicio_i + fim_i) // 2
+        quantidades = np.minimum(fim_j, meio - 1) - inicio_j + 1
+
+        # Divide os intervalos em blocos com cerca de CANDIDATOS_POR_BLOCO candidatos
+        acumuladas = np.cumsum(quantidades)
+        divisoes = np.searchsorted(
+            acumuladas,
+            np.arange(CANDIDATOS_POR_BLOCO, int(acumuladas[-1]), CANDIDATOS_POR_BLOCO),
+            side="right"
+        )
+        melhores = np.empty_like(meio)
+        for inicio, fim in zip(np.concatenate(([0], divisoes)), np.concatenate((divisoes, [len(meio)]))):
+            if inicio == fim:
+                continue
+            minimos, melhores[inicio:fim] = avaliar_intervalos(
+                anterior, acumulados, meio[inicio:fim], inicio_j[inicio:fim], quantidades[inicio:fim]
+            )
+            custos[meio[inicio:fim]] = minimos
+        cortes[meio] = melhores
+
+        # O corte ótimo dos fins à esquerda do meio não passa do melhor corte do meio, e o dos
+        # fins à direita não fica antes dele
+        esquerda = inicio_i <= meio - 1
+        direita = meio + 1 <= fim_i
+        inicio_i, fim_i, inicio_j, fim_j = (
+            np.concatenate((inicio_i[esquerda], meio[direita] + 1)),
+            np.concatenate((meio[esquerda] - 1, fim_i[direita])),
+            np.concatenate((inicio_j[esquerda], melhores[direita])),
+            np.concatenate((melhores[esquerda], fim_j[direita]))
+        )
+
+    return custos, cortes
+
+def segmentar(valores, grupos=GRUPOS_FAIXAS):
+    """
+    Divide os valores em grupos contíguos com a menor soma dos quadrados dentro dos grupos.
+
+    O resultado é determinístico: a mesma entrada sempre gera os mesmos limites. Valores
+    ausentes (NaN) são ignorados; com menos valores distintos do que grupos, cada valor
+    distinto forma um grupo.
+
+    Args:
+        valores: Iterável de números
+        grupos: Número de grupos (k)
+
+    Returns:
+        Dicionário com, para cada grupo em ordem crescente, o limite inferior (menor valor do
+        grupo), o limite superior, o centro (média) e o tamanho, além do custo total
+    """
+    exigir_numpy("a segmentação ótima")
+
+    valores = np.asarray(valores, dtype=float).ravel()
+    valores = valores[~np.isnan(valores)]
+    if len(valores) == 0:
+        raise ValueError("Nenhum valor para segmentar")
+    if grupos < 1:
+        raise ValueError("O número de grupos deve ser pelo menos 1")
+
+    distintos, repeticoes = np.unique(valores, return_counts=True)
+    n = len(distintos)
+    grupos = min(grupos, n)
+
+    # Centralizar os valores reduz a perda de precisão nas somas acumuladas dos quadrados
+    pesos = repeticoes.astype(float)
+    centralizados = distintos - np.average(distintos, weights=pesos)
+    acumulados = tuple(
+        np.concatenate(([0.0], np.cumsum(coluna)))
+        for coluna in (pesos, pesos * centralizados, pesos * centralizados * centralizados)
+    )
+
+    # Primeira camada: um único grupo do início até cada fim
+    custos = np.full(n + 1, np.inf)
+    custos[1:] = custo_grupos(acumulados, np.zeros(n, dtype=np.int64), np.arange(1, n + 1))
+    cortes_por_camada = []
+    for camada in range(1, grupos):
+        custos, cortes = resolver_camada(custos, acumulados, camada, n)
+        cortes_por_camada.append(cortes)
+
+    # Reconstrói os grupos do último para o primeiro
+    limites = [n]
+    for cortes in reversed(cortes_por_camada):
+        limites.append(int(cortes[limites[-1]]))
+    limites.append(0)
+    limites.reverse()
+
+    inicios = np.array(limites[:-1])
+    fins_grupos = np.array(limites[1:])
+    pesos_grupos = acumulados[0][fins_grupos] - acumulados[0][inicios]
+    somas_grupos = np.add.reduceat(pesos * distintos, inicios)
+
+    return {
+        "limites_inferiores": distintos[inicios].tolist(),
+        "limites_superiores": distintos[fins_grupos - 1].tolist(),
+        "centros": (somas_grupos / pesos_grupos).tolist(),
+        "tamanhos": pesos_grupos.astype(int).tolist(),
+        "custo": float(custos[n])
+    }
+
+def exibir_segmentacao(segmentacao, formato="{:.2f}"):
+    """Exibe os limites, o centro e o tamanho de cada grupo de uma segmentação."""
+    for numero, (inferior, superior, centro, tamanho) in enumerate(zip(
+        segmentacao["limites_inferiores"],
+        segmentacao["limites_superiores"],
+        segmentacao["centros"],
+        segmentacao["tamanhos"]
+    ), start=1):
+        print(
+            f"Grupo {numero}: {formato.format(inferior)} a {formato.format(superior)} "
+            f"(centro {formato.format(centro)}, {tamanho} clientes)"
+        )
+
+if __name__ == "__main__":
+    from persistencia import carregar_colunas, listar_arquivos_resultados
+
+    if len(sys.argv) > 1:
+        caminho = sys.argv[1]
+    else:
+        arquivos = listar_arquivos_resultados("resultados", prefixo="resultado_completo_")
+        caminho = arquivos[-1] if arquivos else None
+    if not caminho:
+        print("Nenhum arquivo de resultados encontrado em 'resultados'.")
+        sys.exit(1)
+
+    faturamentos = carregar_colunas(caminho, {"faturamento": "faturamento_ultimos_12_meses.faturamento_liquido"})["faturamento"]
+    faturamentos = faturamentos[faturamentos > 0]
+
+    if len(faturamentos) == 0:
+        print(f"Nenhum faturamento positivo em '{caminho}'.")
+        sys.exit(1)
+
+    print(f"Faturamento de {len(faturamentos)} clientes de '{caminho}' em {GRUPOS_FAIXAS} grupos:\n")
+    exibir_segmentacao(segmentar(faturamentos))
@@ -0,0 +1,144 @@
+"""
+Sistema de Extração de Dados do ERP - Seleção de Métricas
+Este módulo define as métricas calculadas para cada cliente (uma por consulta), os campos do
+resultado preenchidos por cada uma e a seleção das métricas de uma execução (--metricas ou
+variável METRICAS), para que atualizações pontuais executem apenas as consultas necessárias.
+
+Os campos das métricas não calculadas ficam nulos (e não zerados) e as métricas aparecem em
+"metricas_omitidas"; a classificação só é feita quando todas as métricas que ela usa foram
+calculadas. No envio para a collection ClientInsight, os campos omitidos são retirados do
+documento, de modo que os valores já gravados de cada cliente são mantidos.
+"""
+import os
+import sys
+from dotenv import load_dotenv
+
+# Carrega as variáveis de ambiente
+load_dotenv()
+
+# Métricas, na ordem das consultas, com os campos do resultado preenchidos por cada uma
+METRICAS = {
+    "data_primeira_compra": (
+        "data_primeira_compra", "data_primeira_compra_timestamp",
+        "data_ultima_compra", "data_ultima_compra_timestamp"
+    ),
+    "faturamento": ("faturamento_ultimos_12_meses",),
+    "ciclos": ("ciclos_compra_ultimos_6_meses", "ciclo_atual", "meses_compra"),
+    "pecas": ("total_pecas",),
+    "pagamentos": ("titulos_pagos_em_dia", "limite_credito_utilizado"),
+    "valor_por_marca": ("valor_por_marca",),
+    "marcas": ("numero_marcas_diferentes", "lista_marcas")
+}
+
+# Métricas usadas pela classificação e campos preenchidos por ela
+METRICAS_CLASSIFICACAO = ("faturamento", "ciclos", "pecas", "pagamentos", "marcas")
+CAMPOS_CLASSIFICACAO = ("categoria", "classificacao")
+
+# Campo do resultado com as métricas (e a classificação) não calculadas
+CAMPO_OMITIDAS = "metricas_omitidas"
+
+def interpretar_metricas(texto):
+    """
+    Converte uma lista de métricas separadas por vírgula na seleção de métricas.
+
+    Args:
+        texto: Texto como "faturamento,pecas"; vazio ou "todas" seleciona todas as métricas
+
+    Returns:
+        Tupla com as métricas selecionadas, na ordem de METRICAS
+    """
+    nomes = {nome.strip().lower() for nome in (texto or "").split(",") if nome.strip()}
+    if not nomes or nomes == {"todas"}:
+        return tuple(METRICAS)
+
+    desconhecidas = sorted(nomes - set(METRICAS))
+    if desconhecidas:
+        raise ValueError(f"Métricas desconhecidas: {', '.join(desconhecidas)}. Use: {', '.join(METRICAS)}")
+    return tuple(nome for nome in METRICAS if nome in nomes)
+
+# Métricas calculadas por padrão (todas, se METRICAS não estiver definida). Uma variável inválida
+# não interrompe a importação: o erro fica em ERRO_METRICAS e é informado por validar_metricas_ambiente
+try:
+    METRICAS_SELECIONADAS = interpretar_metricas(os.getenv("METRICAS", ""))
+    ERRO_METRICAS = None
+except ValueError as e:
+    METRICAS_SELECIONADAS = tuple(METRICAS)
+    ERRO_METRICAS = str(e)
+
+def validar_metricas_ambiente():
+    """
+    Interrompe a execução com uma mensagem clara se a variável METRICAS for inválida.
+
+    Os scripts de processamento chamam esta função antes de começar; os módulos que apenas
+    importam este (ex: enviar_para_mongodb) não dependem da variável.
+    """
+    if ERRO_METRICAS:
+        sys.exit(f"Erro na variável METRICAS: {ERRO_METRICAS}")
+
+def selecao_completa(metricas):
+    """Indica se a seleção inclui todas as métricas."""
+    return set(METRICAS) <= set(metricas)
+
+def marcar_omitidas(resultado_cliente, metricas_calculadas):
+    """
+    Anula os campos das métricas não calculadas e registra essas métricas no resultado.
+
+    Args:
+        resultado_cliente: Dicionário de resultados do cliente, já preenchido
+        metricas_calculadas: Métricas cujas consultas foram executadas
+
+    Returns:
+        Lista das métricas omitidas (vazia quando todas foram calculadas)
+    """
+    omitidas = [nome for nome in METRICAS if nome not in metricas_calculadas]
+    for nome in omitidas:
+        for campo in METRICAS[nome]:
+            resultado_cliente[campo] = None
+    if omitidas:
+        resultado_cliente[CAMPO_OMITIDAS] = omitidas
+    return omitidas
+
+def pode_classificar(metricas_calculadas):
+    """Indica se todas as métricas usadas pela classificação foram calculadas."""
+    return all(nome in metricas_calculadas for nome in METRICAS_CLASSIFICACAO)
+
+def omitir_classificacao(resultado_cliente):
+    """Anula a categoria e a classificação e as registra entre as omissões do resultado."""
+    for campo in CAMPOS_CLASSIFICACAO:
+        resultado_cliente[campo] = None
+    resultado_cliente.setdefault(CAMPO_OMITIDAS, []).append("classificacao")
+    return resultado_cliente
+
+def campos_omitidos(documento):
+    """
+    Lista os campos de um resultado que não foram calculados.
+
+    Args:
+        documento: Resultado de um cliente (dicionário ou documento BSON bruto)
+
+    Returns:
+        Lista de campos, incluindo o próprio CAMPO_OMITIDAS; vazia para um resultado completo
+    """
+    omitidas = documento.get(CAMPO_OMITIDAS)
+    if not omitidas:
+        return []
+
+    campos = [CAMPO_OMITIDAS]
+    for nome in omitidas:
+        campos.extend(CAMPOS_CLASSIFICACAO if nome == "classificacao" else METRICAS.get(nome, ()))
+    return campos
+
+def remover_omitidos(documento):
+    """
+    Retira de um resultado os campos não calculados, para que o envio mantenha os valores já
+    gravados na collection.
+
+    Args:
+        documento: Dicionário de resultados de um cliente (alterado no próprio objeto)
+
+    Returns:
+        O próprio documento
+    """
+    for campo in campos_omitidos(documento):
+        documento.pop(campo, None)
+    return documento
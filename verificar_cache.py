@@ -0,0 +1,137 @@
+"""
+Sistema de Extração de Dados do ERP - Verificação do Cache de Consultas
+Este script verifica que um cancelamento de venda e uma baixa de título invalidam as entradas do
+cache de consultas (cache_consultas). Um cliente fictício é gravado em um banco temporário do
+servidor configurado (MONGODB_URI), removido ao final, e o cache usa um arquivo SQLite temporário.
+
+Com o marcador completo, a entrada deve ser descartada logo após a alteração; com o marcador por
+contagem, que não percebe alterações de documentos existentes, ela deve valer apenas no dia em
+que foi gravada. O script termina com código 1 se alguma verificação falhar. Execute-o após
+qualquer mudança em calcular_marcador_cliente, calcular_marcador_completo ou CacheConsultas.chave.
+
+Uso:
+    python verificar_cache.py
+    python verificar_cache.py --banco verificacao_cache
+"""
+import os
+import sys
+import argparse
+import tempfile
+from datetime import date, datetime, timedelta
+
+from conexao import obter_cliente
+from cache_consultas import CacheConsultas, calcular_marcador_cliente
+from consultas.titulos_pagos import TIPOS_PAGAMENTO
+
+# Cliente fictício gravado no banco temporário
+COD_CLIENTE = "VERIFICACAO_CACHE"
+
+def gravar_cliente(db):
+    """Grava uma venda e um título em aberto do cliente fictício."""
+    db.movimentacao.insert_one({
+        "codigo_cliente_fornecedor": COD_CLIENTE,
+        "evento": "1",
+        "cancelada": False,
+        "data": datetime.now(),
+        "valor_total": 100.0
+    })
+    db.lancamentos_completo.insert_one({
+        "cod_cliente": COD_CLIENTE,
+        "tipo": "R",
+        "substituido": False,
+        "titulo": True,
+        "tipo_pgto_descricao": TIPOS_PAGAMENTO[0],
+        "data_vencimento": datetime.now(),
+        "data_pagamento": None,
+        "valor_pago_recebido": 0.0
+    })
+
+def cancelar_venda(db):
+    """Cancela a venda do cliente fictício."""
+    db.movimentacao.update_one({"codigo_cliente_fornecedor": COD_CLIENTE}, {"$set": {"cancelada": True}})
+
+def baixar_titulo(db):
+    """Registra o pagamento do título do cliente fictício."""
+    db.lancamentos_completo.update_one(
+        {"cod_cliente": COD_CLIENTE},
+        {"$set": {"data_pagamento": datetime.now(), "valor_pago_recebido": 100.0}}
+    )
+
+def verificar_alteracao(db, diretorio, modo, descricao, alterar):
+    """
+    Grava uma entrada sem janela de datas, altera os dados do cliente e busca a entrada de novo.
+
+    Args:
+        db: Banco temporário, já com o cliente fictício
+        diretorio: Diretório dos arquivos SQLite temporários
+        modo: Marcador do cache, "contagem" ou "completo"
+        descricao: Descrição da alteração
+        alterar: Função que recebe o banco e altera os dados do cliente
+
+    Returns:
+        Lista de falhas (descrições)
+    """
+    caminho = os.path.join(diretorio, f"cache_{modo}_{alterar.__name__}.sqlite")
+    hoje = date.today()
+
+    cache = CacheConsultas(caminho, data_referencia=hoje, modo=modo)
+    cache.guardar("pecas", COD_CLIENTE, calcular_marcador_cliente(db, COD_CLIENTE, modo), {"total": 1})
+    cache.fechar()
+
+    alterar(db)
+    marcador = calcular_marcador_cliente(db, COD_CLIENTE, modo)
+
+    falhas = []
+    if modo == "completo":
+        cache = CacheConsultas(caminho, data_referencia=hoje, modo=modo)
+        encontrado, _ = cache.obter("pecas", COD_CLIENTE, marcador)
+        cache.fechar()
+        if encontrado:
+            falhas.append(f"{descricao} não invalidou a entrada (marcador completo)")
+    else:
+        cache = CacheConsultas(caminho, data_referencia=hoje + timedelta(days=1), modo=modo)
+        encontrado, _ = cache.obter("pecas", COD_CLIENTE, marcador)
+        cache.fechar()
+        if encontrado:
+            falhas.append(f"{descricao} não invalidou a entrada no dia seguinte (marcador por contagem)")
+    return falhas
+
+def main(nome_banco="verificacao_cache"):
+    """
+    Executa as verificações em um banco temporário, removido ao final.
+
+    Args:
+        nome_banco: Nome do banco temporário (não deve ser o banco do ERP)
+
+    Returns:
+        Número de falhas
+    """
+    cliente = obter_cliente()
+    falhas = []
+    verificacoes = 0
+    try:
+        with tempfile.TemporaryDirectory() as diretorio:
+            for modo in ("completo", "contagem"):
+                for descricao, alterar in (("O cancelamento da venda", cancelar_venda), ("A baixa do título", baixar_titulo)):
+                    cliente.drop_database(nome_banco)
+                    db = cliente[nome_banco]
+                    gravar_cliente(db)
+                    falhas.extend(verificar_alteracao(db, diretorio, modo, descricao, alterar))
+                    verificacoes += 1
+    finally:
+        cliente.drop_database(nome_banco)
+
+    for falha in falhas:
+        print(f"FALHA: {falha}")
+    print(f"Cache de consultas: {verificacoes - len(falhas)}/{verificacoes} verificações corretas")
+    return len(falhas)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verifica que cancelamentos e baixas invalidam o cache de consultas")
+    parser.add_argument("--banco", default="verificacao_cache", help="Banco temporário (padrão: verificacao_cache)")
+    args = parser.parse_args()
+
+    if args.banco == os.getenv("MONGODB_DATABASE"):
+        sys.exit("O banco temporário não pode ser o banco do ERP (MONGODB_DATABASE).")
+
+    sys.exit(1 if main(args.banco) else 0)